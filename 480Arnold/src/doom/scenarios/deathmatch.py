@@ -49,7 +49,7 @@ def parse_reward_values(reward_values):
     return reward_values
 
 
-def main(parser, args, parameter_server=None):
+def main(parser, args, parameter_server=None, inference_server=None):
     """
     Deathmatch running script.
     """
@@ -121,6 +121,11 @@ def main(parser, args, parameter_server=None):
         assert params.gpu_id == -1
         parameter_server.register_model(network.module)
 
+    # Shared inference server (evaluation of several co-located agents)
+    if inference_server:
+        assert params.evaluate
+        network = inference_server.register_model(network, params)
+
     # Visualize only
     if params.evaluate:
         evaluate_deathmatch(game, network, params)
@@ -0,0 +1,147 @@
+import os
+import time
+import json
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from logging import getLogger
+
+
+# Arnold
+from ...utils import set_num_threads, get_device_mapping
+from ...model import register_model_args, get_model_class
+from ...args import finalize_args
+from ...inference_server import InferenceServer
+from ..game import GameState
+
+
+logger = getLogger()
+
+
+def register_scenario_args(parser):
+    """
+    Register scenario parameters.
+    """
+    parser.add_argument("--n_agents", type=int, default=8,
+                        help="Number of agents acting at the same time")
+    parser.add_argument("--bench_time", type=float, default=30,
+                        help="Duration (in seconds) of every run")
+    parser.add_argument("--inference_max_delay", type=float, default=5,
+                        help="Time (in ms) the inference server waits for "
+                             "other agents before running a batch")
+
+
+def main(parser, args, parameter_server=None):
+    """
+    Frames per second of `n_agents` agents acting with their own network, and
+    with a shared inference server. There is no game, states are random
+    screens, so this only measures the acting part of evaluation.
+    """
+    register_model_args(parser, args)
+    register_scenario_args(parser)
+    params = parser.parse_args(args)
+    params.game_variables = [('health', 101), ('sel_ammo', 301)]
+    finalize_args(params)
+    set_num_threads(1)
+
+    # the same weights for all agents
+    network = get_model_class(params.network_type)(params)
+    if params.reload:
+        logger.info('Reloading model from %s...' % params.reload)
+        model_path = os.path.join(params.dump_path, params.reload)
+        map_location = get_device_mapping(params.gpu_id)
+        network.module.load_state_dict(torch.load(model_path, map_location=map_location))
+    state_dict = network.module.state_dict()
+
+    results = {}
+    for use_server in [False, True]:
+        n_frames, elapsed = run_agents(params, state_dict, use_server)
+        name = 'server' if use_server else 'no_server'
+        results[name] = n_frames / elapsed
+        logger.info('%i agents, %s: %.1f frames/s' %
+                    (params.n_agents, name, results[name]))
+    logger.info("__log__:%s" % json.dumps(results))
+
+
+def run_agents(params, state_dict, use_server):
+    """
+    Start the agents (and the server), let them act for `bench_time` seconds
+    and return the total number of frames and the elapsed time.
+    """
+    server = None
+    if use_server:
+        server = InferenceServer(params.n_agents,
+                                 params.inference_max_delay / 1000.)
+        server_proc = mp.Process(target=server.serve)
+        server_proc.start()
+
+    ready, counts = mp.Queue(), mp.Queue()
+    start, stop = mp.Event(), mp.Event()
+    processes = []
+    for rank in range(params.n_agents):
+        proc = mp.Process(target=agent_fn,
+                          args=(rank, params, state_dict, server,
+                                ready, start, stop, counts))
+        proc.start()
+        processes.append(proc)
+
+    if server is not None:
+        try:
+            server.wait_ready(processes + [server_proc])
+        except RuntimeError:
+            for proc in processes:
+                proc.terminate()
+            server_proc.join()
+            raise
+    for _ in range(params.n_agents):
+        ready.get()
+    start.set()
+    start_time = time.time()
+    time.sleep(params.bench_time)
+    stop.set()
+    n_frames = sum(counts.get() for _ in range(params.n_agents))
+    elapsed = time.time() - start_time
+
+    for proc in processes:
+        proc.join()
+    if server is not None:
+        server.stop()
+        server_proc.join()
+    return n_frames, elapsed
+
+
+def agent_fn(rank, params, state_dict, server, ready, start, stop, counts):
+    set_num_threads(1)
+    network = get_model_class(params.network_type)(params)
+    network.module.load_state_dict(state_dict)
+    network.module.eval()
+    if server is not None:
+        server.set_rank(rank)
+        network = server.register_model(network, params)
+
+    # random screens and game variables
+    rng = np.random.RandomState(rank)
+    screens = rng.randint(0, 256, (16, params.n_fm, params.height,
+                                   params.width)).astype(np.uint8)
+    last_states = []
+
+    def observe(i):
+        variables = [rng.randint(n) for _, n in params.game_variables]
+        last_states.append(GameState(screens[i % len(screens)], variables, None))
+        if len(last_states) == 1:
+            last_states.extend([last_states[0]] * (params.hist_size - 1))
+        else:
+            del last_states[0]
+
+    network.reset()
+    observe(0)
+    network.next_action(last_states)
+    ready.put(rank)
+    start.wait()
+
+    n_iter = 0
+    while not stop.is_set():
+        n_iter += 1
+        observe(n_iter)
+        network.next_action(last_states)
+    counts.put(n_iter * params.frame_skip)
@@ -3,13 +3,20 @@ import argparse
 import torch.multiprocessing as mp
 
 # Arnold
+from ...utils import bool_flag
 from ...parameter_server import ParameterServer
+from ...inference_server import InferenceServer
 
 
 def worker_fn_factory(main):
-    def worker_fn(rank, parser, args, param_server):
+    def worker_fn(rank, parser, args, param_server, inference_server=None):
         param_server.set_rank(rank)
-        main(parser, args, parameter_server=param_server)
+        if inference_server is None:
+            main(parser, args, parameter_server=param_server)
+        else:
+            inference_server.set_rank(rank)
+            main(parser, args, parameter_server=param_server,
+                 inference_server=inference_server)
     return worker_fn
 
 
@@ -21,6 +28,11 @@ def main(_parser, args):
                         help="Number of agents to run")
     parser.add_argument("--num_games", type=int, default=1,
                         help="Number of games to run")
+    parser.add_argument("--inference_server", type=bool_flag, default=False,
+                        help="Act for all agents in a shared inference server")
+    parser.add_argument("--inference_max_delay", type=float, default=5,
+                        help="Time (in ms) the inference server waits for "
+                             "other agents before running a batch")
     params, remaining_args = parser.parse_known_args(args)
     module = importlib.import_module('...scenarios.' + params.execute,
                                      package=__name__)
@@ -31,13 +43,31 @@ def main(_parser, args):
     assert players_per_game in range(1, 9)
     processes = []
     param_server = ParameterServer(params.num_players)
+    inference_server = None
+    if params.inference_server:
+        inference_server = InferenceServer(params.num_players,
+                                           params.inference_max_delay / 1000.)
+        server_proc = mp.Process(target=inference_server.serve)
+        server_proc.start()
     for i in range(params.num_players):
         subprocess_args = ['--players_per_game', str(players_per_game),
                            '--player_rank', str(i)]
         subprocess_args += remaining_args
         proc = mp.Process(target=worker_fn_factory(module.main),
-                          args=(i, _parser, subprocess_args, param_server))
+                          args=(i, _parser, subprocess_args, param_server,
+                                inference_server))
         proc.start()
         processes.append(proc)
+    if inference_server is not None:
+        try:
+            inference_server.wait_ready(processes + [server_proc])
+        except RuntimeError:
+            for p in processes:
+                p.terminate()
+            server_proc.join()
+            raise
     for p in processes:
         p.join()
+    if inference_server is not None:
+        inference_server.stop()
+        server_proc.join()
@@ -0,0 +1,249 @@
+import time
+import queue
+from logging import getLogger
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+# Arnold
+from .model import get_model_class
+
+
+logger = getLogger()
+
+
+class InferenceServer(object):
+    """
+    Acts for several agents playing on the same machine, in a single process.
+
+    Every agent registers its network with `register_model`, and gets back an
+    `InferenceClient` to use in place of the network. Clients write their last
+    states in shared memory and send their rank, the server waits up to
+    `max_delay` seconds for the other agents, and runs one forward pass per
+    model for all the pending requests. Agents with the same model (same
+    network type and reloaded checkpoint) share a batch.
+    """
+
+    def __init__(self, n_processes, max_delay=0.005):
+        self.n_processes = n_processes
+        self.max_delay = max_delay
+        self.requests = mp.Queue()
+        self.registrations = mp.Queue()
+        self.buffers = [mp.Queue() for _ in range(n_processes)]
+        self.events = [mp.Event() for _ in range(n_processes)]
+        self.ready = mp.Event()
+        self.stopped = mp.Event()
+
+    def __getstate__(self):
+        return (self.n_processes, self.max_delay, self.requests,
+                self.registrations, self.buffers, self.events,
+                self.ready, self.stopped)
+
+    def __setstate__(self, state):
+        (self.n_processes, self.max_delay, self.requests,
+         self.registrations, self.buffers, self.events,
+         self.ready, self.stopped) = state
+
+    def set_rank(self, rank):
+        self.rank = rank
+
+    def register_model(self, network, params):
+        """
+        Called by every agent, returns the client to act with.
+        """
+        key = (params.network_type, params.reload)
+        self.registrations.put((self.rank, key, params,
+                                network.module.state_dict()))
+        buffers, index = self.buffers[self.rank].get()
+        return InferenceClient(self, network, params, buffers, index)
+
+    def wait_ready(self, processes, timeout=1.):
+        """
+        Called by the main process, wait for all agents to register. If one
+        of the `processes` (agents or server) exits before, stop the server
+        and raise an error: the other agents would wait for it forever.
+        """
+        while not self.ready.wait(timeout):
+            for proc in processes:
+                if not proc.is_alive():
+                    self.stop()
+                    raise RuntimeError('%s exited with code %s before the '
+                                       'inference server was ready'
+                                       % (proc.name, proc.exitcode))
+
+    def stop(self):
+        self.stopped.set()
+        self.requests.put(None)
+
+    def serve(self):
+        """
+        Server process main loop, until `stop` is called.
+        """
+        torch.set_num_threads(1)
+        models = self.load_models()
+        if models is None:
+            logger.info('Inference server stopped before all agents '
+                        'registered')
+            return
+        self.ready.set()
+        logger.info('Inference server running %i models for %i agents'
+                    % (len(models), self.n_processes))
+
+        while True:
+            rank = self.requests.get()
+            if rank is None:
+                break
+            pending = [rank]
+            deadline = time.time() + self.max_delay
+            while len(pending) < self.n_processes:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    rank = self.requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if rank is None:
+                    return
+                pending.append(rank)
+
+            for model in models:
+                indices = [model.indices[r] for r in pending
+                           if r in model.indices]
+                if indices:
+                    model.act(indices)
+            for r in pending:
+                self.events[r].set()
+
+    def load_models(self):
+        """
+        Wait for all agents to register, and load one network per model.
+        Returns None if the server is stopped before.
+        """
+        models = {}
+        ranks = {}
+        n_registered = 0
+        while n_registered < self.n_processes:
+            try:
+                rank, key, params, state_dict = \
+                    self.registrations.get(timeout=1)
+            except queue.Empty:
+                if self.stopped.is_set():
+                    return None
+                continue
+            n_registered += 1
+            if key not in models:
+                network = get_model_class(params.network_type)(params)
+                network.module.load_state_dict(state_dict)
+                network.module.eval()
+                models[key] = network
+                ranks[key] = []
+            ranks[key].append(rank)
+        models = [ServerModel(models[key], sorted(ranks[key]))
+                  for key in sorted(models.keys())]
+        for model in models:
+            for rank, index in model.indices.items():
+                self.buffers[rank].put((model.buffers, index))
+        return models
+
+
+class ServerModel(object):
+    """
+    A network of the inference server, with the shared memory of its agents
+    and their recurrent states.
+    """
+
+    def __init__(self, network, ranks):
+        self.network = network
+        self.indices = {rank: i for i, rank in enumerate(ranks)}
+        params = network.params
+        n = len(ranks)
+        self.buffers = {
+            'screens': torch.zeros((n, params.hist_size) + network.screen_shape,
+                                   dtype=torch.uint8).share_memory_(),
+            'variables': torch.zeros(n, params.hist_size, params.n_variables,
+                                     dtype=torch.int64).share_memory_(),
+            'features': torch.zeros(n, params.n_features).share_memory_(),
+            'actions': torch.zeros(n, dtype=torch.int64).share_memory_(),
+            'reset': torch.zeros(n, dtype=torch.uint8).share_memory_(),
+        }
+        if params.network_type == 'dqn_rnn' and params.remember:
+            self.states = network.new_eval_state(n)
+        else:
+            self.states = None
+
+    def act(self, indices):
+        network = self.network
+        idx = torch.LongTensor(indices)
+        screens = network.get_var(self.buffers['screens'][idx])
+        variables = network.get_var(self.buffers['variables'][idx])
+
+        prev_state = None
+        if self.states is not None:
+            # clear the states of the agents which were reset since their last action
+            reset = self.buffers['reset'][idx].nonzero().view(-1)
+            if reset.numel():
+                for x in self._states():
+                    x[:, idx[reset]] = 0
+                self.buffers['reset'][idx] = 0
+            prev_state = self._select(idx)
+
+        with torch.no_grad():
+            scores, pred_features, next_state = network.f_eval_batch(
+                screens, variables, prev_state)
+
+        if self.states is not None:
+            for x, y in zip(self._states(), self._wrap(next_state)):
+                x[:, idx] = y
+        self.buffers['actions'][idx] = scores.max(1)[1].cpu()
+        if pred_features is not None:
+            self.buffers['features'][idx] = pred_features.cpu()
+
+    def _wrap(self, state):
+        return state if isinstance(state, tuple) else (state,)
+
+    def _states(self):
+        return self._wrap(self.states)
+
+    def _select(self, idx):
+        selected = tuple(x[:, idx] for x in self._states())
+        return selected if isinstance(self.states, tuple) else selected[0]
+
+
+class InferenceClient(object):
+    """
+    Used by the agents in place of their network when acting
+    (see `DQN.next_action` and `DQN.reset`).
+    """
+
+    def __init__(self, server, network, params, buffers, index):
+        self.server = server
+        self.module = network.module
+        self.params = params
+        self.rank = server.rank
+        self.buffers = buffers
+        self.index = index
+        self.event = server.events[self.rank]
+        self.n_frames = 1 if (params.network_type == 'dqn_rnn' and
+                              params.remember) else params.hist_size
+        self.pred_features = None
+
+    def reset(self):
+        self.buffers['reset'][self.index] = 1
+
+    def next_action(self, last_states):
+        states = last_states[-self.n_frames:]
+        i = self.index
+        screens = np.uint8([s.screen for s in states])
+        self.buffers['screens'][i, -self.n_frames:] = torch.from_numpy(screens)
+        if self.params.n_variables:
+            variables = np.int64([s.variables for s in states])
+            self.buffers['variables'][i, -self.n_frames:] = torch.from_numpy(variables)
+
+        self.server.requests.put(self.rank)
+        self.event.wait()
+        self.event.clear()
+
+        if self.params.n_features:
+            self.pred_features = self.buffers['features'][i].clone()
+        return int(self.buffers['actions'][i])
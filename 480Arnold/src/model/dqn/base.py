@@ -1,3 +1,4 @@
+import copy
 import numpy as np
 import torch
 import torch.nn as nn
@@ -44,7 +45,7 @@ class DQNModuleBase(nn.Module):
         logger.info('Conv layer output dim : %i' % self.conv_output_dim)
         logger.info('Hidden layer input dim: %i' % self.output_dim)
 
-    def base_forward(self, x_screens, x_variables):
+    def base_forward(self, x_screens, x_variables, screen_index=None):
         """
         Argument sizes:
             - x_screens of shape (batch_size, conv_input_size, h, w)
@@ -55,15 +56,18 @@ class DQNModuleBase(nn.Module):
         and for recurrent:
             batch_size == params.batch_size * (hist_size + n_rec_updates)
             conv_input_size == n_feature_maps
+        If `screen_index` of shape (batch_size,) is given, x_screens only
+        contains distinct frames (n_frames, conv_input_size, h, w), every
+        frame is encoded once and screen_index maps the inputs to their frame.
         Returns:
             - output of shape (batch_size, output_dim)
             - output_gf of shape (batch_size, n_features)
         """
-        batch_size = x_screens.size(0)
-
-        # convolution
+        # convolution (training screens are uint8, division converts them to float)
         x_screens = x_screens / 255.
-        conv_output = self.conv(x_screens).view(batch_size, -1)
+        conv_output = self.conv(x_screens).view(x_screens.size(0), -1)
+        if screen_index is not None:
+            conv_output = conv_output.index_select(0, screen_index)
 
         # game variables
         if self.n_variables:
@@ -100,6 +104,76 @@ class DQNModuleBase(nn.Module):
             return self.proj_action_scores(state_input)
 
 
+class EvalHistory(object):
+    """
+    Device-resident ring buffers holding per-frame data of the last
+    `hist_size` game states seen by the agent when acting.
+
+    Between two actions the window of states usually slides by one, so only
+    the new states have to be sent to the device. States are compared by
+    identity (game.observe_state creates a new GameState for every frame),
+    any other window is considered as new and uploaded from scratch.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.states = []
+        self.buffers = {}
+        self.head = 0      # slot of the oldest state
+        self.n_new = 0     # number of states added by the last `advance`
+        self.indices = {}  # cached slot indices on the device
+
+    def advance(self, last_states):
+        """
+        Slide the window to `last_states`. Returns the new states, that must
+        be stored (see `store`) before reading the buffers.
+        """
+        assert len(last_states) == self.size
+        n_new = self.size
+        if len(self.states) == self.size:
+            for k in range(self.size):
+                if all(x is y for x, y in zip(last_states[:self.size - k],
+                                              self.states[k:])):
+                    n_new = k
+                    break
+        if n_new == self.size:
+            self.head = 0
+        self.head = (self.head + n_new) % self.size
+        self.n_new = n_new
+        self.states = list(last_states)
+        return last_states[self.size - n_new:]
+
+    def slots(self, start, n, device):
+        """
+        Slots of the states `start` to `start + n` of the current window.
+        """
+        key = (self.head, start, n, device)
+        if key not in self.indices:
+            slots = [(self.head + i) % self.size for i in range(start, start + n)]
+            self.indices[key] = torch.LongTensor(slots).to(device)
+        return self.indices[key]
+
+    def store(self, name, x):
+        """
+        Write per-frame data of the last `x.size(0)` states of the window.
+        """
+        n = x.size(0)
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.size()[1:] != x.size()[1:]:
+            assert n == self.size
+            buffer = x.new_empty((self.size,) + x.size()[1:])
+            self.buffers[name] = buffer
+        if n > 0:
+            buffer.index_copy_(0, self.slots(self.size - n, n, x.device), x)
+
+    def get(self, name):
+        """
+        Return per-frame data of the whole window, from the oldest state.
+        """
+        buffer = self.buffers[name]
+        return buffer.index_select(0, self.slots(0, self.size, buffer.device))
+
+
 class DQN(object):
 
     def __init__(self, params):
@@ -120,27 +194,107 @@ class DQN(object):
         if self.cuda:
             self.module.cuda()
 
+        # page-locked staging buffers for training batches, reused across steps
+        self.pinned_buffers = {}
+        self.copy_done = torch.cuda.Event() if self.cuda else None
+
+        # target network, created by the first call to `update_target`
+        self.target_module = None
+
+        # frames of the acting window, kept on the device between actions
+        if params.incremental_eval:
+            self.eval_history = EvalHistory(self.hist_size)
+        else:
+            self.eval_history = None
+
     def get_var(self, x):
         """Move a tensor to a CPU / GPU variable."""
         x = Variable(x)
         return x.cuda() if self.cuda else x
 
+    def get_batch_var(self, name, x, dtype):
+        """
+        Move a numpy batch to a CPU / GPU tensor of the given numpy dtype.
+        On GPU, the batch is staged in a pinned buffer and copied asynchronously.
+        """
+        x = np.ascontiguousarray(x, dtype=dtype)
+        if not self.cuda:
+            return torch.from_numpy(x)
+
+        # the number of distinct frames changes between batches, so buffers
+        # are only reallocated when they are too small
+        buffer = self.pinned_buffers.get(name)
+        if buffer is None or buffer.numel() < x.size:
+            buffer = torch.from_numpy(x).pin_memory().view(-1)
+            self.pinned_buffers[name] = buffer
+        else:
+            buffer[:x.size].numpy()[...] = x.reshape(-1)
+        return buffer[:x.size].view(x.shape).cuda(non_blocking=True)
+
     def reset(self):
         pass
 
+    def update_target(self):
+        """
+        Copy the online network to the target network.
+        """
+        if self.target_module is None:
+            self.target_module = copy.deepcopy(self.module)
+            self.target_module.eval()
+            for p in self.target_module.parameters():
+                p.requires_grad = False
+        else:
+            self.target_module.load_state_dict(self.module.state_dict())
+
+    def bootstrap_values(self, output_sc, target_sc):
+        """
+        Value of the next states, from the scores of the online network and
+        of the target network (None if there is no target network).
+        With Double DQN, actions are selected by the online network and
+        evaluated by the target network.
+        """
+        output_sc = output_sc.detach()
+        if target_sc is None:
+            return output_sc.max(-1)[0]
+        if self.params.double_dqn:
+            best_actions = output_sc.max(-1)[1]
+            return target_sc.gather(-1, best_actions.unsqueeze(-1)).squeeze(-1)
+        return target_sc.max(-1)[0]
+
+    def n_step_targets(self, rewards, isfinal, next_values):
+        """
+        n-step returns of transitions 0 .. seq_len - n_step, from the
+        `rewards` and `isfinal` windows of shape (batch_size, seq_len), and
+        `next_values` of shape (batch_size, seq_len - n_step + 1), the values
+        of the states n_step transitions after each of them. Rewards after
+        the end of an episode are ignored, and nothing is bootstrapped.
+        """
+        n_step = self.params.n_step
+        gamma = self.params.gamma
+        rewards = rewards.unfold(1, n_step, 1)
+        alive = torch.cumprod(1 - isfinal.unfold(1, n_step, 1), 2)
+        alive_before = torch.cat([torch.ones_like(alive[:, :, :1]), alive[:, :, :-1]], 2)
+        discounts = gamma ** torch.arange(n_step, dtype=rewards.dtype, device=rewards.device)
+        returns = (rewards * alive_before * discounts).sum(2)
+        return returns + gamma ** n_step * alive[:, :, -1] * next_values
+
     def new_loss_history(self):
         return dict(dqn_loss=[], gf_loss=[])
 
     def log_loss(self, loss_history):
-        logger.info('DQN loss: %.5f' % np.mean(loss_history['dqn_loss']))
+        logger.info('DQN loss: %.5f' %
+                    np.mean([float(x) for x in loss_history['dqn_loss']]))
         if self.n_features > 0:
             logger.info('Game features loss: %.5f' %
-                        np.mean(loss_history['gf_loss']))
+                        np.mean([float(x) for x in loss_history['gf_loss']]))
 
     def prepare_f_eval_args(self, last_states):
         """
         Prepare inputs for evaluation.
         """
+        if self.eval_history is not None:
+            return self.prepare_incremental_f_eval_args(last_states)
+
         screens = np.float32([s.screen for s in last_states])
         screens = self.get_var(torch.FloatTensor(screens))
         assert screens.size() == (self.hist_size,) + self.screen_shape
@@ -154,41 +308,82 @@ class DQN(object):
 
         return screens, variables
 
+    def prepare_incremental_f_eval_args(self, last_states):
+        """
+        Same as `prepare_f_eval_args`, but only the states which were not in
+        the previous window are sent to the device. Screens are sent as uint8
+        and converted in base_forward.
+        """
+        new_states = self.eval_history.advance(last_states)
+        if new_states:
+            screens = np.uint8([s.screen for s in new_states])
+            self.eval_history.store('screens', self.get_var(torch.from_numpy(screens)))
+            if self.n_variables:
+                variables = np.int64([s.variables for s in new_states])
+                self.eval_history.store('variables', self.get_var(torch.from_numpy(variables)))
+
+        screens = self.eval_history.get('screens')
+        assert screens.size() == (self.hist_size,) + self.screen_shape
+
+        if self.n_variables:
+            variables = self.eval_history.get('variables')
+            assert variables.size() == (self.hist_size, self.n_variables)
+        else:
+            variables = None
+
+        return screens, variables
+
     def prepare_f_train_args(self, screens, variables, features,
-                             actions, rewards, isfinal):
+                             actions, rewards, isfinal, screen_index=None):
         """
         Prepare inputs for training.
         """
-        # convert tensors to torch Variables
-        # TODO remove the .copy below
-        screens = self.get_var(torch.FloatTensor(np.float32(screens).copy()))
+        # the previous batch must be on the device before we overwrite the staging buffers
+        if self.cuda:
+            self.copy_done.synchronize()
+
+        # convert tensors to torch tensors on the device
+        # screens are sent as uint8 and converted in base_forward, this is 4x less data to copy
+        screens = self.get_batch_var('screens', screens, np.uint8)
         if self.n_variables:
-            variables = self.get_var(torch.LongTensor(np.int64(variables).copy()))
+            variables = self.get_batch_var('variables', variables, np.int64)
         if self.n_features:
-            features = self.get_var(torch.LongTensor(np.int64(features).copy()))
-        rewards = self.get_var(torch.FloatTensor(np.float32(rewards).copy()))
-        isfinal = self.get_var(torch.FloatTensor(np.float32(isfinal).copy()))
+            features = self.get_batch_var('features', features, np.int64)
+        actions = self.get_batch_var('actions', actions, np.int64)
+        rewards = self.get_batch_var('rewards', rewards, np.float32)
+        isfinal = self.get_batch_var('isfinal', isfinal, np.float32)
+        if screen_index is not None:
+            screen_index = self.get_batch_var('screen_index', screen_index, np.int64)
+
+        if self.cuda:
+            self.copy_done.record()
 
         recurrence = self.params.recurrence
         batch_size = self.params.batch_size
         n_updates = 1 if recurrence == '' else self.params.n_rec_updates
-        seq_len = self.hist_size + n_updates
+        seq_len = self.hist_size + n_updates + self.params.n_step - 1
 
         # check tensors sizes
-        assert screens.size() == (batch_size, seq_len) + self.screen_shape
+        if screen_index is None:
+            assert screens.size() == (batch_size, seq_len) + self.screen_shape
+        else:
+            assert screens.size()[1:] == self.screen_shape
+            assert screen_index.size() == (batch_size, seq_len)
         if self.n_variables:
             assert variables.size() == (batch_size, seq_len, self.n_variables)
         if self.n_features:
             assert features.size() == (batch_size, seq_len, self.n_features)
-        assert actions.shape == (batch_size, seq_len - 1)
+        assert actions.size() == (batch_size, seq_len - 1)
         assert rewards.size() == (batch_size, seq_len - 1)
         assert isfinal.size() == (batch_size, seq_len - 1)
 
-        return screens, variables, features, actions, rewards, isfinal
+        return screens, variables, features, actions, rewards, isfinal, screen_index
 
     def register_loss(self, loss_history, loss_sc, loss_gf):
-        loss_history['dqn_loss'].append(loss_sc.item())
-        loss_history['gf_loss'].append(loss_gf.item() if self.n_features else 0)
+        # losses are converted to floats only when logged, calling .item()
+        # here would wait for the GPU after every training step
+        loss_history['dqn_loss'].append(loss_sc.detach())
+        loss_history['gf_loss'].append(loss_gf.detach() if self.n_features else 0)
 
 
     def next_action(self, last_states, save_graph=False):
@@ -237,8 +432,28 @@ class DQN(object):
         parser.add_argument("--recurrence", type=str, default='',
                             help="Recurrent neural network (RNN / GRU / LSTM)")
 
+        # bootstrapped targets
+        parser.add_argument("--target_update_freq", type=int, default=0,
+                            help="Update the target network every X training "
+                                 "updates, i.e. every X * update_frequency "
+                                 "iterations (0 to bootstrap from the online "
+                                 "network)")
+        parser.add_argument("--n_step", type=int, default=1,
+                            help="Number of steps of the returns")
+        parser.add_argument("--double_dqn", type=bool_flag, default=False,
+                            help="Select the bootstrap actions with the online "
+                                 "network (requires a target network)")
+
+        # acting
+        parser.add_argument("--incremental_eval", type=bool_flag, default=True,
+                            help="Keep the last frames on the device when acting "
+                                 "and only send / encode the new ones")
+
     @staticmethod
     def validate_params(params):
         assert 0 <= params.start_decay <= params.stop_decay
         assert 0 <= params.final_decay <= 1
         assert params.replay_memory_size >= 1000
+        assert params.target_update_freq >= 0
+        assert params.n_step >= 1
+        assert not params.double_dqn or params.target_update_freq > 0
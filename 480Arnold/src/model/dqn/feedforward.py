@@ -48,39 +48,55 @@ class DQNFeedforward(DQN):
 
         return self.module(
             screens.view(1, -1, *self.screen_shape[1:]),
-            [variables[-1, i] for i in range(self.params.n_variables)]
+            [variables[-1:, i] for i in range(self.params.n_variables)]
         )
 
+    def f_eval_batch(self, screens, variables, prev_state=None):
+        """
+        Evaluate a batch of agents at once (see InferenceServer). `screens` and
+        `variables` are of shape (batch_size, hist_size, ...).
+        """
+        output_sc, output_gf = self.module(
+            screens.view(screens.size(0), -1, *self.screen_shape[1:]),
+            [variables[:, -1, i] for i in range(self.params.n_variables)]
+        )
+        return output_sc, output_gf, None
+
     def f_train(self, screens, variables, features, actions, rewards, isfinal,
                 loss_history=None):
 
-        screens, variables, features, actions, rewards, isfinal = \
+        screens, variables, features, actions, rewards, isfinal, _ = \
             self.prepare_f_train_args(screens, variables, features,
                                       actions, rewards, isfinal)
 
         batch_size = self.params.batch_size
-        seq_len = self.hist_size + 1
+        seq_len = self.hist_size + self.params.n_step
+        n_fm = self.params.n_fm
 
-        screens = screens.view(batch_size, seq_len * self.params.n_fm,
+        # s_t, and s_{t+n} which we bootstrap from
+        screens = screens.view(batch_size, seq_len * n_fm,
                                *self.screen_shape[1:])
-
-        output_sc1, output_gf1 = self.module(
-            screens[:, :-self.params.n_fm, :, :],
-            [variables[:, -2, i] for i in range(self.params.n_variables)]
-        )
-        output_sc2, output_gf2 = self.module(
-            screens[:, self.params.n_fm:, :, :],
-            [variables[:, -1, i] for i in range(self.params.n_variables)]
-        )
+        screens1 = screens[:, :self.hist_size * n_fm, :, :]
+        screens2 = screens[:, -self.hist_size * n_fm:, :, :]
+        variables1 = [variables[:, self.hist_size - 1, i]
+                      for i in range(self.params.n_variables)]
+        variables2 = [variables[:, -1, i]
+                      for i in range(self.params.n_variables)]
+
+        output_sc1, output_gf1 = self.module(screens1, variables1)
+        output_sc2, output_gf2 = self.module(screens2, variables2)
+        target_sc2 = None
+        if self.target_module is not None:
+            with torch.no_grad():
+                target_sc2, _ = self.target_module(screens2, variables2)
 
         # compute scores
-        mask = torch.ByteTensor(output_sc1.size()).fill_(0)
-        for i in range(batch_size):
-            mask[i, int(actions[i, -1])] = 1
-        scores1 = output_sc1.masked_select(self.get_var(mask))
-        scores2 = rewards[:, -1] + (
-            self.params.gamma * output_sc2.max(1)[0] * (1 - isfinal[:, -1])
-        )
+        t = self.hist_size - 1
+        scores1 = output_sc1.gather(1, actions[:, t:t + 1]).squeeze(1)
+        scores2 = self.n_step_targets(
+            rewards[:, t:], isfinal[:, t:],
+            self.bootstrap_values(output_sc2, target_sc2).unsqueeze(1)
+        ).squeeze(1)
 
         # dqn loss
         loss_sc = self.loss_fn_sc(scores1, Variable(scores2.data))
@@ -88,7 +104,7 @@ class DQNFeedforward(DQN):
         # game features loss
         loss_gf = 0
         if self.n_features:
-            loss_gf += self.loss_fn_gf(output_gf1, features[:, -2].float())
+            loss_gf += self.loss_fn_gf(output_gf1, features[:, t].float())
             loss_gf += self.loss_fn_gf(output_gf2, features[:, -1].float())
 
         self.register_loss(loss_history, loss_sc, loss_gf)
@@ -16,16 +16,26 @@ class DQNModuleRecurrent(DQNModuleBase):
                                     dropout=params.dropout,
                                     batch_first=True)
 
-    def forward(self, x_screens, x_variables, prev_state):
+    def forward(self, x_screens, x_variables, prev_state, screen_index=None):
         """
         Argument sizes:
             - x_screens of shape (batch_size, seq_len, n_fm, h, w)
             - x_variables list of n_var tensors of shape (batch_size, seq_len)
+        or, to encode frames shared by several sequences only once:
+            - x_screens of shape (n_frames, n_fm, h, w), distinct frames
+            - screen_index of shape (batch_size, seq_len), frame of every step
         """
-        batch_size = x_screens.size(0)
-        seq_len = x_screens.size(1)
+        if screen_index is None:
+            assert x_screens.ndimension() == 5
+            batch_size = x_screens.size(0)
+            seq_len = x_screens.size(1)
+            x_screens = x_screens.view(batch_size * seq_len, *x_screens.size()[2:])
+        else:
+            assert x_screens.ndimension() == 4
+            batch_size = screen_index.size(0)
+            seq_len = screen_index.size(1)
+            screen_index = screen_index.contiguous().view(batch_size * seq_len)
 
-        assert x_screens.ndimension() == 5
         assert len(x_variables) == self.n_variables
         assert all(x.ndimension() == 2 and x.size(0) == batch_size and
                    x.size(1) == seq_len for x in x_variables)
@@ -34,10 +44,20 @@ class DQNModuleRecurrent(DQNModuleBase):
         # Flattening seq_len into batch_size ensures that it will be applied
         # to all timesteps independently.
         state_input, output_gf = self.base_forward(
-            x_screens.view(batch_size * seq_len, *x_screens.size()[2:]),
-            [v.contiguous().view(batch_size * seq_len) for v in x_variables]
+            x_screens,
+            [v.contiguous().view(batch_size * seq_len) for v in x_variables],
+            screen_index
         )
 
+        return self.recurrent_forward(state_input, output_gf,
+                                      batch_size, seq_len, prev_state)
+
+    def recurrent_forward(self, state_input, output_gf, batch_size, seq_len,
+                          prev_state):
+        """
+        Apply the RNN and the head to the outputs of base_forward, of shape
+        (batch_size * seq_len, output_dim) and (batch_size * seq_len, n_features).
+        """
         # unflatten the input and apply the RNN
         rnn_input = state_input.view(batch_size, seq_len, self.output_dim)
         rnn_output, next_state = self.rnn(rnn_input, prev_state)
@@ -69,10 +89,23 @@ class DQNRecurrent(DQN):
             self.init_state_e = (self.init_state_e, self.init_state_e)
         self.reset()
 
+        # parameters versions of the frame features cached in eval_history
+        self.eval_features_version = None
+
     def reset(self):
         # prev_state is only used for evaluation, so has a batch size of 1
         self.prev_state = self.init_state_e
 
+    def new_eval_state(self, batch_size):
+        """
+        Zero recurrent state to evaluate a batch of `batch_size` sequences.
+        """
+        h_0 = self.init_state_e[0] if self.params.recurrence == 'lstm' else self.init_state_e
+        h_0 = h_0.data.new(h_0.size(0), batch_size, h_0.size(2)).zero_()
+        if self.params.recurrence == 'lstm':
+            return (h_0, h_0.clone())
+        return h_0
+
     def f_eval(self, last_states):
 
         screens, variables = self.prepare_f_eval_args(last_states)
@@ -87,7 +120,10 @@ class DQNRecurrent(DQN):
             )
             # save the hidden state if we want to remember the whole sequence
             self.prev_state = output[-1]
-        # otherwise, feed the last `hist_size` ones
+        # otherwise, feed the last `hist_size` ones. frames are encoded
+        # independently, so we only need to encode the new ones
+        elif self.eval_history is not None:
+            output = self.f_eval_cached(screens, variables)
         else:
             output = self.module(
                 screens.view(1, self.hist_size, *self.screen_shape),
@@ -99,35 +135,92 @@ class DQNRecurrent(DQN):
         # do not return the recurrent state
         return output[:-1]
 
+    def f_eval_cached(self, screens, variables):
+        """
+        Feed the last `hist_size` frames, reusing the frame features computed
+        during the previous steps, unless the network has changed since then.
+        """
+        history = self.eval_history
+        version = (self.module.training,) + tuple(p._version for p in self.module.parameters())
+        n_new = history.n_new if version == self.eval_features_version else self.hist_size
+        self.eval_features_version = version
+
+        if n_new:
+            state_input, output_gf = self.module.base_forward(
+                screens[-n_new:],
+                [variables[-n_new:, i] for i in range(self.params.n_variables)]
+            )
+            history.store('state_input', state_input.detach())
+            if self.n_features:
+                history.store('output_gf', output_gf.detach())
+
+        return self.module.recurrent_forward(
+            history.get('state_input'),
+            history.get('output_gf') if self.n_features else None,
+            1, self.hist_size, self.prev_state
+        )
+
+    def f_eval_batch(self, screens, variables, prev_state):
+        """
+        Evaluate a batch of agents at once (see InferenceServer). `screens` and
+        `variables` are of shape (batch_size, hist_size, ...), `prev_state` is
+        the recurrent state of the agents if we remember the whole sequence.
+        Return the scores and game features of the last frames, and the next
+        recurrent state.
+        """
+        batch_size = screens.size(0)
+        if self.params.remember:
+            screens = screens[:, -1:]
+            variables = variables[:, -1:]
+        else:
+            prev_state = self.new_eval_state(batch_size)
+
+        output_sc, output_gf, next_state = self.module(
+            screens,
+            [variables[:, :, i] for i in range(self.params.n_variables)],
+            prev_state=prev_state
+        )
+        return (output_sc[:, -1],
+                output_gf[:, -1] if self.n_features else None,
+                next_state)
+
     def f_train(self, screens, variables, features, actions, rewards, isfinal,
-                loss_history=None):
+                screen_index=None, loss_history=None):
 
-        screens, variables, features, actions, rewards, isfinal = \
+        screens, variables, features, actions, rewards, isfinal, screen_index = \
             self.prepare_f_train_args(screens, variables, features,
-                                      actions, rewards, isfinal)
+                                      actions, rewards, isfinal, screen_index)
 
         batch_size = self.params.batch_size
-        seq_len = self.hist_size + self.params.n_rec_updates
 
         output_sc, output_gf, _ = self.module(
             screens,
             [variables[:, :, i] for i in range(self.params.n_variables)],
-            prev_state=self.init_state_t
+            prev_state=self.init_state_t,
+            screen_index=screen_index
         )
 
-        # compute scores
-        mask = torch.ByteTensor(output_sc.size()).fill_(0)
-        for i in range(batch_size):
-            for j in range(seq_len - 1):
-                mask[i, j, int(actions[i, j])] = 1
-        scores1 = output_sc.masked_select(self.get_var(mask))
-        scores2 = rewards + (
-            self.params.gamma * output_sc[:, 1:, :].max(2)[0] * (1 - isfinal)
-        )
+        target_sc = None
+        if self.target_module is not None:
+            with torch.no_grad():
+                target_sc, _, _ = self.target_module(
+                    screens,
+                    [variables[:, :, i] for i in range(self.params.n_variables)],
+                    prev_state=self.init_state_t,
+                    screen_index=screen_index
+                )
+
+        # compute scores, targets are only available for the transitions
+        # followed by n_step others in the sequence
+        scores1 = output_sc[:, :-1].gather(2, actions.unsqueeze(2)).squeeze(2)
+        next_values = self.bootstrap_values(output_sc, target_sc)
+        scores2 = self.n_step_targets(rewards, isfinal,
+                                      next_values[:, self.params.n_step:])
+        n_targets = scores2.size(1)
 
         # dqn loss
         loss_sc = self.loss_fn_sc(
-            scores1.view(batch_size, -1)[:, -self.params.n_rec_updates:],
+            scores1.view(batch_size, -1)[:, n_targets - self.params.n_rec_updates:n_targets],
             Variable(scores2.data[:, -self.params.n_rec_updates:])
         )
 
@@ -150,6 +243,9 @@ class DQNRecurrent(DQN):
                             help="Number of recurrent layers")
         parser.add_argument("--remember", type=bool_flag, default=True,
                             help="Remember the whole sequence")
+        parser.add_argument("--dedup_frames", type=bool_flag, default=True,
+                            help="Encode frames shared by several sequences "
+                                 "of a training batch only once")
 
     @staticmethod
     def validate_params(params):
@@ -44,14 +44,19 @@ class ReplayMemory:
         self.cursor = 0
         self.full = False
 
-    def get_batch(self, batch_size, hist_size):
+    def get_batch(self, batch_size, hist_size, n_steps=1, unique_screens=False):
         """
         Sample a batch of experiences from the replay memory.
         `hist_size` represents the number of observed frames for s_t, so must
         be >= 1
+        `n_steps` is the number of transitions returned after s_t (i.e. for
+        n-step returns), the episode can end during any of them.
+        With `unique_screens`, frames that appear in several sequences are
+        only returned once, and `screen_index` gives the frame of every step.
         """
         assert self.size > 0, 'replay memory is empty'
         assert hist_size >= 1, 'history is required'
+        assert n_steps >= 1
 
         # idx contains the s_t indices
         idx = np.zeros(batch_size, dtype='int32')
@@ -60,10 +65,10 @@ class ReplayMemory:
         while count < batch_size:
 
             # index will be the index of s_t
-            index = np.random.randint(hist_size - 1, self.size - 1)
+            index = np.random.randint(hist_size - 1, self.size - n_steps)
 
             # check that we are not wrapping over the cursor
-            if self.cursor <= index + 1 < self.cursor + hist_size:
+            if self.cursor <= index + n_steps < self.cursor + hist_size + n_steps - 1:
                 continue
 
             # s_t should not contain any terminal state, so only
@@ -74,8 +79,13 @@ class ReplayMemory:
             idx[count] = index
             count += 1
 
-        all_indices = idx.reshape((-1, 1)) + np.arange(-(hist_size - 1), 2)
-        screens = self.screens[all_indices]
+        all_indices = idx.reshape((-1, 1)) + np.arange(-(hist_size - 1), n_steps + 1)
+        if unique_screens:
+            unique_indices, screen_index = np.unique(all_indices, return_inverse=True)
+            screen_index = screen_index.reshape(all_indices.shape)
+            screens = self.screens[unique_indices]
+        else:
+            screens = self.screens[all_indices]
         variables = self.variables[all_indices] if self.n_variables else None
         features = self.features[all_indices] if self.n_features else None
         actions = self.actions[all_indices[:, :-1]]
@@ -84,16 +94,20 @@ class ReplayMemory:
 
         # check batch sizes
         assert idx.shape == (batch_size,)
-        assert screens.shape == (batch_size, hist_size + 1) + self.screen_shape
+        if unique_screens:
+            assert screens.shape[1:] == self.screen_shape
+            assert screen_index.shape == (batch_size, hist_size + n_steps)
+        else:
+            assert screens.shape == (batch_size, hist_size + n_steps) + self.screen_shape
         assert (variables is None or variables.shape == (batch_size,
-                hist_size + 1, self.n_variables))
+                hist_size + n_steps, self.n_variables))
         assert (features is None or features.shape == (batch_size,
-                hist_size + 1, self.n_features))
-        assert actions.shape == (batch_size, hist_size)
-        assert rewards.shape == (batch_size, hist_size)
-        assert isfinal.shape == (batch_size, hist_size)
+                hist_size + n_steps, self.n_features))
+        assert actions.shape == (batch_size, hist_size + n_steps - 1)
+        assert rewards.shape == (batch_size, hist_size + n_steps - 1)
+        assert isfinal.shape == (batch_size, hist_size + n_steps - 1)
 
-        return dict(
+        batch = dict(
             screens=screens,
             variables=variables,
             features=features,
@@ -101,3 +115,6 @@ class ReplayMemory:
             rewards=rewards,
             isfinal=isfinal
         )
+        if unique_screens:
+            batch['screen_index'] = screen_index
+        return batch
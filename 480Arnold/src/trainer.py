@@ -1,6 +1,7 @@
 import torch
 import os
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait
 from logging import getLogger
 
 from .utils import get_optimizer
@@ -44,6 +45,7 @@ class Trainer(object):
         update_frequency = self.params.update_frequency
         log_frequency = self.params.log_frequency
         dump_frequency = self.params.dump_freq
+        target_update_freq = self.params.target_update_freq
 
         # log current training loss
         current_loss = self.network.new_loss_history()
@@ -52,6 +54,11 @@ class Trainer(object):
         start_iter = self.n_iter
         last_eval_iter = self.n_iter
         last_dump_iter = self.n_iter
+        n_updates = 0
+
+        # the target network starts from the current (i.e. reloaded) weights
+        if target_update_freq > 0:
+            self.network.update_target()
 
         self.network.module.train()
 
@@ -112,6 +119,11 @@ class Trainer(object):
 
             # update
             self.sync_update_parameters()
+            n_updates += 1
+
+            # periodically update the target network
+            if target_update_freq > 0 and n_updates % target_update_freq == 0:
+                self.network.update_target()
 
         self.game.close()
 
@@ -198,7 +210,26 @@ class ReplayMemoryTrainer(Trainer):
             params.n_variables, params.n_features
         )
 
+        # the batch of a training iteration is sampled in a background thread
+        # once the transition of the previous iteration is stored, while the
+        # next action is selected and performed. batches are indexed by the
+        # iteration that uses them
+        self.batch_sampler = ThreadPoolExecutor(max_workers=1)
+        self.next_batches = {}
+
+    def sample_batch(self):
+        recurrent = self.params.recurrence != ''
+        return self.replay_memory.get_batch(
+            self.params.batch_size,
+            self.params.hist_size + (self.params.n_rec_updates - 1 if recurrent else 0),
+            n_steps=self.params.n_step,
+            unique_screens=recurrent and self.params.dedup_frames
+        )
+
     def game_iter(self, last_states, action):
+        # the replay memory must not change while a batch is being sampled
+        wait(list(self.next_batches.values()))
+
         # store the transition in the replay table
         self.replay_memory.add(
             screen=last_states[-1].screen,
@@ -209,6 +240,12 @@ class ReplayMemoryTrainer(Trainer):
             is_final=self.game.is_final()
         )
 
+        # prefetch the batch of the next iteration if it is a training one
+        if ((self.n_iter + 1) % self.params.update_frequency == 0 and
+                self.replay_memory.size >= self.params.batch_size):
+            self.next_batches[self.n_iter + 1] = \
+                self.batch_sampler.submit(self.sample_batch)
+
     def training_step(self, current_loss):
         # enforce update frequency
         if self.n_iter % self.params.update_frequency != 0:
@@ -217,10 +254,11 @@ class ReplayMemoryTrainer(Trainer):
         if self.replay_memory.size < self.params.batch_size:
             return
 
-        # sample from replay memory and compute predictions and losses
-        memory = self.replay_memory.get_batch(
-            self.params.batch_size,
-            self.params.hist_size + (0 if self.params.recurrence == ''
-                                     else self.params.n_rec_updates - 1)
-        )
+        # sample from replay memory (unless prefetched during the previous
+        # step) and compute predictions and losses
+        next_batch = self.next_batches.pop(self.n_iter, None)
+        if next_batch is None:
+            memory = self.sample_batch()
+        else:
+            memory = next_batch.result()
         return self.network.f_train(loss_history=current_loss, **memory)
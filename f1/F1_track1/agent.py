@@ -44,20 +44,29 @@ class FinalEnv(RLEnvironment):
         self.current_ammo = 10
         self.timer = 0
 
+        # reused by parse_state
+        self._screen = None
+        self._img = None
+        self._center_patch = None
+
     def dead(self):
         self.last_history.clear()
         self.current_ammo = 10
         self.timer = 0
 
     def parse_state(self, s):
+        """ the image is returned as [img, center_patch], to be concatenated
+            along the channels. both are overwritten by the next call """
         img = s.screen_buffer
         if img is None:
             raise EOGError()
-        img = np.transpose(img, (1,2,0))
-        center_patch = self._center_rect.roi(img)
-        center_patch = cv2.resize(center_patch, self._image_shape[::-1])
-        img = cv2.resize(img, self._image_shape[::-1])
-        img = np.concatenate((img, center_patch), axis=2)
+        # CHW -> HWC, a lot faster than a transposed copy with numpy
+        self._screen = cv2.merge(list(img), self._screen)
+        center_patch = self._center_rect.roi(self._screen)
+        self._center_patch = cv2.resize(center_patch, self._image_shape[::-1],
+                                        dst=self._center_patch)
+        self._img = cv2.resize(self._screen, self._image_shape[::-1], dst=self._img)
+        img = [self._img, self._center_patch]
 
         v = s.game_variables
         v = [(v[0] - 50) * 0.01,    # health
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: benchmark_expreplay.py
+
+"""
+Batches/sec of the array-backed ExpReplay, compared to the previous
+deque-based implementation (kept below as `DequeReplay` for reference).
+
+    python benchmark_expreplay.py --memory-size 100000 --history-len 4 --nr-proc 2
+"""
+
+from __future__ import print_function
+import argparse
+import time
+from collections import deque
+import numpy as np
+from six.moves import queue, range
+
+from tensorpack.RL.expreplay import ExpReplay, ReplayMemory, Experience
+from tensorpack.RL.envbase import RLEnvironment, DiscreteActionSpace
+
+
+class RandomPlayer(RLEnvironment):
+    """ random frames, episodes of random length """
+    def __init__(self, shape, episode_len=100):
+        super(RandomPlayer, self).__init__()
+        self.rng = np.random.RandomState(0)
+        self.frames = self.rng.randint(0, 256, size=(256,) + shape).astype('uint8')
+        self.episode_len = episode_len
+        self.t = 0
+
+    def get_action_space(self):
+        return DiscreteActionSpace(6)
+
+    def current_state(self):
+        return self.frames[self.t % len(self.frames)]
+
+    def action(self, act):
+        self.t += 1
+        return float(act), self.rng.rand() < 1.0 / self.episode_len
+
+    def restart_episode(self):
+        pass
+
+
+class DequeReplay(object):
+    """ sampling of the previous ExpReplay, with transitions in a deque """
+    def __init__(self, memory_size, history_len, rng):
+        self.mem = deque(maxlen=memory_size)
+        self.history_len = history_len
+        self.rng = rng
+
+    def _sample_one(self):
+        idx = self.rng.randint(len(self.mem) - self.history_len - 1)
+
+        samples = [self.mem[k] for k in range(idx, idx+self.history_len+1)]
+        def concat(idx):
+            v = [x.state for x in samples[idx:idx+self.history_len]]
+            return np.concatenate(v, axis=2)
+        state = concat(0)
+        next_state = concat(1)
+        start_mem = samples[-2]
+        reward, action, isOver = start_mem.reward, start_mem.action, start_mem.isOver
+
+        start_idx = self.history_len - 1
+
+        # zero-fill state before starting
+        zero_fill = False
+        for k in range(1, self.history_len):
+            if samples[start_idx-k].isOver:
+                zero_fill = True
+            if zero_fill:
+                state[:,:,-k-1] = 0
+                if k + 2 <= self.history_len:
+                    next_state[:,:,-k-2] = 0
+        return (state, next_state, reward, action, isOver)
+
+    def recent_state(self, old_s):
+        ss = [old_s]
+
+        isOver = False
+        for k in range(1, self.history_len):
+            hist_exp = self.mem[-k]
+            if hist_exp.isOver:
+                isOver = True
+            if isOver:
+                ss.append(np.zeros_like(ss[0]))
+            else:
+                ss.append(hist_exp.state)
+        ss.reverse()
+        return np.concatenate(ss, axis=2)
+
+    def sample(self, batch_size):
+        batch_exp = [self._sample_one() for _ in range(batch_size)]
+        state = np.array([e[0] for e in batch_exp])
+        next_state = np.array([e[1] for e in batch_exp])
+        reward = np.array([e[2] for e in batch_exp])
+        action = np.array([e[3] for e in batch_exp], dtype='int8')
+        isOver = np.array([e[4] for e in batch_exp], dtype='bool')
+        return [state, action, reward, next_state, isOver]
+
+
+def check_same_batches(args, shape):
+    """ both implementations return the same batch for the same random indices.
+        with one channel only: for multi-channel states the deque version
+        zero-filled one channel per frame instead of the whole frames """
+    shape = shape[:2] + (1,)
+    player = RandomPlayer(shape, episode_len=5)
+    mem = ReplayMemory(1000, shape, args.history_len)
+    ref = DequeReplay(1000, args.history_len, np.random.RandomState(1))
+    # more transitions than the memory size, to wrap around
+    for _ in range(1500):
+        s = player.current_state()
+        act = player.rng.randint(6)
+        reward, isOver = player.action(act)
+        mem.append(Experience(s, act, reward, isOver))
+        ref.mem.append(Experience(s, act, reward, isOver))
+
+    batch = mem.sample(np.random.RandomState(1), args.batch_size)
+    ref_batch = ref.sample(args.batch_size)
+    for x, y in zip(batch, ref_batch):
+        assert np.array_equal(x, y)
+    # and the same history state for the predictor
+    s = player.current_state()
+    assert np.array_equal(mem.recent_state(s), ref.recent_state(s))
+
+
+def benchmark(name, sample, batch_size, seconds):
+    sample()
+    n, start = 0, time.time()
+    while time.time() - start < seconds:
+        sample()
+        n += 1
+    print('{:<24} {:8.1f} batches/sec {:10.0f} samples/sec'.format(
+        name, n / (time.time() - start), n * batch_size / (time.time() - start)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--memory-size', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--history-len', type=int, default=4)
+    parser.add_argument('--image-size', type=int, default=84)
+    parser.add_argument('--channel', type=int, default=1)
+    parser.add_argument('--nr-proc', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+    shape = (args.image_size, args.image_size, args.channel)
+
+    check_same_batches(args, shape)
+
+    ref = DequeReplay(args.memory_size, args.history_len, np.random.RandomState(1))
+    player = RandomPlayer(shape)
+    for _ in range(args.memory_size):
+        s = player.current_state()
+        reward, isOver = player.action(0)
+        ref.mem.append(Experience(s, 0, reward, isOver))
+    benchmark('deque', lambda: ref.sample(args.batch_size), args.batch_size, args.seconds)
+    ref.mem.clear()
+
+    for nr_proc in sorted(set([0, args.nr_proc])):
+        expreplay = ExpReplay(None, RandomPlayer(shape),
+                batch_size=args.batch_size,
+                memory_size=args.memory_size,
+                init_memory_size=args.memory_size,
+                history_len=args.history_len,
+                nr_proc=nr_proc)
+        expreplay._init_memory()
+        # no trainer here, do not populate new transitions between batches
+        expreplay._populate_job_queue = queue.Queue()
+        it = expreplay.get_data()
+        benchmark('array, nr_proc={}'.format(nr_proc), lambda: next(it),
+                  args.batch_size, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
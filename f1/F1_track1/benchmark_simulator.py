@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: benchmark_simulator.py
+
+"""
+Steps/sec of SimulatorProcess -> SimulatorMaster state exchange, with the
+states serialized over ZMQ or sent through a SharedStateArena.
+The master answers right away, so this only measures the transport.
+
+    python benchmark_simulator.py --nr-simulators 1 4 16 32
+"""
+
+from __future__ import print_function
+import argparse
+import os
+import tempfile
+import time
+import uuid
+import numpy as np
+
+from tensorpack.RL.simulator import (SimulatorProcess, SimulatorMaster,
+        SharedStateArena)
+from tensorpack.RL.envbase import RLEnvironment, DiscreteActionSpace
+from tensorpack.utils.concurrency import ensure_proc_terminate, start_proc_mask_signal
+from tensorpack.utils.serialize import dumps
+
+
+class RandomPlayer(RLEnvironment):
+    """ random frames, episodes of random length """
+    def __init__(self, shape, episode_len=100):
+        super(RandomPlayer, self).__init__()
+        self.rng = np.random.RandomState()
+        self.frames = self.rng.randint(0, 256, size=(16,) + shape).astype('uint8')
+        self.episode_len = episode_len
+        self.t = 0
+
+    def get_action_space(self):
+        return DiscreteActionSpace(6)
+
+    def current_state(self):
+        return self.frames[self.t % len(self.frames)]
+
+    def action(self, act):
+        self.t += 1
+        return 0.0, self.rng.rand() < 1.0 / self.episode_len
+
+    def restart_episode(self):
+        pass
+
+
+class RandomSimulator(SimulatorProcess):
+    def __init__(self, idx, pipe_c2s, pipe_s2c, shape, arena=None):
+        super(RandomSimulator, self).__init__(idx, pipe_c2s, pipe_s2c, arena)
+        self.shape = shape
+
+    def _build_player(self):
+        return RandomPlayer(self.shape)
+
+
+class CountingMaster(SimulatorMaster):
+    def __init__(self, pipe_c2s, pipe_s2c, arena=None):
+        super(CountingMaster, self).__init__(pipe_c2s, pipe_s2c, arena)
+        self.nr_steps = 0
+        self.nr_batches = 0
+
+    def _on_state(self, state, ident):
+        self.nr_steps += 1
+        self.send_queue.put([ident, dumps(int(state[0, 0, 0]) % 6)])
+
+    def _on_states(self, states, idents):
+        # the whole batch would go through the predictor at once
+        self.nr_batches += 1
+        actions = states[:, 0, 0, 0] % 6
+        for ident, act in zip(idents, actions):
+            self.nr_steps += 1
+            self.send_queue.put([ident, dumps(int(act))])
+
+    def _on_episode_over(self, ident):
+        self.clients[ident].memory = []
+
+
+def benchmark(nr_sim, shape, use_arena, seconds):
+    pipedir = tempfile.gettempdir()
+    name = 'ipc://{}/sim-{}-'.format(pipedir, str(uuid.uuid1())[:8])
+    c2s, s2c = name + 'c2s', name + 's2c'
+
+    arena = SharedStateArena(nr_sim, shape) if use_arena else None
+    procs = [RandomSimulator(k, c2s, s2c, shape, arena) for k in range(nr_sim)]
+    master = CountingMaster(c2s, s2c, arena)
+    ensure_proc_terminate(procs)
+    start_proc_mask_signal(procs)
+    master.start()
+
+    time.sleep(1)   # warm up
+    start_steps, start = master.nr_steps, time.time()
+    start_batches = master.nr_batches
+    time.sleep(seconds)
+    steps = master.nr_steps - start_steps
+    batches = master.nr_batches - start_batches
+    elapsed = time.time() - start
+    for p in procs:
+        p.terminate()
+        p.join()
+
+    print('{:<10} {:4d} simulators {:10.1f} steps/sec{}'.format(
+        'arena' if use_arena else 'serialize', nr_sim, steps / elapsed,
+        ', {:.1f} states per batch'.format(float(steps) / batches) if batches else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nr-simulators', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--shape', type=int, nargs=3, default=[120, 120, 24])
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    for nr_sim in args.nr_simulators:
+        for use_arena in [False, True]:
+            benchmark(nr_sim, tuple(args.shape), use_arena, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
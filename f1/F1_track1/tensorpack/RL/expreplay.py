@@ -4,29 +4,139 @@
 # Author: Yuxin Wu <ppwwyyxxc@gmail.com>
 
 import numpy as np
-from collections import deque, namedtuple
+from collections import namedtuple
 import threading
+import multiprocessing as mp
 from tqdm import tqdm
 import six
-from six.moves import queue
+from six.moves import queue, range
 
 from ..dataflow import DataFlow
 from ..utils import *
-from ..utils.concurrency import LoopThread
+from ..utils.concurrency import (LoopThread, ensure_proc_terminate,
+        start_proc_mask_signal, shared_zeros)
 from ..callbacks.base import Callback
 
-__all__ = ['ExpReplay']
+__all__ = ['ExpReplay', 'ReplayMemory']
 
 Experience = namedtuple('Experience',
         ['state', 'action', 'reward', 'isOver'])
 
+class ReplayMemory(object):
+    """
+    Transitions stored in preallocated circular arrays, batches are
+    assembled with a few vectorized numpy operations.
+
+    With `shared=True` the arrays (and the write position) live in shared
+    memory, so processes forked after the construction see new transitions.
+    """
+    def __init__(self, max_size, state_shape, history_len,
+            state_dtype='uint8', shared=False):
+        """
+        :param state_shape: shape of one state, (h, w, c). states are
+            concatenated along the last axis to build the history
+        """
+        self.max_size = int(max_size)
+        self.state_shape = tuple(state_shape)
+        assert len(self.state_shape) == 3, self.state_shape
+        self.history_len = int(history_len)
+
+        alloc = shared_zeros if shared else np.zeros
+        self.state = alloc((self.max_size,) + self.state_shape, state_dtype)
+        self.action = alloc((self.max_size,), 'int8')
+        self.reward = alloc((self.max_size,), 'float32')
+        self.isOver = alloc((self.max_size,), 'bool')
+        # (next position to write, number of transitions)
+        self._pos_size = alloc((2,), 'int64')
+        # writing a transition must not interleave with reading a batch
+        self.lock = mp.Lock() if shared else threading.Lock()
+
+    def __len__(self):
+        return int(self._pos_size[1])
+
+    def append(self, exp):
+        """ :param exp: an `Experience` """
+        with self.lock:
+            pos, size = self._pos_size
+            self.state[pos] = exp.state
+            self.action[pos] = exp.action
+            self.reward[pos] = exp.reward
+            self.isOver[pos] = exp.isOver
+            self._pos_size[0] = (pos + 1) % self.max_size
+            self._pos_size[1] = min(size + 1, self.max_size)
+
+    def recent_state(self, state):
+        """ :returns: `state` concatenated after the last `history_len-1` states,
+            zero-filled before the start of its episode """
+        n = self.history_len - 1
+        if n == 0:
+            return state
+        assert len(self) >= n
+        idx = (self._pos_size[0] - np.arange(n, 0, -1)) % self.max_size
+        # a state is of a previous episode if it, or any state after it, is the last of an episode
+        zero = np.logical_or.accumulate(self.isOver[idx][::-1])[::-1]
+        hist = self.state[idx]
+        hist[zero] = 0
+        return np.concatenate(list(hist) + [state], axis=2)
+
+    def sample(self, rng, batch_size):
+        """ :returns: a batch of [state, action, reward, next_state, isOver],
+            for transitions from state idx+history_len-1 to state idx+history_len
+            (zero-filled before the start of the episode) with random idx """
+        H = self.history_len
+        with self.lock:
+            pos, size = self._pos_size
+            start = (pos - size) % self.max_size
+            idx = start + rng.randint(size - H - 1, size=batch_size)
+            window = (idx[:, None] + np.arange(H + 1)) % self.max_size
+            frames = self.state[window]
+            isOver = self.isOver[window]
+            action = self.action[window[:, H - 1]]
+            reward = self.reward[window[:, H - 1]]
+
+        # when x.isOver==True, (x+1).state is of a different episode
+        if H > 1:
+            zero = np.zeros_like(isOver)
+            zero[:, :H - 1] = np.logical_or.accumulate(isOver[:, H - 2::-1], axis=1)[:, ::-1]
+            frames[zero] = 0
+
+        # concat the frames along the channels. copying one frame at a time
+        # is a lot faster than a transposed copy of all the frames
+        h, w, c = self.state_shape
+        state = np.empty((batch_size, h, w, H * c), dtype=frames.dtype)
+        next_state = np.empty_like(state)
+        for k in range(H):
+            state[:, :, :, k * c:(k + 1) * c] = frames[:, k]
+            next_state[:, :, :, k * c:(k + 1) * c] = frames[:, k + 1]
+        return [state, action, reward, next_state, isOver[:, H - 1]]
+
+class _BatchProcess(mp.Process):
+    """ assemble batches from a shared `ReplayMemory` into shared batch slots """
+    def __init__(self, mem, batch_size, slots, free_queue, full_queue):
+        super(_BatchProcess, self).__init__()
+        self.mem = mem
+        self.batch_size = batch_size
+        self.slots = slots
+        self.free_queue = free_queue
+        self.full_queue = full_queue
+        self.daemon = True
+
+    def run(self):
+        rng = get_rng(self)
+        while True:
+            k = self.free_queue.get()
+            for dst, src in zip(self.slots[k], self.mem.sample(rng, self.batch_size)):
+                dst[...] = src
+            self.full_queue.put(k)
+
 class ExpReplay(DataFlow, Callback):
     """
     Implement experience replay in the paper
     `Human-level control through deep reinforcement learning`.
 
     This implementation provides the interface as an DataFlow.
-    This DataFlow is not fork-safe (doesn't support multiprocess prefetching)
+    This DataFlow is not fork-safe (doesn't support multiprocess prefetching),
+    use `nr_proc` to assemble the batches in other processes instead.
     """
     def __init__(self,
             predictor_io_names,
@@ -40,7 +150,8 @@ class ExpReplay(DataFlow, Callback):
             exploration_epoch_anneal=0.002,
             reward_clip=None,
             update_frequency=1,
-            history_len=1
+            history_len=1,
+            nr_proc=0
             ):
         """
         :param predictor: a callabale running the up-to-date network.
@@ -49,6 +160,8 @@ class ExpReplay(DataFlow, Callback):
         :param history_len: length of history frames to concat. zero-filled initial frames
         :param update_frequency: number of new transitions to add to memory
             after sampling a batch of transitions for training
+        :param nr_proc: number of processes assembling batches from a replay
+            memory in shared memory. 0 to assemble them in the dataflow thread
         """
         # XXX back-compat
         if populate_size is not None:
@@ -61,7 +174,9 @@ class ExpReplay(DataFlow, Callback):
                 setattr(self, k, v)
         self.num_actions = player.get_action_space().num_actions()
         logger.info("Number of Legal actions: {}".format(self.num_actions))
-        self.mem = deque(maxlen=memory_size)
+        state = player.current_state()
+        self.mem = ReplayMemory(memory_size, state.shape, history_len,
+                state.dtype, shared=nr_proc > 0)
         self.rng = get_rng(self)
         self._init_memory_flag = threading.Event()  # tell if memory has been initialized
         self._predictor_io_names = predictor_io_names
@@ -82,8 +197,26 @@ class ExpReplay(DataFlow, Callback):
                 #self.mem.append(deepcopy(self.mem[0]))
                 self._populate_exp()
                 pbar.update()
+        if self.nr_proc > 0:
+            self._start_batch_procs()
         self._init_memory_flag.set()
 
+    def _start_batch_procs(self):
+        # two batches per process, so that a process never waits for the trainer
+        nr_slots = 2 * self.nr_proc
+        batch = self.mem.sample(self.rng, self.batch_size)
+        self._batch_slots = [[shared_zeros(x.shape, x.dtype) for x in batch]
+                             for _ in range(nr_slots)]
+        self._free_slots = mp.Queue()
+        self._full_slots = mp.Queue()
+        for k in range(nr_slots):
+            self._free_slots.put(k)
+        self._batch_procs = [_BatchProcess(self.mem, self.batch_size, self._batch_slots,
+                                           self._free_slots, self._full_slots)
+                             for _ in range(self.nr_proc)]
+        ensure_proc_terminate(self._batch_procs)
+        start_proc_mask_signal(self._batch_procs)
+
     def _populate_exp(self):
         """ populate a transition by epsilon-greedy"""
         old_s = self.player.current_state()
@@ -92,19 +225,7 @@ class ExpReplay(DataFlow, Callback):
         else:
             # build a history state
             # XXX assume a state can be representated by one tensor
-            ss = [old_s]
-
-            isOver = False
-            for k in range(1, self.history_len):
-                hist_exp = self.mem[-k]
-                if hist_exp.isOver:
-                    isOver = True
-                if isOver:
-                    ss.append(np.zeros_like(ss[0]))
-                else:
-                    ss.append(hist_exp.state)
-            ss.reverse()
-            ss = np.concatenate(ss, axis=2)
+            ss = self.mem.recent_state(old_s)
             # XXX assume batched network
             q_values = self.predictor([[ss]])[0][0]
             act = np.argmax(q_values)
@@ -117,64 +238,15 @@ class ExpReplay(DataFlow, Callback):
         self._init_memory_flag.wait()
         # new s is considered useless if isOver==True
         while True:
-            batch_exp = [self._sample_one() for _ in range(self.batch_size)]
-
-            #import cv2  # for debug
-            #def view_state(state, next_state):
-                #""" for debugging state representation"""
-                #r = np.concatenate([state[:,:,k] for k in range(self.history_len)], axis=1)
-                #r2 = np.concatenate([next_state[:,:,k] for k in range(self.history_len)], axis=1)
-                #r = np.concatenate([r, r2], axis=0)
-                #print r.shape
-                #cv2.imshow("state", r)
-                #cv2.waitKey()
-            #exp = batch_exp[0]
-            #print("Act: ", exp[3], " reward:", exp[2], " isOver: ", exp[4])
-            #if exp[2] or exp[4]:
-                #view_state(exp[0], exp[1])
-
-            yield self._process_batch(batch_exp)
+            if self.nr_proc > 0:
+                k = self._full_slots.get()
+                batch = [x.copy() for x in self._batch_slots[k]]
+                self._free_slots.put(k)
+            else:
+                batch = self.mem.sample(self.rng, self.batch_size)
+            yield batch
             self._populate_job_queue.put(1)
 
-    def _sample_one(self):
-        """ return the transition tuple for
-            [idx, idx+history_len) -> [idx+1, idx+1+history_len)
-            it's the transition from state idx+history_len-1 to state idx+history_len
-        """
-        # look for a state to start with
-        # when x.isOver==True, (x+1).state is of a different episode
-        idx = self.rng.randint(len(self.mem) - self.history_len - 1)
-
-        samples = [self.mem[k] for k in range(idx, idx+self.history_len+1)]
-        def concat(idx):
-            v = [x.state for x in samples[idx:idx+self.history_len]]
-            return np.concatenate(v, axis=2)
-        state = concat(0)
-        next_state = concat(1)
-        start_mem = samples[-2]
-        reward, action, isOver = start_mem.reward, start_mem.action, start_mem.isOver
-
-        start_idx = self.history_len - 1
-
-        # zero-fill state before starting
-        zero_fill = False
-        for k in range(1, self.history_len):
-            if samples[start_idx-k].isOver:
-                zero_fill = True
-            if zero_fill:
-                state[:,:,-k-1] = 0
-                if k + 2 <= self.history_len:
-                    next_state[:,:,-k-2] = 0
-        return (state, next_state, reward, action, isOver)
-
-    def _process_batch(self, batch_exp):
-        state = np.array([e[0] for e in batch_exp])
-        next_state = np.array([e[1] for e in batch_exp])
-        reward = np.array([e[2] for e in batch_exp])
-        action = np.array([e[3] for e in batch_exp], dtype='int8')
-        isOver = np.array([e[4] for e in batch_exp], dtype='bool')
-        return [state, action, reward, next_state, isOver]
-
     def _setup_graph(self):
         self.predictor = self.trainer.get_predict_func(*self._predictor_io_names)
 
@@ -4,10 +4,48 @@
 # Author: Yuxin Wu <ppwwyyxxc@gmail.com>
 
 import numpy as np
-from collections import deque
 from .envbase import ProxyPlayer
 
-__all__ = ['HistoryFramePlayer']
+__all__ = ['HistoryFramePlayer', 'FrameHistory']
+
+class FrameHistory(object):
+    """ The last `hist_len` frames concatenated along the channels, in a
+        preallocated buffer. Each frame is written twice in a buffer of
+        2 * hist_len frames, so that the history is always a slice of it.
+        Frames before the start of the episode are zeros.
+    """
+    def __init__(self, hist_len, frame):
+        """
+        :param frame: a frame of shape (h, w, c), or a list of parts
+            to concatenate along the channels
+        """
+        parts = _frame_parts(frame)
+        self.hist_len = hist_len
+        self.channel = sum(p.shape[2] for p in parts)
+        h, w = parts[0].shape[:2]
+        self.buffer = np.zeros((h, w, 2 * hist_len * self.channel), dtype=parts[0].dtype)
+        self.pos = hist_len - 1
+
+    def clear(self):
+        self.buffer[...] = 0
+
+    def append(self, frame):
+        parts = _frame_parts(frame)
+        self.pos = (self.pos + 1) % self.hist_len
+        for k in [self.pos, self.pos + self.hist_len]:
+            c = k * self.channel
+            for p in parts:
+                self.buffer[:, :, c:c + p.shape[2]] = p
+                c += p.shape[2]
+
+    def stacked(self):
+        """ :returns: a view of the history, from the oldest frame.
+            only valid until the next `append` or `clear` """
+        c = (self.pos + 1) * self.channel
+        return self.buffer[:, :, c:c + self.hist_len * self.channel]
+
+def _frame_parts(frame):
+    return list(frame) if isinstance(frame, (list, tuple)) else [frame]
 
 class HistoryFramePlayer(ProxyPlayer):
     """ Include history frames in state, or use black images
@@ -19,34 +57,31 @@ class HistoryFramePlayer(ProxyPlayer):
             and `hist_len-1` history
         """
         super(HistoryFramePlayer, self).__init__(player)
-        self.history = deque(maxlen=hist_len)
+        self.hist_len = hist_len
+        self.history = None
 
         s = self.player.current_state()
+        self._append(s)
+
+    def _append(self, s):
+        if self.history is None:
+            self.history = FrameHistory(self.hist_len, s)
         self.history.append(s)
 
     def current_state(self):
-        assert len(self.history) != 0
-        diff_len = self.history.maxlen - len(self.history)
-        if diff_len == 0:
-            return np.concatenate(self.history, axis=2)
-        zeros = [np.zeros_like(self.history[0]) for k in range(diff_len)]
-        for k in self.history:
-            zeros.append(k)
-        assert len(zeros) == self.history.maxlen
-        return np.concatenate(zeros, axis=2)
+        # a copy, since the states may be kept (i.e. in a replay memory)
+        return self.history.stacked().copy()
 
     def action(self, act):
         r, isOver = self.player.action(act)
         s = self.player.current_state()
-        self.history.append(s)
 
         if isOver:  # s would be a new episode
             self.history.clear()
-            self.history.append(s)
+        self._append(s)
         return (r, isOver)
 
     def restart_episode(self):
         super(HistoryFramePlayer, self).restart_episode()
         self.history.clear()
-        self.history.append(self.player.current_state())
-
+        self._append(self.player.current_state())
@@ -25,7 +25,7 @@ from ..utils.concurrency import *
 
 __all__ = ['SimulatorProcess', 'SimulatorMaster',
         'SimulatorProcessStateExchange', 'SimulatorProcessSharedWeight',
-        'TransitionExperience', 'WeightSync']
+        'TransitionExperience', 'WeightSync', 'SharedStateArena']
 
 try:
     import zmq
@@ -43,6 +43,35 @@ class TransitionExperience(object):
         for k, v in six.iteritems(kwargs):
             setattr(self, k, v)
 
+class SharedStateArena(object):
+    """ Shared memory with one state slot per simulator, so that simulators
+        send the master only their slot index instead of the serialized state.
+        Must be created before starting the simulator processes.
+    """
+    def __init__(self, nr_slots, shape, dtype='uint8'):
+        """
+        :param nr_slots: number of simulators, slot k is used by simulator k
+        :param shape: shape of a state. for states made of several arrays
+            (i.e. [image, vars]), a list of shapes and a list of dtypes
+        """
+        self.nr_slots = nr_slots
+        self.composite = isinstance(shape[0], (list, tuple))
+        if not self.composite:
+            shape, dtype = [shape], [dtype]
+        self.arrays = [shared_zeros((nr_slots,) + tuple(shp), dt)
+                       for shp, dt in zip(shape, dtype)]
+
+    def write(self, slot, state):
+        if not self.composite:
+            state = [state]
+        for arr, x in zip(self.arrays, state):
+            arr[slot] = x
+
+    def read(self, slots):
+        """ :returns: a batch (copy) of the states in these slots """
+        batch = [arr[slots] for arr in self.arrays]
+        return batch if self.composite else batch[0]
+
 class SimulatorProcessBase(mp.Process):
     __metaclass__ = ABCMeta
 
@@ -63,13 +92,18 @@ class SimulatorProcessStateExchange(SimulatorProcessBase):
     """
     __metaclass__ = ABCMeta
 
-    def __init__(self, idx, pipe_c2s, pipe_s2c):
+    def __init__(self, idx, pipe_c2s, pipe_s2c, arena=None):
         """
         :param idx: idx of this process
+        :param arena: a `SharedStateArena` to send the states through,
+            the same as the master's. states are serialized if None
         """
         super(SimulatorProcessStateExchange, self).__init__(idx)
         self.c2s = pipe_c2s
         self.s2c = pipe_s2c
+        self.arena = arena
+        if arena is not None:
+            assert self.idx < arena.nr_slots
 
     def run(self):
         player = self._build_player()
@@ -87,9 +121,16 @@ class SimulatorProcessStateExchange(SimulatorProcessBase):
         state = player.current_state()
         reward, isOver = 0, False
         while True:
-            c2s_socket.send(dumps(
-                (self.identity, state, reward, isOver)),
-                copy=False)
+            if self.arena is None:
+                c2s_socket.send(dumps(
+                    (self.identity, state, reward, isOver)),
+                    copy=False)
+            else:
+                # the master reads the slot before sending the action back
+                self.arena.write(self.idx, state)
+                c2s_socket.send(dumps(
+                    (self.identity, self.idx, reward, isOver)),
+                    copy=False)
             action = loads(s2c_socket.recv(copy=False).bytes)
             reward, isOver = player.action(action)
             state = player.current_state()
@@ -108,9 +149,14 @@ class SimulatorMaster(threading.Thread):
         def __init__(self):
             self.memory = []    # list of Experience
 
-    def __init__(self, pipe_c2s, pipe_s2c):
+    def __init__(self, pipe_c2s, pipe_s2c, arena=None):
+        """
+        :param arena: a `SharedStateArena` the simulators send their states
+            through. ready states are then given to `_on_states` in batches
+        """
         super(SimulatorMaster, self).__init__()
         self.daemon = True
+        self.arena = arena
 
         self.context = zmq.Context()
 
@@ -141,26 +187,54 @@ class SimulatorMaster(threading.Thread):
 
     def run(self):
         self.clients = defaultdict(self.ClientState)
+        if self.arena is not None:
+            return self._run_arena()
         while True:
             msg = loads(self.c2s_socket.recv(copy=False).bytes)
             ident, state, reward, isOver = msg
-            client = self.clients[ident]
-
-            # check if reward&isOver is valid
-            # in the first message, only state is valid
-            if len(client.memory) > 0:
-                client.memory[-1].reward = reward
-                if isOver:
-                    self._on_episode_over(ident)
-                else:
-                    self._on_datapoint(ident)
+            self._on_transition(ident, reward, isOver)
             # feed state and return action
             self._on_state(state, ident)
 
+    def _run_arena(self):
+        while True:
+            msgs = [loads(self.c2s_socket.recv(copy=False).bytes)]
+            # take all the states which are ready
+            while len(msgs) < self.arena.nr_slots:
+                try:
+                    msgs.append(loads(self.c2s_socket.recv(zmq.NOBLOCK, copy=False).bytes))
+                except zmq.Again:
+                    break
+            for ident, slot, reward, isOver in msgs:
+                self._on_transition(ident, reward, isOver)
+            self._on_states(self.arena.read([m[1] for m in msgs]),
+                            [m[0] for m in msgs])
+
+    def _on_transition(self, ident, reward, isOver):
+        client = self.clients[ident]
+
+        # check if reward&isOver is valid
+        # in the first message, only state is valid
+        if len(client.memory) > 0:
+            client.memory[-1].reward = reward
+            if isOver:
+                self._on_episode_over(ident)
+            else:
+                self._on_datapoint(ident)
+
     @abstractmethod
     def _on_state(self, state, ident):
         """response to state sent by ident. Preferrably an async call"""
 
+    def _on_states(self, states, idents):
+        """ response to a batch of states (with a SharedStateArena).
+            Override it to predict the actions of the batch at once """
+        for k, ident in enumerate(idents):
+            if isinstance(states, list):
+                self._on_state([x[k] for x in states], ident)
+            else:
+                self._on_state(states[k], ident)
+
     @abstractmethod
     def _on_episode_over(self, client):
         """ callback when the client just finished an episode.
@@ -10,6 +10,8 @@ import bisect
 from contextlib import contextmanager
 import signal
 import weakref
+import mmap
+import numpy as np
 import six
 if six.PY2:
     import subprocess32 as subprocess
@@ -21,7 +23,7 @@ from . import logger
 
 __all__ = ['StoppableThread', 'LoopThread', 'ensure_proc_terminate',
            'OrderedResultGatherProc', 'OrderedContainer', 'DIE',
-           'mask_sigint', 'start_proc_mask_signal']
+           'mask_sigint', 'start_proc_mask_signal', 'shared_zeros']
 
 class StoppableThread(threading.Thread):
     """
@@ -122,6 +124,14 @@ def start_proc_mask_signal(proc):
         for p in proc:
             p.start()
 
+def shared_zeros(shape, dtype):
+    """ zero-filled array in anonymous shared memory, visible to forked processes.
+        pages are only allocated when written to, like np.zeros """
+    dtype = np.dtype(dtype)
+    size = int(np.prod(shape))
+    buf = mmap.mmap(-1, max(size * dtype.itemsize, 1))
+    return np.frombuffer(buf, dtype=dtype, count=size).reshape(shape)
+
 def subproc_call(cmd, timeout=None):
     try:
         output = subprocess.check_output(
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+import json
 import vizdoom as vzd
 from tabulate import tabulate
 from warnings import warn
@@ -14,6 +15,7 @@ DEFAULT_TIMELIMIT = 10
 # WAD_FILE = "wads/vex.wad"
 WAD_FILE = "wads/dwango5.wad"
 FRAMERATE = 35
+DEFAULT_PORT = 5029
 
 if __name__ == "__main__":
     parser = ArgumentParser("Host script for ViZDoom Copmetition at CIG 2017.",
@@ -42,6 +44,18 @@ if __name__ == "__main__":
     parser.add_argument('-w', '--watch', dest='watch', action='store_const',
                         default=False, const=True,
                         help='roam the map as a ghost spectator')
+    parser.add_argument('--port', metavar="PORT", dest='port',
+                        default=DEFAULT_PORT, type=int,
+                        help='network port, players join with -join localhost -port PORT')
+    parser.add_argument('--wad', metavar="WAD_FILE", dest='wad',
+                        default=WAD_FILE, type=str,
+                        help='wad file with the maps')
+    parser.add_argument('--ticrate', metavar="TICRATE", dest='ticrate',
+                        default=FRAMERATE, type=int,
+                        help='tics per second, higher runs faster than real time if all the players keep up')
+    parser.add_argument('--results-file', metavar="RESULTS_FILE", dest='results_file',
+                        default=None, type=str,
+                        help='json file where the final frags are written')
 
     args = parser.parse_args()
 
@@ -78,13 +92,13 @@ if __name__ == "__main__":
 
     game.set_doom_map(map)
 
-    game.set_doom_scenario_path(WAD_FILE)
+    game.set_doom_scenario_path(args.wad)
     game.add_game_args("-deathmatch +viz_nocheat 1 +viz_debug 0 +viz_respawn_delay 10")
     game.add_game_args("+sv_forcerespawn 1 +sv_noautoaim 1 +sv_respawnprotect 1 +sv_spawnfarthest 1 +sv_crouch 1")
 
     game.add_game_args("+viz_spectator 1")
     game.add_game_args("+name ghost")
-    game.add_game_args("-host {}".format(players_num))
+    game.add_game_args("-host {} -port {}".format(players_num, args.port))
     game.add_game_args("+timelimit {}".format(timelimit))
     game.add_game_args("-record {}".format(record_file))
     game.set_console_enabled(console_enabled)
@@ -106,6 +120,7 @@ if __name__ == "__main__":
         game.set_window_visible(True)
     else:
         game.set_mode(vzd.Mode.ASYNC_PLAYER)
+        game.set_ticrate(args.ticrate)
         game.set_window_visible(False)
 
     game.set_screen_resolution(vzd.ScreenResolution.RES_1024X576)
@@ -123,14 +138,16 @@ if __name__ == "__main__":
     print("Starting vizdoom CIG 2017 host for {} player{}.".format(pn, plural))
     print("Configuration:")
     print(tabulate([
-        ("WAD", WAD_FILE),
+        ("WAD", args.wad),
+        ("PORT", args.port),
         ("TIMELIMIT (min)", timelimit),
         ("MAP", map),
         ("PLAYERS", players_num - 1),
         ("BOTS", bots_num),
         ("CONSOLE", console_enabled),
         ("RECORDFILE", record_file),
-        ("LOG_INTERVAL (min)", log_interval_min)
+        ("LOG_INTERVAL (min)", log_interval_min),
+        ("TICRATE", args.ticrate)
     ], tablefmt="fancy_grid"
     ))
     print()
@@ -172,3 +189,7 @@ if __name__ == "__main__":
     t = game.get_episode_time()
     log = gather_log()
     print_log(log, t)
+
+    if args.results_file is not None:
+        with open(args.results_file, "w") as f:
+            json.dump({"map": map, "time": t, "frags": log}, f)
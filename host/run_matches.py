@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Runs many matches between the competition bots on one machine, without docker.
+
+Every match gets its own port from a pool, so matches run side by side. The host and the bots
+are started as local processes, headless and with an uncapped tic rate, and the final frags of
+every match are appended to a json lines results file:
+
+    python host/run_matches.py -n 20 -j 4 --players intelact f1 random --bots 4 -t 5
+
+Bots join ViZDoom through the _vizdoom.cfg in their working directory. Each bot is started in a
+copy of its directory made of symlinks, with a _vizdoom.cfg pointing to the match port.
+Players are numbered in the order they join, so the bots are started one at a time,
+--join-delay seconds apart, to match the host's player numbers to the bots.
+"""
+
+import json
+import os
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+
+from tabulate import tabulate
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOST_SCRIPT = os.path.join(ROOT_DIR, "host", "host.py")
+WAD_FILE = os.path.join(ROOT_DIR, "wads", "dwango5.wad")
+FIRST_PORT = 5029
+UNCAPPED_TICRATE = 10000
+
+# directory and command of every bot, as in their Dockerfiles
+BOTS = {
+    "random": ("random", "python3 sample_random_agent.py"),
+    "f1": ("f1/F1_track1", "python2 my_glorious_agent.py"),
+    "intelact": ("intelact/IntelAct_track2", "python run_agent.py"),
+    "arnold": ("480Arnold", "python3 arnold.py --exp_name test --main_dump_path ./dumped "
+                            "--frame_skip 4 --action_combinations 'move_fb+move_lr;turn_lr;attack' "
+                            "--network_type dqn_rnn --recurrence lstm --n_rec_layers 1 --hist_size 4 --remember 1 "
+                            "--labels_mapping '' --game_features target,enemy --bucket_size '[10, 1]' --dropout 0.5 "
+                            "--speed on --crouch off --map_ids_test 1 --manual_control 1 "
+                            "--scenario deathmatch --wad dwango5 --players_per_game 2 "
+                            "--reload ../../../pretrained/vizdoom_2017_track2.pth --evaluate 1 --visualize 0 --gpu_id -1"),
+    # --reload is the checkpoint path inside the docker image, override with --bot-cmd
+    "arnold_track2": ("arnold_track2", "python3 -m arnold --exp_name test --main_dump_path . --final_decay 0.1 "
+                                       "--dueling_network false --render_weapon true --height 60 "
+                                       "--use_screen_buffer true --update_frequency 4 --frame_skip 4 "
+                                       "--action_combinations 'move_fb+move_lr;turn_lr;attack' --variable_dim 32 "
+                                       "--optimizer rmsprop,lr=0.00005 --speed on --hist_size 4 "
+                                       "--use_depth_buffer false --render_crosshair true --use_bn off "
+                                       "--wad deathmatch_rockets --freelook false --recurrence lstm --width 108 "
+                                       "--clip_delta 1.0 --start_decay 0 --n_rec_layers 1 --bucket_size '[10, 1]' "
+                                       "--crouch off --n_bots 8 --freedoom true --dropout 0.5 --labels_mapping '' "
+                                       "--batch_size 32 --game_features target,enemy --dump_freq 200000 --gray false "
+                                       "--remember 1 --scenario deathmatch --replay_memory_size 1000000 "
+                                       "--n_rec_updates 5 --hidden_dim 512 --render_hud false --network_type dqn_rnn "
+                                       "--gamma 0.99 --stop_decay 1000000 --evaluate 1 --visualize 0 "
+                                       "--reload /263816479_periodic-3800000 --gpu_id -1"),
+}
+
+VIZDOOM_CFG = """window_visible = false
+mode = ASYNC_PLAYER
+ticrate = {ticrate}
+doom_scenario_path = {wad}
+game_args += -join localhost -port {port}
+"""
+
+
+class PortPool:
+    """ Ports for the matches running at the same time, acquire() blocks until one is free. """
+
+    def __init__(self, first_port, num_ports):
+        self.ports = Queue()
+        for port in range(first_port, first_port + num_ports):
+            self.ports.put(port)
+
+    @staticmethod
+    def is_free(port):
+        # the host listens on UDP
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            try:
+                s.bind(("", port))
+            except OSError:
+                return False
+        return True
+
+    def acquire(self):
+        while True:
+            port = self.ports.get()
+            if self.is_free(port):
+                return port
+            # used by something else, try it again later
+            self.ports.put(port)
+            time.sleep(1)
+
+    def release(self, port):
+        self.ports.put(port)
+
+
+def make_bot_dir(bot_dir, work_dir, vizdoom_cfg):
+    """ Symlinks to everything in bot_dir, except its _vizdoom.cfg which is replaced by vizdoom_cfg. """
+    os.makedirs(work_dir)
+    for name in os.listdir(bot_dir):
+        if name != "_vizdoom.cfg":
+            os.symlink(os.path.join(bot_dir, name), os.path.join(work_dir, name))
+    with open(os.path.join(work_dir, "_vizdoom.cfg"), "w") as f:
+        f.write(vizdoom_cfg)
+
+
+def kill(procs):
+    for p in procs:
+        if p.poll() is None:
+            p.kill()
+    for p in procs:
+        p.wait()
+
+
+def run_match(match_id, args, bot_cmds, port_pool, match_dir):
+    players = args.players
+    map_id = args.maps[match_id % len(args.maps)]
+    port = port_pool.acquire()
+    results_file = os.path.join(match_dir, "results.json")
+    os.makedirs(match_dir)
+
+    procs = []
+    logs = []
+
+    def start(cmd, cwd, log_name):
+        log = open(os.path.join(match_dir, log_name + ".log"), "w")
+        logs.append(log)
+        procs.append(subprocess.Popen(cmd, cwd=cwd, stdout=log, stderr=subprocess.STDOUT))
+        return procs[-1]
+
+    try:
+        host = start([sys.executable, HOST_SCRIPT, "-p", str(len(players)), "-b", str(args.bots_num),
+                      "-m", str(map_id), "-t", str(args.timelimit), "-dc", "--port", str(port),
+                      "--wad", args.wad, "--ticrate", str(args.ticrate), "--results-file", results_file],
+                     ROOT_DIR, "host")
+        vizdoom_cfg = VIZDOOM_CFG.format(ticrate=args.ticrate, wad=args.wad, port=port)
+        for i, name in enumerate(players):
+            work_dir = os.path.join(match_dir, "{}_{}".format(i, name))
+            make_bot_dir(os.path.join(ROOT_DIR, BOTS[name][0]), work_dir, vizdoom_cfg)
+            time.sleep(args.join_delay)
+            start(bot_cmds[name], work_dir, "{}_{}".format(i, name))
+
+        try:
+            host.wait(timeout=args.timelimit * 60 + args.timeout)
+        except subprocess.TimeoutExpired:
+            print("Match {} timed out, see the logs in {}".format(match_id, match_dir))
+    finally:
+        kill(procs)
+        for log in logs:
+            log.close()
+        port_pool.release(port)
+
+    if not os.path.isfile(results_file):
+        return None
+
+    with open(results_file) as f:
+        res = json.load(f)
+    # player 1 is the host, then the players in the order they joined, then the builtin bots
+    names = list(players) + ["bot"] * (len(res["frags"]) - len(players))
+    return dict(match=match_id, map=res["map"], port=port, time=res["time"],
+                players=[dict(player=p, name=n, frags=frags) for n, (p, frags) in zip(names, res["frags"])])
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser("Runs local matches between the competition bots.",
+                            formatter_class=ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--players', nargs='+', default=["intelact", "f1", "random"], choices=sorted(BOTS.keys()),
+                        help='bots playing every match, the same bot can be given several times')
+    parser.add_argument('-b', '--bots', dest='bots_num', default=0, type=int,
+                        help='number of builtin bots added by the host')
+    parser.add_argument('-m', '--maps', nargs='+', default=[1], type=int,
+                        help='maps, used in turn by the matches')
+    parser.add_argument('-t', '--time', dest='timelimit', default=10, type=float,
+                        help='timelimit in minutes of game time')
+    parser.add_argument('-n', '--num-matches', default=1, type=int,
+                        help='number of matches')
+    parser.add_argument('-j', '--parallel', default=1, type=int,
+                        help='matches running at the same time')
+    parser.add_argument('--first-port', default=FIRST_PORT, type=int,
+                        help='ports first-port..first-port+parallel-1 are used')
+    parser.add_argument('--ticrate', default=UNCAPPED_TICRATE, type=int,
+                        help='tics per second, the game runs as fast as the slowest player')
+    parser.add_argument('--wad', default=WAD_FILE,
+                        help='wad file with the maps, for the host and the players')
+    parser.add_argument('--join-delay', default=5., type=float,
+                        help='seconds between the start of two players, so that they join in order')
+    parser.add_argument('--timeout', default=600., type=float,
+                        help='seconds on top of the timelimit before a match is killed')
+    parser.add_argument('--bot-cmd', action='append', default=[], metavar='NAME=CMD',
+                        help='command to start a bot instead of the default one, run in its directory')
+    parser.add_argument('--out-dir', default=None,
+                        help='logs of every match, a temporary directory by default')
+    parser.add_argument('-o', '--results', default='results.jsonl',
+                        help='json lines file, where the results of every match are appended')
+    args = parser.parse_args()
+    args.wad = os.path.abspath(args.wad)
+
+    bot_cmds = {name: shlex.split(cmd) for name, (_, cmd) in BOTS.items()}
+    for bot_cmd in args.bot_cmd:
+        name, cmd = bot_cmd.split("=", 1)
+        if name not in BOTS:
+            raise ValueError("Unknown bot: {}. Known bots: {}".format(name, sorted(BOTS.keys())))
+        bot_cmds[name] = shlex.split(cmd)
+
+    out_dir = args.out_dir if args.out_dir is not None else tempfile.mkdtemp(prefix="matches_")
+    print("Logs in {}".format(out_dir))
+
+    port_pool = PortPool(args.first_port, args.parallel)
+    results_lock = threading.Lock()
+    total_frags = defaultdict(float)
+    num_played = defaultdict(int)
+
+    def play(match_id):
+        res = run_match(match_id, args, bot_cmds, port_pool, os.path.join(out_dir, "match_{}".format(match_id)))
+        if res is None:
+            print("Match {} failed, no results".format(match_id))
+            return
+        with results_lock:
+            with open(args.results, "a") as f:
+                f.write(json.dumps(res) + "\n")
+            for p in res["players"]:
+                total_frags[p["name"]] += p["frags"]
+                num_played[p["name"]] += 1
+        print("Match {} on {}: {}".format(
+            match_id, res["map"], ", ".join("{} {:.0f}".format(p["name"], p["frags"]) for p in res["players"])))
+
+    with ThreadPoolExecutor(max_workers=args.parallel) as executor:
+        list(executor.map(play, range(args.num_matches)))
+
+    print(tabulate([(name, num_played[name], total_frags[name], total_frags[name] / num_played[name])
+                    for name in sorted(total_frags, key=lambda n: -total_frags[n] / num_played[n])],
+                   ["Player", "Games", "Frags", "Frags per game"], tablefmt="fancy_grid"))
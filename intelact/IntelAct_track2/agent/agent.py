@@ -62,9 +62,16 @@ class Agent:
         self.net_discrete_actions = np.array(self.net_discrete_actions)
         self.onehot_discrete_actions = np.eye(self.num_net_discrete_actions)
         
+        # actions as binary codes, so that a whole batch is converted to indices with a single lookup
+        self.action_code_weights = 2 ** np.arange(len(self.discrete_controls_to_net))[::-1]
+        self.action_code_to_index = -np.ones(2 ** len(self.discrete_controls_to_net), dtype=int)
+        self.action_code_to_index[np.dot(self.net_discrete_actions, self.action_code_weights)] = np.arange(self.num_net_discrete_actions)
+        
     def preprocess_actions(self, acts):
-        to_net_acts = acts[:,self.discrete_controls_to_net]
-        return self.onehot_discrete_actions[np.array([self.action_to_index[tuple(act)] for act in to_net_acts.tolist()])]
+        to_net_acts = np.asarray(acts)[:,self.discrete_controls_to_net] != 0
+        inds = self.action_code_to_index[np.dot(to_net_acts, self.action_code_weights)]
+        assert(np.all(inds >= 0)) # not one of the net actions, i.e. opposite buttons pressed together
+        return self.onehot_discrete_actions[inds]
         
     def postprocess_actions(self, acts_net, acts_manual=[]):
         out_actions = np.zeros((acts_net.shape[0], len(self.discrete_controls)), dtype=np.int)
@@ -131,7 +138,7 @@ class Agent:
         predictions = self.sess.run(self.pred_all, feed_dict={self.input_images: state_imgs, 
                                                             self.input_measurements: state_meas[:,self.meas_for_net]})
             
-        objectives = np.sum(predictions[:,:,objective[0]]*objective[1][None,None,:], axis=2)    
+        objectives = np.dot(predictions[:,:,objective[0]], objective[1])
         curr_action = np.argmax(objectives, axis=1)
         return curr_action
     
@@ -142,20 +149,15 @@ class Agent:
             assert(len(self.meas_for_manual) == 13) # expected to be [AMMO2 AMMO3 AMMO4 AMMO5 AMMO6 AMMO7 WEAPON2 WEAPON3 WEAPON4 WEAPON5 WEAPON6 WEAPON7 SELECTED_WEAPON]
             assert(self.num_manual_controls == 6) # expected to be [SELECT_WEAPON2 SELECT_WEAPON3 SELECT_WEAPON4 SELECT_WEAPON5 SELECT_WEAPON6 SELECT_WEAPON7]
             
-            curr_act = np.zeros((state_meas.shape[0],self.num_manual_controls), dtype=np.int)
-            for ns in range(state_meas.shape[0]):
-                # always pistol
-                #if not state_meas[ns,self.meas_for_manual[12]] == 2:
-                    #curr_act[ns, 0] = 1
-                # best weapon
-                curr_ammo = state_meas[ns,self.meas_for_manual[:6]]
-                curr_weapons = state_meas[ns,self.meas_for_manual[6:12]]
-                #print(curr_ammo,curr_weapons)
-                available_weapons = np.logical_and(curr_ammo >= np.array([1,2,1,1,1,40]), curr_weapons)
-                if any(available_weapons):
-                    best_weapon = np.nonzero(available_weapons)[0][-1]
-                    if not state_meas[ns,self.meas_for_manual[12]] == best_weapon+2:
-                        curr_act[ns, best_weapon] = 1
+            # best weapon: the last one that is owned and has enough ammo, selected unless it already is
+            curr_ammo = state_meas[:,self.meas_for_manual[:6]]
+            curr_weapons = state_meas[:,self.meas_for_manual[6:12]]
+            available_weapons = np.logical_and(curr_ammo >= np.array([1,2,1,1,1,40]), curr_weapons)
+            best_weapon = self.num_manual_controls - 1 - np.argmax(available_weapons[:,::-1], axis=1)
+            to_select = np.logical_and(np.any(available_weapons, axis=1), state_meas[:,self.meas_for_manual[12]] != best_weapon+2)
+            
+            curr_act = np.zeros((state_meas.shape[0],self.num_manual_controls), dtype=int)
+            curr_act[to_select, best_weapon[to_select]] = 1
             return curr_act
 
     def load(self, checkpoint_dir):
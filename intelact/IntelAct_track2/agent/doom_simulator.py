@@ -80,6 +80,9 @@ class DoomSimulator:
 
         return img, meas, rwrd, term
 
+    def new_episode(self):
+        self._game.new_episode()
+
     def get_random_action(self):
         return [(random.random() >= .5) for i in range(self.num_buttons)]
 
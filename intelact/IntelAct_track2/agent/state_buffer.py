@@ -0,0 +1,41 @@
+from __future__ import print_function
+import numpy as np
+
+
+class StateBuffer:
+
+    def __init__(self, num_simulators, history_length, num_channels, resolution, num_meas):
+        '''StateBuffer - the last history_length frames and measurements of several simulators,
+        kept in the layout the net takes, so a batch of states is ready without copies.
+        '''
+        self.num_simulators = num_simulators
+        self.history_length = history_length
+        self.num_channels = num_channels
+        self.resolution = resolution
+        self.num_meas = num_meas
+
+        # frames stacked along the last axis, oldest first, as in Agent.input_images
+        self.imgs = np.zeros((num_simulators, resolution[1], resolution[0], history_length*num_channels), dtype=np.uint8)
+        self.meas = np.zeros((num_simulators, history_length*num_meas), dtype=np.float32)
+        self.num_steps = np.zeros(num_simulators, dtype=int)
+
+    def add(self, ns, img, meas):
+        # shift the history by one frame and write the new one at the end
+        if self.history_length > 1:
+            self.imgs[ns,:,:,:-self.num_channels] = self.imgs[ns,:,:,self.num_channels:]
+            self.meas[ns,:-self.num_meas] = self.meas[ns,self.num_meas:]
+        self.imgs[ns,:,:,-self.num_channels:] = np.reshape(img, (self.num_channels, self.resolution[1], self.resolution[0])).transpose(1,2,0)
+        self.meas[ns,-self.num_meas:] = meas
+        self.num_steps[ns] += 1
+
+    def reset(self, ns):
+        self.imgs[ns] = 0
+        self.meas[ns] = 0
+        self.num_steps[ns] = 0
+
+    def ready(self):
+        # simulators with a full history, the others should act randomly
+        return self.num_steps >= self.history_length
+
+    def get_states(self):
+        return self.imgs, self.meas
@@ -0,0 +1,58 @@
+from __future__ import print_function
+import argparse
+import time
+import numpy as np
+from agent.doom_simulator import DoomSimulator
+from agent.state_buffer import StateBuffer
+from run_agent import make_simulator_args, make_agent_args, make_agent, act
+
+# Runs N simulators in lockstep, acting for all of them with a single session.run per step:
+#   python benchmark_batched.py --num-simulators 8 --seconds 60
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-simulators', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=60.)
+    parser.add_argument('--game-args', default=None, help='e.g. a map or bots for offline runs, default as in run_agent.py')
+    args = parser.parse_args()
+
+    simulator_args = make_simulator_args()
+    if args.game_args is not None:
+        simulator_args['game_args'] = args.game_args
+    simulators = [DoomSimulator(simulator_args) for _ in range(args.num_simulators)]
+    simulator = simulators[0]
+
+    agent_args = make_agent_args(simulator)
+    ag = make_agent(agent_args)
+    states = StateBuffer(args.num_simulators, agent_args['history_length'], simulator.num_channels, simulator.resolution, simulator.num_meas)
+
+    num_frames, num_episodes, act_time = 0, 0, 0.
+    start = time.time()
+    while time.time() - start < args.seconds:
+        acting = states.ready()
+        act_start = time.time()
+        acts = act(ag, agent_args, states, acting)
+        act_time += time.time() - act_start
+
+        for ns, sim in enumerate(simulators):
+            img, meas, rwrd, term = sim.step(acts[ns].tolist())
+            if term:
+                num_episodes += 1
+                sim.new_episode()
+                states.reset(ns)
+                continue
+            if acting[ns] and meas[0] > 30.:
+                meas[0] = 30.
+            states.add(ns, img, meas)
+        num_frames += args.num_simulators * simulator.frame_skip
+
+    elapsed = time.time() - start
+    print('%d simulators: %.1f frames/sec, %.1f%% of the time acting, %d episodes' % (
+        args.num_simulators, num_frames / elapsed, 100. * act_time / elapsed, num_episodes))
+
+    for sim in simulators:
+        sim.close_game()
+
+
+if __name__ == '__main__':
+    main()
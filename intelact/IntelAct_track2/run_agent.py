@@ -5,10 +5,19 @@ sys.path.append('./bin/python')
 import vizdoom 
 from agent.doom_simulator import DoomSimulator
 from agent.agent import Agent
+from agent.state_buffer import StateBuffer
 import tensorflow as tf
 
-def main():
-    
+#MOVE_FORWARD   MOVE_BACKWARD   TURN_LEFT   TURN_RIGHT  ATTACK  SPEED   SELECT_WEAPON2  SELECT_WEAPON3  SELECT_WEAPON4  SELECT_WEAPON5  SELECT_WEAPON6  SELECT_WEAPON7
+replacement_act = [0,1,0,0,0,1,0,0,0,0,0,0]
+
+def replace_idle_actions(acts):
+    # standing still (opposite buttons both pressed or released, not attacking) is replaced by running backwards
+    idle = np.logical_and(np.logical_and(acts[:,0] == acts[:,1], acts[:,2] == acts[:,3]), acts[:,4] == 0)
+    acts[idle] = replacement_act
+    return acts
+
+def make_simulator_args():
     ## Simulator
     simulator_args = {}
     simulator_args['config'] = 'config/config.cfg'
@@ -16,7 +25,9 @@ def main():
     simulator_args['frame_skip'] = 2
     simulator_args['color_mode'] = 'GRAY'   
     simulator_args['game_args'] = "+name IntelAct +colorset 7"
-        
+    return simulator_args
+
+def make_agent_args(simulator):
     ## Agent    
     agent_args = {}
     
@@ -43,12 +54,6 @@ def main():
     agent_args['test_objective_params'] = (np.array([5,11,17]), np.array([1.,1.,1.]))
     agent_args['history_length'] = 1
     agent_args['test_checkpoint'] = 'model'
-    
-    print('starting simulator')
-
-    simulator = DoomSimulator(simulator_args)
-    
-    print('started simulator')
 
     agent_args['discrete_controls'] = simulator.discrete_controls
     agent_args['continuous_controls'] = simulator.continuous_controls
@@ -65,40 +70,45 @@ def main():
     else:
         agent_args['meas_for_manual'] = []
     agent_args['state_meas_shape'] = (len(agent_args['meas_for_net']),)
-    
+    return agent_args
+
+def make_agent(agent_args):
     gpu_options = tf.GPUOptions(per_process_gpu_memory_fraction=0.1)
     sess = tf.Session(config=tf.ConfigProto(gpu_options=gpu_options,log_device_placement=False))
     ag = Agent(sess, agent_args)
     ag.load('./checkpoints')
+    return ag
+
+def act(ag, agent_args, states, acting):
+    # one batch for all simulators, random actions for the ones that do not have a full history yet
+    if not np.any(acting):
+        return ag.random_actions(len(acting))
+    state_imgs, state_meas = states.get_states()
+    acts = replace_idle_actions(ag.act(state_imgs, state_meas, agent_args['test_objective_params'])[0])
+    acts[~acting] = ag.random_actions(np.sum(~acting))
+    return acts
+
+def main():
+    print('starting simulator')
+
+    simulator = DoomSimulator(make_simulator_args())
     
-    img_buffer = np.zeros((agent_args['history_length'], simulator.num_channels, simulator.resolution[1], simulator.resolution[0]))
-    meas_buffer = np.zeros((agent_args['history_length'], simulator.num_meas))
-    curr_step = 0
-    term = False
+    print('started simulator')
+
+    agent_args = make_agent_args(simulator)
+    ag = make_agent(agent_args)
     
-    acts_to_replace = [a+b+d+e for a in [[0,0],[1,1]] for b in [[0,0],[1,1]] for d in [[0]] for e in [[0],[1]]]
-    print(acts_to_replace)
-    replacement_act = [0,1,0,0,0,1,0,0,0,0,0,0]
-    #MOVE_FORWARD   MOVE_BACKWARD   TURN_LEFT   TURN_RIGHT  ATTACK  SPEED   SELECT_WEAPON2  SELECT_WEAPON3  SELECT_WEAPON4  SELECT_WEAPON5  SELECT_WEAPON6  SELECT_WEAPON7
+    states = StateBuffer(1, agent_args['history_length'], simulator.num_channels, simulator.resolution, simulator.num_meas)
+    term = False
 
     while not term:
-        if curr_step < agent_args['history_length']:
-            img, meas, rwrd, term = simulator.step(np.squeeze(ag.random_actions(1)).tolist())
-        else:
-            state_imgs = np.transpose(np.reshape(img_buffer[np.arange(curr_step-agent_args['history_length'], curr_step) % agent_args['history_length']], (1,) + agent_args['state_imgs_shape']), [0,2,3,1])
-            state_meas = np.reshape(meas_buffer[np.arange(curr_step-agent_args['history_length'], curr_step) % agent_args['history_length']], (1,agent_args['history_length']*simulator.num_meas))
-
-            curr_act = np.squeeze(ag.act(state_imgs, state_meas, agent_args['test_objective_params'])[0]).tolist()
-            if curr_act[:6] in acts_to_replace:
-                curr_act = replacement_act
-            img, meas, rwrd, term = simulator.step(curr_act)
-            if (not (meas is None)) and meas[0] > 30.:
-                meas[0] = 30.
+        acting = states.ready()
+        img, meas, rwrd, term = simulator.step(act(ag, agent_args, states, acting)[0].tolist())
+        if acting[0] and (not (meas is None)) and meas[0] > 30.:
+            meas[0] = 30.
             
         if not term:
-            img_buffer[curr_step % agent_args['history_length']] = img
-            meas_buffer[curr_step % agent_args['history_length']] = meas
-            curr_step += 1
+            states.add(0, img, meas)
                 
     simulator.close_game()
 
@@ -1,12 +1,15 @@
 import random
+import time
 from typing import Dict, Iterable, List, Optional, Tuple
 
 import torch
-from signal_slot.signal_slot import EventLoop, signal
+from signal_slot.signal_slot import EventLoop, Timer, signal
 
+from sample_factory.algo.learning.experience_replay import ExperienceReplayBuffer
 from sample_factory.algo.utils.env_info import EnvInfo
 from sample_factory.algo.utils.heartbeat import HeartbeatStoppableEventLoopObject
 from sample_factory.algo.utils.shared_buffers import BufferMgr, alloc_trajectory_tensors, policy_device
+from sample_factory.algo.utils.telemetry import telemetry_enabled, telemetry_msg
 from sample_factory.algo.utils.tensor_dict import TensorDict
 from sample_factory.model.model_utils import get_rnn_size
 from sample_factory.utils.attr_dict import AttrDict
@@ -121,6 +124,27 @@ class Batcher(HeartbeatStoppableEventLoopObject):
             [] for _ in range(self.max_batches_to_accumulate)
         ]
 
+        # Zero-copy batches are views into the trajectory buffer, so the trajectories are released only after training.
+        # The learner modifies some tensors of the batch in-place, which is why we can't share trajectories between
+        # multiple policies this way.
+        self.zero_copy = cfg.batcher_zero_copy and cfg.num_policies == 1
+        self.zero_copy_devices: List[Device] = []
+        self.training_batch_views: List[Optional[TensorDict]] = [None] * self.max_batches_to_accumulate
+        self.num_zero_copy_batches = self.num_copied_batches = 0
+
+        # experience replay: the learner trains on copies of recent batches when it would otherwise be idle
+        self.policy_versions = buffer_mgr.policy_versions
+        self.replay_buffer: Optional[ExperienceReplayBuffer] = None
+        self.replay_credit: float = 0.0
+        self.replayed_batches: List[bool] = [False] * self.max_batches_to_accumulate
+        self.num_replayed_batches = 0
+
+        # telemetry: how long the sampler was throttled because all training batches were taken
+        self.collection_stopped_since: Optional[float] = None
+        self.collection_stopped_sec: float = 0.0
+        self.num_collection_stops: int = 0
+        self.telemetry_timer: Optional[Timer] = None
+
     @signal
     def initialized(self):
         ...
@@ -141,15 +165,20 @@ class Batcher(HeartbeatStoppableEventLoopObject):
     def resume_experience_collection(self):
         ...
 
+    @signal
+    def report_msg(self):
+        ...
+
     @signal
     def stop(self):
         ...
 
     def init(self):
         device = policy_device(self.cfg, self.policy_id)
-        for i in range(self.max_batches_to_accumulate):
-            rnn_size = get_rnn_size(self.cfg)
-            training_batch = alloc_trajectory_tensors(
+        rnn_size = get_rnn_size(self.cfg)
+
+        def alloc_training_batch() -> TensorDict:
+            return alloc_trajectory_tensors(
                 self.env_info,
                 self.traj_per_training_iteration,
                 self.cfg.rollout,
@@ -157,7 +186,27 @@ class Batcher(HeartbeatStoppableEventLoopObject):
                 device,
                 False,
             )
-            self.training_batches.append(training_batch)
+
+        for i in range(self.max_batches_to_accumulate):
+            self.training_batches.append(alloc_training_batch())
+
+        if self.cfg.experience_replay_batches > 0:
+            if not self.cfg.async_rl:
+                log.warning("Experience replay requires --async_rl=True, disabling it")
+            else:
+                if not self.cfg.with_vtrace:
+                    log.warning("Experience replay without V-trace, consider --with_vtrace=True to correct policy lag")
+                self.replay_buffer = ExperienceReplayBuffer(
+                    self.cfg.experience_replay_batches, alloc_training_batch, self.cfg.max_policy_lag
+                )
+
+        if self.zero_copy:
+            batch_device = self.training_batches[0]["rewards"].device
+            self.zero_copy_devices = [d for d, t in self.traj_tensors.items() if t["rewards"].device == batch_device]
+
+        if telemetry_enabled(self.cfg):
+            self.telemetry_timer = Timer(self.event_loop, self.cfg.telemetry_interval)
+            self.telemetry_timer.timeout.connect(self._report_telemetry)
 
         self.initialized.emit()
 
@@ -189,6 +238,15 @@ class Batcher(HeartbeatStoppableEventLoopObject):
                 self.available_batches.pop(0)
                 assert len(self.traj_tensors_to_release[batch_idx]) == 0
 
+                if self._maybe_use_zero_copy_batch(batch_idx):
+                    self._store_for_replay(batch_idx)
+                    self.training_batches_available.emit(batch_idx)
+                    if self.cfg.async_rl and not self.available_batches:
+                        self._stop_experience_collection()
+                    continue
+
+                self.num_copied_batches += 1
+
                 # extract slices of trajectories and copy them to the training batch
                 devices = list(self.slices_for_training.keys())
                 random.shuffle(devices)  # so that no sampling device is preferred
@@ -213,6 +271,7 @@ class Batcher(HeartbeatStoppableEventLoopObject):
                         remaining = self.traj_per_training_iteration - trajectories_copied
 
                 assert trajectories_copied == self.traj_per_training_iteration and remaining == 0
+                self._store_for_replay(batch_idx)
 
                 # signal the learner that we have a new training batch
                 self.training_batches_available.emit(batch_idx)
@@ -220,24 +279,96 @@ class Batcher(HeartbeatStoppableEventLoopObject):
                 if self.cfg.async_rl:
                     self._release_traj_tensors(batch_idx)
                     if not self.available_batches:
-                        debug_log_every_n(50, "Signal inference workers to stop experience collection...")
-                        self.stop_experience_collection.emit()
+                        self._stop_experience_collection()
+
+    def _stop_experience_collection(self):
+        debug_log_every_n(50, "Signal inference workers to stop experience collection...")
+        self.stop_experience_collection.emit()
+        self.collection_stopped_since = time.time()
+        self.num_collection_stops += 1
+
+    def _maybe_use_zero_copy_batch(self, batch_idx: int) -> bool:
+        """If trajectories for the entire batch are contiguous in the buffer, the learner can use them directly."""
+        if not self.zero_copy_devices:
+            return False
+
+        if self.cfg.async_rl and any(view is not None for view in self.training_batch_views):
+            # Trajectories of zero-copy batches are not available for sampling until the learner is done.
+            # Hold at most one batch worth of trajectories so that rollout workers never run out of buffers.
+            return False
+
+        for device in self.zero_copy_devices:
+            traj_slice = self.slices_for_training[device].get_exactly(self.traj_per_training_iteration)
+            if traj_slice is not None:
+                self.training_batch_views[batch_idx] = self.traj_tensors[device][traj_slice]
+                self.traj_tensors_to_release[batch_idx].append((device, traj_slice))
+                self.num_zero_copy_batches += 1
+                return True
+
+        return False
+
+    def _store_for_replay(self, batch_idx: int):
+        """Must be called before the learner gets the batch because the learner modifies it in-place."""
+        if self.replay_buffer is None:
+            return
+
+        with self.timing.add_time("replay_store"):
+            self.replay_buffer.store(self.training_batch(batch_idx))
+        ratio = self.cfg.experience_replay_ratio
+        self.replay_credit = min(self.replay_credit + ratio, max(ratio, 1.0))
+
+    def _maybe_replay(self):
+        """Give the learner a replayed batch if it has nothing else to train on."""
+        if self.replay_buffer is None or self.replay_credit < 1.0:
+            return
+        if len(self.available_batches) < self.max_batches_to_accumulate:
+            # the learner still has new experience to process
+            return
+
+        with torch.no_grad():
+            replay_batch = self.replay_buffer.sample(int(self.policy_versions[self.policy_id].item()))
+            if replay_batch is None:
+                return
+
+            batch_idx = self.available_batches.pop(0)
+            with self.timing.add_time("replay_copy"):
+                self.training_batches[batch_idx][:] = replay_batch
+
+        self.replayed_batches[batch_idx] = True
+        self.replay_credit -= 1.0
+        self.num_replayed_batches += 1
+        self.training_batches_available.emit(batch_idx)
+
+    def is_replayed_batch(self, batch_idx: int) -> bool:
+        return self.replayed_batches[batch_idx]
+
+    def training_batch(self, batch_idx: int) -> TensorDict:
+        """Training batch for the learner, either a view into the trajectory buffer or a copy."""
+        view = self.training_batch_views[batch_idx]
+        return self.training_batches[batch_idx] if view is None else view
 
     def on_training_batch_released(self, batch_idx: int, training_iteration: int):
         with self.timing.add_time("releasing_batches"):
             self.training_iteration = training_iteration
 
-            if not self.cfg.async_rl:
-                # in synchronous RL, we release the trajectories after they're processed by the learner
+            if self.replayed_batches[batch_idx]:
+                # replayed batches are copies that don't hold any trajectories
+                self.replayed_batches[batch_idx] = False
+            elif not self.cfg.async_rl or self.training_batch_views[batch_idx] is not None:
+                # in synchronous RL (and for zero-copy batches) we release the trajectories after they're processed
+                self.training_batch_views[batch_idx] = None
                 self._release_traj_tensors(batch_idx)
 
-            if not self.available_batches and self.cfg.async_rl:
+            if self.collection_stopped_since is not None:
                 debug_log_every_n(50, "Signal inference workers to resume experience collection...")
                 self.resume_experience_collection.emit()
+                self.collection_stopped_sec += time.time() - self.collection_stopped_since
+                self.collection_stopped_since = None
 
             self.available_batches.append(batch_idx)
 
             self._maybe_enqueue_new_training_batches()
+            self._maybe_replay()
 
             # log.debug(
             #     f"{self.object_id} finished processing batch {batch_idx}, available batches: {self.available_batches}, {training_iteration=}"
@@ -272,6 +403,46 @@ class Batcher(HeartbeatStoppableEventLoopObject):
             self.traj_buffer_queues[device].put_many(batches)
         self.trajectory_buffers_available.emit(self.policy_id, self.training_iteration)
 
+    def _report_telemetry(self):
+        collection_stopped_sec = self.collection_stopped_sec
+        if self.collection_stopped_since is not None:
+            collection_stopped_sec += time.time() - self.collection_stopped_since
+
+        values = dict(
+            batcher_trajectories_waiting=sum(s.total_num for s in self.slices_for_training.values()),
+            batcher_slices_waiting=sum(len(s.slice_starts) for s in self.slices_for_training.values()),
+            batcher_available_batches=len(self.available_batches),
+            collection_stopped_sec=collection_stopped_sec,
+            num_collection_stops=self.num_collection_stops,
+            batcher_zero_copy_batches=self.num_zero_copy_batches,
+            batcher_copied_batches=self.num_copied_batches,
+        )
+        total_batches = self.num_zero_copy_batches + self.num_copied_batches
+        if total_batches > 0:
+            values["batcher_zero_copy_fraction"] = self.num_zero_copy_batches / total_batches
+        if self.replay_buffer is not None:
+            values["replayed_batches"] = self.num_replayed_batches
+            if total_batches > 0:
+                # how many times each sample was used for training on average (not counting epochs)
+                values["experience_reuse"] = (total_batches + self.num_replayed_batches) / total_batches
+        self.report_msg.emit(telemetry_msg(self.object_id, self.policy_id, values=values))
+
     def on_stop(self, *args):
+        total_batches = self.num_zero_copy_batches + self.num_copied_batches
+        if total_batches > 0:
+            log.debug(
+                "%s: %d of %d training batches (%.1f%%) used without copying",
+                self.object_id,
+                self.num_zero_copy_batches,
+                total_batches,
+                100.0 * self.num_zero_copy_batches / total_batches,
+            )
+        if self.replay_buffer is not None:
+            log.debug(
+                "%s: %d replayed batches, %d batches of new experience",
+                self.object_id,
+                self.num_replayed_batches,
+                total_batches,
+            )
         self.stop.emit(self.object_id, {self.object_id: self.timing})
         super().on_stop(*args)
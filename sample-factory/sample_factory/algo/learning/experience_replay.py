@@ -0,0 +1,42 @@
+import random
+from typing import Callable, List, Optional
+
+from sample_factory.algo.utils.tensor_dict import TensorDict
+
+
+class ExperienceReplayBuffer:
+    """
+    Copies of the last `capacity` training batches, the learner trains on them again when it would otherwise be
+    waiting for new experience. Batches are stored before the learner modifies them in-place and are copied into
+    a regular training batch for every replay.
+    Staleness is handled by the learner as usual: samples older than max_policy_lag are masked out, and V-trace
+    (if enabled) corrects for the policy lag of the remaining samples.
+    """
+
+    def __init__(self, capacity: int, alloc_batch: Callable[[], TensorDict], max_policy_lag: int):
+        self.capacity = capacity
+        self.max_policy_lag = max_policy_lag
+
+        self.batches: List[TensorDict] = [alloc_batch() for _ in range(capacity)]
+        # newest policy version in each stored batch, used to skip batches that are entirely too old
+        self.newest_versions: List[Optional[int]] = [None] * capacity
+        self.next_slot = 0
+
+    def store(self, batch: TensorDict) -> None:
+        slot = self.next_slot
+        self.batches[slot][:] = batch
+        self.newest_versions[slot] = int(batch["policy_version"].max().item())
+        self.next_slot = (slot + 1) % self.capacity
+
+    def sample(self, curr_policy_version: int) -> Optional[TensorDict]:
+        candidates = [
+            i
+            for i, version in enumerate(self.newest_versions)
+            if version is not None and curr_policy_version - version < self.max_policy_lag
+        ]
+        if not candidates:
+            return None
+        return self.batches[random.choice(candidates)]
+
+    def __len__(self) -> int:
+        return sum(version is not None for version in self.newest_versions)
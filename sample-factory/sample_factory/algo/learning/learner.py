@@ -16,7 +16,7 @@ from sample_factory.algo.learning.rnn_utils import build_core_out_from_seq, buil
 from sample_factory.algo.utils.action_distributions import get_action_distribution, is_continuous_action_space
 from sample_factory.algo.utils.env_info import EnvInfo
 from sample_factory.algo.utils.misc import LEARNER_ENV_STEPS, POLICY_ID_KEY, STATS_KEY, TRAIN_STATS, memory_stats
-from sample_factory.algo.utils.model_sharing import ParameterServer
+from sample_factory.algo.utils.model_sharing import CheckpointSlot, ParameterServer
 from sample_factory.algo.utils.optimizers import Lamb
 from sample_factory.algo.utils.rl_utils import gae_advantages, prepare_and_normalize_obs
 from sample_factory.algo.utils.shared_buffers import policy_device
@@ -27,6 +27,7 @@ from sample_factory.model.actor_critic import ActorCritic, create_actor_critic
 from sample_factory.utils.attr_dict import AttrDict
 from sample_factory.utils.decay import LinearDecay
 from sample_factory.utils.dicts import iterate_recursively
+from sample_factory.utils.streaming_stats import StreamingHistogram
 from sample_factory.utils.timing import Timing
 from sample_factory.utils.typing import ActionDistribution, Config, InitModelData, PolicyID
 from sample_factory.utils.utils import ensure_dir_exists, experiment_dir, log
@@ -130,6 +131,7 @@ class Learner(Configurable):
         policy_versions_tensor: Tensor,
         policy_id: PolicyID,
         param_server: ParameterServer,
+        checkpoint_slots: Optional[Dict[PolicyID, CheckpointSlot]] = None,
     ):
         Configurable.__init__(self, cfg)
 
@@ -157,6 +159,10 @@ class Learner(Configurable):
 
         # for multi-policy learning (i.e. with PBT) when we need to load weights of another policy
         self.policy_to_load: Optional[PolicyID] = None
+        # version of the other policy that was saved or published when we were asked to load it
+        self.policy_to_load_version: int = -1
+        # if available, weights are exchanged between learners through these instead of checkpoint files
+        self.checkpoint_slots: Optional[Dict[PolicyID, CheckpointSlot]] = checkpoint_slots
 
         # decay rate at which summaries are collected
         # save summaries every 5 seconds in the beginning, but decay to every 4 minutes in the limit, because we
@@ -173,6 +179,10 @@ class Learner(Configurable):
         self.exploration_loss_func: Optional[Callable] = None
         self.kl_loss_func: Optional[Callable] = None
 
+        # telemetry: distribution of the policy lag of incoming experience (before training on it),
+        # counted on the training device and only copied to the host when telemetry is reported
+        self.policy_lag_counts: Optional[Tensor] = None
+
         self.is_initialized = False
 
     def init(self) -> InitModelData:
@@ -383,11 +393,20 @@ class Learner(Configurable):
 
         return False
 
+    def publish(self) -> bool:
+        """Copy the current state into the shared checkpoint slot of this policy. False if there's no slot."""
+        if not self.is_initialized or self.checkpoint_slots is None:
+            return False
+
+        with self.timing.add_time("publish"):
+            return self.checkpoint_slots[self.policy_id].publish(self._get_checkpoint_dict(), self.train_step)
+
     def set_new_cfg(self, new_cfg: Dict) -> None:
         self.new_cfg = new_cfg
 
-    def set_policy_to_load(self, policy_to_load: PolicyID) -> None:
+    def set_policy_to_load(self, policy_to_load: PolicyID, policy_version: int = -1) -> None:
         self.policy_to_load = policy_to_load
+        self.policy_to_load_version = policy_version
 
     def _maybe_update_cfg(self) -> None:
         if self.new_cfg is not None:
@@ -412,9 +431,19 @@ class Learner(Configurable):
 
     def _maybe_load_policy(self) -> None:
         if self.policy_to_load is not None:
+            checkpoint_dict = None
+            if self.checkpoint_slots is not None:
+                # the slot can hold an older version if the other policy was saved to a file since it last published
+                slot = self.checkpoint_slots[self.policy_to_load]
+                checkpoint_dict = slot.read(self.device, min_version=self.policy_to_load_version)
+
             with self.param_server.policy_lock:
                 # don't re-load progress if we are loading from another policy checkpoint
-                self.load_from_checkpoint(self.policy_to_load, load_progress=False)
+                if checkpoint_dict is None:
+                    self.load_from_checkpoint(self.policy_to_load, load_progress=False)
+                else:
+                    log.debug(f"Learner {self.policy_id} copying weights of policy {self.policy_to_load} from memory")
+                    self._load_state(checkpoint_dict, load_progress=False)
 
             # make sure everything (such as policy weights) is committed to shared device memory
             synchronize(self.cfg, self.device)
@@ -937,6 +966,25 @@ class Learner(Configurable):
 
         return normalized_obs
 
+    def _record_policy_lag(self, policy_lag: Tensor, valids: Tensor) -> None:
+        # policy lag is a small integer, so counting every value is a cheap way to get the exact distribution.
+        # Invalid samples are counted with a weight of 0 rather than masked out to avoid a host-device sync
+        lag = policy_lag.long().clamp_(0, self.cfg.max_policy_lag).view(-1)
+        if self.policy_lag_counts is None:
+            self.policy_lag_counts = torch.zeros(self.cfg.max_policy_lag + 1, dtype=torch.long, device=lag.device)
+        self.policy_lag_counts.index_add_(0, lag, valids.reshape(-1).long())
+
+    def pop_telemetry(self) -> Tuple[StreamingHistogram, int]:
+        policy_lag_hist, num_samples_too_old = StreamingHistogram(), 0
+        if self.policy_lag_counts is not None:
+            # on CPU this is a view of the counts, so only reset them once they're read
+            lag_counts = self.policy_lag_counts.cpu().numpy()
+            for lag in np.flatnonzero(lag_counts):
+                policy_lag_hist.add(lag, int(lag_counts[lag]))
+            num_samples_too_old = int(lag_counts[self.cfg.max_policy_lag])
+            self.policy_lag_counts.zero_()
+        return policy_lag_hist, num_samples_too_old
+
     def _prepare_batch(self, batch: TensorDict) -> Tuple[TensorDict, int, int]:
         with torch.no_grad():
             # create a shallow copy so we can modify the dictionary
@@ -948,6 +996,9 @@ class Learner(Configurable):
             # ignore experience that was older than the threshold even before training started
             curr_policy_version: int = self.train_step
             buff["valids"][:, :-1] = valids & (curr_policy_version - buff["policy_version"] < self.cfg.max_policy_lag)
+
+            if self.cfg.telemetry_interval > 0:
+                self._record_policy_lag(curr_policy_version - buff["policy_version"], valids)
             # for last T+1 step, we want to use the validity of the previous step
             buff["valids"][:, -1] = buff["valids"][:, -2]
 
@@ -1030,7 +1081,8 @@ class Learner(Configurable):
 
             return buff, dataset_size, num_invalids
 
-    def train(self, batch: TensorDict) -> Optional[Dict]:
+    def train(self, batch: TensorDict, count_env_steps: bool = True) -> Optional[Dict]:
+        """count_env_steps=False for replayed batches, so that env step counters reflect only new experience."""
         with self.timing.add_time("misc"):
             self._maybe_update_cfg()
             self._maybe_load_policy()
@@ -1050,9 +1102,9 @@ class Learner(Configurable):
 
             # multiply the number of samples by frameskip so that FPS metrics reflect the number
             # of environment steps actually simulated
-            if self.cfg.summaries_use_frameskip:
+            if count_env_steps and self.cfg.summaries_use_frameskip:
                 self.env_steps += experience_size * self.env_info.frameskip
-            else:
+            elif count_env_steps:
                 self.env_steps += experience_size
 
             stats = {LEARNER_ENV_STEPS: self.env_steps, POLICY_ID_KEY: self.policy_id}
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import os
+import time
 from threading import Thread
 from typing import Dict, Optional
 
@@ -17,9 +18,11 @@ from sample_factory.algo.utils.heartbeat import HeartbeatStoppableEventLoopObjec
 from sample_factory.algo.utils.misc import LEARNER_ENV_STEPS, POLICY_ID_KEY
 from sample_factory.algo.utils.model_sharing import ParameterServer
 from sample_factory.algo.utils.shared_buffers import BufferMgr
+from sample_factory.algo.utils.telemetry import telemetry_enabled, telemetry_msg
 from sample_factory.algo.utils.torch_utils import init_torch_runtime
 from sample_factory.cfg.configurable import Configurable
 from sample_factory.utils.gpu_utils import cuda_envvars_for_policy
+from sample_factory.utils.tracing import init_event_tracer
 from sample_factory.utils.typing import Config, PolicyID
 from sample_factory.utils.utils import init_file_logger, log
 
@@ -35,6 +38,7 @@ def init_learner_process(sf_context: SampleFactoryContext, learner_worker: Learn
 
     cfg = learner_worker.cfg
     init_file_logger(cfg)
+    init_event_tracer(cfg, learner_worker.object_id)
 
     try:
         psutil.Process().nice(cfg.default_niceness)
@@ -67,14 +71,23 @@ class LearnerWorker(HeartbeatStoppableEventLoopObject, Configurable):
 
         policy_versions_tensor: Tensor = buffer_mgr.policy_versions
         self.param_server = ParameterServer(policy_id, policy_versions_tensor, cfg.serial_mode)
-        self.learner: Learner = Learner(cfg, env_info, policy_versions_tensor, policy_id, self.param_server)
+        self.learner: Learner = Learner(
+            cfg, env_info, policy_versions_tensor, policy_id, self.param_server, buffer_mgr.checkpoint_slots
+        )
 
         # total number of full training iterations (potentially multiple minibatches/epochs per iteration)
         self.training_iteration_since_resume: int = 0
 
+        # time spent training, reported as learner utilization
+        self.training_sec: float = 0.0
+
         self.cache_cleanup_timer = Timer(self.event_loop, 30)
         self.cache_cleanup_timer.timeout.connect(self._cleanup_cache)
 
+        if telemetry_enabled(cfg):
+            self.telemetry_timer = Timer(self.event_loop, cfg.telemetry_interval)
+            self.telemetry_timer.timeout.connect(self._report_telemetry)
+
     @signal
     def initialized(self):
         ...
@@ -105,21 +118,31 @@ class LearnerWorker(HeartbeatStoppableEventLoopObject, Configurable):
 
     def save(self) -> bool:
         if self.learner.save():
-            self.saved_model.emit(self.learner.policy_id)
+            self.saved_model.emit(self.learner.policy_id, self.learner.train_step)
             return True
         return False
 
+    def publish(self) -> None:
+        """
+        Make the latest weights of this policy available to other learners.
+        Goes through shared memory if possible, otherwise through a regular checkpoint file.
+        """
+        if self.learner.publish():
+            self.saved_model.emit(self.learner.policy_id, self.learner.train_step)
+        else:
+            self.save()
+
     def save_best(self, policy_id: PolicyID, metric: str, metric_value: float) -> bool:
         if self.learner.save_best(policy_id, metric, metric_value):
-            self.saved_model.emit(self.learner.policy_id)
+            self.saved_model.emit(self.learner.policy_id, self.learner.train_step)
             return True
         return False
 
     def save_milestone(self) -> None:
         self.learner.save_milestone()
 
-    def load(self, policy_to_load: PolicyID) -> None:
-        self.learner.set_policy_to_load(policy_to_load)
+    def load(self, policy_to_load: PolicyID, policy_version: int) -> None:
+        self.learner.set_policy_to_load(policy_to_load, policy_version)
 
     def on_update_cfg(self, new_cfg: Dict) -> None:
         self.learner.set_new_cfg(new_cfg)
@@ -147,7 +170,10 @@ class LearnerWorker(HeartbeatStoppableEventLoopObject, Configurable):
         log.debug(f"{self.object_id} finished initialization!")
 
     def on_new_training_batch(self, batch_idx: int):
-        stats = self.learner.train(self.batcher.training_batches[batch_idx])
+        start = time.time()
+        replayed = self.batcher.is_replayed_batch(batch_idx)
+        stats = self.learner.train(self.batcher.training_batch(batch_idx), count_env_steps=not replayed)
+        self.training_sec += time.time() - start
 
         self.training_iteration_since_resume += 1
         self.training_batch_released.emit(batch_idx, self.training_iteration_since_resume)
@@ -155,6 +181,17 @@ class LearnerWorker(HeartbeatStoppableEventLoopObject, Configurable):
         if stats is not None:
             self.report_msg.emit(stats)
 
+    def _report_telemetry(self):
+        policy_lag, num_samples_too_old = self.learner.pop_telemetry()
+        values = dict(
+            samples_too_old=num_samples_too_old,
+            training_iterations=self.training_iteration_since_resume,
+            learner_busy_sec=self.training_sec,
+        )
+        self.report_msg.emit(
+            telemetry_msg(self.object_id, self.learner.policy_id, dict(policy_lag=policy_lag), values)
+        )
+
     # noinspection PyMethodMayBeStatic
     def _cleanup_cache(self):
         torch.cuda.empty_cache()
@@ -2,10 +2,13 @@ from __future__ import annotations
 
 import json
 import math
+import os
 import shutil
+import signal as os_signal
 import time
 from collections import OrderedDict, deque
 from os.path import isdir, join
+from threading import Thread
 from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
 
 import numpy as np
@@ -14,26 +17,45 @@ from tensorboardX import SummaryWriter
 
 from sample_factory.algo.learning.batcher import Batcher
 from sample_factory.algo.learning.learner_worker import LearnerWorker
+from sample_factory.algo.sampling.remote_rollout import RemoteRolloutServer
 from sample_factory.algo.sampling.sampler import AbstractSampler
 from sample_factory.algo.sampling.stats import samples_stats_handler, stats_msg_handler, timing_msg_handler
 from sample_factory.algo.utils.env_info import EnvInfo, obtain_env_info_in_a_separate_process
 from sample_factory.algo.utils.heartbeat import HeartbeatStoppableEventLoopObject
 from sample_factory.algo.utils.misc import (
     EPISODIC,
+    EPISODIC_SUMMARY,
     LEARNER_ENV_STEPS,
     SAMPLES_COLLECTED,
     STATS_KEY,
+    TELEMETRY,
     TIMING_STATS,
     TRAIN_STATS,
     ExperimentStatus,
 )
+from sample_factory.algo.utils.multiprocessing_utils import init_mp_ctx
 from sample_factory.algo.utils.shared_buffers import BufferMgr
+from sample_factory.algo.utils.telemetry import TelemetryAggregator, telemetry_enabled
 from sample_factory.cfg.arguments import cfg_dict, cfg_str, preprocess_cfg
 from sample_factory.cfg.configurable import Configurable
+from sample_factory.envs.env_wrappers import EPISODE_BOOKKEEPING_KEYS
 from sample_factory.utils.attr_dict import AttrDict
 from sample_factory.utils.dicts import iterate_recursively
 from sample_factory.utils.gpu_utils import set_global_cuda_envvars
+from sample_factory.utils.streaming_stats import (
+    EpisodicStatsSketches,
+    SketchWindow,
+    StreamingHistogram,
+    parse_percentiles,
+)
 from sample_factory.utils.timing import Timing
+from sample_factory.utils.tracing import (
+    dump_event_tracer,
+    init_event_tracer,
+    merge_traces,
+    remove_trace_parts,
+    trace_dir,
+)
 from sample_factory.utils.typing import PolicyID, StatusCode
 from sample_factory.utils.utils import (
     cfg_file,
@@ -98,6 +120,7 @@ class Runner(EventLoopObject, Configurable):
         self.learners: Dict[PolicyID, LearnerWorker] = dict()
         self.batchers: Dict[PolicyID, Batcher] = dict()
         self.sampler: Optional[AbstractSampler] = None
+        self.remote_rollout_server: Optional[RemoteRolloutServer] = None
 
         self.timing = Timing("Runner profile")
 
@@ -109,6 +132,8 @@ class Runner(EventLoopObject, Configurable):
 
         self.total_env_steps_since_resume: Optional[int] = None
         self.start_time: float = time.time()
+        # startup latency, seconds from the creation of the runner to the first collected sample
+        self.time_to_first_sample: Optional[float] = None
 
         # currently, this applies only to the current run, not experiment as a whole
         # to change this behavior we'd need to save the state of the main loop to a filesystem
@@ -129,6 +154,13 @@ class Runner(EventLoopObject, Configurable):
         self.avg_stats = dict()
 
         self.policy_avg_stats: Dict[str, List[Deque]] = dict()
+
+        # streaming histograms of episodic stats for percentile and distribution summaries
+        # (filled by the rollout workers with --episodic_stats_sketches, otherwise from individual episodes)
+        self.stats_percentiles: List[float] = parse_percentiles(self.cfg.stats_percentiles)
+        self.pending_stats_sketches = EpisodicStatsSketches(self.cfg.num_policies)
+        self.policy_stats_sketches: Dict[str, List[SketchWindow]] = dict()
+
         self.policy_lag = [dict() for _ in range(self.cfg.num_policies)]
 
         self._handle_restart()
@@ -151,10 +183,16 @@ class Runner(EventLoopObject, Configurable):
         self.policy_msg_handlers: Dict[str, List[PolicyMsgHandler]] = {
             LEARNER_ENV_STEPS: [self._learner_steps_handler],
             EPISODIC: [self._episodic_stats_handler],
+            EPISODIC_SUMMARY: [self._episodic_summary_handler],
             TRAIN_STATS: [self._train_stats_handler],
-            SAMPLES_COLLECTED: [samples_stats_handler],
+            SAMPLES_COLLECTED: [samples_stats_handler, self._first_sample_handler],
         }
 
+        self.telemetry: Optional[TelemetryAggregator] = None
+        if telemetry_enabled(self.cfg):
+            self.telemetry = TelemetryAggregator(self.cfg)
+            self.policy_msg_handlers[TELEMETRY] = [self._telemetry_handler]
+
         self.observers: List[AlgoObserver] = []
 
         self.timers: List[Timer] = []
@@ -177,6 +215,16 @@ class Runner(EventLoopObject, Configurable):
 
         periodic(self.heartbeat_report_sec, self._check_heartbeat)
 
+        if self.telemetry is not None:
+            periodic(self.cfg.telemetry_interval, self._report_telemetry)
+
+        # when tracing is enabled, SIGUSR1 makes all processes dump their events, and we merge them shortly after
+        self.trace_export_requested_at: Optional[float] = None
+        self.trace_export_delay_sec = 2.0
+        self.trace_export_thread: Optional[Thread] = None
+        if self.cfg.trace_events:
+            periodic(1.0, self._maybe_export_trace)
+
         self.heartbeat_dict = {}
         self.queue_size_dict = {}
 
@@ -253,6 +301,15 @@ class Runner(EventLoopObject, Configurable):
                     for handler in self.policy_msg_handlers.get(key, ()):
                         handler(self, msg, policy_id)
 
+    @staticmethod
+    def _first_sample_handler(runner: Runner, msg: Dict, policy_id: PolicyID) -> None:
+        if runner.time_to_first_sample is None:
+            runner.time_to_first_sample = time.time() - runner.start_time
+            log.info(
+                f"Time to first sample: {runner.time_to_first_sample:.1f} sec "
+                f"({runner.cfg.num_workers} workers, {runner.cfg.worker_start_method} start method)"
+            )
+
     @staticmethod
     def _learner_steps_handler(runner: Runner, msg: Dict, policy_id: PolicyID) -> None:
         env_steps: int = msg[LEARNER_ENV_STEPS]
@@ -268,6 +325,9 @@ class Runner(EventLoopObject, Configurable):
     def _episodic_stats_handler(runner: Runner, msg: Dict, policy_id: PolicyID) -> None:
         s = msg[EPISODIC]
         for _, key, value in iterate_recursively(s):
+            if key in EPISODE_BOOKKEEPING_KEYS:
+                continue
+
             if key not in runner.policy_avg_stats:
                 runner.policy_avg_stats[key] = [
                     deque(maxlen=runner.cfg.stats_avg) for _ in range(runner.cfg.num_policies)
@@ -282,6 +342,33 @@ class Runner(EventLoopObject, Configurable):
             else:
                 runner.policy_avg_stats[key][policy_id].append(value)
 
+        runner.pending_stats_sketches.add_episode_stats(policy_id, s)
+
+    @staticmethod
+    def _episodic_summary_handler(runner: Runner, msg: Dict, policy_id: PolicyID) -> None:
+        """Summaries of many episodes sent by rollout workers with --episodic_stats_sketches."""
+        for key, sketch in msg[EPISODIC_SUMMARY].items():
+            runner._add_stats_sketch(key, policy_id, sketch)
+
+            # individual episodes are not available, but the averages (used by PBT, save_best and console reports)
+            # remain correct if every episode in the summary contributes the summary mean
+            if key not in runner.policy_avg_stats:
+                runner.policy_avg_stats[key] = [
+                    deque(maxlen=runner.cfg.stats_avg) for _ in range(runner.cfg.num_policies)
+                ]
+            avg_stats = runner.policy_avg_stats[key][policy_id]
+            avg_stats.extend([sketch.mean] * min(sketch.count, avg_stats.maxlen))
+
+    def _add_stats_sketch(self, key: str, policy_id: PolicyID, sketch: StreamingHistogram) -> None:
+        if key not in self.policy_stats_sketches:
+            self.policy_stats_sketches[key] = [SketchWindow(self.cfg.stats_avg) for _ in range(self.cfg.num_policies)]
+        self.policy_stats_sketches[key][policy_id].add(sketch)
+
+    def _flush_pending_stats_sketches(self) -> None:
+        for policy_id in range(self.cfg.num_policies):
+            for key, sketch in self.pending_stats_sketches.pop(policy_id).items():
+                self._add_stats_sketch(key, policy_id, sketch)
+
     @staticmethod
     def _train_stats_handler(runner: Runner, msg: Dict, policy_id: PolicyID) -> None:
         """We write the train summaries to disk right away instead of accumulating them."""
@@ -293,6 +380,16 @@ class Runner(EventLoopObject, Configurable):
             if key in train_stats:
                 runner.policy_lag[policy_id][key] = train_stats[key]
 
+    @staticmethod
+    def _telemetry_handler(runner: Runner, msg: Dict, policy_id: PolicyID) -> None:
+        runner.telemetry.on_telemetry_msg(msg, policy_id)
+
+    def _report_telemetry(self):
+        self.telemetry.save_snapshot(self.env_steps, dict(self.queue_size_dict))
+        for policy_id, env_steps in self.env_steps.items():
+            self.telemetry.write_summaries(self.writers[policy_id], policy_id, env_steps)
+        self.telemetry.reset_histograms()
+
     def _get_perf_stats(self):
         # total env steps simulated across all policies
         fps_stats = []
@@ -370,8 +467,28 @@ class Runner(EventLoopObject, Configurable):
         total_env_steps = sum(self.env_steps.values())
         self.print_stats(fps_stats, sample_throughput, total_env_steps)
 
+    def _report_stats_distributions(self, policy_id: PolicyID, writer: SummaryWriter, env_steps: int) -> None:
+        for key, windows in self.policy_stats_sketches.items():
+            sketch = windows[policy_id].merged()
+            if sketch is None:
+                continue
+
+            if "/" in key:
+                tag = key
+            elif key in ("reward", "len"):
+                tag = f"{key}/{key}"
+            else:
+                tag = f"policy_stats/{key}"
+
+            for q, value in zip(self.stats_percentiles, sketch.quantiles([p / 100 for p in self.stats_percentiles])):
+                writer.add_scalar(f"{tag}_p{q:g}", value, env_steps)
+
+            if self.cfg.stats_histograms and key in ("reward", "true_objective", "len"):
+                writer.add_histogram_raw(f"{tag}_hist", global_step=env_steps, **sketch.tensorboard_histogram())
+
     def _report_experiment_summaries(self):
         memory_mb = memory_consumption_mb()
+        self._flush_pending_stats_sketches()
 
         fps_stats, sample_throughput = self._get_perf_stats()
         fps = fps_stats[0]
@@ -419,8 +536,16 @@ class Runner(EventLoopObject, Configurable):
 
                     # for key stats report min/max as well
                     if key in ("reward", "true_objective", "len"):
-                        writer.add_scalar(min_tag, float(min(stat[policy_id])), env_steps)
-                        writer.add_scalar(max_tag, float(max(stat[policy_id])), env_steps)
+                        min_value, max_value = min(stat[policy_id]), max(stat[policy_id])
+                        if self.cfg.episodic_stats_sketches and key in self.policy_stats_sketches:
+                            # the deque only contains summary means, sketches keep the exact extremes
+                            sketch = self.policy_stats_sketches[key][policy_id].merged()
+                            if sketch is not None:
+                                min_value, max_value = sketch.min, sketch.max
+                        writer.add_scalar(min_tag, float(min_value), env_steps)
+                        writer.add_scalar(max_tag, float(max_value), env_steps)
+
+            self._report_stats_distributions(policy_id, writer, env_steps)
 
             self._observers_call(AlgoObserver.extra_summaries, self, policy_id, writer, env_steps)
 
@@ -479,6 +604,33 @@ class Runner(EventLoopObject, Configurable):
                     avg_metric = np.mean(stats)
                     self.save_best.emit(policy_id, metric, avg_metric)
 
+    def _traced_process_pids(self) -> List[int]:
+        """Pids of other processes with event tracing enabled. Override in subclasses that start processes."""
+        return []
+
+    def _on_trace_signal(self) -> None:
+        """Called from the SIGUSR1 handler after the runner's own trace events are dumped."""
+        for pid in self._traced_process_pids():
+            try:
+                os.kill(pid, os_signal.SIGUSR1)
+            except OSError:
+                pass
+
+        self.trace_export_requested_at = time.time()
+
+    def _maybe_export_trace(self):
+        if self.trace_export_requested_at is None:
+            return
+
+        if self.trace_export_thread is not None and self.trace_export_thread.is_alive():
+            return
+
+        if time.time() - self.trace_export_requested_at >= self.trace_export_delay_sec:
+            self.trace_export_requested_at = None
+            # merging can take a while for big traces, don't stall the event loop
+            self.trace_export_thread = Thread(target=merge_traces, args=(trace_dir(self.cfg),), daemon=True)
+            self.trace_export_thread.start()
+
     @staticmethod
     def _register_msg_handler(handlers_dict, key, func):
         handlers_dict[key] = func
@@ -523,8 +675,13 @@ class Runner(EventLoopObject, Configurable):
         param_servers = {policy: self.learners[policy].param_server for policy in self.learners}
         return sampler_cls(event_loop, self.buffer_mgr, param_servers, self.cfg, self.env_info)
 
+    def _make_remote_rollout_server(self) -> RemoteRolloutServer:
+        param_servers = {policy: self.learners[policy].param_server for policy in self.learners}
+        return RemoteRolloutServer(self.event_loop, self.buffer_mgr, param_servers, self.cfg, self.env_info)
+
     def init(self) -> StatusCode:
         set_global_cuda_envvars(self.cfg)
+        init_mp_ctx(self.cfg)
         self.env_info = obtain_env_info_in_a_separate_process(self.cfg)
 
         for policy_id in range(self.cfg.num_policies):
@@ -538,6 +695,10 @@ class Runner(EventLoopObject, Configurable):
 
         init_file_logger(self.cfg)
         self._save_cfg()
+
+        if self.cfg.trace_events:
+            remove_trace_parts(ensure_dir_exists(trace_dir(self.cfg)))
+            init_event_tracer(self.cfg, self.object_id, on_signal=self._on_trace_signal)
         save_git_diff(experiment_dir(self.cfg))
 
         self.buffer_mgr = BufferMgr(self.cfg, self.env_info)
@@ -656,6 +817,7 @@ class Runner(EventLoopObject, Configurable):
             # auxiliary connections, such as summary reporting and checkpointing
             learner_worker.finished_training_iteration.connect(self._after_training_iteration)
             learner_worker.report_msg.connect(self._process_msg)
+            batcher.report_msg.connect(self._process_msg)
             sampler.connect_report_msg(self._process_msg)
             sampler.connect_update_training_info(self.update_training_info)
             self.save_periodic.connect(learner_worker.save)
@@ -670,6 +832,9 @@ class Runner(EventLoopObject, Configurable):
             self._setup_component_heartbeat(batcher)
             self._setup_component_heartbeat(learner_worker)
 
+        if self.cfg.remote_rollout_port > 0:
+            self._connect_remote_rollout_server()
+
         for sampler_component in sampler.stoppable_components():
             self._setup_component_termination(self.stop, sampler_component)
 
@@ -682,12 +847,26 @@ class Runner(EventLoopObject, Configurable):
         # connect additional signal-slot pairs in the observers if needed
         self._observers_call(AlgoObserver.on_connect_components, self)
 
+    def _connect_remote_rollout_server(self):
+        """Remote rollout workers feed the Batcher just like the local sampler (single policy only)."""
+        self.remote_rollout_server = server = self._make_remote_rollout_server()
+        learner_worker, batcher = self.learners[server.policy_id], self.batchers[server.policy_id]
+
+        self.event_loop.start.connect(server.init)
+        learner_worker.model_initialized.connect(server.on_model_initialized)
+        server.new_trajectories.connect(batcher.on_new_trajectories)
+        batcher.stop_experience_collection.connect(server.on_stop_experience_collection)
+        batcher.resume_experience_collection.connect(server.on_resume_experience_collection)
+        server.report_msg.connect(self._process_msg)
+        self.stop.connect(server.on_stop)
+
     def _should_end_training(self):
         end = len(self.env_steps) > 0 and all(s > self.cfg.train_for_env_steps for s in self.env_steps.values())
         end |= self.total_train_seconds > self.cfg.train_for_seconds
         return end
 
     def _after_training_iteration(self, training_iteration_since_resume: int):
+        self.total_train_seconds = time.time() - self.start_time
         self._observers_call(AlgoObserver.on_training_step, self, training_iteration_since_resume)
 
         if self._should_end_training():
@@ -763,6 +942,14 @@ class Runner(EventLoopObject, Configurable):
                 self.status = ExperimentStatus.FAILURE
 
         log.info(self.timing)
+
+        if self.cfg.trace_events:
+            # by now all other processes have exited and dumped their events
+            if self.trace_export_thread is not None:
+                self.trace_export_thread.join()
+            dump_event_tracer(self.cfg)
+            merge_traces(trace_dir(self.cfg))
+
         if self.total_env_steps_since_resume is None:
             self.total_env_steps_since_resume = 0
         fps = self.total_env_steps_since_resume / self.timing.main_loop
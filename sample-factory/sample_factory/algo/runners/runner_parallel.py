@@ -45,6 +45,10 @@ class ParallelRunner(Runner):
         self.connect_components()
         return status
 
+    def _traced_process_pids(self) -> List[int]:
+        processes = self.processes + self.sampler.processes
+        return [p.pid for p in processes if p.pid is not None]
+
     def _on_start(self):
         self._start_processes()
         super()._on_start()
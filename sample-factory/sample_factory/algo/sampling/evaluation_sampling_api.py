@@ -3,7 +3,7 @@ from __future__ import annotations
 import math
 import time
 from collections import OrderedDict
-from threading import Thread
+from threading import Condition, Thread
 from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
 import numpy as np
@@ -17,11 +17,13 @@ from sample_factory.algo.sampling.stats import samples_stats_handler, stats_msg_
 from sample_factory.algo.utils.env_info import EnvInfo
 from sample_factory.algo.utils.misc import EPISODIC, SAMPLES_COLLECTED, STATS_KEY, TIMING_STATS, ExperimentStatus
 from sample_factory.algo.utils.model_sharing import ParameterServer
+from sample_factory.algo.utils.multiprocessing_utils import init_mp_ctx
 from sample_factory.algo.utils.rl_utils import samples_per_trajectory
 from sample_factory.algo.utils.shared_buffers import BufferMgr
 from sample_factory.algo.utils.tensor_dict import TensorDict
 from sample_factory.cfg.arguments import cfg_dict
 from sample_factory.cfg.configurable import Configurable
+from sample_factory.envs.env_wrappers import ENV_UID_KEY, EPISODE_BOOKKEEPING_KEYS, EPISODE_START_TIME_KEY
 from sample_factory.utils.dicts import iterate_recursively
 from sample_factory.utils.gpu_utils import set_global_cuda_envvars
 from sample_factory.utils.typing import Config, InitModelData, PolicyID, StatusCode
@@ -31,6 +33,8 @@ from sample_factory.utils.utils import log
 class SamplingLoop(EventLoopObject, Configurable):
     def __init__(self, cfg: Config, env_info: EnvInfo, print_episode_info: bool = True):
         Configurable.__init__(self, cfg_dict(cfg))
+        # episodes are filtered by episode number below, so rollout workers have to report them one by one
+        self.cfg.episodic_stats_sketches = False
 
         unique_name = SamplingLoop.__name__
         self.event_loop: EventLoop = EventLoop(unique_loop_name=f"{unique_name}_EvtLoop", serial_mode=cfg.serial_mode)
@@ -45,6 +49,11 @@ class SamplingLoop(EventLoopObject, Configurable):
         sample_env_episodes = self.cfg.get("sample_env_episodes", math.inf)
         self.max_episode_number = sample_env_episodes / total_envs
 
+        # when the policy weights are replaced, episodes that started before this moment are ignored
+        self.min_episode_start_time = 0.0
+        # number of the first accepted episode of every env, envs keep running between evaluations
+        self.first_episode_number: Dict[int, int] = dict()
+
         self.env_info = env_info
         self.iteration: int = 0
 
@@ -64,6 +73,10 @@ class SamplingLoop(EventLoopObject, Configurable):
         self.avg_stats = dict()
 
         self.policy_avg_stats: Dict[str, List[List]] = dict()
+        self.num_episodes = [0 for _ in range(self.cfg.num_policies)]
+
+        # notified every time an episode is accepted, so the client can wait for episodes without polling
+        self.episodes_cond = Condition()
 
         # global msg handlers for messages from algo components
         self.msg_handlers: Dict[str, List[MsgHandler]] = {
@@ -144,20 +157,39 @@ class SamplingLoop(EventLoopObject, Configurable):
                     for handler in self.policy_msg_handlers.get(key, ()):
                         handler(self, msg, policy_id)
 
+    def _accept_episode(self, extra_stats: Dict) -> bool:
+        episode_number = extra_stats.get("episode_number", 0)
+
+        env_uid = extra_stats.get(ENV_UID_KEY)
+        if env_uid is None:
+            # skip invalid stats, potentially be not setting episode_number one could always add stats
+            return episode_number < self.max_episode_number
+
+        if extra_stats.get(EPISODE_START_TIME_KEY, math.inf) < self.min_episode_start_time:
+            # this episode was (at least partially) played by the previous policy
+            return False
+
+        first_episode_number = self.first_episode_number.setdefault(env_uid, episode_number)
+        return episode_number - first_episode_number < self.max_episode_number
+
     @staticmethod
     def _episodic_stats_handler(stats_observer: SamplingLoop, msg: Dict, policy_id: PolicyID) -> None:
         # heavily based on the `_episodic_stats_handler` from `Runner`
         s = msg[EPISODIC]
 
-        # skip invalid stats, potentially be not setting episode_number one could always add stats
-        episode_number = s["episode_extra_stats"].get("episode_number", 0)
-        if episode_number < stats_observer.max_episode_number:
+        with stats_observer.episodes_cond:
+            if not stats_observer._accept_episode(s["episode_extra_stats"]):
+                return
+
             if stats_observer.print_episode_info:
                 log.debug(
                     f"Episode ended after {s['len']:.1f} steps. Return: {s['reward']:.1f}. True objective {s['true_objective']:.1f}"
                 )
 
             for _, key, value in iterate_recursively(s):
+                if key in EPISODE_BOOKKEEPING_KEYS:
+                    continue
+
                 if key not in stats_observer.policy_avg_stats:
                     stats_observer.policy_avg_stats[key] = [[] for _ in range(stats_observer.cfg.num_policies)]
 
@@ -166,6 +198,17 @@ class SamplingLoop(EventLoopObject, Configurable):
                 else:
                     stats_observer.policy_avg_stats[key][policy_id].append(value)
 
+            stats_observer.num_episodes[policy_id] += 1
+            stats_observer.episodes_cond.notify_all()
+
+    def reset_episodes(self, min_episode_start_time: float) -> None:
+        """Forget all collected episodes, i.e. to evaluate another checkpoint without restarting the envs."""
+        with self.episodes_cond:
+            self.min_episode_start_time = min_episode_start_time
+            self.first_episode_number = dict()
+            self.policy_avg_stats = dict()
+            self.num_episodes = [0 for _ in range(self.cfg.num_policies)]
+
     def wait_until_ready(self):
         while not self.ready:
             log.debug(f"{self.object_id}: waiting for sampler to be ready...")
@@ -234,6 +277,9 @@ class SamplingLoop(EventLoopObject, Configurable):
         self.stopped = True
 
 
+CHECKPOINT_SWITCH_GRACE_SEC = 0.5
+
+
 class EvalSamplingAPI:
     def __init__(
         self,
@@ -257,6 +303,7 @@ class EvalSamplingAPI:
 
     def init(self):
         set_global_cuda_envvars(self.cfg)
+        init_mp_ctx(self.cfg)
 
         self.buffer_mgr = BufferMgr(self.cfg, self.env_info)
         self.policy_versions_tensor: Tensor = self.buffer_mgr.policy_versions
@@ -284,6 +331,40 @@ class EvalSamplingAPI:
 
         self.sampling_loop.wait_until_ready()
 
+    def wait_for_episodes(self, policy_id: PolicyID, num_episodes: int, timeout: Optional[float] = None) -> int:
+        """
+        Blocks until at least num_episodes episodes of the policy are collected, or until the timeout expires.
+        Returns the number of collected episodes.
+        """
+        loop = self.sampling_loop
+        with loop.episodes_cond:
+            loop.episodes_cond.wait_for(lambda: loop.num_episodes[policy_id] >= num_episodes, timeout)
+            return loop.num_episodes[policy_id]
+
+    def load_checkpoint(self, policy_id: PolicyID, checkpoint_path: str) -> Dict:
+        """
+        Replaces the weights of the policy with weights from the checkpoint while the envs keep running.
+        Episodes collected so far are discarded, as well as episodes that are still in progress.
+        Returns the checkpoint dict.
+        """
+        learner = self.learners[policy_id]
+        checkpoint_dict = Learner.load_checkpoint([checkpoint_path], learner.device)
+        if checkpoint_dict is None:
+            raise RuntimeError(f"Could not load checkpoint {checkpoint_path}")
+
+        param_server = self.param_servers[policy_id]
+        with param_server.policy_lock:
+            # in-place update, in async mode inference workers copy the weights from these (shared) tensors
+            learner.actor_critic.load_state_dict(checkpoint_dict["model"])
+
+        # make inference workers pick up the new weights
+        param_server.update_weights(self.policy_versions_tensor[policy_id].item() + 1)
+
+        # inference workers only check for new weights between batches, give them some time to switch
+        self.sampling_loop.reset_episodes(time.time() + CHECKPOINT_SWITCH_GRACE_SEC)
+        log.info(f"Loaded {checkpoint_path} for policy {policy_id} (env_steps={checkpoint_dict.get('env_steps')})")
+        return checkpoint_dict
+
     @property
     def eval_stats(self):
         # it's possible that we would like to return additional stats, like fps or sth
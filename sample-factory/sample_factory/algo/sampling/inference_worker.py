@@ -26,13 +26,16 @@ from sample_factory.algo.utils.misc import (
 from sample_factory.algo.utils.model_sharing import ParameterServer, make_parameter_client
 from sample_factory.algo.utils.rl_utils import prepare_and_normalize_obs
 from sample_factory.algo.utils.shared_buffers import policy_device
+from sample_factory.algo.utils.telemetry import telemetry_enabled, telemetry_msg
 from sample_factory.algo.utils.tensor_dict import TensorDict, to_numpy
 from sample_factory.algo.utils.tensor_utils import cat_tensors, dict_of_lists_cat, ensure_torch_tensor
 from sample_factory.algo.utils.torch_utils import inference_context, init_torch_runtime, synchronize
 from sample_factory.cfg.configurable import Configurable
 from sample_factory.utils.dicts import dict_of_lists_append_idx
 from sample_factory.utils.gpu_utils import cuda_envvars_for_policy
+from sample_factory.utils.streaming_stats import StreamingHistogram
 from sample_factory.utils.timing import Timing
+from sample_factory.utils.tracing import init_event_tracer
 from sample_factory.utils.typing import Device, InitModelData, MpQueue, PolicyID
 from sample_factory.utils.utils import debug_log_every_n, init_file_logger, log
 
@@ -51,6 +54,7 @@ def init_inference_process(sf_context: SampleFactoryContext, worker: InferenceWo
 
     cfg = worker.cfg
     init_file_logger(cfg)
+    init_event_tracer(cfg, worker.object_id)
 
     try:
         if cfg.num_workers > 1:
@@ -96,6 +100,10 @@ class InferenceWorker(HeartbeatStoppableEventLoopObject, Configurable):
 
         self.request_count = deque(maxlen=50)
 
+        # number of requests in the inference queue (including the ones we're about to process) at each step
+        self.queue_depth: Optional[StreamingHistogram] = StreamingHistogram() if telemetry_enabled(cfg) else None
+        self.collection_stopped = False
+
         # very conservative limit on the minimum number of requests to wait for
         # this will almost guarantee that the system will continue collecting experience
         # at max rate even when 2/3 of workers are stuck for some reason (e.g. doing a long env reset)
@@ -177,10 +185,12 @@ class InferenceWorker(HeartbeatStoppableEventLoopObject, Configurable):
     def should_stop_experience_collection(self):
         debug_log_every_n(50, f"{self.object_id}: stopping experience collection")
         self.inference_loop.stop()
+        self.collection_stopped = True
 
     def should_resume_experience_collection(self):
         debug_log_every_n(50, f"{self.object_id}: resuming experience collection")
         self.inference_loop.start()
+        self.collection_stopped = False
 
     def _batch_slices(self, timing):
         with timing.add_time("deserialize"):
@@ -366,10 +376,17 @@ class InferenceWorker(HeartbeatStoppableEventLoopObject, Configurable):
         with self.timing.add_time("update_model"):
             self.param_client.ensure_weights_updated()
 
+        if self.queue_depth is not None:
+            self.queue_depth.add(len(self.requests) + self.inference_queue.qsize())
+
         with self.timing.timeit("one_step"), self.timing.add_time("handle_policy_step"):
             self.request_count.append(len(self.requests))
             self._handle_policy_steps(self.timing)
 
+        if self.last_report_samples == 0:
+            # report the very first samples right away so the runner can measure startup latency
+            self._report_stats()
+
     def _report_stats(self):
         if "one_step" not in self.timing:
             return
@@ -391,6 +408,13 @@ class InferenceWorker(HeartbeatStoppableEventLoopObject, Configurable):
             }
         )
 
+        if self.queue_depth is not None:
+            queue_depth, self.queue_depth = self.queue_depth, StreamingHistogram()
+            values = dict(inference_collection_stopped=float(self.collection_stopped))
+            self.report_msg.emit(
+                telemetry_msg(self.object_id, self.policy_id, dict(inference_queue_depth=queue_depth), values)
+            )
+
     def _cache_cleanup(self):
         if self.cfg.device == "gpu":
             torch.cuda.empty_cache()
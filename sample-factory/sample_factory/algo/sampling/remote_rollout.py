@@ -0,0 +1,405 @@
+"""
+Learner side of remote rollout workers: rollout and inference workers running on other hosts stream trajectories
+to the learner over TCP and receive weight updates in return (see sample_factory/remote_rollout.py).
+
+RemoteRolloutServer lives in the runner's event loop. It writes received trajectories into the regular trajectory
+buffers and hands them to the Batcher exactly like local rollout workers do.
+
+"""
+
+from __future__ import annotations
+
+import selectors
+import socket
+import time
+from collections import deque
+from queue import Empty
+from typing import Deque, Dict, Optional, Tuple
+
+import numpy as np
+import torch
+from signal_slot.signal_slot import EventLoop, EventLoopObject, Timer, signal
+
+from sample_factory.algo.utils.env_info import EnvInfo
+from sample_factory.algo.utils.misc import EPISODIC, POLICY_ID_KEY, SAMPLES_COLLECTED
+from sample_factory.algo.utils.model_sharing import ParameterServer
+from sample_factory.algo.utils.remote_protocol import (
+    PROTOCOL_VERSION,
+    FrameReader,
+    MsgType,
+    copy_trajectories,
+    decode_json,
+    decode_trajectories,
+    encode_json,
+    encode_weights,
+    frame,
+    trajectories_mismatch,
+    trajectory_spec,
+)
+from sample_factory.algo.utils.shared_buffers import BufferMgr
+from sample_factory.algo.utils.telemetry import telemetry_enabled, telemetry_msg
+from sample_factory.algo.utils.tensor_dict import TensorDict
+from sample_factory.cfg.configurable import Configurable
+from sample_factory.utils.typing import Config, InitModelData, PolicyID
+from sample_factory.utils.utils import log
+
+# only these reports from remote workers are forwarded to the runner
+REMOTE_REPORT_KEYS = (EPISODIC, SAMPLES_COLLECTED)
+
+
+class RemoteConnection:
+    def __init__(self, sock: socket.socket, address: Tuple):
+        self.sock = sock
+        self.name = f"{address[0]}:{address[1]}"
+        self.reader = FrameReader()
+        self.out_buffer = bytearray()
+        self.accepted = False
+        self.closing = False
+
+        self.weights_version = -1
+        self.last_weights_time = 0.0
+
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.samples_received = 0
+
+
+class RemoteRolloutServer(EventLoopObject, Configurable):
+    def __init__(
+        self,
+        evt_loop: EventLoop,
+        buffer_mgr: BufferMgr,
+        param_servers: Dict[PolicyID, ParameterServer],
+        cfg: Config,
+        env_info: EnvInfo,
+    ):
+        EventLoopObject.__init__(self, evt_loop, object_id=RemoteRolloutServer.__name__)
+        Configurable.__init__(self, cfg)
+
+        self.env_info = env_info
+        self.policy_id: PolicyID = 0  # remote rollout workers are only supported with a single policy
+        self.param_server = param_servers[self.policy_id]
+        self.policy_versions = buffer_mgr.policy_versions
+
+        # remote trajectories go to the first sampling device, typically there's only one
+        self.device = next(iter(buffer_mgr.traj_buffer_queues))
+        self.traj_buffer_queue = buffer_mgr.traj_buffer_queues[self.device]
+        self.traj_tensors: TensorDict = buffer_mgr.traj_tensors_torch[self.device]
+        self.spec = trajectory_spec(self.traj_tensors)
+
+        # received trajectories that are not in the trajectory buffers yet: (arrays, index of the first trajectory)
+        self.pending: Deque[Tuple[Dict[str, np.ndarray], int]] = deque()
+        self.num_pending = 0
+        self.max_pending = 2 * max(
+            buffer_mgr.trajectories_per_training_iteration, buffer_mgr.sampling_trajectories_per_iteration
+        )
+        self.collection_stopped = False
+
+        self.state_dict: Optional[Dict] = None
+        self.weights_payload: Optional[Tuple[int, bytes]] = None
+
+        self.listen_socket: Optional[socket.socket] = None
+        self.selector: Optional[selectors.BaseSelector] = None
+        self.remote_connections: Dict[socket.socket, RemoteConnection] = dict()
+
+        self.bytes_received = self.bytes_sent = self.samples_received = 0
+
+        self.poll_timer: Optional[Timer] = None
+        self.telemetry_timer: Optional[Timer] = None
+
+    @signal
+    def new_trajectories(self):
+        ...
+
+    @signal
+    def report_msg(self):
+        ...
+
+    def init(self):
+        self.listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listen_socket.bind((self.cfg.remote_rollout_bind_address, self.cfg.remote_rollout_port))
+        self.listen_socket.listen()
+        self.listen_socket.setblocking(False)
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listen_socket, selectors.EVENT_READ, data=None)
+
+        self.poll_timer = Timer(self.event_loop, 0.005)
+        self.poll_timer.timeout.connect(self._poll)
+
+        if telemetry_enabled(self.cfg):
+            self.telemetry_timer = Timer(self.event_loop, self.cfg.telemetry_interval)
+            self.telemetry_timer.timeout.connect(self._report_telemetry)
+
+        log.info(
+            "Listening for remote rollout workers on %s:%d",
+            self.cfg.remote_rollout_bind_address,
+            self.cfg.remote_rollout_port,
+        )
+
+    def on_model_initialized(self, init_model_data: Optional[InitModelData]):
+        if init_model_data is None:
+            return
+        policy_id, state_dict, _, _ = init_model_data
+        if policy_id == self.policy_id:
+            # in parallel mode these are the learner's weights in shared memory, in serial mode it's None
+            self.state_dict = state_dict
+
+    def on_stop_experience_collection(self):
+        self.collection_stopped = True
+
+    def on_resume_experience_collection(self):
+        self.collection_stopped = False
+
+    def _poll(self):
+        if self.selector is None:
+            # already stopped
+            return
+
+        for key, events in self.selector.select(timeout=0):
+            if key.data is None:
+                self._accept()
+                continue
+
+            conn: RemoteConnection = key.data
+            if events & selectors.EVENT_WRITE:
+                self._flush(conn)
+            if events & selectors.EVENT_READ and conn.sock in self.remote_connections and self._can_receive():
+                self._receive(conn)
+
+        self._write_pending_trajectories()
+        self._maybe_send_weights()
+
+    def _can_receive(self) -> bool:
+        # not reading from sockets throttles remote workers the same way local ones are throttled
+        return not self.collection_stopped and self.num_pending < self.max_pending
+
+    def _accept(self):
+        try:
+            sock, address = self.listen_socket.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = RemoteConnection(sock, address)
+        self.remote_connections[sock] = conn
+        self.selector.register(sock, selectors.EVENT_READ, data=conn)
+        log.info("Remote rollout worker connected from %s", conn.name)
+
+    def _close(self, conn: RemoteConnection, reason: str):
+        if conn.sock not in self.remote_connections:
+            return
+        log.info("Remote rollout worker %s disconnected (%s)", conn.name, reason)
+        del self.remote_connections[conn.sock]
+        self.selector.unregister(conn.sock)
+        conn.sock.close()
+
+    def _receive(self, conn: RemoteConnection):
+        try:
+            data = conn.sock.recv(1 << 22)
+        except BlockingIOError:
+            return
+        except OSError as exc:
+            self._close(conn, repr(exc))
+            return
+
+        if not data:
+            self._close(conn, "connection closed")
+            return
+
+        conn.bytes_received += len(data)
+        self.bytes_received += len(data)
+
+        try:
+            for msg_type, payload in conn.reader.feed(data):
+                if conn.sock not in self.remote_connections:
+                    # closed by the previous message, ignore the rest
+                    break
+                self._on_frame(conn, msg_type, payload)
+        except Exception as exc:
+            log.exception("Error while processing a message from remote rollout worker %s", conn.name)
+            self._close(conn, repr(exc))
+
+    def _on_frame(self, conn: RemoteConnection, msg_type: MsgType, payload: bytes):
+        if msg_type == MsgType.HELLO:
+            self._on_hello(conn, decode_json(payload))
+        elif not conn.accepted:
+            self._close(conn, f"unexpected {msg_type.name} before handshake")
+        elif msg_type == MsgType.TRAJECTORIES:
+            arrays = decode_trajectories(payload)
+            # check everything here, trajectories are copied into the buffers later, outside of the error handling
+            mismatch = trajectories_mismatch(arrays, self.spec)
+            if mismatch is not None:
+                self._close(conn, f"trajectories do not match the spec: {mismatch}")
+                return
+            num_trajectories = len(arrays["rewards"])
+            self.pending.append((arrays, 0))
+            self.num_pending += num_trajectories
+            num_samples = num_trajectories * self.cfg.rollout
+            conn.samples_received += num_samples
+            self.samples_received += num_samples
+        elif msg_type == MsgType.REPORT:
+            msgs = []
+            for msg in decode_json(payload):
+                msg = {k: v for k, v in msg.items() if k in REMOTE_REPORT_KEYS}
+                if msg:
+                    msg[POLICY_ID_KEY] = self.policy_id
+                    msgs.append(msg)
+            if msgs:
+                self.report_msg.emit(msgs)
+        else:
+            self._close(conn, f"unexpected message {msg_type.name}")
+
+    def _on_hello(self, conn: RemoteConnection, hello: Dict):
+        error = None
+        if hello.get("protocol_version") != PROTOCOL_VERSION:
+            error = f"protocol version {hello.get('protocol_version')} != {PROTOCOL_VERSION}"
+        elif not isinstance(hello.get("spec"), dict):
+            error = "missing or malformed trajectory spec"
+        elif hello["spec"] != self.spec:
+            keys = set(self.spec) | set(hello["spec"])
+            mismatch = sorted(k for k in keys if self.spec.get(k) != hello["spec"].get(k))
+            error = f"trajectory tensors do not match the learner (check env and rollout args): {mismatch}"
+
+        if error is not None:
+            log.error("Rejecting remote rollout worker %s: %s", conn.name, error)
+            self._send(conn, frame(MsgType.ERROR, encode_json(dict(error=error))))
+            conn.closing = True
+            return
+
+        conn.accepted = True
+        self._send(conn, frame(MsgType.WELCOME, encode_json(dict(policy_id=self.policy_id))))
+        log.info("Accepted remote rollout worker %s (%s)", conn.name, hello.get("hostname"))
+
+    def _write_pending_trajectories(self):
+        new_trajectories = []
+        while self.num_pending > 0:
+            try:
+                buffers = self.traj_buffer_queue.get(block=False)
+            except Empty:
+                break
+
+            traj_slice = buffers if isinstance(buffers, slice) else slice(buffers, buffers + 1)
+            n = traj_slice.stop - traj_slice.start
+            if n > self.num_pending:
+                # with batched sampling buffers come in big slices, wait until we have enough trajectories
+                self.traj_buffer_queue.put(buffers)
+                break
+
+            self._copy_pending(traj_slice)
+            new_trajectories.append(dict(policy_id=self.policy_id, traj_buffer_idx=buffers))
+
+        if new_trajectories:
+            self.new_trajectories.emit(new_trajectories, self.device)
+
+    def _copy_pending(self, traj_slice: slice):
+        dst = traj_slice.start
+        while dst < traj_slice.stop:
+            arrays, src = self.pending[0]
+            available = len(arrays["rewards"]) - src
+            n = min(available, traj_slice.stop - dst)
+            with torch.no_grad():
+                copy_trajectories(self.traj_tensors, slice(dst, dst + n), arrays, slice(src, src + n))
+
+            dst += n
+            self.num_pending -= n
+            if n == available:
+                self.pending.popleft()
+            else:
+                self.pending[0] = (arrays, src + n)
+
+    def _weights(self, policy_version: int) -> Optional[bytes]:
+        if self.weights_payload is not None and self.weights_payload[0] == policy_version:
+            return self.weights_payload[1]
+
+        state_dict = self.state_dict
+        if state_dict is None and self.param_server.actor_critic is not None:
+            # serial mode, the learner's model lives in this process
+            state_dict = self.param_server.actor_critic.state_dict()
+        if state_dict is None:
+            return None
+
+        with self.param_server.policy_lock:
+            payload = frame(MsgType.WEIGHTS, encode_weights(policy_version, state_dict))
+        self.weights_payload = (policy_version, payload)
+        return payload
+
+    def _maybe_send_weights(self):
+        policy_version = int(self.policy_versions[self.policy_id].item())
+        now = time.time()
+        for conn in list(self.remote_connections.values()):
+            if not conn.accepted or conn.out_buffer or conn.weights_version >= policy_version:
+                continue
+            if now - conn.last_weights_time < self.cfg.remote_weights_interval:
+                continue
+
+            payload = self._weights(policy_version)
+            if payload is None:
+                return
+
+            conn.weights_version = policy_version
+            conn.last_weights_time = now
+            self._send(conn, payload)
+
+    def _send(self, conn: RemoteConnection, data: bytes):
+        conn.out_buffer += data
+        conn.bytes_sent += len(data)
+        self.bytes_sent += len(data)
+        self._flush(conn)
+
+    def _flush(self, conn: RemoteConnection):
+        try:
+            while conn.out_buffer:
+                sent = conn.sock.send(conn.out_buffer)
+                del conn.out_buffer[:sent]
+        except BlockingIOError:
+            pass
+        except OSError as exc:
+            self._close(conn, repr(exc))
+            return
+
+        if not conn.out_buffer and conn.closing:
+            self._close(conn, "rejected")
+            return
+
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if conn.out_buffer else 0)
+        self.selector.modify(conn.sock, events, data=conn)
+
+    def stats(self) -> Dict[str, float]:
+        stats = dict(
+            remote_workers=len([c for c in self.remote_connections.values() if c.accepted]),
+            remote_bytes_received=self.bytes_received,
+            remote_bytes_sent=self.bytes_sent,
+            remote_samples_received=self.samples_received,
+            remote_pending_trajectories=self.num_pending,
+        )
+        if self.samples_received > 0:
+            stats["remote_bytes_per_sample"] = self.bytes_received / self.samples_received
+        return stats
+
+    def _report_telemetry(self):
+        self.report_msg.emit(telemetry_msg(self.object_id, self.policy_id, values=self.stats()))
+
+    def on_stop(self, *_):
+        if self.selector is None:
+            return
+
+        for timer in (self.poll_timer, self.telemetry_timer):
+            if timer is not None:
+                timer.stop()
+
+        for conn in list(self.remote_connections.values()):
+            self._close(conn, "training finished")
+        self.selector.close()
+        self.listen_socket.close()
+        self.selector = None
+
+        stats = self.stats()
+        log.info(
+            "Remote rollout workers: %d samples received, %.1f MB in, %.1f MB out, %.1f bytes/sample",
+            self.samples_received,
+            self.bytes_received / 1e6,
+            self.bytes_sent / 1e6,
+            stats.get("remote_bytes_per_sample", 0.0),
+        )
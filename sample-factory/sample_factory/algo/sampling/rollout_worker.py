@@ -14,12 +14,19 @@ from sample_factory.algo.sampling.sampling_utils import VectorEnvRunner, rollout
 from sample_factory.algo.utils.context import SampleFactoryContext, set_global_context
 from sample_factory.algo.utils.env_info import EnvInfo
 from sample_factory.algo.utils.heartbeat import HeartbeatStoppableEventLoopObject
-from sample_factory.algo.utils.misc import advance_rollouts_signal, new_trajectories_signal
+from sample_factory.algo.utils.misc import (
+    EPISODIC_SUMMARY,
+    POLICY_ID_KEY,
+    advance_rollouts_signal,
+    new_trajectories_signal,
+)
 from sample_factory.algo.utils.rl_utils import total_num_agents, trajectories_per_training_iteration
 from sample_factory.algo.utils.torch_utils import inference_context
 from sample_factory.cfg.configurable import Configurable
 from sample_factory.utils.gpu_utils import set_gpus_for_process
+from sample_factory.utils.streaming_stats import EpisodicStatsSketches
 from sample_factory.utils.timing import Timing
+from sample_factory.utils.tracing import init_event_tracer
 from sample_factory.utils.typing import MpQueue, PolicyID
 from sample_factory.utils.utils import (
     cores_for_worker_process,
@@ -43,6 +50,7 @@ def init_rollout_worker_process(sf_context: SampleFactoryContext, worker: Rollou
 
     cfg = worker.cfg
     init_file_logger(cfg)
+    init_event_tracer(cfg, worker.object_id)
 
     # on MacOS, psutil.Process() has no method 'cpu_affinity'
     if hasattr(psutil.Process(), "cpu_affinity"):
@@ -125,6 +133,12 @@ class RolloutWorker(HeartbeatStoppableEventLoopObject, Configurable):
         self.rollouts_per_iteration: int = rollouts_per_iteration
         self.remaining_rollouts: List[int] = [self.rollouts_per_iteration for _ in range(self.num_splits)]
 
+        # with --episodic_stats_sketches episodes are aggregated locally and sent to the runner as compact summaries
+        self.episodic_sketches: Optional[EpisodicStatsSketches] = None
+        if cfg.episodic_stats_sketches:
+            self.episodic_sketches = EpisodicStatsSketches(cfg.num_policies)
+        self.last_episodic_summary = time.time()
+
         self.experience_decorrelated: bool = False
         self.is_initialized: bool = False
 
@@ -252,13 +266,35 @@ class RolloutWorker(HeartbeatStoppableEventLoopObject, Configurable):
                     self.remaining_rollouts[split_idx] -= 1
 
             if episodic_stats:
-                self.report_msg.emit(episodic_stats)
+                if self.episodic_sketches is None:
+                    self.report_msg.emit(episodic_stats)
+                else:
+                    self.episodic_sketches.add_reports(episodic_stats)
+
+            if self.episodic_sketches is not None:
+                self._maybe_send_episodic_summaries()
 
             # We finished one step of environment simulation.
             # If we also have the trajectory buffer to share the new data with the inference worker then
             # we are ready to enqueue inference request
             self._maybe_send_policy_request(runner)
 
+    def _maybe_send_episodic_summaries(self) -> None:
+        now = time.time()
+        if now - self.last_episodic_summary < self.cfg.episodic_stats_sketch_interval:
+            return
+        self.last_episodic_summary = now
+
+        if self.episodic_sketches.empty():
+            return
+
+        summaries = []
+        for policy_id in range(self.cfg.num_policies):
+            sketches = self.episodic_sketches.pop(policy_id)
+            if sketches:
+                summaries.append({EPISODIC_SUMMARY: sketches, POLICY_ID_KEY: policy_id})
+        self.report_msg.emit(summaries)
+
     def on_trajectory_buffers_available(self, policy_id: PolicyID, training_iteration: int):
         """
         Used to wake up rollout workers waiting for trajectory buffers to be freed.
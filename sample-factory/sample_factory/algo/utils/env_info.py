@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import multiprocessing
 import os
 import pickle
 from dataclasses import dataclass
@@ -12,6 +11,7 @@ import gymnasium as gym
 from sample_factory.algo.utils.action_distributions import calc_num_actions
 from sample_factory.algo.utils.context import set_global_context, sf_global_context
 from sample_factory.algo.utils.make_env import BatchedVecEnv, NonBatchedVecEnv, make_env_func_batched
+from sample_factory.algo.utils.multiprocessing_utils import get_mp_ctx
 from sample_factory.envs.env_utils import get_default_reward_shaping
 from sample_factory.utils.typing import Config
 from sample_factory.utils.utils import log, project_tmp_dir
@@ -119,7 +119,7 @@ def obtain_env_info_in_a_separate_process(cfg: Config) -> EnvInfo:
 
     sf_context = sf_global_context()
 
-    ctx = multiprocessing.get_context("spawn")
+    ctx = get_mp_ctx(serial=False)
     q = ctx.Queue()
     p = ctx.Process(target=spawn_tmp_env_and_get_info, args=(sf_context, q, cfg))
     p.start()
@@ -8,12 +8,14 @@ EPS = 1e-8
 
 # stats dictionary keys
 EPISODIC = "episodic"
+EPISODIC_SUMMARY = "episodic_summary"
 LEARNER_ENV_STEPS = "learner_env_steps"
 TRAIN_STATS = "train"
 TIMING_STATS = "timing"
 STATS_KEY = "stats"
 SAMPLES_COLLECTED = "samples_collected"
 POLICY_ID_KEY = "policy_id"
+TELEMETRY = "telemetry"
 
 
 MAGIC_FLOAT = -4242.42
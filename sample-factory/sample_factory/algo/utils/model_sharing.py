@@ -2,8 +2,9 @@
 Utilities for sharing model parameters between components.
 """
 
+import pickle
 import sys
-from typing import Optional
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 
 import torch
 from torch import Tensor
@@ -11,8 +12,12 @@ from torch import Tensor
 from sample_factory.algo.utils.multiprocessing_utils import get_lock, get_mp_ctx
 from sample_factory.model.actor_critic import create_actor_critic
 from sample_factory.utils.timing import Timing
+from sample_factory.utils.typing import PolicyID
 from sample_factory.utils.utils import log
 
+# tensors in a checkpoint slot start at offsets aligned to this many bytes, so we can view them with any dtype
+_SLOT_ALIGNMENT = 64
+
 
 class ParameterServer:
     def __init__(self, policy_id, policy_versions: Tensor, serial_mode: bool):
@@ -160,3 +165,125 @@ def make_parameter_client(is_serial_mode, parameter_server, cfg, env_info, timin
     """Parameter client factory."""
     cls = ParameterClientSerial if is_serial_mode else ParameterClientAsync
     return cls(parameter_server, cfg, env_info, timing)
+
+
+class _TensorRef(NamedTuple):
+    offset: int
+    dtype: torch.dtype
+    shape: Tuple[int, ...]
+
+    @property
+    def nbytes(self) -> int:
+        numel = 1
+        for dim in self.shape:
+            numel *= dim
+        return numel * torch.empty([], dtype=self.dtype).element_size()
+
+
+def _align(offset: int) -> int:
+    return (offset + _SLOT_ALIGNMENT - 1) // _SLOT_ALIGNMENT * _SLOT_ALIGNMENT
+
+
+class CheckpointSlot:
+    """
+    Fixed-size (shared) memory that holds the latest published checkpoint dict of a policy:
+    model weights, optimizer state, etc.
+    Tensors are copied into a flat byte buffer, the rest of the checkpoint structure (nested dicts, lists, scalars)
+    is pickled into a small manifest. This allows learners to exchange weights directly (i.e. for PBT), without
+    going through torch.save/torch.load and the filesystem.
+    """
+
+    def __init__(self, capacity_bytes: int, serial_mode: bool, manifest_capacity_bytes: int = 1 << 20):
+        self.data = torch.zeros([capacity_bytes], dtype=torch.uint8)
+        self.manifest = torch.zeros([manifest_capacity_bytes], dtype=torch.uint8)
+        # published version (-1 if nothing was published yet) and size of the manifest in bytes
+        self.header = torch.tensor([-1, 0], dtype=torch.int64)
+
+        if not serial_mode:
+            for t in (self.data, self.manifest, self.header):
+                t.share_memory_()
+
+        mp_ctx = get_mp_ctx(serial_mode)
+        self._lock = get_lock(serial_mode, mp_ctx)
+
+    @property
+    def version(self) -> int:
+        return int(self.header[0].item())
+
+    def _view(self, ref: _TensorRef) -> Tensor:
+        return self.data[ref.offset : ref.offset + ref.nbytes].view(ref.dtype).view(ref.shape)
+
+    def publish(self, checkpoint: Dict, version: int) -> bool:
+        """Returns False if the checkpoint does not fit into the slot."""
+        tensors: List[Tuple[_TensorRef, Tensor]] = []
+        offset = 0
+
+        def to_refs(x: Any) -> Any:
+            nonlocal offset
+            if isinstance(x, Tensor):
+                ref = _TensorRef(offset, x.dtype, tuple(x.shape))
+                tensors.append((ref, x))
+                offset = _align(offset + ref.nbytes)
+                return ref
+            elif isinstance(x, dict):
+                return type(x)((key, to_refs(value)) for key, value in x.items())
+            elif isinstance(x, (list, tuple)):
+                return type(x)(to_refs(value) for value in x)
+            return x
+
+        manifest = pickle.dumps(to_refs(checkpoint))
+
+        if offset > self.data.numel() or len(manifest) > self.manifest.numel():
+            log.warning(
+                f"Checkpoint ({offset} bytes, manifest {len(manifest)} bytes) does not fit into the slot "
+                f"({self.data.numel()} bytes, manifest {self.manifest.numel()} bytes)"
+            )
+            return False
+
+        with self._lock:
+            for ref, t in tensors:
+                self._view(ref).copy_(t.detach())
+            self.manifest[: len(manifest)].copy_(torch.frombuffer(bytearray(manifest), dtype=torch.uint8))
+            self.header[0] = version
+            self.header[1] = len(manifest)
+
+        return True
+
+    def read(self, device: torch.device, min_version: int = 0) -> Optional[Dict]:
+        """
+        Returns a copy of the latest published checkpoint (with tensors on the device),
+        None if the slot is empty or the published version is older than min_version.
+        """
+
+        def from_refs(x: Any) -> Any:
+            if isinstance(x, _TensorRef):
+                return self._view(x).to(device, copy=True)
+            elif isinstance(x, dict):
+                return type(x)((key, from_refs(value)) for key, value in x.items())
+            elif isinstance(x, (list, tuple)):
+                return type(x)(from_refs(value) for value in x)
+            return x
+
+        with self._lock:
+            if self.version < max(min_version, 0):
+                return None
+            manifest_size = int(self.header[1].item())
+            structure = pickle.loads(self.manifest[:manifest_size].numpy().tobytes())
+            return from_refs(structure)
+
+
+def checkpoint_slot_capacity(cfg, env_info) -> int:
+    """Upper bound on the size of the checkpoint dict of a learner, in bytes."""
+    actor_critic = create_actor_critic(cfg, env_info.obs_space, env_info.action_space)
+    model_bytes = sum(_align(t.numel() * t.element_size()) for t in actor_critic.state_dict().values())
+    params = list(actor_critic.parameters())
+    param_bytes = sum(_align(p.numel() * p.element_size()) for p in params)
+    # Adam and Lamb keep two moments per parameter (Lamb with lookahead also keeps a slow copy of parameters),
+    # plus small per-parameter tensors such as the step counter
+    return model_bytes + 3 * param_bytes + 4 * _SLOT_ALIGNMENT * len(params)
+
+
+def alloc_checkpoint_slots(cfg, env_info) -> Dict[PolicyID, CheckpointSlot]:
+    capacity = checkpoint_slot_capacity(cfg, env_info)
+    log.debug(f"Allocating {cfg.num_policies} checkpoint slots of {capacity / (1 << 20):.1f} MB")
+    return {policy_id: CheckpointSlot(capacity, cfg.serial_mode) for policy_id in range(cfg.num_policies)}
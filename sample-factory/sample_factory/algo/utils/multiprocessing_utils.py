@@ -1,8 +1,22 @@
 import multiprocessing
+import sys
 from multiprocessing.context import BaseContext
-from typing import Optional
+from typing import List, Optional
 
-from sample_factory.utils.utils import static_vars
+from sample_factory.algo.utils.context import sf_global_context
+from sample_factory.utils.typing import Config
+from sample_factory.utils.utils import log, static_vars
+
+# imported once by the forkserver process, workers forked from it don't have to import them again
+FORKSERVER_PRELOAD_MODULES = [
+    "numpy",
+    "torch",
+    "gymnasium",
+    "sample_factory.algo.learning.learner_worker",
+    "sample_factory.algo.sampling.inference_worker",
+    "sample_factory.algo.sampling.rollout_worker",
+    "sample_factory.algo.utils.env_info",
+]
 
 
 @static_vars(mp_ctx=None)
@@ -15,6 +29,38 @@ def get_mp_ctx(serial: bool) -> Optional[BaseContext]:
     return get_mp_ctx.mp_ctx
 
 
+def forkserver_preload_modules() -> List[str]:
+    """Heavy modules plus the modules that define registered envs (i.e. sf_examples.vizdoom, vizdoom itself)."""
+    modules = list(FORKSERVER_PRELOAD_MODULES)
+    for make_env_func in sf_global_context().env_registry.values():
+        # unwrap functools.partial
+        module = getattr(getattr(make_env_func, "func", make_env_func), "__module__", None)
+        if module and module != "__main__" and module not in modules:
+            modules.append(module)
+
+    # training script is imported by workers anyway (same as with spawn), this way it happens only once
+    if getattr(sys.modules.get("__main__"), "__file__", None):
+        modules.append("__main__")
+    return modules
+
+
+def init_mp_ctx(cfg: Config) -> None:
+    """
+    Select how worker processes are started. Should be called before any processes are started or
+    any multiprocessing primitives are created.
+    """
+    if cfg.serial_mode:
+        return
+
+    mp_ctx = multiprocessing.get_context(cfg.worker_start_method)
+    if cfg.worker_start_method == "forkserver":
+        preload = forkserver_preload_modules()
+        log.debug(f"Preloading modules in the forkserver process: {preload}")
+        mp_ctx.set_forkserver_preload(preload)
+
+    get_mp_ctx.mp_ctx = mp_ctx
+
+
 def get_lock(serial=False, mp_ctx=None):
     if serial:
         return FakeLock()
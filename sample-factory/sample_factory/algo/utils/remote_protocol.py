@@ -0,0 +1,188 @@
+"""
+Wire protocol between remote rollout workers and the learner host.
+
+Every message is a frame: 1-byte message type, 8-byte payload length, payload.
+Trajectories are sent as npz archives of flattened TensorDicts (optionally zlib-compressed), weights as torch
+state dicts, everything else as JSON. Nothing is unpickled on the receiving side.
+
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import socket
+import struct
+import zlib
+from enum import IntEnum
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+from sample_factory.algo.utils.tensor_dict import TensorDict
+
+PROTOCOL_VERSION = 1
+
+FRAME_HEADER = struct.Struct("!BQ")
+WEIGHTS_HEADER = struct.Struct("!q")
+KEY_SEPARATOR = "/"
+
+
+class MsgType(IntEnum):
+    HELLO = 1  # client -> server: trajectory spec and client info
+    WELCOME = 2  # server -> client: handshake accepted
+    ERROR = 3  # server -> client: handshake rejected, connection will be closed
+    TRAJECTORIES = 4  # client -> server: a batch of trajectories
+    REPORT = 5  # client -> server: episodic stats and sample counts
+    WEIGHTS = 6  # server -> client: policy version and state dict
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def frame(msg_type: MsgType, payload: bytes) -> bytes:
+    return FRAME_HEADER.pack(int(msg_type), len(payload)) + payload
+
+
+class FrameReader:
+    """Incrementally splits a byte stream into frames, for non-blocking sockets."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes) -> Iterator[Tuple[MsgType, bytes]]:
+        self.buffer += data
+        while len(self.buffer) >= FRAME_HEADER.size:
+            msg_type, length = FRAME_HEADER.unpack_from(self.buffer)
+            end = FRAME_HEADER.size + length
+            if len(self.buffer) < end:
+                break
+            payload = bytes(self.buffer[FRAME_HEADER.size : end])
+            del self.buffer[:end]
+            yield MsgType(msg_type), payload
+
+
+def _recv_exactly(sock: socket.socket, n: int) -> Optional[bytes]:
+    chunks = []
+    while n > 0:
+        chunk = sock.recv(min(n, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_frame(sock: socket.socket) -> Optional[Tuple[MsgType, bytes]]:
+    """Blocking read of a single frame, None if the connection was closed."""
+    header = _recv_exactly(sock, FRAME_HEADER.size)
+    if header is None:
+        return None
+    msg_type, length = FRAME_HEADER.unpack(header)
+    payload = _recv_exactly(sock, length) if length > 0 else b""
+    if payload is None:
+        return None
+    return MsgType(msg_type), payload
+
+
+def flatten_tensor_dict(tensors: TensorDict, prefix: str = "") -> Dict[str, torch.Tensor]:
+    flat = dict()
+    for key, value in tensors.items():
+        if isinstance(value, (TensorDict, dict)):
+            flat.update(flatten_tensor_dict(value, f"{prefix}{key}{KEY_SEPARATOR}"))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def trajectory_spec(traj_tensors: TensorDict) -> Dict[str, List]:
+    """Shapes (without the trajectory dimension) and dtypes of all trajectory tensors, must match on both ends."""
+    return {
+        key: [list(t.shape[1:]), str(t.dtype).replace("torch.", "")]
+        for key, t in sorted(flatten_tensor_dict(traj_tensors).items())
+    }
+
+
+def encode_trajectories(traj: TensorDict, compression_level: int) -> bytes:
+    arrays = {key: t.cpu().numpy() for key, t in flatten_tensor_dict(traj).items()}
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    data = buffer.getvalue()
+    if compression_level > 0:
+        return b"\x01" + zlib.compress(data, compression_level)
+    return b"\x00" + data
+
+
+def decode_trajectories(payload: bytes) -> Dict[str, np.ndarray]:
+    data = zlib.decompress(payload[1:]) if payload[:1] == b"\x01" else payload[1:]
+    with np.load(io.BytesIO(data), allow_pickle=False) as archive:
+        return {key: archive[key] for key in archive.files}
+
+
+def trajectories_mismatch(arrays: Dict[str, np.ndarray], spec: Dict[str, List]) -> Optional[str]:
+    """Describes how the decoded trajectories differ from the spec, None if they match."""
+    if set(arrays) != set(spec):
+        return f"keys {sorted(set(arrays) ^ set(spec))} do not match"
+
+    num_trajectories = len(arrays["rewards"])
+    for key, array in arrays.items():
+        shape, dtype = spec[key]
+        if array.ndim == 0 or list(array.shape[1:]) != shape or array.dtype.name != dtype:
+            return f"{key} of shape {list(array.shape)} and dtype {array.dtype.name}, expected {shape} and {dtype}"
+        if len(array) != num_trajectories:
+            return f"{key} has {len(array)} trajectories, rewards has {num_trajectories}"
+    return None
+
+
+def copy_trajectories(dst: TensorDict, dst_slice: slice, arrays: Dict[str, np.ndarray], src_slice: slice) -> None:
+    for key, array in arrays.items():
+        *path, name = key.split(KEY_SEPARATOR)
+        tensors = dst
+        for k in path:
+            tensors = tensors[k]
+        tensors[name][dst_slice] = torch.from_numpy(array[src_slice])
+
+
+def encode_weights(policy_version: int, state_dict: Dict[str, torch.Tensor]) -> bytes:
+    buffer = io.BytesIO()
+    torch.save({k: v.detach().cpu() for k, v in state_dict.items()}, buffer)
+    return WEIGHTS_HEADER.pack(policy_version) + buffer.getvalue()
+
+
+def decode_weights(payload: bytes, device: torch.device) -> Tuple[int, Dict[str, torch.Tensor]]:
+    (policy_version,) = WEIGHTS_HEADER.unpack_from(payload)
+    state_dict = torch.load(io.BytesIO(payload[WEIGHTS_HEADER.size :]), map_location=device, weights_only=True)
+    return policy_version, state_dict
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, np.ndarray):
+        return {"__ndarray__": obj.tolist(), "dtype": str(obj.dtype)}
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, torch.Tensor):
+        return _json_default(obj.cpu().numpy())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _json_object_hook(obj: Dict) -> Any:
+    if "__ndarray__" in obj:
+        return np.array(obj["__ndarray__"], dtype=obj["dtype"])
+    return obj
+
+
+def encode_json(obj: Any) -> bytes:
+    return json.dumps(obj, default=_json_default).encode()
+
+
+def decode_json(payload: bytes) -> Any:
+    return json.loads(payload.decode(), object_hook=_json_object_hook)
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    host, sep, port = address.rpartition(":")
+    if not sep or not port.isdigit():
+        raise ProtocolError(f"Expected an address in the form host:port, got {address!r}")
+    return host or "localhost", int(port)
@@ -4,7 +4,7 @@ All credit goes to https://github.com/Denys88/rl_games (only slightly changed he
 Thanks a lot, great module!
 """
 
-from typing import Dict, Final, List, Optional, Union
+from typing import Dict, Final, List, Optional, Tuple, Union
 
 import gymnasium as gym
 import torch
@@ -61,20 +61,24 @@ class RunningMeanStdInPlace(nn.Module):
         new_var = M2 / tot_count
         return new_mean, new_var, tot_count
 
+    def update(self, x: Tensor) -> None:
+        """Updates running statistics with a batch of data without normalizing it."""
+        # check if the shape exactly matches or it's a scalar for which we use shape (1, )
+        assert x.shape[1:] == self.input_shape or (
+            x.shape[1:] == () and self.input_shape == (1,)
+        ), f"RMS expected input shape {self.input_shape}, got {x.shape[1:]}"
+
+        batch_count = x.size()[0]
+        μ = x.mean(self.axis)  # along channel axis
+        σ2 = x.var(self.axis)
+        self.running_mean[:], self.running_var[:], self.count[:] = self._update_mean_var_count_from_moments(
+            self.running_mean, self.running_var, self.count, μ, σ2, batch_count
+        )
+
     def forward(self, x: Tensor, denormalize: bool = False) -> None:
         """Normalizes in-place! This function modifies the input tensor and returns nothing."""
         if self.training and not denormalize:
-            # check if the shape exactly matches or it's a scalar for which we use shape (1, )
-            assert x.shape[1:] == self.input_shape or (
-                x.shape[1:] == () and self.input_shape == (1,)
-            ), f"RMS expected input shape {self.input_shape}, got {x.shape[1:]}"
-
-            batch_count = x.size()[0]
-            μ = x.mean(self.axis)  # along channel axis
-            σ2 = x.var(self.axis)
-            self.running_mean[:], self.running_var[:], self.count[:] = self._update_mean_var_count_from_moments(
-                self.running_mean, self.running_var, self.count, μ, σ2, batch_count
-            )
+            self.update(x)
 
         # change shape
         if self.per_channel:
@@ -130,10 +134,11 @@ class RunningMeanStdDictInPlace(nn.Module):
             }
         )
 
-    def forward(self, x: Dict[str, Tensor]) -> None:
-        """Normalize in-place!"""
+    def forward(self, x: Dict[str, Tensor], skip_keys: Tuple[str, ...] = ()) -> None:
+        """Normalize in-place! Keys in skip_keys are left alone (i.e. they are normalized elsewhere)."""
         for k, module in self.running_mean_std.items():
-            module(x[k])
+            if k not in skip_keys:
+                module(x[k])
 
 
 def running_mean_std_summaries(running_mean_std_module: Union[nn.Module, ScriptModule, RecursiveScriptModule]):
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import math
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import torch
 from gymnasium import spaces
@@ -12,6 +12,7 @@ from sample_factory.algo.sampling.sampling_utils import rollout_worker_device
 from sample_factory.algo.utils.action_distributions import calc_num_action_parameters, calc_num_actions
 from sample_factory.algo.utils.env_info import EnvInfo
 from sample_factory.algo.utils.misc import MAGIC_FLOAT, MAGIC_INT
+from sample_factory.algo.utils.model_sharing import CheckpointSlot, alloc_checkpoint_slots
 from sample_factory.algo.utils.rl_utils import trajectories_per_training_iteration
 from sample_factory.algo.utils.tensor_dict import TensorDict
 from sample_factory.algo.utils.torch_utils import to_torch_dtype
@@ -237,3 +238,8 @@ class BufferMgr(Configurable):
         self.policy_versions = torch.zeros([cfg.num_policies], dtype=torch.int32)
         if share:
             self.policy_versions.share_memory_()
+
+        # learners publish their weights here so that other learners can copy them directly (i.e. PBT replacements)
+        self.checkpoint_slots: Optional[Dict[PolicyID, CheckpointSlot]] = None
+        if cfg.with_pbt and cfg.num_policies > 1 and cfg.pbt_shared_memory_weights:
+            self.checkpoint_slots = alloc_checkpoint_slots(cfg, env_info)
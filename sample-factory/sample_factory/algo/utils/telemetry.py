@@ -0,0 +1,144 @@
+"""
+Telemetry about the internal state of the APPO pipeline: policy lag distribution on the learner, depth of the
+inference request queues, trajectories waiting in the Batcher, time spent with experience collection stopped,
+learner utilization and experience replay.
+
+Components send TELEMETRY messages with histograms (StreamingHistogram) and instantaneous values, the runner
+aggregates them, writes telemetry/* summaries and periodically saves a JSON snapshot to the experiment folder.
+This helps to tune num_batches_to_accumulate, the number of workers, etc.
+
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from os.path import join
+from typing import Any, Dict, List, Optional
+
+from tensorboardX import SummaryWriter
+
+from sample_factory.algo.utils.misc import POLICY_ID_KEY, TELEMETRY
+from sample_factory.utils.streaming_stats import StreamingHistogram
+from sample_factory.utils.typing import Config, PolicyID
+from sample_factory.utils.utils import experiment_dir
+
+TELEMETRY_SNAPSHOT_FILE = "telemetry.json"
+
+# telemetry histograms are summarized with these quantiles
+TELEMETRY_QUANTILES = (0.5, 0.9, 0.99)
+
+
+def telemetry_enabled(cfg: Config) -> bool:
+    return cfg.telemetry_interval > 0
+
+
+def telemetry_msg(
+    component: str,
+    policy_id: PolicyID,
+    histograms: Optional[Dict[str, StreamingHistogram]] = None,
+    values: Optional[Dict[str, float]] = None,
+) -> Dict:
+    return {
+        TELEMETRY: dict(component=component, histograms=histograms or dict(), values=values or dict()),
+        POLICY_ID_KEY: policy_id,
+    }
+
+
+def histogram_summary(h: StreamingHistogram) -> Dict[str, float]:
+    summary = dict(count=h.count, mean=h.mean, min=h.min, max=h.max)
+    for q, value in zip(TELEMETRY_QUANTILES, h.quantiles(TELEMETRY_QUANTILES)):
+        summary[f"p{int(q * 100)}"] = value
+    return summary
+
+
+class TelemetryAggregator:
+    def __init__(self, cfg: Config):
+        self.cfg = cfg
+        self.snapshot_path = join(experiment_dir(cfg=cfg), TELEMETRY_SNAPSHOT_FILE)
+
+        # histograms accumulated since the last snapshot, per policy
+        self.histograms: List[Dict[str, StreamingHistogram]] = [dict() for _ in range(cfg.num_policies)]
+        # latest values reported by each component, per policy
+        self.values: List[Dict[str, Dict[str, float]]] = [dict() for _ in range(cfg.num_policies)]
+
+        # *_sec values (i.e. collection_stopped_sec, learner_busy_sec) are cumulative,
+        # we also report them as *_fraction of time since the last snapshot
+        self.prev_totals_sec: List[Dict[str, float]] = [dict() for _ in range(cfg.num_policies)]
+        self.fractions: List[Dict[str, float]] = [dict() for _ in range(cfg.num_policies)]
+
+        self.last_snapshot_time = time.time()
+
+    def on_telemetry_msg(self, msg: Dict, policy_id: PolicyID) -> None:
+        telemetry = msg[TELEMETRY]
+        histograms = self.histograms[policy_id]
+        for key, h in telemetry["histograms"].items():
+            if h.count == 0:
+                continue
+            if key in histograms:
+                histograms[key].merge(h)
+            else:
+                histograms[key] = h
+
+        self.values[policy_id][telemetry["component"]] = telemetry["values"]
+
+    def _totals(self, policy_id: PolicyID) -> Dict[str, float]:
+        """Values of the same kind from different components (i.e. several inference workers) are summed up."""
+        totals: Dict[str, float] = dict()
+        for values in self.values[policy_id].values():
+            for key, value in values.items():
+                totals[key] = totals.get(key, 0.0) + value
+        return totals
+
+    def _update_fractions(self, policy_id: PolicyID, interval_sec: float) -> None:
+        totals_sec = {k: v for k, v in self._totals(policy_id).items() if k.endswith("_sec")}
+        prev_totals_sec = self.prev_totals_sec[policy_id]
+        for key, total_sec in totals_sec.items():
+            if key in prev_totals_sec and interval_sec > 0:
+                fraction = (total_sec - prev_totals_sec[key]) / interval_sec
+                self.fractions[policy_id][f"{key[:-len('_sec')]}_fraction"] = min(1.0, max(0.0, fraction))
+        self.prev_totals_sec[policy_id] = totals_sec
+
+    def _policy_snapshot(self, policy_id: PolicyID) -> Dict[str, Any]:
+        snapshot: Dict[str, Any] = {key: histogram_summary(h) for key, h in self.histograms[policy_id].items()}
+        snapshot["totals"] = {**self._totals(policy_id), **self.fractions[policy_id]}
+        snapshot["components"] = dict(sorted(self.values[policy_id].items()))
+        return snapshot
+
+    def write_summaries(self, writer: SummaryWriter, policy_id: PolicyID, env_steps: int) -> None:
+        for key, h in self.histograms[policy_id].items():
+            summary = histogram_summary(h)
+            for stat in ("mean", "max", *(f"p{int(q * 100)}" for q in TELEMETRY_QUANTILES)):
+                writer.add_scalar(f"telemetry/{key}_{stat}", summary[stat], env_steps)
+
+        for key, value in self._totals(policy_id).items():
+            writer.add_scalar(f"telemetry/{key}", value, env_steps)
+
+        for key, value in self.fractions[policy_id].items():
+            writer.add_scalar(f"telemetry/{key}", value, env_steps)
+
+    def save_snapshot(self, env_steps: Dict[PolicyID, int], event_loop_queue_sizes: Dict[str, int]) -> Dict:
+        now = time.time()
+        interval_sec = now - self.last_snapshot_time
+        for policy_id in range(self.cfg.num_policies):
+            self._update_fractions(policy_id, interval_sec)
+
+        snapshot = dict(
+            time=now,
+            interval_sec=interval_sec,
+            env_steps={str(p): s for p, s in env_steps.items()},
+            event_loop_queue_sizes=event_loop_queue_sizes,
+            policies={str(p): self._policy_snapshot(p) for p in range(self.cfg.num_policies)},
+        )
+
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "w") as snapshot_file:
+            json.dump(snapshot, snapshot_file, indent=2, default=float)
+        os.replace(tmp_path, self.snapshot_path)
+
+        return snapshot
+
+    def reset_histograms(self) -> None:
+        self.histograms = [dict() for _ in range(self.cfg.num_policies)]
+        self.last_snapshot_time = time.time()
@@ -177,6 +177,9 @@ def verify_cfg(cfg: Config, env_info: EnvInfo) -> bool:
             )
             good_config = False
 
+    if cfg.remote_rollout_port > 0 and (sync_rl or cfg.num_policies > 1):
+        cfg_error("Remote rollout workers require --async_rl=True and a single policy")
+
     if sync_rl and cfg.num_policies > 1:
         log.warning(
             "Sync mode is not fully tested with multi-policy training. Use at your own risk. "
@@ -66,6 +66,15 @@ def add_rl_args(p: ArgumentParser):
         type=str2bool,
         help="Enable serial mode: run everything completely synchronously in the same process",
     )
+    p.add_argument(
+        "--worker_start_method",
+        default="spawn",
+        choices=["spawn", "forkserver"],
+        type=str,
+        help="How worker processes are started. With forkserver, heavy modules (torch, env packages, the training "
+        "script) are imported once by a server process and workers are forked from it, "
+        "which can make startup with many workers much faster",
+    )
     p.add_argument(
         "--batched_sampling",
         default=False,
@@ -90,6 +99,62 @@ def add_rl_args(p: ArgumentParser):
         "are processed. Set this parameter to 1 to further reduce policy-lag. "
         "If the experience collection is very non-uniform, increasing this parameter can increase overall throughput, at the cost of increased policy-lag.",
     )
+    p.add_argument(
+        "--batcher_zero_copy",
+        default=True,
+        type=str2bool,
+        help="When a whole training batch is a single contiguous slice of the trajectory buffer on the learner's device, "
+        "let the learner train on a view into the trajectory buffer instead of copying the data. The trajectories are "
+        "released only after training on them is finished. Only used with a single policy",
+    )
+    p.add_argument(
+        "--experience_replay_batches",
+        default=0,
+        type=int,
+        help="Keep copies of the last K training batches on the learner and train on them again whenever the learner "
+        "would otherwise wait for new experience (async mode only). This trades environment cost for learner compute. "
+        "Samples older than --max_policy_lag are ignored, consider --with_vtrace=True to correct for the policy lag. "
+        "0 disables experience replay",
+    )
+    p.add_argument(
+        "--experience_replay_ratio",
+        default=1.0,
+        type=float,
+        help="Maximum number of replayed training batches per batch of new experience, can be fractional",
+    )
+    p.add_argument(
+        "--remote_rollout_port",
+        default=0,
+        type=int,
+        help="Listen on this TCP port for remote rollout workers (see sample_factory/remote_rollout.py). "
+        "Remote workers stream trajectories into the learner's trajectory buffers and receive weight updates. "
+        "Requires --async_rl=True and a single policy. There is no authentication, only use on trusted networks. "
+        "0 disables remote rollout workers",
+    )
+    p.add_argument(
+        "--remote_rollout_bind_address",
+        default="0.0.0.0",
+        type=str,
+        help="Network interface to listen on for remote rollout workers",
+    )
+    p.add_argument(
+        "--remote_learner_address",
+        default=None,
+        type=str,
+        help="host:port of the learner, used when running remote rollout workers on another host",
+    )
+    p.add_argument(
+        "--remote_compression_level",
+        default=1,
+        type=int,
+        help="zlib compression level for trajectories sent by remote rollout workers (0 disables compression)",
+    )
+    p.add_argument(
+        "--remote_weights_interval",
+        default=1.0,
+        type=float,
+        help="Minimum interval in seconds between weight updates sent to each remote rollout worker",
+    )
     p.add_argument(
         "--worker_num_splits",
         default=2,
@@ -333,6 +398,17 @@ def add_rl_args(p: ArgumentParser):
         type=float,
         help="Observation preprocessing, divide observation tensors by this scalar (e.g. 128.0 for 8-bit RGB)",
     )
+    p.add_argument(
+        "--fused_obs_normalization",
+        default=False,
+        type=str2bool,
+        help=(
+            "Keep uint8 image observations as uint8 until the encoder and do obs_subtract_mean/obs_scale and "
+            "normalize_input in a single fused multiply-add right before it. Avoids full-size float copies of "
+            "observations in the inference worker and in the learner's buffers. Custom models that override "
+            "forward_head() should call obs_normalizer.normalize_fused() before their encoder"
+        ),
+    )
     p.add_argument(
         "--normalize_input",
         default=True,
@@ -424,6 +500,41 @@ def add_rl_args(p: ArgumentParser):
         type=int,
         help="How many episodes to average to measure performance (avg. reward etc)",
     )
+    p.add_argument(
+        "--stats_percentiles",
+        default="5,50,95",
+        type=str,
+        help="Comma-separated percentiles of episodic stats to write to summaries, estimated with streaming histograms "
+        "over the same window as --stats_avg. Empty string disables percentile summaries",
+    )
+    p.add_argument(
+        "--stats_histograms",
+        default=True,
+        type=str2bool,
+        help="Write distributions of reward, episode length and true objective to Tensorboard histograms",
+    )
+    p.add_argument(
+        "--episodic_stats_sketches",
+        default=False,
+        type=str2bool,
+        help="Rollout workers aggregate episodic stats into mergeable streaming histograms and send a compact summary "
+        "every --episodic_stats_sketch_interval seconds instead of a message per episode. "
+        "Custom episodic stats handlers (register_episodic_stats_handler) do not receive individual episodes in this mode",
+    )
+    p.add_argument(
+        "--episodic_stats_sketch_interval",
+        default=5.0,
+        type=float,
+        help="How often in seconds rollout workers send episodic stats summaries (with --episodic_stats_sketches)",
+    )
+    p.add_argument(
+        "--telemetry_interval",
+        default=10.0,
+        type=float,
+        help="How often in seconds to report telemetry about the training pipeline (policy lag distribution, "
+        "inference queue depth, Batcher backlog, time with experience collection stopped) to telemetry/* summaries "
+        "and telemetry.json in the experiment folder. Set to 0 to disable",
+    )
     p.add_argument(
         "--summaries_use_frameskip",
         default=True,
@@ -488,6 +599,20 @@ def add_rl_args(p: ArgumentParser):
 
     # debugging options
     p.add_argument("--benchmark", default=False, type=str2bool, help="Benchmark mode")
+    p.add_argument(
+        "--trace_events",
+        default=False,
+        type=str2bool,
+        help="Record begin/end timestamps of all Timing blocks in every process and export them as a Chrome/Perfetto "
+        "trace (trace/trace.json in the experiment folder) on shutdown or when the main process receives SIGUSR1. "
+        "Useful to see how rollout workers, inference workers, batcher and learner overlap in time.",
+    )
+    p.add_argument(
+        "--trace_buffer_events",
+        default=200000,
+        type=int,
+        help="Size of the per-process ring buffer for --trace_events. Only the most recent events are kept.",
+    )
 
 
 def add_model_args(p: ArgumentParser):
@@ -674,6 +799,14 @@ def add_eval_args(parser):
     parser.add_argument("--video_name", default=None, type=str, help="Name of video to save")
     parser.add_argument("--max_num_frames", default=1e9, type=int, help="Maximum number of frames for evaluation")
     parser.add_argument("--max_num_episodes", default=1e9, type=int, help="Maximum number of episodes for evaluation")
+    parser.add_argument(
+        "--eval_num_envs",
+        default=1,
+        type=int,
+        help="Number of envs to simulate during evaluation. Observations of all envs are batched into a single "
+        "forward pass of the policy. Only the first env is rendered or recorded, so this is mostly useful with "
+        "--no_render to evaluate a policy on many episodes quickly. max_num_frames is counted per env.",
+    )
 
     parser.add_argument("--push_to_hub", action="store_true", help="Push experiment folder to HuggingFace Hub")
     parser.add_argument(
@@ -718,6 +851,15 @@ def add_eval_args(parser):
         type=str,
         help="Path where the evaluation csv will be stored.",
     )
+    parser.add_argument(
+        "--eval_checkpoints",
+        default=None,
+        type=str,
+        help="Evaluate several checkpoints back to back without restarting the envs. "
+        'Either "all" (all regular, milestone and best checkpoints of all policies in the experiment) '
+        "or a comma-separated list of checkpoint paths or glob patterns (relative to the experiment dir or cwd). "
+        "Results are appended to eval_checkpoints.csv after every checkpoint.",
+    )
 
 
 def add_wandb_args(p: ArgumentParser):
@@ -774,6 +916,13 @@ def add_pbt_args(p: ArgumentParser):
         help="A portion of policies performing worst to be replace by better policies (rounded up)",
     )
     p.add_argument("--pbt_mutation_rate", default=0.15, type=float, help="Probability that a parameter mutates")
+    p.add_argument(
+        "--pbt_shared_memory_weights",
+        default=True,
+        type=str2bool,
+        help="When a policy is replaced, copy weights and optimizer state of the better policy directly through "
+        "shared memory instead of saving and loading a checkpoint file",
+    )
     p.add_argument(
         "--pbt_replace_reward_gap",
         default=0.1,
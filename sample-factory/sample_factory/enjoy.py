@@ -11,7 +11,7 @@ from sample_factory.algo.learning.learner import Learner
 from sample_factory.algo.sampling.batched_sampling import preprocess_actions
 from sample_factory.algo.utils.action_distributions import argmax_actions
 from sample_factory.algo.utils.env_info import extract_env_info
-from sample_factory.algo.utils.make_env import make_env_func_batched
+from sample_factory.algo.utils.make_env import SequentialVectorizeWrapper, make_env_func_batched
 from sample_factory.algo.utils.misc import ExperimentStatus
 from sample_factory.algo.utils.rl_utils import make_dones, prepare_and_normalize_obs
 from sample_factory.algo.utils.tensor_utils import unsqueeze_tensor
@@ -103,14 +103,21 @@ def enjoy(cfg: Config) -> Tuple[StatusCode, float]:
     elif cfg.no_render:
         render_mode = None
 
-    env = make_env_func_batched(
-        cfg, env_config=AttrDict(worker_index=0, vector_index=0, env_id=0), render_mode=render_mode
-    )
-    env_info = extract_env_info(env, cfg)
+    # only the first env is rendered, the rest are simulated headless and batched together with it
+    num_envs = max(cfg.eval_num_envs, 1)
+    envs = []
+    for env_i in range(num_envs):
+        env_config = AttrDict(worker_index=0, vector_index=env_i, env_id=env_i)
+        envs.append(make_env_func_batched(cfg, env_config=env_config, render_mode=render_mode if env_i == 0 else None))
+
+        if hasattr(envs[-1].unwrapped, "reset_on_init"):
+            # reset call ruins the demo recording for VizDoom
+            envs[-1].unwrapped.reset_on_init = False
 
-    if hasattr(env.unwrapped, "reset_on_init"):
-        # reset call ruins the demo recording for VizDoom
-        env.unwrapped.reset_on_init = False
+    env_info = extract_env_info(envs[0], cfg)
+    env = envs[0] if num_envs == 1 else SequentialVectorizeWrapper(envs)
+    # agents of the first (rendered) env come first in the batch
+    rendered_agents = envs[0].num_agents
 
     actor_critic = create_actor_critic(cfg, env.observation_space, env.action_space)
     actor_critic.eval()
@@ -162,6 +169,7 @@ def enjoy(cfg: Config) -> Tuple[StatusCode, float]:
 
     video_frames = []
     num_episodes = 0
+    eval_start = time.time()
 
     with torch.no_grad():
         while not max_frames_reached(num_frames):
@@ -190,7 +198,7 @@ def enjoy(cfg: Config) -> Tuple[StatusCode, float]:
 
                 obs, rew, terminated, truncated, infos = env.step(actions)
                 dones = make_dones(terminated, truncated)
-                infos = [{} for _ in range(env_info.num_agents)] if infos is None else infos
+                infos = [{} for _ in range(env.num_agents)] if infos is None else infos
 
                 if episode_reward is None:
                     episode_reward = rew.float().clone()
@@ -234,9 +242,10 @@ def enjoy(cfg: Config) -> Tuple[StatusCode, float]:
                             reward_list.append(true_objective)
 
                 # if episode terminated synchronously for all agents, pause a bit before starting a new one
-                if all(dones):
+                if all(dones[:rendered_agents]):
                     render_frame(cfg, env, video_frames, num_episodes, last_render_start)
-                    time.sleep(0.05)
+                    if not cfg.no_render:
+                        time.sleep(0.05)
 
                 if all(finished_episode):
                     finished_episode = [False] * env.num_agents
@@ -274,6 +283,12 @@ def enjoy(cfg: Config) -> Tuple[StatusCode, float]:
 
     env.close()
 
+    eval_time = time.time() - eval_start
+    log.info(
+        f"Evaluated {num_episodes} episodes ({num_frames * num_envs} env frames) in {eval_time:.1f} sec "
+        f"with {num_envs} env(s)"
+    )
+
     if cfg.save_video:
         if cfg.fps > 0:
             fps = cfg.fps
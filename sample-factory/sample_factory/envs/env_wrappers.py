@@ -3,8 +3,8 @@ Gym env wrappers that make the environment suitable for the RL algorithms.
 
 """
 
-import json
-import os
+import random
+import time
 from os.path import join
 from typing import Any, Dict, Tuple, Union
 
@@ -14,7 +14,7 @@ import numpy as np
 from gymnasium import ObservationWrapper, RewardWrapper, spaces
 
 from sample_factory.envs.env_utils import num_env_steps
-from sample_factory.utils.utils import ensure_dir_exists, log
+from sample_factory.envs.episode_recorder import AsyncEpisodeWriter, EpisodeChunkBuffer
 
 
 def has_image_observations(observation_space):
@@ -192,69 +192,75 @@ class PixelFormatChwWrapper(ObservationWrapper):
 
 
 class RecordingWrapper(gym.core.Wrapper):
-    def __init__(self, env, record_to, player_id):
+    """
+    Records observations, actions and rewards of every episode into record_to/ep_XXX_pY.
+    Compression and disk IO happen in a background process (see episode_recorder.py), the env process only copies
+    frames into a preallocated chunk buffer and blocks only if the writer falls behind by more than max_buffered_mb.
+    """
+
+    def __init__(self, env, record_to, player_id, chunk_len=256, max_buffered_mb=512):
         super().__init__(env)
 
         self._record_to = record_to
         self._episode_recording_dir = None
         self._record_id = 0
-        self._frame_id = 0
         self._player_id = player_id
         self._recorded_episode_reward = 0
         self._recorded_episode_shaping_reward = 0
 
-        self._recorded_actions = []
+        self._writer = AsyncEpisodeWriter(max_buffered_bytes=int(max_buffered_mb * 1024 * 1024))
+        self._chunks = EpisodeChunkBuffer(self._writer, chunk_len)
 
         # Experimental! Recording Doom replay. Does not work in all scenarios, e.g. when there are in-game bots.
         self.unwrapped.record_to = record_to
 
+    def _finish_episode(self):
+        if self._episode_recording_dir is None or self._chunks.num_frames == 0:
+            return
+
+        self._chunks.flush()
+
+        reward = self._recorded_episode_reward + self._recorded_episode_shaping_reward
+        final_dir = self._episode_recording_dir + f"_r{reward:.2f}"
+        meta = dict(
+            num_frames=self._chunks.num_frames,
+            reward=float(reward),
+            shaping_reward=float(self._recorded_episode_shaping_reward),
+            player_id=self._player_id,
+        )
+        self._writer.finish_episode(self._episode_recording_dir, final_dir, meta)
+        self._episode_recording_dir = None
+
     def reset(self, **kwargs):
-        if self._episode_recording_dir is not None and self._record_id > 0:
-            # save actions to text file
-            with open(join(self._episode_recording_dir, "actions.json"), "w") as actions_file:
-                json.dump(self._recorded_actions, actions_file)
-
-            # rename previous episode dir
-            reward = self._recorded_episode_reward + self._recorded_episode_shaping_reward
-            new_dir_name = self._episode_recording_dir + f"_r{reward:.2f}"
-            os.rename(self._episode_recording_dir, new_dir_name)
-            log.info(
-                "Finished recording %s (rew %.3f, shaping %.3f)",
-                new_dir_name,
-                reward,
-                self._recorded_episode_shaping_reward,
-            )
+        self._writer.start()
+        self._finish_episode()
 
         dir_name = f"ep_{self._record_id:03d}_p{self._player_id}"
         self._episode_recording_dir = join(self._record_to, dir_name)
-        ensure_dir_exists(self._episode_recording_dir)
+        self._chunks.start_episode(self._episode_recording_dir)
 
         self._record_id += 1
-        self._frame_id = 0
         self._recorded_episode_reward = 0
         self._recorded_episode_shaping_reward = 0
 
-        self._recorded_actions = []
-
         return self.env.reset(**kwargs)
 
-    def _record(self, img):
-        frame_name = f"{self._frame_id:05d}.png"
-        img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-        cv2.imwrite(join(self._episode_recording_dir, frame_name), img)
-        self._frame_id += 1
-
-    def step(self, action):
-        observation, reward, terminated, truncated, info = self.env.step(action)
-
+    @staticmethod
+    def _action_to_record(action):
         if isinstance(action, np.ndarray):
-            self._recorded_actions.append(action.tolist())
+            return action.tolist()
         elif np.issubdtype(type(action), np.integer):
-            self._recorded_actions.append(int(action))
+            return int(action)
         else:
-            self._recorded_actions.append(action)
+            return action
+
+    def _record(self, img, action, reward):
+        self._chunks.add(img, self._action_to_record(action), reward)
+
+    def step(self, action):
+        observation, reward, terminated, truncated, info = self.env.step(action)
 
-        self._record(observation)
+        self._record(observation, action, reward)
         self._recorded_episode_reward += reward
         if hasattr(self.env.unwrapped, "_total_shaping_reward"):
             # noinspection PyProtectedMember
@@ -262,6 +268,11 @@ class RecordingWrapper(gym.core.Wrapper):
 
         return observation, reward, terminated, truncated, info
 
+    def close(self):
+        self._finish_episode()
+        self._writer.stop()
+        return self.env.close()
+
 
 GymObs = Union[Tuple, Dict[str, Any], np.ndarray, int]
 GymStepReturn = Tuple[GymObs, float, bool, bool, Dict]
@@ -437,12 +448,25 @@ class NumpyObsWrapper(gym.ObservationWrapper):
         return np.array(observation)
 
 
+# bookkeeping stats reported by EpisodeCounterWrapper, they identify the env and when the episode started
+ENV_UID_KEY = "env_uid"
+EPISODE_START_TIME_KEY = "episode_start_time"
+# not actual episode stats, training summaries and stats averages skip them
+EPISODE_BOOKKEEPING_KEYS = (ENV_UID_KEY, EPISODE_START_TIME_KEY)
+
+
 class EpisodeCounterWrapper(gym.Wrapper):
     def __init__(self, env):
         gym.Wrapper.__init__(self, env)
         self.episode_count = 0
 
+        # lets evaluation tell episodes of different envs apart, i.e. to take first N episodes of every env
+        # (fits into a float64 mantissa, so it survives conversion of stats to numpy arrays)
+        self.env_uid = random.getrandbits(52)
+        self.episode_start_time = time.time()
+
     def reset(self, **kwargs) -> Tuple[GymObs, Dict]:
+        self.episode_start_time = time.time()
         return self.env.reset(**kwargs)
 
     def step(self, action: int) -> GymStepReturn:
@@ -451,7 +475,11 @@ class EpisodeCounterWrapper(gym.Wrapper):
         if terminated | truncated:
             extra_stats = info.get("episode_extra_stats", {})
             extra_stats["episode_number"] = self.episode_count
+            extra_stats[ENV_UID_KEY] = self.env_uid
+            extra_stats[EPISODE_START_TIME_KEY] = self.episode_start_time
             info["episode_extra_stats"] = extra_stats
             self.episode_count += 1
+            # envs are auto-reset after the end of the episode
+            self.episode_start_time = time.time()
 
         return obs, reward, terminated, truncated, info
@@ -0,0 +1,229 @@
+"""
+Asynchronous episode recorder.
+
+Frames, actions and rewards are accumulated in a preallocated chunk buffer on the env side and shipped to a
+background writer process which compresses them into chunk_XXXX.npz files. The queue between the env and the writer
+is bounded by a memory budget, so if the writer cannot keep up the env process blocks (back-pressure) instead of
+accumulating an unbounded number of frames in memory.
+
+Recordings can be read back with load_episode_recording().
+
+"""
+
+import json
+import multiprocessing
+import os
+from os.path import join
+from queue import Empty, Full
+from typing import Any, Dict, List, Optional
+
+import faster_fifo
+import numpy as np
+
+from sample_factory.utils.utils import ensure_dir_exists, log
+
+CHUNK_FILE_PREFIX = "chunk_"
+EPISODE_META_FILE = "meta.json"
+
+
+class RecorderMsg:
+    CHUNK, FINISH_EPISODE, STOP = range(3)
+
+
+def _write_chunk(episode_dir: str, chunk_idx: int, frames: np.ndarray, actions: List, rewards: np.ndarray) -> None:
+    ensure_dir_exists(episode_dir)
+    chunk_path = join(episode_dir, f"{CHUNK_FILE_PREFIX}{chunk_idx:04d}.npz")
+
+    actions = np.asarray(actions)
+    np.savez_compressed(chunk_path, frames=frames, actions=actions, rewards=rewards)
+
+
+def _finish_episode(episode_dir: str, final_dir: str, meta: Dict[str, Any]) -> None:
+    ensure_dir_exists(episode_dir)
+    with open(join(episode_dir, EPISODE_META_FILE), "w") as meta_file:
+        json.dump(meta, meta_file)
+
+    if final_dir != episode_dir:
+        os.rename(episode_dir, final_dir)
+
+    log.info(
+        "Finished recording %s (%d frames, rew %.3f, shaping %.3f)",
+        final_dir,
+        meta["num_frames"],
+        meta["reward"],
+        meta["shaping_reward"],
+    )
+
+
+def recorder_process_loop(queue: faster_fifo.Queue, parent_pid: int) -> None:
+    while True:
+        try:
+            msgs = queue.get_many(timeout=1.0)
+        except Empty:
+            # everything the env sent is written, exit if nobody is left to send the rest (or STOP)
+            if os.getppid() != parent_pid:
+                log.warning("Env process %d is gone, episode recorder process is exiting", parent_pid)
+                return
+            continue
+
+        for msg in msgs:
+            msg_type = msg[0]
+            if msg_type == RecorderMsg.CHUNK:
+                _write_chunk(*msg[1:])
+            elif msg_type == RecorderMsg.FINISH_EPISODE:
+                _finish_episode(*msg[1:])
+            elif msg_type == RecorderMsg.STOP:
+                return
+            else:
+                raise RuntimeError(f"Unknown recorder message {msg_type}")
+
+
+class AsyncEpisodeWriter:
+    """Owns the background writer process and the size-limited queue that feeds it."""
+
+    def __init__(self, max_buffered_bytes: int):
+        self.max_buffered_bytes = max_buffered_bytes
+        self._queue: Optional[faster_fifo.Queue] = None
+        self._process: Optional[multiprocessing.Process] = None
+        self._warned_about_backpressure = False
+
+    def start(self) -> None:
+        if self._process is not None:
+            return
+
+        ctx = multiprocessing.get_context("spawn")
+        self._queue = faster_fifo.Queue(max_size_bytes=self.max_buffered_bytes)
+        self._process = ctx.Process(target=recorder_process_loop, args=(self._queue, os.getpid()), daemon=False)
+        self._process.start()
+
+    def _put(self, msg) -> None:
+        assert self._process is not None, "Writer process is not started"
+
+        try:
+            self._queue.put(msg, block=False)
+            return
+        except Full:
+            pass
+
+        if not self._warned_about_backpressure:
+            log.warning("Episode recorder cannot keep up with the env, env process will wait for the writer")
+            self._warned_about_backpressure = True
+
+        while True:
+            try:
+                self._queue.put(msg, block=True, timeout=1.0)
+                return
+            except Full:
+                if not self._process.is_alive():
+                    raise RuntimeError("Episode recorder process is dead, cannot record any more frames")
+
+    def write_chunk(self, episode_dir: str, chunk_idx: int, frames: np.ndarray, actions: List, rewards: np.ndarray):
+        self._put((RecorderMsg.CHUNK, episode_dir, chunk_idx, frames, actions, rewards))
+
+    def finish_episode(self, episode_dir: str, final_dir: str, meta: Dict[str, Any]) -> None:
+        self._put((RecorderMsg.FINISH_EPISODE, episode_dir, final_dir, meta))
+
+    def stop(self) -> None:
+        if self._process is None:
+            return
+
+        self._put((RecorderMsg.STOP,))
+        self._process.join()
+        self._process = None
+        self._queue = None
+
+
+class EpisodeChunkBuffer:
+    """
+    Accumulates frames of the current episode in a preallocated array and flushes them to the writer in chunks.
+    Only one chunk is kept on the env side, everything else is in the size-limited writer queue.
+    """
+
+    def __init__(self, writer: AsyncEpisodeWriter, chunk_len: int):
+        self.writer = writer
+        self.requested_chunk_len = chunk_len
+        self.chunk_len = chunk_len
+
+        self.frames: Optional[np.ndarray] = None
+        self.rewards: Optional[np.ndarray] = None
+        self.actions: List = []
+        self.num_buffered = 0
+
+        self.episode_dir: Optional[str] = None
+        self.chunk_idx = 0
+        self.num_frames = 0
+
+    def _allocate(self, frame: np.ndarray) -> None:
+        frame_bytes = max(frame.nbytes, 1)
+        # a single chunk must fit into the writer queue with some headroom for actions, rewards and pickling overhead
+        max_chunk_len = max(1, self.writer.max_buffered_bytes // (2 * frame_bytes))
+        if self.requested_chunk_len > max_chunk_len:
+            log.warning(
+                "Recording chunk of %d frames does not fit into the memory budget, using %d frames per chunk",
+                self.requested_chunk_len,
+                max_chunk_len,
+            )
+        self.chunk_len = min(self.requested_chunk_len, max_chunk_len)
+
+        self.frames = np.empty((self.chunk_len,) + frame.shape, dtype=frame.dtype)
+        self.rewards = np.empty(self.chunk_len, dtype=np.float32)
+
+    def start_episode(self, episode_dir: str) -> None:
+        self.episode_dir = episode_dir
+        self.chunk_idx = 0
+        self.num_frames = 0
+        self.num_buffered = 0
+        self.actions = []
+
+    def add(self, frame: np.ndarray, action: Any, reward: float) -> None:
+        if self.frames is None or self.frames.shape[1:] != frame.shape or self.frames.dtype != frame.dtype:
+            self.flush()
+            self._allocate(frame)
+
+        self.frames[self.num_buffered] = frame
+        self.rewards[self.num_buffered] = reward
+        self.actions.append(action)
+        self.num_buffered += 1
+        self.num_frames += 1
+
+        if self.num_buffered >= self.chunk_len:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.num_buffered == 0:
+            return
+
+        n = self.num_buffered
+        # faster_fifo pickles the message synchronously during put(), so it is safe to reuse the buffer right away
+        self.writer.write_chunk(self.episode_dir, self.chunk_idx, self.frames[:n], self.actions, self.rewards[:n])
+        self.chunk_idx += 1
+        self.num_buffered = 0
+        self.actions = []
+
+
+def _chunk_files(episode_dir: str) -> List[str]:
+    files = [f for f in os.listdir(episode_dir) if f.startswith(CHUNK_FILE_PREFIX) and f.endswith(".npz")]
+    return sorted(files)
+
+
+def load_episode_recording(episode_dir: str) -> Dict[str, Any]:
+    """Read an episode written by the async recorder back into memory."""
+    frames, actions, rewards = [], [], []
+    for chunk_file in _chunk_files(episode_dir):
+        with np.load(join(episode_dir, chunk_file), allow_pickle=True) as chunk:
+            frames.append(chunk["frames"])
+            actions.append(chunk["actions"])
+            rewards.append(chunk["rewards"])
+
+    recording = dict(
+        frames=np.concatenate(frames) if frames else np.empty(0),
+        actions=np.concatenate(actions) if actions else np.empty(0),
+        rewards=np.concatenate(rewards) if rewards else np.empty(0, dtype=np.float32),
+    )
+
+    meta_path = join(episode_dir, EPISODE_META_FILE)
+    if os.path.isfile(meta_path):
+        with open(meta_path, "r") as meta_file:
+            recording["meta"] = json.load(meta_file)
+
+    return recording
@@ -1,18 +1,27 @@
+import csv
+import glob
 import json
+import os
 import time
 from collections import deque
+from os.path import isabs, join
 from pathlib import Path
-from typing import Deque
+from typing import Deque, Dict, List
 
 import numpy as np
 import pandas as pd
 from signal_slot.signal_slot import StatusCode
 
+from sample_factory.algo.learning.learner import Learner
 from sample_factory.algo.sampling.evaluation_sampling_api import EvalSamplingAPI
 from sample_factory.algo.utils.env_info import EnvInfo, obtain_env_info_in_a_separate_process
+from sample_factory.algo.utils.misc import ExperimentStatus
 from sample_factory.utils.typing import Config
 from sample_factory.utils.utils import experiment_dir, log
 
+# per-episode stats summarized in eval_checkpoints.csv
+CHECKPOINT_SUMMARY_KEYS = ("reward", "len", "true_objective")
+
 
 def _print_fps_stats(cfg: Config, fps_stats: Deque):
     episodes_sampled = fps_stats[-1][1]
@@ -58,48 +67,55 @@ def _print_eval_summaries(cfg, eval_stats):
         log.info(json.dumps(results, indent=4))
 
 
+def _csv_output_dir(cfg) -> Path:
+    csv_output_dir = Path(experiment_dir(cfg=cfg))
+    if cfg.csv_folder_name is not None:
+        csv_output_dir = csv_output_dir / cfg.csv_folder_name
+    csv_output_dir.mkdir(exist_ok=True, parents=True)
+    return csv_output_dir
+
+
 def _save_eval_results(cfg, eval_stats):
     for policy_id in range(cfg.num_policies):
         data = {}
         for key, stat in eval_stats.items():
             data[key] = stat[policy_id]
 
-        csv_output_dir = Path(experiment_dir(cfg=cfg))
-        if cfg.csv_folder_name is not None:
-            csv_output_dir = csv_output_dir / cfg.csv_folder_name
-        csv_output_dir.mkdir(exist_ok=True, parents=True)
-        csv_output_path = csv_output_dir / f"eval_p{policy_id}.csv"
+        csv_output_path = _csv_output_dir(cfg) / f"eval_p{policy_id}.csv"
 
         data = pd.DataFrame(data)
         data.to_csv(csv_output_path)
 
 
-def generate_trajectories(cfg: Config, env_info: EnvInfo, sample_env_episodes: int = 1024) -> StatusCode:
-    sampler = EvalSamplingAPI(cfg, env_info)
-    sampler.init()
-    sampler.start()
-
+def _wait_for_episodes(cfg: Config, sampler: EvalSamplingAPI, sample_env_episodes: int) -> bool:
+    """Returns False if interrupted."""
     print_interval_sec = 1.0
     fps_stats = deque([(time.time(), 0, 0)], maxlen=10)
-    episodes_sampled = 0
-    last_print = time.time()
 
-    while episodes_sampled < sample_env_episodes:
+    # for now we only look at the first policy
+    policy_id = 0
+
+    while True:
         try:
-            if time.time() - last_print > print_interval_sec:
-                # for now we only look at the first policy
-                policy_id = 0
-                episodes_sampled = len(sampler.eval_episodes[policy_id])
-                env_steps_sampled = sampler.total_samples
+            # wakes up as soon as enough episodes are collected, otherwise once in a while to report progress
+            episodes_sampled = sampler.wait_for_episodes(policy_id, sample_env_episodes, timeout=print_interval_sec)
+            if episodes_sampled >= sample_env_episodes:
+                return True
+
+            fps_stats.append((time.time(), episodes_sampled, sampler.total_samples))
+            _print_fps_stats(cfg, fps_stats)
+            log.info(f"Progress: {episodes_sampled}/{sample_env_episodes} episodes sampled")
+        except KeyboardInterrupt:
+            log.info(f"KeyboardInterrupt in {_wait_for_episodes.__name__}()")
+            return False
 
-                fps_stats.append((time.time(), episodes_sampled, env_steps_sampled))
-                _print_fps_stats(cfg, fps_stats)
-                last_print = time.time()
 
-                log.info(f"Progress: {episodes_sampled}/{sample_env_episodes} episodes sampled")
-        except KeyboardInterrupt:
-            log.info(f"KeyboardInterrupt in {generate_trajectories.__name__}()")
-            break
+def generate_trajectories(cfg: Config, env_info: EnvInfo, sample_env_episodes: int = 1024) -> StatusCode:
+    sampler = EvalSamplingAPI(cfg, env_info)
+    sampler.init()
+    sampler.start()
+
+    _wait_for_episodes(cfg, sampler, sample_env_episodes)
 
     status = sampler.stop()
 
@@ -110,10 +126,106 @@ def generate_trajectories(cfg: Config, env_info: EnvInfo, sample_env_episodes: i
     return status
 
 
+def find_eval_checkpoints(cfg: Config, num_policies: int) -> List[str]:
+    """Resolves --eval_checkpoints into a list of checkpoint paths."""
+    if cfg.eval_checkpoints == "all":
+        checkpoints = []
+        for policy_id in range(num_policies):
+            checkpoint_dir = Learner.checkpoint_dir(cfg, policy_id)
+            checkpoints.extend(Learner.get_checkpoints(checkpoint_dir, "checkpoint_*"))
+            checkpoints.extend(Learner.get_checkpoints(join(checkpoint_dir, "milestones"), "checkpoint_*"))
+            checkpoints.extend(Learner.get_checkpoints(checkpoint_dir, "best_*"))
+        return checkpoints
+
+    checkpoints = []
+    for pattern in cfg.eval_checkpoints.split(","):
+        pattern = pattern.strip()
+        if not pattern:
+            continue
+        paths = sorted(glob.glob(pattern))
+        if not paths and not isabs(pattern):
+            paths = sorted(glob.glob(join(experiment_dir(cfg=cfg), pattern)))
+        if not paths:
+            raise FileNotFoundError(f"No checkpoints match {pattern!r}")
+        checkpoints.extend(paths)
+    return checkpoints
+
+
+def _checkpoint_summary(checkpoint: str, checkpoint_dict: Dict, eval_stats: Dict, policy_id: int) -> Dict:
+    summary = dict(
+        checkpoint=checkpoint,
+        train_step=checkpoint_dict.get("train_step"),
+        env_steps=checkpoint_dict.get("env_steps"),
+        episodes=len(eval_stats.get("len", [[]])[policy_id]),
+    )
+    for key in CHECKPOINT_SUMMARY_KEYS:
+        values = eval_stats.get(key, [[]])[policy_id]
+        if len(values) > 0:
+            summary[f"{key}_mean"] = float(np.mean(values))
+            summary[f"{key}_std"] = float(np.std(values))
+            summary[f"{key}_min"] = float(np.min(values))
+            summary[f"{key}_max"] = float(np.max(values))
+    return summary
+
+
+def evaluate_checkpoints(
+    cfg: Config, env_info: EnvInfo, checkpoints: List[str], sample_env_episodes: int = 1024
+) -> StatusCode:
+    """
+    Evaluates checkpoints one after another. Envs (and workers) are created once and keep running, only the
+    policy weights are replaced. A summary row is appended to eval_checkpoints.csv as soon as a checkpoint
+    is evaluated, so partial results survive an interrupted evaluation.
+    """
+    policy_id = 0
+    sampler = EvalSamplingAPI(cfg, env_info)
+    sampler.init()
+    sampler.start()
+
+    csv_output_path = _csv_output_dir(cfg) / "eval_checkpoints.csv"
+    fieldnames = ["checkpoint", "train_step", "env_steps", "episodes"]
+    fieldnames += [f"{key}_{stat}" for key in CHECKPOINT_SUMMARY_KEYS for stat in ("mean", "std", "min", "max")]
+
+    interrupted = False
+    with open(csv_output_path, "w", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+        writer.writeheader()
+
+        for i, checkpoint in enumerate(checkpoints):
+            log.info(f"Evaluating checkpoint {i + 1}/{len(checkpoints)}: {checkpoint}")
+            checkpoint_dict = sampler.load_checkpoint(policy_id, checkpoint)
+
+            if not _wait_for_episodes(cfg, sampler, sample_env_episodes):
+                interrupted = True
+                break
+
+            summary = _checkpoint_summary(checkpoint, checkpoint_dict, sampler.eval_stats, policy_id)
+            log.info(json.dumps(summary, indent=4))
+            writer.writerow(summary)
+            csv_file.flush()
+            os.fsync(csv_file.fileno())
+
+    status = sampler.stop()
+    log.info(f"Evaluation results saved to {csv_output_path}")
+    return ExperimentStatus.INTERRUPTED if interrupted else status
+
+
 def do_eval(cfg: Config) -> StatusCode:
     # should always be set to True for this script
     cfg.episode_counter = True
     # decorrelation isn't needed in eval, it only slows us down
     cfg.decorrelate_envs_on_one_worker = False
+
+    if cfg.eval_checkpoints:
+        checkpoints = find_eval_checkpoints(cfg, cfg.num_policies)
+        if not checkpoints:
+            log.error(f"No checkpoints found for {cfg.eval_checkpoints=}")
+            return ExperimentStatus.FAILURE
+
+        # checkpoints are evaluated one by one by the same policy slot
+        cfg.num_policies = 1
+        cfg.with_pbt = False
+        env_info = obtain_env_info_in_a_separate_process(cfg)
+        return evaluate_checkpoints(cfg, env_info, checkpoints, cfg.sample_env_episodes)
+
     env_info = obtain_env_info_in_a_separate_process(cfg)
     return generate_trajectories(cfg, env_info, cfg.sample_env_episodes)
@@ -87,15 +87,19 @@ class ParamGrid(ParamGenerator):
 
 
 class Experiment:
-    def __init__(self, name, cmd, param_generator=(), env_vars=None):
+    def __init__(self, name, cmd, param_generator=(), env_vars=None, cpus=None, memory_gb=None):
         """
         :param cmd: base command to append the parameters to
         :param param_generator: iterable of parameter dicts
+        :param cpus: CPU cores required by each run of this experiment (overrides --cpus_per_experiment)
+        :param memory_gb: memory required by each run of this experiment (overrides --memory_gb_per_experiment)
         """
         self.base_name = name
         self.cmd = cmd
         self.params = list(param_generator)
         self.env_vars = env_vars
+        self.cpus = cpus
+        self.memory_gb = memory_gb
 
     def generate_experiments(self, experiment_arg_name, customize_experiment_name, param_prefix):
         """Yields tuples of (cmd, experiment_name)"""
@@ -172,7 +176,12 @@ class RunDescription:
         self.param_prefix = param_prefix
 
     def generate_experiments(self, train_dir, makedirs=True):
-        """Yields tuples (final cmd for experiment, experiment_name, root_dir)."""
+        """Yields tuples (final cmd for experiment, experiment_name, root_dir, env_vars)."""
+        for experiment, experiment_cmd, experiment_name, root_dir in self.generate_experiment_runs(train_dir, makedirs):
+            yield experiment_cmd, experiment_name, root_dir, experiment.env_vars
+
+    def generate_experiment_runs(self, train_dir, makedirs=True):
+        """Yields tuples (Experiment object, final cmd for experiment, experiment_name, root_dir)."""
         for experiment in self.experiments:
             root_dir = join(self.run_name, f"{experiment.base_name}_{self.experiment_suffix}")
 
@@ -184,4 +193,4 @@ class RunDescription:
                 if makedirs:
                     os.makedirs(experiment_dir, exist_ok=True)
                 experiment_cmd += f" {self.experiment_dir_arg_name}={experiment_dir}"
-                yield experiment_cmd, experiment_name, root_dir, experiment.env_vars
+                yield experiment, experiment_cmd, experiment_name, root_dir
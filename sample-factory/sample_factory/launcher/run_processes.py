@@ -2,13 +2,25 @@
 
 import argparse
 import os
+import signal
 import subprocess
 import sys
 import time
 from os.path import join
 
+from sample_factory.launcher.scheduling import (
+    AsyncSuccessiveHalving,
+    ResourcePool,
+    SummaryMonitor,
+    available_cores,
+    pin_to_cores,
+    total_memory_gb,
+)
 from sample_factory.utils.utils import ensure_dir_exists, log
 
+# pruned experiments get this much time to shut down gracefully (i.e. save a checkpoint) before they are killed
+PRUNE_GRACE_PERIOD_SEC = 60
+
 
 def add_os_parallelism_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
     parser.add_argument("--num_gpus", default=1, type=int, help="How many local GPUs to use")
@@ -24,6 +36,50 @@ def add_os_parallelism_args(parser: argparse.ArgumentParser) -> argparse.Argumen
         "This will allow your experiments to use all GPUs available (as many as --num_gpu allows)"
         "Helpful when e.g. you are running a single big PBT experiment.",
     )
+    parser.add_argument(
+        "--cpus_per_experiment",
+        default=0,
+        type=int,
+        help="CPU cores required by each experiment (Experiment(cpus=...) overrides this per experiment). "
+        "If specified, experiments are packed onto the available cores and every experiment is pinned to its own "
+        "core set (rollout workers are pinned within this set with --set_workers_cpu_affinity). "
+        "Default (0) means no CPU-aware scheduling.",
+    )
+    parser.add_argument(
+        "--memory_gb_per_experiment",
+        default=0.0,
+        type=float,
+        help="RAM required by each experiment (Experiment(memory_gb=...) overrides this per experiment). "
+        "Experiments are only started if their declared memory fits into the total RAM of the machine.",
+    )
+    parser.add_argument(
+        "--asha_min_env_steps",
+        default=0,
+        type=int,
+        help="Enables early stopping of underperforming experiments with asynchronous successive halving (ASHA). "
+        "This is the first rung milestone in env steps, next ones are multiplied by --asha_reduction_factor. "
+        "Default (0) disables early stopping.",
+    )
+    parser.add_argument(
+        "--asha_reduction_factor",
+        default=3.0,
+        type=float,
+        help="Only the top 1/asha_reduction_factor experiments at each rung continue training",
+    )
+    parser.add_argument("--asha_num_rungs", default=4, type=int, help="Number of ASHA rungs (milestones)")
+    parser.add_argument(
+        "--asha_metric",
+        default="reward/reward",
+        type=str,
+        help="Summary scalar (of policy 0) to compare experiments by, higher is better. "
+        "I.e. use policy_stats/avg_true_objective if your env reports a true objective",
+    )
+    parser.add_argument(
+        "--monitor_interval",
+        default=30.0,
+        type=float,
+        help="How often (in seconds) to check experiments' summaries for early stopping",
+    )
     return parser
 
 
@@ -38,9 +94,24 @@ def run(run_description, args):
     processes = []
     processes_per_gpu = {g: [] for g in range(args.num_gpus)}
 
-    experiments = run_description.generate_experiments(args.train_dir)
+    experiments = run_description.generate_experiment_runs(args.train_dir)
     next_experiment = next(experiments, None)
 
+    resources = None
+    if args.cpus_per_experiment > 0 or args.memory_gb_per_experiment > 0:
+        resources = ResourcePool(available_cores(), total_memory_gb())
+        log.info("Scheduling experiments on %d CPU cores, %.1f GB RAM", len(resources.cores), resources.memory_gb)
+
+    asha = None
+    if args.asha_min_env_steps > 0:
+        asha = AsyncSuccessiveHalving(args.asha_min_env_steps, args.asha_reduction_factor, args.asha_num_rungs)
+        log.info("Early stopping with ASHA, rungs at %r env steps", sorted(m for m, _ in asha.rungs))
+
+    def experiment_resources(experiment):
+        cpus = args.cpus_per_experiment if experiment.cpus is None else experiment.cpus
+        memory_gb = args.memory_gb_per_experiment if experiment.memory_gb is None else experiment.memory_gb
+        return cpus, memory_gb
+
     def find_least_busy_gpu():
         least_busy_gpu = None
         gpu_available_processes = 0
@@ -62,15 +133,38 @@ def run(run_description, args):
             if gpu_available_processes <= 0:
                 return False
 
+        if resources is not None and next_experiment is not None:
+            if not resources.can_allocate(*experiment_resources(next_experiment[0])):
+                return False
+
         return True
 
+    def check_summaries():
+        for process in processes:
+            if process.pruned_at is not None:
+                continue
+
+            latest = process.summary_monitor.latest()
+            if latest is None:
+                continue
+
+            env_steps, metric = latest
+            if asha.on_result(process.run_id, env_steps, metric):
+                log.info("Stopping underperforming experiment %s (PID: %d)", process.experiment_name, process.pid)
+                process.send_signal(signal.SIGINT)
+                process.pruned_at = time.time()
+                pruned_processes.append(process.run_id)
+
     failed_processes = []
+    pruned_processes = []
     last_log_time = 0
     log_interval = 3  # seconds
+    last_monitor_time = time.time()
 
     while len(processes) > 0 or next_experiment is not None:
         while can_squeeze_another_process() and next_experiment is not None:
-            cmd, name, root_dir, exp_env_vars = next_experiment
+            experiment, cmd, name, root_dir = next_experiment
+            exp_env_vars = experiment.env_vars
 
             cmd_tokens = cmd.split(" ")
 
@@ -93,6 +187,11 @@ def run(run_description, args):
                 )
                 envvars["CUDA_VISIBLE_DEVICES"] = f"{best_gpu}"
 
+            cores, memory_gb = [], 0.0
+            if resources is not None:
+                # no cores are assigned (and the process is not pinned) if the experiment did not declare its CPU needs
+                cores, memory_gb = resources.allocate(*experiment_resources(experiment))
+
             log.info("Starting process %r", cmd_tokens)
 
             if exp_env_vars is not None:
@@ -100,16 +199,24 @@ def run(run_description, args):
                     log.info("Adding env variable %r %r", key, value)
                     envvars[str(key)] = str(value)
 
-            process = subprocess.Popen(cmd_tokens, stdout=None, stderr=None, env=envvars)
+            process = subprocess.Popen(
+                cmd_tokens, stdout=None, stderr=None, env=envvars, preexec_fn=pin_to_cores(cores)
+            )
             process.gpu_id = best_gpu
             process.proc_cmd = cmd
+            process.experiment_name = name
+            process.run_id = join(root_dir, name)
+            process.cores = cores
+            process.memory_gb = memory_gb
+            process.pruned_at = None
+            process.summary_monitor = SummaryMonitor(join(args.train_dir, root_dir, name), args.asha_metric)
 
             processes.append(process)
 
             if process.gpu_id is not None:
                 processes_per_gpu[process.gpu_id].append(process.proc_cmd)
 
-            log.info("Started process %s on GPU %r", process.proc_cmd, process.gpu_id)
+            log.info("Started process %s on GPU %r, CPU cores %r", process.proc_cmd, process.gpu_id, process.cores)
             log.info("Waiting for %d seconds before starting next process", args.pause_between)
             time.sleep(args.pause_between)
 
@@ -118,18 +225,27 @@ def run(run_description, args):
         remaining_processes = []
         for process in processes:
             if process.poll() is None:
+                if process.pruned_at is not None and time.time() - process.pruned_at > PRUNE_GRACE_PERIOD_SEC:
+                    log.warning("Process %r did not stop after SIGINT, killing it", process.proc_cmd)
+                    process.kill()
                 remaining_processes.append(process)
                 continue
             else:
                 if process.gpu_id is not None:
                     processes_per_gpu[process.gpu_id].remove(process.proc_cmd)
+                if resources is not None:
+                    resources.release(process.cores, process.memory_gb)
                 log.info("Process %r finished with code %r", process.proc_cmd, process.returncode)
-                if process.returncode != 0:
+                if process.returncode != 0 and process.pruned_at is None:
                     failed_processes.append((process.proc_cmd, process.pid, process.returncode))
                     log.error("WARNING: RETURN CODE IS %r", process.returncode)
 
         processes = remaining_processes
 
+        if asha is not None and time.time() - last_monitor_time > args.monitor_interval:
+            check_summaries()
+            last_monitor_time = time.time()
+
         if time.time() - last_log_time > log_interval:
             if failed_processes:
                 log.error("Failed processes: %s", ", ".join([f"PID: {p[1]} code: {p[2]}" for p in failed_processes]))
@@ -137,6 +253,9 @@ def run(run_description, args):
 
         time.sleep(0.1)
 
+    if asha is not None:
+        log.info("Stopped %d underperforming experiments: %r", len(pruned_processes), pruned_processes)
+
     log.info("Done!")
 
     return 0
@@ -0,0 +1,144 @@
+"""
+Resource-aware scheduling and early stopping for the local (processes) launcher backend.
+
+ResourcePool packs experiments onto the machine by their declared CPU core and memory requirements. Each experiment
+is pinned to its own set of cores, and with --set_workers_cpu_affinity (default) Sample Factory rollout workers
+are further pinned to cores within this set, so concurrent experiments don't compete for the same cores.
+
+AsyncSuccessiveHalving implements the stopping variant of ASHA (https://arxiv.org/abs/1810.05934): when a run reaches
+a rung milestone (in env steps) its metric is compared to all runs that previously reached the same rung, and
+the run is stopped unless it is in the top 1/reduction_factor. Resources of stopped runs go to the next
+configurations in the queue.
+
+"""
+
+from __future__ import annotations
+
+import os
+from os.path import isdir, join
+from sys import platform
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import psutil
+from tensorboard.backend.event_processing.event_accumulator import EventAccumulator
+
+from sample_factory.utils.utils import log
+
+
+def available_cores() -> List[int]:
+    if platform == "darwin":
+        return list(range(psutil.cpu_count()))
+    return sorted(psutil.Process().cpu_affinity())
+
+
+def total_memory_gb() -> float:
+    return psutil.virtual_memory().total / (1 << 30)
+
+
+class ResourcePool:
+    def __init__(self, cores: List[int], memory_gb: float):
+        self.cores = list(cores)
+        self.memory_gb = memory_gb
+
+        self.free_cores: List[int] = list(cores)
+        self.free_memory_gb = memory_gb
+
+    def _clamp(self, num_cores: int, memory_gb: float) -> Tuple[int, float]:
+        # experiments that don't fit even on an empty machine are scheduled alone, otherwise we would wait forever
+        return min(num_cores, len(self.cores)), min(memory_gb, self.memory_gb)
+
+    def can_allocate(self, num_cores: int, memory_gb: float) -> bool:
+        num_cores, memory_gb = self._clamp(num_cores, memory_gb)
+        return num_cores <= len(self.free_cores) and memory_gb <= self.free_memory_gb + 1e-6
+
+    def allocate(self, num_cores: int, memory_gb: float) -> Tuple[List[int], float]:
+        """Returns the list of cores assigned to the experiment and the amount of memory reserved for it."""
+        assert self.can_allocate(num_cores, memory_gb)
+        num_cores, memory_gb = self._clamp(num_cores, memory_gb)
+
+        # lowest free core indices first, this tends to keep cores of one experiment adjacent
+        self.free_cores.sort()
+        cores, self.free_cores = self.free_cores[:num_cores], self.free_cores[num_cores:]
+        self.free_memory_gb -= memory_gb
+        return cores, memory_gb
+
+    def release(self, cores: List[int], memory_gb: float) -> None:
+        self.free_cores.extend(cores)
+        self.free_memory_gb = min(self.free_memory_gb + memory_gb, self.memory_gb)
+
+
+def pin_to_cores(cores: Optional[List[int]]):
+    """Returns preexec_fn for subprocess.Popen that sets CPU affinity of the child process before exec."""
+    if not cores or not hasattr(os, "sched_setaffinity"):
+        return None
+
+    def _set_affinity():
+        os.sched_setaffinity(0, cores)
+
+    return _set_affinity
+
+
+class AsyncSuccessiveHalving:
+    def __init__(self, min_env_steps: int, reduction_factor: float, num_rungs: int):
+        assert min_env_steps > 0 and reduction_factor > 1 and num_rungs > 0
+
+        self.reduction_factor = reduction_factor
+
+        # (milestone, metrics of runs that reached the milestone), highest milestone first
+        self.rungs: List[Tuple[int, Dict[Hashable, float]]] = [
+            (int(min_env_steps * reduction_factor**k), dict()) for k in reversed(range(num_rungs))
+        ]
+
+    def cutoff(self, recorded: Dict[Hashable, float]) -> Optional[float]:
+        if not recorded:
+            return None
+        return float(np.nanpercentile(list(recorded.values()), (1 - 1 / self.reduction_factor) * 100))
+
+    def on_result(self, run_id: Hashable, env_steps: int, metric: float) -> bool:
+        """Returns True if the run should be stopped."""
+        # a run is judged only once, at the highest milestone it has reached, never again at the lower ones
+        reached = [(milestone, recorded) for milestone, recorded in self.rungs if env_steps >= milestone]
+        if not reached:
+            return False
+
+        milestone, recorded = reached[0]
+        if run_id in recorded:
+            return False
+
+        cutoff = self.cutoff(recorded)
+        recorded[run_id] = metric
+        if cutoff is not None and metric < cutoff:
+            log.info("Run %r is below the cutoff at %d env steps (%.3f < %.3f)", run_id, milestone, metric, cutoff)
+            return True
+
+        return False
+
+
+class SummaryMonitor:
+    """Reads the latest value of a scalar from the tensorboard summaries of a Sample Factory experiment."""
+
+    def __init__(self, experiment_dir: str, metric: str, policy_id: int = 0):
+        self.summary_dir = join(experiment_dir, ".summary", str(policy_id))
+        self.metric = metric
+        self.accumulator: Optional[EventAccumulator] = None
+
+    def latest(self) -> Optional[Tuple[int, float]]:
+        """Returns (env_steps, value) for the most recent data point, None if nothing was written yet."""
+        if self.accumulator is None:
+            if not isdir(self.summary_dir):
+                return None
+            # we only need the last data point
+            self.accumulator = EventAccumulator(self.summary_dir, size_guidance={"scalars": 1})
+
+        try:
+            self.accumulator.Reload()
+            if self.metric not in self.accumulator.Tags()["scalars"]:
+                return None
+            event = self.accumulator.Scalars(self.metric)[-1]
+        except Exception as exc:
+            # summaries are written concurrently, we'll try again on the next check
+            log.debug("Could not read summaries from %s: %r", self.summary_dir, exc)
+            return None
+
+        return event.step, event.value
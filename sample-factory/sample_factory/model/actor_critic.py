@@ -67,6 +67,8 @@ class ActorCritic(nn.Module, Configurable):
         return device
 
     def type_for_input_tensor(self, input_tensor_name: str) -> torch.dtype:
+        if input_tensor_name == "obs" and self.obs_normalizer.fused:
+            return torch.uint8  # normalized right before the encoder, see forward_head()
         return self.encoders[0].type_for_input_tensor(input_tensor_name)
 
     def initialize_weights(self, layer):
@@ -153,6 +155,7 @@ class ActorCriticSharedWeights(ActorCritic):
         self.apply(self.initialize_weights)
 
     def forward_head(self, normalized_obs_dict: Dict[str, Tensor]) -> Tensor:
+        normalized_obs_dict = self.obs_normalizer.normalize_fused(normalized_obs_dict)
         x = self.encoder(normalized_obs_dict)
         return x
 
@@ -267,6 +270,7 @@ class ActorCriticSeparateWeights(ActorCritic):
         return head_output, fake_rnn_states
 
     def forward_head(self, normalized_obs_dict: Dict):
+        normalized_obs_dict = self.obs_normalizer.normalize_fused(normalized_obs_dict)
         head_outputs = []
         for enc in self.encoders:
             head_outputs.append(enc(normalized_obs_dict))
@@ -96,8 +96,8 @@ def update_cfg_signal(policy_id: PolicyID) -> str:
     return f"update_cfg{policy_id}"
 
 
-def save_model_signal(policy_id: PolicyID) -> str:
-    return f"save_model{policy_id}"
+def publish_model_signal(policy_id: PolicyID) -> str:
+    return f"publish_model{policy_id}"
 
 
 def load_model_signal(policy_id: PolicyID) -> str:
@@ -184,7 +184,7 @@ class PopulationBasedTraining(AlgoObserver, EventLoopObject):
     def on_connect_components(self, runner: Runner) -> None:
         for policy_id, learner_worker in runner.learners.items():
             self.connect(update_cfg_signal(policy_id), learner_worker.on_update_cfg)
-            self.connect(save_model_signal(policy_id), learner_worker.save)
+            self.connect(publish_model_signal(policy_id), learner_worker.publish)
             self.connect(load_model_signal(policy_id), learner_worker.load)
             learner_worker.saved_model.connect(self.on_saved_model)
 
@@ -359,15 +359,17 @@ class PopulationBasedTraining(AlgoObserver, EventLoopObject):
             self.policy_cfg[policy_id] = self._perturb_cfg(self.policy_cfg[replacement_policy])
             self.policy_reward_shaping[policy_id] = self._perturb_reward(self.policy_reward_shaping[replacement_policy])
 
-        # force replacement policy learner to save its model so we get the latest version
+        # force replacement policy learner to publish its model (through shared memory or a checkpoint file)
+        # so we get the latest version
         # for simplicity we do this even if the policy is replaced by itself (so no replacement happens)
         self.replacement_policy[policy_id] = replacement_policy
-        self.emit(save_model_signal(replacement_policy))
+        self.emit(publish_model_signal(replacement_policy))
 
-    def on_saved_model(self, replacement_policy: PolicyID) -> None:
+    def on_saved_model(self, replacement_policy: PolicyID, policy_version: int) -> None:
         """
-        Called when learner saves its model. At this point we're free to use this model to
-        replace other policies.
+        Called when learner saves or publishes its model. At this point we're free to use this model to
+        replace other policies. policy_version is passed on to the learners that load the model, so they don't
+        load an older version from the shared memory slot if this was a regular save to a checkpoint file.
         """
         for policy_id in range(self.cfg.num_policies):
             if self.replacement_policy[policy_id] != replacement_policy:
@@ -376,7 +378,7 @@ class PopulationBasedTraining(AlgoObserver, EventLoopObject):
             if replacement_policy != policy_id:
                 # only load the model if it's not already loaded
                 log.debug(f"Asking learner {policy_id} to load model from {replacement_policy}")
-                self.emit(load_model_signal(policy_id), replacement_policy)
+                self.emit(load_model_signal(policy_id), replacement_policy, policy_version)
 
             self.replacement_policy[policy_id] = None
 
@@ -0,0 +1,264 @@
+"""
+Remote rollout workers for multi-host training.
+
+Start the learner as usual with --remote_rollout_port=<port>, then on any number of other hosts start rollout
+workers with the same env and model arguments plus --remote_learner_address=<learner_host>:<port>.
+Remote hosts run rollout and inference workers with a local copy of the policy, stream trajectories to the learner
+and receive weight updates in return. Scripts that train custom envs can call run_remote_rollout(cfg) after
+registering their components, i.e. see sf_examples/train_custom_env_custom_model.py.
+
+"""
+
+from __future__ import annotations
+
+import selectors
+import socket
+import sys
+import threading
+import time
+from threading import Thread
+from typing import Dict, List, Optional, Tuple
+
+import torch
+
+from sample_factory.algo.learning.learner import model_initialization_data
+from sample_factory.algo.sampling.evaluation_sampling_api import SamplingLoop
+from sample_factory.algo.sampling.remote_rollout import REMOTE_REPORT_KEYS
+from sample_factory.algo.utils.env_info import EnvInfo, obtain_env_info_in_a_separate_process
+from sample_factory.algo.utils.misc import ExperimentStatus
+from sample_factory.algo.utils.model_sharing import ParameterServer
+from sample_factory.algo.utils.remote_protocol import (
+    PROTOCOL_VERSION,
+    FrameReader,
+    MsgType,
+    decode_json,
+    decode_weights,
+    encode_json,
+    encode_trajectories,
+    frame,
+    parse_address,
+    recv_frame,
+    trajectory_spec,
+)
+from sample_factory.algo.utils.shared_buffers import BufferMgr, policy_device
+from sample_factory.algo.utils.tensor_dict import TensorDict
+from sample_factory.cfg.arguments import parse_full_cfg, parse_sf_args
+from sample_factory.model.actor_critic import create_actor_critic
+from sample_factory.utils.gpu_utils import set_global_cuda_envvars
+from sample_factory.utils.typing import Config, InitModelData, PolicyID, StatusCode
+from sample_factory.utils.utils import log
+
+CONNECT_TIMEOUT_SEC = 120.0
+
+
+class RemoteRolloutClient:
+    """Runs rollout and inference workers on this host and streams trajectories to a remote learner."""
+
+    def __init__(self, cfg: Config, env_info: EnvInfo):
+        self.cfg = cfg
+        self.env_info = env_info
+        self.policy_id: PolicyID = 0
+
+        self.sock: Optional[socket.socket] = None
+        self.send_lock = threading.Lock()
+        self.disconnected = False
+
+        self.buffer_mgr: Optional[BufferMgr] = None
+        self.param_server: Optional[ParameterServer] = None
+        self.actor_critic = None
+        self.device: Optional[torch.device] = None
+
+        self.sampling_loop: Optional[SamplingLoop] = None
+        self.sampling_thread: Optional[Thread] = None
+
+        self.reports: List[Dict] = []
+        self.bytes_sent = 0
+        self.samples_sent = 0
+        self.num_weight_updates = 0
+
+    def _connect(self) -> socket.socket:
+        host, port = parse_address(self.cfg.remote_learner_address)
+        started = time.time()
+        while True:
+            try:
+                sock = socket.create_connection((host, port), timeout=10.0)
+                break
+            except OSError as exc:
+                if time.time() - started > CONNECT_TIMEOUT_SEC:
+                    raise
+                log.debug("Waiting for the learner at %s:%d (%r)...", host, port, exc)
+                time.sleep(1.0)
+
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(None)
+        log.info("Connected to the learner at %s:%d", host, port)
+        return sock
+
+    def _send(self, msg_type: MsgType, payload: bytes):
+        data = frame(msg_type, payload)
+        with self.send_lock:
+            self.sock.sendall(data)
+            self.bytes_sent += len(data)
+
+    def _handshake(self) -> Optional[Tuple[int, Dict]]:
+        spec = trajectory_spec(next(iter(self.buffer_mgr.traj_tensors_torch.values())))
+        hello = dict(protocol_version=PROTOCOL_VERSION, spec=spec, hostname=socket.gethostname())
+        self._send(MsgType.HELLO, encode_json(hello))
+
+        while (msg := recv_frame(self.sock)) is not None:
+            msg_type, payload = msg
+            if msg_type == MsgType.ERROR:
+                log.error("Learner rejected this rollout worker: %s", decode_json(payload)["error"])
+                return None
+            elif msg_type == MsgType.WELCOME:
+                self.policy_id = decode_json(payload)["policy_id"]
+            elif msg_type == MsgType.WEIGHTS:
+                return decode_weights(payload, self.device)
+
+        log.error("Learner closed the connection during the handshake")
+        return None
+
+    def _init_model(self, policy_version: int, state_dict: Dict) -> InitModelData:
+        self.actor_critic = create_actor_critic(self.cfg, self.env_info.obs_space, self.env_info.action_space)
+        self.actor_critic.model_to_device(self.device)
+        self.actor_critic.load_state_dict(state_dict)
+
+        def share_mem(t):
+            if t is not None and not t.is_cuda:
+                return t.share_memory_()
+            return t
+
+        # noinspection PyProtectedMember
+        self.actor_critic._apply(share_mem)
+        for p in self.actor_critic.parameters():
+            p.requires_grad = False
+        self.actor_critic.eval()
+
+        self.param_server.init(self.actor_critic, policy_version, self.device)
+        return model_initialization_data(self.cfg, self.policy_id, self.actor_critic, policy_version, self.device)
+
+    def _on_weights(self, payload: bytes):
+        policy_version, state_dict = decode_weights(payload, self.device)
+        with self.param_server.policy_lock:
+            self.actor_critic.load_state_dict(state_dict)
+        # inference workers pick up the new weights when they see the new version
+        self.param_server.update_weights(policy_version)
+        self.num_weight_updates += 1
+
+    def _forward_report(self, _sampling_loop: SamplingLoop, msg: Dict, _policy_id: PolicyID):
+        self.reports.append({k: msg[k] for k in REMOTE_REPORT_KEYS if k in msg})
+
+    def _on_new_trajectories(self, traj: TensorDict, traj_buffer_indices, device: str):
+        payload = encode_trajectories(traj, self.cfg.remote_compression_level)
+        # data is serialized, buffers can be reused right away
+        self.sampling_loop.yield_trajectory_buffers(traj_buffer_indices, device)
+
+        if self.disconnected:
+            return
+
+        try:
+            if self.reports:
+                reports, self.reports = self.reports, []
+                self._send(MsgType.REPORT, encode_json(reports))
+            # blocks when the learner can't keep up, this throttles experience collection on this host
+            self._send(MsgType.TRAJECTORIES, payload)
+        except OSError as exc:
+            log.warning("Lost connection to the learner: %r", exc)
+            self.disconnected = True
+            return
+
+        self.samples_sent += len(traj["rewards"]) * self.cfg.rollout
+
+    def _receive_loop(self):
+        """Receives weight updates until the learner closes the connection or sampling stops."""
+        reader = FrameReader()
+        # the socket stays blocking (no timeout), so sending trajectories from the sampling thread blocks for as long
+        # as the learner applies back-pressure. Here we only poll it to notice when sampling stops
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.sock, selectors.EVENT_READ)
+            while not self.disconnected and self.sampling_thread.is_alive():
+                if not selector.select(timeout=1.0):
+                    continue
+
+                data = self.sock.recv(1 << 22)
+                if not data:
+                    log.info("Learner closed the connection")
+                    break
+
+                for msg_type, payload in reader.feed(data):
+                    if msg_type == MsgType.WEIGHTS:
+                        self._on_weights(payload)
+
+    def run(self) -> StatusCode:
+        self.device = policy_device(self.cfg, self.policy_id)
+        self.buffer_mgr = BufferMgr(self.cfg, self.env_info)
+        self.param_server = ParameterServer(self.policy_id, self.buffer_mgr.policy_versions, self.cfg.serial_mode)
+
+        try:
+            self.sock = self._connect()
+        except OSError as exc:
+            log.error("Could not connect to the learner at %s: %r", self.cfg.remote_learner_address, exc)
+            return ExperimentStatus.FAILURE
+
+        weights = self._handshake()
+        if weights is None:
+            self.sock.close()
+            return ExperimentStatus.FAILURE
+        init_model_data = self._init_model(*weights)
+
+        self.sampling_loop = SamplingLoop(self.cfg, self.env_info, print_episode_info=False)
+        self.sampling_loop.init(self.buffer_mgr, {self.policy_id: self.param_server})
+        self.sampling_loop.set_new_trajectory_callback(self._on_new_trajectories)
+        for key in REMOTE_REPORT_KEYS:
+            self.sampling_loop.policy_msg_handlers[key] = [self._forward_report]
+
+        self.sampling_thread = Thread(target=self.sampling_loop.run)
+        self.sampling_thread.start()
+        self.sampling_loop.wait_until_ready()
+        self.sampling_loop.start({self.policy_id: init_model_data})
+
+        started = time.time()
+        try:
+            self._receive_loop()
+        except OSError as exc:
+            log.warning("Lost connection to the learner: %r", exc)
+        except KeyboardInterrupt:
+            log.info("Interrupted, stopping remote rollout worker")
+        finally:
+            self.disconnected = True
+            self.sampling_loop.stop_sampling()
+            self.sampling_thread.join()
+            self.sock.close()
+
+        elapsed = max(time.time() - started, 1e-9)
+        log.info(
+            "Sent %d samples (%.1f samples/s), %.1f MB, %.1f bytes/sample, received %d weight updates",
+            self.samples_sent,
+            self.samples_sent / elapsed,
+            self.bytes_sent / 1e6,
+            self.bytes_sent / max(self.samples_sent, 1),
+            self.num_weight_updates,
+        )
+        return ExperimentStatus.SUCCESS
+
+
+def run_remote_rollout(cfg: Config) -> StatusCode:
+    if not cfg.remote_learner_address:
+        log.error("Please specify --remote_learner_address=<learner_host>:<port>")
+        return ExperimentStatus.FAILURE
+
+    set_global_cuda_envvars(cfg)
+    env_info = obtain_env_info_in_a_separate_process(cfg)
+    return RemoteRolloutClient(cfg, env_info).run()
+
+
+def main():  # pragma: no cover
+    """Remote rollout workers for envs that are registered by default, i.e. gym/gymnasium envs."""
+    parser, _ = parse_sf_args()
+    cfg = parse_full_cfg(parser)
+    status = run_remote_rollout(cfg)
+    return status
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Elo ratings for multiplayer matches, i.e. to rank checkpoints against each other in a tournament.
+
+A match between N players is treated as N*(N-1)/2 simultaneous pairwise games: for every pair the player with
+the higher score wins (a tie is half a win). Rating change of each player is the sum of its pairwise
+Elo updates, scaled by 1/(N-1) so that a match is worth the same as a single duel.
+
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import random
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+DEFAULT_RATING = 1000.0
+DEFAULT_K_FACTOR = 32.0
+
+# opponents are picked with probability proportional to exp(-rating_difference / MATCHMAKING_TEMPERATURE)
+MATCHMAKING_TEMPERATURE = 200.0
+
+
+def expected_score(rating: float, opponent_rating: float) -> float:
+    return 1.0 / (1.0 + 10.0 ** ((opponent_rating - rating) / 400.0))
+
+
+@dataclass
+class LadderEntry:
+    rating: float = DEFAULT_RATING
+    matches: int = 0
+    wins: int = 0  # matches where the player had the highest score (including shared first place)
+    total_score: float = 0.0
+
+
+@dataclass
+class EloLadder:
+    k_factor: float = DEFAULT_K_FACTOR
+    entries: Dict[str, LadderEntry] = field(default_factory=dict)
+    num_matches: int = 0
+
+    def add_player(self, name: str, rating: Optional[float] = None) -> LadderEntry:
+        if name not in self.entries:
+            self.entries[name] = LadderEntry(rating=DEFAULT_RATING if rating is None else rating)
+        return self.entries[name]
+
+    def rating(self, name: str) -> float:
+        return self.add_player(name).rating
+
+    def update(self, players: Sequence[str], scores: Sequence[float]) -> Dict[str, float]:
+        """Updates ratings with the result of a single match, returns rating changes."""
+        assert len(players) == len(scores) and len(players) > 1
+        assert len(set(players)) == len(players), f"Player can't play against itself: {players}"
+
+        ratings = [self.rating(p) for p in players]
+        n = len(players)
+        deltas = dict()
+        for i, player in enumerate(players):
+            delta = 0.0
+            for j in range(n):
+                if i == j:
+                    continue
+                actual = 1.0 if scores[i] > scores[j] else (0.5 if scores[i] == scores[j] else 0.0)
+                delta += actual - expected_score(ratings[i], ratings[j])
+            deltas[player] = self.k_factor * delta / (n - 1)
+
+        best_score = max(scores)
+        for player, score in zip(players, scores):
+            entry = self.entries[player]
+            entry.rating += deltas[player]
+            entry.matches += 1
+            entry.wins += int(score == best_score)
+            entry.total_score += score
+
+        self.num_matches += 1
+        return deltas
+
+    def matchmake(
+        self,
+        players: Sequence[str],
+        num_players: int,
+        scheduled: Sequence[str] = (),
+        rng: Optional[random.Random] = None,
+    ) -> List[str]:
+        """
+        Picks players for the next match: the one with the fewest matches (including already scheduled ones)
+        and opponents of similar strength, so that the ladder converges quickly.
+        """
+        assert 1 < num_players <= len(players)
+        rng = rng or random.Random()
+        num_scheduled = Counter(scheduled)
+
+        def matches(name: str) -> int:
+            return self.add_player(name).matches + num_scheduled[name]
+
+        first = min(players, key=lambda name: (matches(name), rng.random()))
+        candidates = [name for name in players if name != first]
+        match_players = [first]
+        while len(match_players) < num_players:
+            weights = [
+                math.exp(-abs(self.rating(name) - self.rating(first)) / MATCHMAKING_TEMPERATURE) for name in candidates
+            ]
+            opponent = rng.choices(candidates, weights=weights)[0]
+            candidates.remove(opponent)
+            match_players.append(opponent)
+
+        # random seats
+        rng.shuffle(match_players)
+        return match_players
+
+    def standings(self) -> List[str]:
+        return sorted(self.entries, key=lambda name: self.entries[name].rating, reverse=True)
+
+    def table(self) -> str:
+        lines = [f"{'#':>3}  {'player':<40} {'rating':>8} {'matches':>8} {'wins':>6} {'avg score':>10}"]
+        for place, name in enumerate(self.standings(), start=1):
+            e = self.entries[name]
+            avg_score = e.total_score / max(e.matches, 1)
+            lines.append(f"{place:>3}  {name:<40} {e.rating:8.1f} {e.matches:8d} {e.wins:6d} {avg_score:10.2f}")
+        return "\n".join(lines)
+
+    def save(self, path: str) -> None:
+        # write to a temporary file first so that an interrupted tournament never leaves a corrupted ladder behind
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as json_file:
+            json.dump(asdict(self), json_file, indent=2)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path: str) -> EloLadder:
+        with open(path, "r") as json_file:
+            data = json.load(json_file)
+        entries = {name: LadderEntry(**entry) for name, entry in data.pop("entries").items()}
+        return EloLadder(entries=entries, **data)
@@ -9,16 +9,36 @@ before each learning iteration (not before each epoch or minibatch), since this
 
 If no data normalization is needed we just keep the original data.
 Otherwise, we create a copy of data and do all of the operations operations in-place.
+
+With --fused_obs_normalization uint8 image observations are not copied here at all. They stay uint8
+(i.e. in the learner's buffers) all the way to the model, which normalizes them right before the encoder
+with a single fused multiply-add, see ObservationNormalizer.normalize_fused().
 """
 
-from typing import Dict
+from typing import Dict, Optional, Tuple
 
+import numpy as np
 import torch
-from torch import nn
+from gymnasium import spaces
+from torch import Tensor, nn
 
 from sample_factory.algo.utils.misc import EPS
-from sample_factory.algo.utils.running_mean_std import RunningMeanStdDictInPlace, running_mean_std_summaries
+from sample_factory.algo.utils.running_mean_std import (
+    RunningMeanStdDictInPlace,
+    RunningMeanStdInPlace,
+    running_mean_std_summaries,
+)
 from sample_factory.utils.dicts import copy_dict_structure, iter_dicts_recursively
+from sample_factory.utils.typing import Config, ObsSpace
+
+
+def fused_obs_normalization_enabled(cfg: Config, obs_space: ObsSpace) -> bool:
+    """Fused normalization only applies to uint8 "obs" tensors (i.e. images) where it saves the most memory."""
+    if not cfg.fused_obs_normalization or "obs" not in obs_space.keys():
+        return False
+
+    space = obs_space["obs"]
+    return isinstance(space, spaces.Box) and space.dtype == np.uint8
 
 
 class ObservationNormalizer(nn.Module):
@@ -36,11 +56,23 @@ class ObservationNormalizer(nn.Module):
         self.should_scale = abs(self.scale - 1.0) > EPS
         self.should_normalize = self.should_sub_mean or self.should_scale or self.running_mean_std is not None
 
-    @staticmethod
-    def _clone_tensordict(obs_dict: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+        self.fused = fused_obs_normalization_enabled(cfg, obs_space)
+
+    @property
+    def fused_rms(self) -> Optional[RunningMeanStdInPlace]:
+        """Running mean/std of "obs" to be applied by normalize_fused(), not an attribute to keep state_dict intact."""
+        if not self.fused or not self.running_mean_std:
+            return None
+        modules = self.running_mean_std.running_mean_std
+        return modules["obs"] if "obs" in modules else None
+
+    def _clone_tensordict(self, obs_dict: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
         obs_clone = copy_dict_structure(obs_dict)  # creates an identical dict but with None values
         for d, d_clone, k, x, _ in iter_dicts_recursively(obs_dict, obs_clone):
-            if x.dtype != torch.float:
+            if self.fused and k == "obs":
+                # normalized later by normalize_fused(), no need to copy since we're not changing it here
+                d_clone[k] = x
+            elif x.dtype != torch.float:
                 # type conversion requires a copy, do this check to make sure we don't do it twice
                 d_clone[k] = x.float()  # this will create a copy of a tensor
             else:
@@ -56,19 +88,70 @@ class ObservationNormalizer(nn.Module):
             # since we are creating a clone, it is safe to use in-place operations
             obs_clone = self._clone_tensordict(obs_dict)
 
-            # subtraction of mean and scaling is only applied to default "obs"
-            # this should be modified for custom obs dicts
-            if self.should_sub_mean:
-                obs_clone["obs"].sub_(self.sub_mean)
-
-            if self.should_scale:
-                obs_clone["obs"].mul_(1.0 / self.scale)
+            if not self.fused:
+                self._scale(obs_clone["obs"])
+            elif self.fused_rms is not None and self.fused_rms.training:
+                # we only need the statistics here, this temporary copy is made once per training iteration
+                self.fused_rms.update(self._scale(obs_dict["obs"].float()))
 
             if self.running_mean_std:
-                self.running_mean_std(obs_clone)  # in-place normalization
+                # in-place normalization
+                self.running_mean_std(obs_clone, skip_keys=("obs",) if self.fused else ())
 
         return obs_clone
 
+    def _scale(self, obs: Tensor) -> Tensor:
+        # subtraction of mean and scaling is only applied to default "obs"
+        # this should be modified for custom obs dicts
+        if self.should_sub_mean:
+            obs.sub_(self.sub_mean)
+
+        if self.should_scale:
+            obs.mul_(1.0 / self.scale)
+
+        return obs
+
+    def _fused_coefficients(self, device: torch.device) -> Tuple[Tensor, Tensor]:
+        """Returns (a, b) such that a * obs + b is equivalent to scaling followed by running mean/std normalization."""
+        inv_scale = 1.0 / self.scale if self.should_scale else 1.0
+        shift = -self.sub_mean * inv_scale if self.should_sub_mean else 0.0
+        a = torch.tensor(inv_scale, device=device)
+        b = torch.tensor(shift, device=device)
+
+        rms = self.fused_rms
+        if rms is not None:
+            mean, var = rms.running_mean.float(), rms.running_var.float()
+            if rms.per_channel and len(rms.input_shape) > 1:
+                channel_shape = (rms.input_shape[0],) + (1,) * (len(rms.input_shape) - 1)
+                mean, var = mean.view(channel_shape), var.view(channel_shape)
+
+            inv_std = (1.0 / torch.sqrt(var + rms.eps)).to(device)
+            a = a * inv_std
+            b = b * inv_std if rms.norm_only else (b - mean.to(device)) * inv_std
+
+        return a, b
+
+    def normalize_fused(self, obs_dict: Dict[str, Tensor]) -> Dict[str, Tensor]:
+        """
+        Second half of the fused normalization, models call this right before the encoder.
+        Turns uint8 "obs" into a normalized float tensor with a single in-place multiply-add (plus clipping)
+        instead of separate passes for mean subtraction, scaling and running mean/std normalization.
+        """
+        if not self.fused or obs_dict["obs"].dtype != torch.uint8:
+            return obs_dict
+
+        with torch.no_grad():
+            a, b = self._fused_coefficients(obs_dict["obs"].device)
+            # addcmul directly on uint8 input is much slower on CPU than the type conversion followed by addcmul
+            normalized = obs_dict["obs"].float()
+            torch.addcmul(b, normalized, a, out=normalized)
+            if self.fused_rms is not None and not self.fused_rms.norm_only:
+                normalized.clamp_(-self.fused_rms.clip, self.fused_rms.clip)
+
+        normalized_obs_dict = dict(obs_dict)
+        normalized_obs_dict["obs"] = normalized
+        return normalized_obs_dict
+
     def summaries(self) -> Dict:
         res = dict()
         if self.running_mean_std:
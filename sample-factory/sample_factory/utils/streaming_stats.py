@@ -0,0 +1,240 @@
+"""
+Mergeable streaming statistics for episodic metrics.
+
+StreamingHistogram is a log-bucketed quantile sketch (similar to DDSketch): every value is counted in a bucket
+whose boundaries grow geometrically, so quantiles are estimated with a bounded relative error and two sketches
+can be merged exactly by adding bucket counts. Memory does not depend on the number of recorded values,
+which makes sketches cheap to ship between processes instead of individual episode stats.
+
+"""
+
+from __future__ import annotations
+
+import math
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from sample_factory.algo.utils.misc import EPISODIC, POLICY_ID_KEY
+from sample_factory.envs.env_wrappers import EPISODE_BOOKKEEPING_KEYS
+from sample_factory.utils.dicts import iterate_recursively
+from sample_factory.utils.typing import PolicyID
+
+
+class StreamingHistogram:
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048, min_abs_value: float = 1e-9):
+        assert 0.0 < relative_accuracy < 1.0
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.min_abs_value = min_abs_value
+
+        self._gamma = (1.0 + relative_accuracy) / (1.0 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+
+        # bucket index -> count, separately for positive and negative values
+        self.positive: Dict[int, int] = dict()
+        self.negative: Dict[int, int] = dict()
+        self.zero_count = 0
+
+        self.count = 0
+        self.sum = 0.0
+        self.sum_squares = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _bucket_idx(self, abs_value: float) -> int:
+        return int(math.ceil(math.log(abs_value) / self._log_gamma))
+
+    def _bucket_value(self, idx: int) -> float:
+        """Representative value of a bucket, relative error w.r.t. any value in the bucket is <= relative_accuracy."""
+        return 2.0 * self._gamma**idx / (self._gamma + 1.0)
+
+    def add(self, value: float, count: int = 1) -> None:
+        value = float(value)
+        if not math.isfinite(value):
+            return
+
+        if value > self.min_abs_value:
+            idx = self._bucket_idx(value)
+            self.positive[idx] = self.positive.get(idx, 0) + count
+        elif value < -self.min_abs_value:
+            idx = self._bucket_idx(-value)
+            self.negative[idx] = self.negative.get(idx, 0) + count
+        else:
+            self.zero_count += count
+
+        self.count += count
+        self.sum += value * count
+        self.sum_squares += value * value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+        if len(self.positive) + len(self.negative) > self.max_buckets:
+            self._collapse()
+
+    def add_many(self, values: Iterable[float]) -> None:
+        for v in values:
+            self.add(v)
+
+    def _collapse(self) -> None:
+        """Merge buckets closest to zero to stay within max_buckets, this only affects accuracy near zero."""
+        while len(self.positive) + len(self.negative) > self.max_buckets:
+            store = self.positive if len(self.positive) >= len(self.negative) else self.negative
+            lowest = sorted(store.keys())[:2]
+            store[lowest[1]] += store.pop(lowest[0])
+
+    def merge(self, other: StreamingHistogram) -> None:
+        assert self.relative_accuracy == other.relative_accuracy, "Can only merge sketches with the same accuracy"
+        for idx, c in other.positive.items():
+            self.positive[idx] = self.positive.get(idx, 0) + c
+        for idx, c in other.negative.items():
+            self.negative[idx] = self.negative.get(idx, 0) + c
+        self.zero_count += other.zero_count
+
+        self.count += other.count
+        self.sum += other.sum
+        self.sum_squares += other.sum_squares
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+        if len(self.positive) + len(self.negative) > self.max_buckets:
+            self._collapse()
+
+    def copy(self) -> StreamingHistogram:
+        h = StreamingHistogram(self.relative_accuracy, self.max_buckets, self.min_abs_value)
+        h.merge(self)
+        return h
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count > 0 else math.nan
+
+    def _sorted_buckets(self) -> List[Tuple[float, int]]:
+        """(representative value, count) for all non-empty buckets in ascending order."""
+        buckets = [(-self._bucket_value(idx), self.negative[idx]) for idx in sorted(self.negative, reverse=True)]
+        if self.zero_count > 0:
+            buckets.append((0.0, self.zero_count))
+        buckets.extend((self._bucket_value(idx), self.positive[idx]) for idx in sorted(self.positive))
+        return buckets
+
+    def quantiles(self, qs: Sequence[float]) -> List[float]:
+        if self.count == 0:
+            return [math.nan] * len(qs)
+
+        buckets = self._sorted_buckets()
+        cumulative = np.cumsum([c for _, c in buckets])
+        result = []
+        for q in qs:
+            rank = min(max(q, 0.0), 1.0) * (self.count - 1)
+            bucket = int(np.searchsorted(cumulative, rank, side="right"))
+            value = buckets[min(bucket, len(buckets) - 1)][0]
+            # exact min/max are known, this makes p0/p100 exact and keeps other estimates in range
+            result.append(min(max(value, self.min), self.max))
+        return result
+
+    def quantile(self, q: float) -> float:
+        return self.quantiles([q])[0]
+
+    def tensorboard_histogram(self, max_bins: int = 64) -> Optional[Dict]:
+        """Arguments for SummaryWriter.add_histogram_raw(), adjacent buckets are combined to at most max_bins."""
+        if self.count == 0:
+            return None
+
+        buckets = self._sorted_buckets()
+        group = max(1, int(math.ceil(len(buckets) / max_bins)))
+        bucket_limits, bucket_counts = [], []
+        for i in range(0, len(buckets), group):
+            chunk = buckets[i : i + group]
+            bucket_limits.append(min(chunk[-1][0], self.max))
+            bucket_counts.append(sum(c for _, c in chunk))
+        bucket_limits[-1] = self.max
+
+        return dict(
+            min=self.min,
+            max=self.max,
+            num=self.count,
+            sum=self.sum,
+            sum_squares=self.sum_squares,
+            bucket_limits=bucket_limits,
+            bucket_counts=bucket_counts,
+        )
+
+
+def _numeric_values(value) -> Optional[Iterable[float]]:
+    if isinstance(value, np.ndarray):
+        return value.reshape(-1).tolist() if value.dtype.kind in "biuf" else None
+    if isinstance(value, (bool, int, float, np.number)):
+        return (value,)
+    return None
+
+
+class EpisodicStatsSketches:
+    """Per-policy sketches of every numeric episodic stat, filled from EPISODIC reports."""
+
+    def __init__(self, num_policies: int, relative_accuracy: float = 0.01):
+        self.num_policies = num_policies
+        self.relative_accuracy = relative_accuracy
+        self.sketches: List[Dict[str, StreamingHistogram]] = [dict() for _ in range(num_policies)]
+
+    def add_episode_stats(self, policy_id: PolicyID, stats: Dict) -> None:
+        sketches = self.sketches[policy_id]
+        for _, key, value in iterate_recursively(stats):
+            if key in EPISODE_BOOKKEEPING_KEYS:
+                continue
+
+            values = _numeric_values(value)
+            if values is None:
+                continue
+
+            if key not in sketches:
+                sketches[key] = StreamingHistogram(self.relative_accuracy)
+            sketches[key].add_many(values)
+
+    def add_reports(self, reports: Iterable[Dict]) -> None:
+        for report in reports:
+            if EPISODIC in report:
+                self.add_episode_stats(report[POLICY_ID_KEY], report[EPISODIC])
+
+    def empty(self) -> bool:
+        return not any(self.sketches)
+
+    def pop(self, policy_id: PolicyID) -> Dict[str, StreamingHistogram]:
+        sketches = self.sketches[policy_id]
+        self.sketches[policy_id] = dict()
+        return sketches
+
+
+class SketchWindow:
+    """
+    Recent sketches of a single stat. Old sketches are dropped once the remaining ones still cover at least
+    min_count values, this is the streaming equivalent of a deque(maxlen=stats_avg) over individual episodes.
+    """
+
+    def __init__(self, min_count: int):
+        self.min_count = min_count
+        self.window: Deque[StreamingHistogram] = deque()
+        self.count = 0
+
+    def add(self, sketch: StreamingHistogram) -> None:
+        if sketch.count == 0:
+            return
+
+        self.window.append(sketch)
+        self.count += sketch.count
+        while len(self.window) > 1 and self.count - self.window[0].count >= self.min_count:
+            self.count -= self.window.popleft().count
+
+    def merged(self) -> Optional[StreamingHistogram]:
+        if not self.window:
+            return None
+
+        merged = self.window[0].copy()
+        for sketch in list(self.window)[1:]:
+            merged.merge(sketch)
+        return merged
+
+
+def parse_percentiles(percentiles: str) -> List[float]:
+    """'5,50,95' -> [5.0, 50.0, 95.0]"""
+    return [float(p) for p in percentiles.split(",") if p.strip()]
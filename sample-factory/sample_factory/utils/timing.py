@@ -9,6 +9,7 @@ from typing import Any, Optional, Union
 import psutil
 
 from sample_factory.algo.utils.misc import EPS
+from sample_factory.utils import tracing
 from sample_factory.utils.attr_dict import AttrDict
 from sample_factory.utils.utils import log
 
@@ -66,10 +67,14 @@ class TimingContext:
         self._timing._open_contexts_stack.append(self)
 
     def __exit__(self, type_, value, traceback):
-        time_passed = max(time.time() - self._time_enter, EPS)  # EPS to prevent div by zero
+        time_exit = time.time()
+        time_passed = max(time_exit - self._time_enter, EPS)  # EPS to prevent div by zero
         self._record_measurement(self._key, time_passed)
         self._timing._open_contexts_stack.pop()
 
+        if tracing.TRACER is not None:
+            tracing.TRACER.record(self._timing._name, self._key, self._time_enter, time_exit)
+
 
 class Timing(AttrDict):
     def __init__(self, name="Profile", *args, **kwargs):
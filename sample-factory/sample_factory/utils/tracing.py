@@ -0,0 +1,232 @@
+"""
+Optional event tracer for the Timing instrumentation.
+
+When enabled (--trace_events=True), every Timing block (add_time/timeit/time_avg) records its begin/end timestamps
+into a fixed-size per-process ring buffer. Each process dumps its buffer to a part file on exit or on SIGUSR1,
+and the runner merges the parts into a single Chrome/Perfetto trace (chrome://tracing or https://ui.perfetto.dev).
+
+Parts can also be merged manually:
+    python -m sample_factory.utils.tracing <trace_dir>
+
+"""
+
+import json
+import os
+import signal
+import sys
+import threading
+from multiprocessing.util import Finalize
+from os.path import join
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from sample_factory.utils.typing import Config
+from sample_factory.utils.utils import ensure_dir_exists, experiment_dir, log
+
+PART_PREFIX = "part_"
+MERGED_TRACE_FILE = "trace.json"
+
+# set in each process by init_event_tracer(), Timing checks this on every measurement
+TRACER: Optional["EventTracer"] = None
+
+
+class EventTracer:
+    def __init__(self, process_name: str, capacity: int):
+        self.process_name = process_name
+        self.capacity = capacity
+        self.pid = os.getpid()
+
+        self._event_names: Dict[Tuple[str, str], int] = dict()
+        self._event_name_list: List[Tuple[str, str]] = []
+        self._thread_names: Dict[int, str] = dict()
+
+        self._name_idx = np.zeros(capacity, dtype=np.int32)
+        self._tid = np.zeros(capacity, dtype=np.int64)
+        self._begin = np.zeros(capacity, dtype=np.float64)
+        self._end = np.zeros(capacity, dtype=np.float64)
+        self.num_recorded = 0
+
+        # learner process runs the batcher in a separate thread, so recording must be thread-safe
+        # (reentrant because the SIGUSR1 handler can interrupt record() in the main thread)
+        self._lock = threading.RLock()
+
+    def _name_index(self, category: str, name: str) -> int:
+        key = (category, name)
+        idx = self._event_names.get(key)
+        if idx is None:
+            idx = self._event_names[key] = len(self._event_name_list)
+            self._event_name_list.append(key)
+        return idx
+
+    def record(self, category: str, name: str, begin: float, end: float) -> None:
+        tid = threading.get_native_id()
+        with self._lock:
+            if tid not in self._thread_names:
+                self._thread_names[tid] = threading.current_thread().name
+
+            i = self.num_recorded % self.capacity
+            self._name_idx[i] = self._name_index(category, name)
+            self._tid[i] = tid
+            self._begin[i] = begin
+            self._end[i] = end
+            self.num_recorded += 1
+
+    def _ordered_indices(self) -> np.ndarray:
+        n = self.num_recorded
+        if n <= self.capacity:
+            return np.arange(n)
+        start = n % self.capacity
+        return np.concatenate([np.arange(start, self.capacity), np.arange(0, start)])
+
+    def dump(self, trace_dir_: str) -> str:
+        """Save raw events, this is fast enough to be done from a signal handler. Conversion happens in merge."""
+        ensure_dir_exists(trace_dir_)
+        filename = join(trace_dir_, f"{PART_PREFIX}{self.process_name}_{self.pid}.npz")
+
+        with self._lock:
+            indices = self._ordered_indices()
+            header = dict(
+                process_name=self.process_name,
+                pid=self.pid,
+                event_names=self._event_name_list,
+                thread_names=list(self._thread_names.items()),
+            )
+            # write to a temporary file first so the merge never reads a partially written part
+            tmp_filename = f"{filename}.tmp.npz"
+            np.savez(
+                tmp_filename,
+                header=np.array(json.dumps(header)),
+                name_idx=self._name_idx[indices],
+                tid=self._tid[indices],
+                begin=self._begin[indices],
+                end=self._end[indices],
+            )
+        os.replace(tmp_filename, filename)
+
+        if self.num_recorded > self.capacity:
+            log.debug(
+                "Event tracer in %s overflowed, only the last %d of %d events are saved",
+                self.process_name,
+                self.capacity,
+                self.num_recorded,
+            )
+        return filename
+
+
+def trace_dir(cfg: Config) -> str:
+    return join(experiment_dir(cfg=cfg), "trace")
+
+
+def part_to_chrome_trace_events(part_filename: str) -> Iterator[Dict]:
+    with np.load(part_filename) as part:
+        header = json.loads(str(part["header"]))
+        name_idx, tid, begin, end = part["name_idx"], part["tid"], part["begin"], part["end"]
+
+    pid = header["pid"]
+    yield dict(name="process_name", ph="M", pid=pid, args=dict(name=header["process_name"]))
+    for thread_id, thread_name in header["thread_names"]:
+        yield dict(name="thread_name", ph="M", pid=pid, tid=thread_id, args=dict(name=thread_name))
+
+    event_names = header["event_names"]
+    begin_us, dur_us = begin * 1e6, (end - begin) * 1e6
+    for i in range(len(name_idx)):
+        category, name = event_names[name_idx[i]]
+        yield dict(
+            name=name, cat=category, ph="X", ts=float(begin_us[i]), dur=float(dur_us[i]), pid=pid, tid=int(tid[i])
+        )
+
+
+def _trace_parts(trace_dir_: str) -> List[str]:
+    return sorted(f for f in os.listdir(trace_dir_) if f.startswith(PART_PREFIX) and f.endswith(".npz"))
+
+
+def merge_traces(trace_dir_: str) -> Optional[str]:
+    """Merge per-process parts into a single Chrome trace. Events are streamed to disk to keep memory bounded."""
+    parts = [p for p in _trace_parts(trace_dir_) if not p.endswith(".tmp.npz")]
+    if not parts:
+        return None
+
+    merged_filename = join(trace_dir_, MERGED_TRACE_FILE)
+    tmp_filename = f"{merged_filename}.tmp"
+    num_events = 0
+    with open(tmp_filename, "w") as trace_file:
+        trace_file.write('{"displayTimeUnit": "ms", "traceEvents": [\n')
+        for part in parts:
+            try:
+                for event in part_to_chrome_trace_events(join(trace_dir_, part)):
+                    if num_events > 0:
+                        trace_file.write(",\n")
+                    trace_file.write(json.dumps(event))
+                    num_events += 1
+            except (OSError, ValueError, KeyError) as exc:
+                log.warning("Could not read trace part %s: %r", part, exc)
+        trace_file.write("\n]}\n")
+    os.replace(tmp_filename, merged_filename)
+
+    log.info("Saved trace with %d events from %d processes to %s", num_events, len(parts), merged_filename)
+    return merged_filename
+
+
+def remove_trace_parts(trace_dir_: str) -> None:
+    for f in os.listdir(trace_dir_):
+        if f.startswith(PART_PREFIX):
+            os.remove(join(trace_dir_, f))
+
+
+def init_event_tracer(
+    cfg: Config, process_name: str, on_signal: Optional[Callable[[], None]] = None
+) -> Optional[EventTracer]:
+    """
+    Enable the tracer in the current process. Must be called from the main thread (installs a SIGUSR1 handler).
+    on_signal is called after the buffer is dumped, the runner uses it to forward the signal to other processes.
+    """
+    global TRACER
+
+    if not cfg.trace_events:
+        return None
+
+    if TRACER is not None and TRACER.pid == os.getpid():
+        return TRACER
+
+    tracer = EventTracer(process_name, cfg.trace_buffer_events)
+    trace_dir_ = ensure_dir_exists(trace_dir(cfg))
+
+    def dump():
+        try:
+            tracer.dump(trace_dir_)
+        except OSError as exc:
+            log.warning("Could not save trace events for %s: %r", process_name, exc)
+
+    def signal_handler(_signum, _frame):
+        dump()
+        if on_signal is not None:
+            on_signal()
+
+    # also runs when a multiprocessing child exits normally (atexit handlers are not executed there)
+    Finalize(tracer, dump, exitpriority=10)
+
+    if sys.platform != "win32":
+        signal.signal(signal.SIGUSR1, signal_handler)
+
+    TRACER = tracer
+    log.debug("Event tracing enabled in %s (pid %d), buffer size %d", process_name, tracer.pid, tracer.capacity)
+    return tracer
+
+
+def dump_event_tracer(cfg: Config) -> None:
+    if TRACER is not None:
+        TRACER.dump(trace_dir(cfg))
+
+
+def main() -> int:
+    if len(sys.argv) != 2:
+        print("Usage: python -m sample_factory.utils.tracing <trace_dir>")
+        return 1
+
+    merged = merge_traces(sys.argv[1])
+    return 0 if merged is not None else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -22,6 +22,7 @@ from sample_factory.cfg.arguments import parse_full_cfg, parse_sf_args
 from sample_factory.envs.env_utils import RewardShapingInterface, TrainingInfoInterface, register_env
 from sample_factory.model.encoder import Encoder
 from sample_factory.model.model_utils import nonlinearity
+from sample_factory.remote_rollout import run_remote_rollout
 from sample_factory.train import run_rl
 from sample_factory.utils.typing import Config, ObsSpace
 
@@ -149,7 +150,11 @@ def main():
     """Script entry point."""
     register_custom_components()
     cfg = parse_custom_args()
-    status = run_rl(cfg)
+    if cfg.remote_learner_address:
+        # rollout workers on this host feed a learner running elsewhere
+        status = run_remote_rollout(cfg)
+    else:
+        status = run_rl(cfg)
     return status
 
 
@@ -0,0 +1,317 @@
+"""
+Throughput benchmark matrix for VizDoom.
+
+Sweeps scenarios and sampling configurations, runs a short training session for each combination in a fresh process
+and writes a comparable report (results.json and results.csv) to the output folder.
+
+Usage example:
+python -m sf_examples.vizdoom.benchmark_vizdoom --scenarios doom_basic doom_battle --num_workers 8 16
+    --num_envs_per_worker 8 16 --worker_num_splits 1 2 --modes async sync serial --duration_sec 60 --output bench/xeon
+
+Startup latency:
+python -m sf_examples.vizdoom.benchmark_vizdoom --scenarios doom_battle --num_workers 8 32 64 --num_envs_per_worker 8
+    --worker_num_splits 1 --modes async --worker_start_methods spawn forkserver --duration_sec 10 --output bench/startup
+
+Any unrecognized arguments are forwarded to the training script, i.e. --device=cpu or --env_frameskip=4.
+
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from os.path import join
+from queue import Empty
+from typing import Dict, List, Optional, Tuple
+
+import psutil
+
+from sample_factory.algo.runners.runner import AlgoObserver, Runner
+from sample_factory.algo.utils.misc import ExperimentStatus
+from sample_factory.train import make_runner
+from sample_factory.utils.typing import Config
+from sample_factory.utils.utils import ensure_dir_exists, get_git_commit_hash, log, str2bool
+from sf_examples.vizdoom.train_vizdoom import parse_vizdoom_cfg, register_vizdoom_components
+
+MODES = {
+    "async": dict(serial_mode=False, async_rl=True),
+    "sync": dict(serial_mode=False, async_rl=False),
+    "serial": dict(serial_mode=True, async_rl=False),
+}
+
+MATRIX_KEYS = (
+    "scenario",
+    "mode",
+    "num_workers",
+    "num_envs_per_worker",
+    "worker_num_splits",
+    "batched_sampling",
+    "worker_start_method",
+)
+
+
+class BenchmarkObserver(AlgoObserver):
+    """Measures throughput after the warmup period, i.e. once all envs are created and the learner is running."""
+
+    def __init__(self, cfg: Config, warmup_sec: float):
+        self.cfg = cfg
+        self.warmup_sec = warmup_sec
+
+        self.start_time: Optional[float] = None
+        self.num_iterations = 0
+
+        # (time, env_steps, samples, training iterations) at the beginning and at the end of the measurement window
+        self.first: Optional[Tuple[float, int, int, int]] = None
+        self.last: Optional[Tuple[float, int, int, int]] = None
+
+        self.lag_avg: List[float] = []
+        self.lag_max = 0.0
+
+        self.time_to_first_sample: Optional[float] = None
+
+    def on_start(self, runner: Runner) -> None:
+        self.start_time = time.time()
+
+    def on_training_step(self, runner: Runner, training_iteration_since_resume: int) -> None:
+        self.num_iterations += 1
+        self.time_to_first_sample = runner.time_to_first_sample
+        now = time.time()
+        if self.start_time is None or now - self.start_time < self.warmup_sec:
+            return
+
+        snapshot = (now, runner.total_env_steps_since_resume or 0, sum(runner.samples_collected), self.num_iterations)
+        if self.first is None:
+            self.first = snapshot
+            return
+        self.last = snapshot
+
+        lag = runner.policy_lag[0]
+        if "version_diff_avg" in lag:
+            self.lag_avg.append(lag["version_diff_avg"])
+            self.lag_max = max(self.lag_max, lag["version_diff_max"])
+
+    def results(self) -> Dict:
+        if self.first is None or self.last is None or self.last[0] <= self.first[0]:
+            return dict(time_to_first_sample_sec=self.time_to_first_sample, measured_sec=0.0)
+
+        dt = self.last[0] - self.first[0]
+        env_steps, samples, iterations = (self.last[i] - self.first[i] for i in range(1, 4))
+        sgd_steps = iterations * self.cfg.num_epochs * self.cfg.num_batches_per_epoch
+        return dict(
+            time_to_first_sample_sec=self.time_to_first_sample,
+            measured_sec=dt,
+            env_fps=env_steps / dt,
+            sample_throughput=samples / dt,
+            learner_sgd_steps_per_sec=sgd_steps / dt,
+            policy_lag_avg=sum(self.lag_avg) / len(self.lag_avg) if self.lag_avg else float("nan"),
+            policy_lag_max=self.lag_max if self.lag_avg else float("nan"),
+        )
+
+
+def _run_config(argv: List[str], warmup_sec: float, result_queue) -> None:
+    register_vizdoom_components()
+    cfg = parse_vizdoom_cfg(argv=argv)
+    cfg, runner = make_runner(cfg)
+
+    observer = BenchmarkObserver(cfg, warmup_sec)
+    runner.register_observer(observer)
+
+    status = runner.init()
+    if status == ExperimentStatus.SUCCESS:
+        status = runner.run()
+
+    result_queue.put(dict(status=int(status), **observer.results()))
+
+
+def trainer_argv(params: Dict, args: argparse.Namespace, extra_argv: List[str]) -> List[str]:
+    experiment = "bench_" + "_".join(f"{params[k]}" for k in MATRIX_KEYS)
+    run_params = dict(
+        env=params["scenario"],
+        experiment=experiment,
+        train_dir=join(args.output, "train_dir"),
+        restart_behavior="overwrite",
+        num_workers=params["num_workers"],
+        num_envs_per_worker=params["num_envs_per_worker"],
+        worker_num_splits=params["worker_num_splits"],
+        batched_sampling=params["batched_sampling"],
+        worker_start_method=params["worker_start_method"],
+        train_for_seconds=args.warmup_sec + args.duration_sec,
+        benchmark=True,
+        decorrelate_experience_max_seconds=0,
+        save_every_sec=int(1e6),
+        save_best_every_sec=int(1e6),
+        with_wandb=False,
+        **MODES[params["mode"]],
+    )
+    return [f"--{k}={v}" for k, v in run_params.items()] + extra_argv
+
+
+def benchmark_matrix(args: argparse.Namespace) -> List[Dict]:
+    matrix = []
+    for values in itertools.product(
+        args.scenarios,
+        args.modes,
+        args.num_workers,
+        args.num_envs_per_worker,
+        args.worker_num_splits,
+        args.batched_sampling,
+        args.worker_start_methods,
+    ):
+        params = dict(zip(MATRIX_KEYS, values))
+        if params["num_envs_per_worker"] % params["worker_num_splits"] != 0:
+            log.debug("Skipping %r, num_envs_per_worker must be a multiple of worker_num_splits", params)
+            continue
+        matrix.append(params)
+    return matrix
+
+
+def _wait_for_result(process, result_queue, deadline: float) -> Optional[Dict]:
+    """Result of the benchmark process, or None if it did not finish before the deadline."""
+    while time.time() < deadline:
+        try:
+            return result_queue.get(timeout=1.0)
+        except Empty:
+            if not process.is_alive():
+                break
+
+    # the process might have exited right after sending its result
+    try:
+        return result_queue.get(timeout=1.0)
+    except Empty:
+        return None
+
+
+def run_benchmark(params: Dict, args: argparse.Namespace, extra_argv: List[str]) -> Dict:
+    argv = trainer_argv(params, args, extra_argv)
+    log.info("Benchmarking %r", params)
+
+    ctx = multiprocessing.get_context("spawn")
+    result_queue = ctx.Queue()
+    process = ctx.Process(target=_run_config, args=(argv, args.warmup_sec, result_queue))
+
+    started = time.time()
+    process.start()
+
+    timeout = args.warmup_sec + args.duration_sec + args.startup_timeout_sec
+    result = dict(status=ExperimentStatus.FAILURE, measured_sec=0.0)
+    try:
+        reported = _wait_for_result(process, result_queue, started + timeout)
+        if reported is not None:
+            result = reported
+        elif process.exitcode is not None:
+            log.error("Benchmark run %r exited with code %d without results", params, process.exitcode)
+        else:
+            log.error("Benchmark run %r did not finish in %.0f sec", params, timeout)
+    finally:
+        process.join(timeout=30)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    result["wall_time_sec"] = time.time() - started
+    return dict(**params, **result)
+
+
+def host_info() -> Dict:
+    git_hash, _ = get_git_commit_hash()
+    return dict(
+        hostname=platform.node(),
+        platform=platform.platform(),
+        cpu_count=psutil.cpu_count(logical=True),
+        physical_cores=psutil.cpu_count(logical=False),
+        memory_gb=psutil.virtual_memory().total / 1024**3,
+        git_hash=git_hash,
+        timestamp=time.strftime("%Y%m%d_%H%M%S"),
+    )
+
+
+def write_report(output: str, host: Dict, results: List[Dict]) -> None:
+    with open(join(output, "results.json"), "w") as json_file:
+        json.dump(dict(host=host, results=results), json_file, indent=2)
+
+    if results:
+        fieldnames = list(results[0].keys())
+        for r in results:
+            fieldnames.extend(k for k in r.keys() if k not in fieldnames)
+
+        with open(join(output, "results.csv"), "w", newline="") as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(results)
+
+
+def print_summary(results: List[Dict]) -> None:
+    header = f"{'scenario':<22} {'mode':<7} {'workers':>7} {'envs':>5} {'splits':>6} {'batched':>7} {'start':>10} "
+    header += f"{'TTFS':>6} {'env FPS':>10} {'samples/s':>10} {'SGD/s':>7} {'lag':>6}"
+    lines = [header]
+    for r in results:
+        line = f"{r['scenario']:<22} {r['mode']:<7} {r['num_workers']:>7} {r['num_envs_per_worker']:>5} "
+        line += f"{r['worker_num_splits']:>6} {str(r['batched_sampling']):>7} {r['worker_start_method']:>10} "
+        ttfs = r.get("time_to_first_sample_sec")
+        line += f"{ttfs:>6.1f} " if ttfs is not None else f"{'-':>6} "
+        if r.get("measured_sec", 0) > 0:
+            line += f"{r['env_fps']:>10.1f} {r['sample_throughput']:>10.1f} {r['learner_sgd_steps_per_sec']:>7.2f} "
+            line += f"{r['policy_lag_avg']:>6.2f}"
+        else:
+            line += f"{'failed':>10}"
+        lines.append(line)
+    log.info("Benchmark results:\n%s", "\n".join(lines))
+
+
+def parse_benchmark_args(argv=None) -> Tuple[argparse.Namespace, List[str]]:
+    p = argparse.ArgumentParser(description="VizDoom throughput benchmark matrix")
+    p.add_argument("--scenarios", nargs="+", default=["doom_basic", "doom_battle", "doom_deathmatch_bots"])
+    p.add_argument("--modes", nargs="+", default=["async", "serial"], choices=list(MODES.keys()))
+    p.add_argument("--num_workers", nargs="+", type=int, default=[psutil.cpu_count(logical=True)])
+    p.add_argument("--num_envs_per_worker", nargs="+", type=int, default=[8, 16])
+    p.add_argument("--worker_num_splits", nargs="+", type=int, default=[1, 2])
+    p.add_argument("--batched_sampling", nargs="+", type=str2bool, default=[False])
+    p.add_argument(
+        "--worker_start_methods",
+        nargs="+",
+        default=["spawn"],
+        choices=["spawn", "forkserver"],
+        help="Compare startup latency (time to first sample) of different worker start methods",
+    )
+    p.add_argument("--duration_sec", type=float, default=60, help="Length of the measurement window for each run")
+    p.add_argument("--warmup_sec", type=float, default=20, help="Ignore this many seconds after the start of each run")
+    p.add_argument(
+        "--startup_timeout_sec",
+        type=float,
+        default=300,
+        help="Extra time given to each run to start and stop before it is killed",
+    )
+    p.add_argument("--output", type=str, default=join(os.getcwd(), "doom_benchmark"), help="Folder for the report")
+    p.add_argument("--dry_run", action="store_true", help="Only print the benchmark matrix")
+    return p.parse_known_args(argv)
+
+
+def main():  # pragma: no cover
+    args, extra_argv = parse_benchmark_args()
+    matrix = benchmark_matrix(args)
+    log.info("Benchmark matrix contains %d runs", len(matrix))
+
+    if args.dry_run:
+        for params in matrix:
+            log.info("%r: %s", params, " ".join(trainer_argv(params, args, extra_argv)))
+        return 0
+
+    ensure_dir_exists(args.output)
+    host = host_info()
+    results = []
+    for params in matrix:
+        results.append(run_benchmark(params, args, extra_argv))
+        # write the report after each run so partial results survive an interrupted benchmark
+        write_report(args.output, host, results)
+
+    print_summary(results)
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main())
@@ -46,6 +46,18 @@ def add_doom_env_eval_args(parser):
         type=str,
         help="Record episodes to this folder. This records a demo that can be replayed at full resolution. Currently, this does not work for bot environments so it is recommended to use --save_video to record episodes at lower resolution instead for such environments",
     )
+    parser.add_argument(
+        "--record_chunk_len",
+        default=256,
+        type=int,
+        help="Recorded frames are compressed and written to disk by a background process in chunks of this many frames",
+    )
+    parser.add_argument(
+        "--record_max_buffered_mb",
+        default=512,
+        type=int,
+        help="Memory budget for recorded frames waiting to be written. If the writer falls behind, env steps block until it catches up",
+    )
 
 
 def doom_override_defaults(parser):
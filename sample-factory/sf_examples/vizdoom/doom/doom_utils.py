@@ -277,7 +277,9 @@ def make_doom_env_impl(
         should_record = True
 
     if record_to is not None and should_record:
-        env = RecordingWrapper(env, record_to, player_id)
+        chunk_len = cfg.record_chunk_len if "record_chunk_len" in cfg else 256
+        max_buffered_mb = cfg.record_max_buffered_mb if "record_max_buffered_mb" in cfg else 512
+        env = RecordingWrapper(env, record_to, player_id, chunk_len=chunk_len, max_buffered_mb=max_buffered_mb)
 
     env = MultiplayerStatsWrapper(env)
 
@@ -1,232 +1,461 @@
 """
-Evaluate different policies against one another in a multiplayer VizDoom match.
+Tournament between Doom agents: plays many multiplayer matches concurrently and ranks contestants on an Elo ladder.
+
+Contestants are Sample Factory checkpoints: an experiment folder (latest checkpoint of policy 0), an experiment folder
+with a policy index (i.e. train_dir/pbt_experiment#3), or a path to a specific .pth file inside checkpoint_p*.
+Agents trained with other codebases (i.e. Arnold) can take part through an adapter, see Contestant class below.
+
+Matches are played by a pool of worker processes. Every worker hosts --matches_per_worker matches at the same time,
+each with its own host process and UDP port, and runs inference for all seats of the same contestant
+(across all of its matches) as a single batch. After every match the ladder is updated and saved, so an interrupted
+tournament can be resumed by running the same command again.
+
+Example:
+python -m sf_examples.vizdoom.doom.multi_agent_match --env=doom_deathmatch_full --players_per_match=4 \
+    --contestants train_dir/dm_exp1 train_dir/dm_exp2 train_dir/pbt_dm#0 train_dir/pbt_dm#1 \
+    --num_matches=200 --num_workers=4 --matches_per_worker=2 --ladder=train_dir/dm_ladder.json
 
-This is an old/unsupported script, update for SF2 API would be needed.
 """
 
-# import os
-# import sys
-# import time
-# from multiprocessing import Process
-# from os.path import join
-#
-# import numpy as np
-# import torch
-#
-# from sample_factory.algo.utils.make_env import NonBatchedMultiAgentWrapper, is_multiagent_env
-# from sample_factory.cfg.arguments import load_from_checkpoint
-# from sample_factory.envs.create_env import create_env
-# from sample_factory.utils.utils import AttrDict, log
-#
-#
-# class Rival:
-#     def __init__(self, name, args):
-#         self.name = name
-#         self.args = args
-#         self.policy_index = None
-#         self.parsed_config = parse_args(args, evaluation=True)
-#         self.cfg = load_from_checkpoint(self.parsed_config)
-#
-#         self.actor_critic = None
-#         self.rnn_state = None
-#
-#
-# RIVALS = [
-#     Rival(
-#         name="duel",
-#         args=[
-#             "--env=doom_duel",
-#             "--algo=APPO",
-#             "--experiment=00_bots_ssl2_fs2_ppo_1",
-#             "--experiments_root=paper_doom_duel_v65_fs2/bots_ssl2_fs2",
-#         ],
-#     ),
-#     Rival(
-#         name="duel_bots",
-#         args=[
-#             "--env=doom_duel_bots",
-#             "--algo=APPO",
-#             "--experiment=00_bots_ssl2_fs2_ppo_1",
-#             "--experiments_root=paper_doom_duel_bots_v65_fs2/bots_ssl2_fs2",
-#         ],
-#     ),
-# ]
-#
-# ENV_NAME = "doom_duel"
-# NO_RENDER = True
-# FPS = 10000
-#
-#
-# def multi_agent_match(policy_indices, max_num_episodes=int(1e9), max_num_frames=1e10):
-#     log.debug("Starting eval process with policies %r", policy_indices)
-#     for i, rival in enumerate(RIVALS):
-#         rival.policy_index = policy_indices[i]
-#
-#     curr_dir = os.path.dirname(os.path.abspath(__file__))
-#     evaluation_filename = join(curr_dir, f'eval_{"vs".join([str(pi) for pi in policy_indices])}.txt')
-#     with open(evaluation_filename, "w") as fobj:
-#         fobj.write("start\n")
-#
-#     common_config = RIVALS[0].cfg
-#
-#     render_action_repeat = (
-#         common_config.render_action_repeat
-#         if common_config.render_action_repeat is not None
-#         else common_config.env_frameskip
-#     )
-#     if render_action_repeat is None:
-#         log.warning("Not using action repeat!")
-#         render_action_repeat = 1
-#     log.debug("Using action repeat %d during evaluation", render_action_repeat)
-#
-#     common_config.env_frameskip = 1  # for evaluation
-#     common_config.num_envs = 1
-#     common_config.timelimit = 4.0  # for faster evaluation
-#
-#     def make_env_func(env_config):
-#         return create_env(ENV_NAME, cfg=common_config, env_config=env_config)
-#
-#     env = make_env_func(AttrDict({"worker_index": 0, "vector_index": 0}))
-#     env.seed(0)
-#
-#     is_multiagent = is_multiagent_env(env)
-#     if not is_multiagent:
-#         env = NonBatchedMultiAgentWrapper(env)
-#     else:
-#         assert env.num_agents == len(RIVALS)
-#
-#     device = torch.device("cuda")
-#     for rival in RIVALS:
-#         rival.actor_critic = create_actor_critic(rival.cfg, env.observation_space, env.action_space)
-#         rival.actor_critic.model_to_device(device)
-#
-#         policy_id = rival.policy_index
-#         checkpoints = LearnerWorker.get_checkpoints(LearnerWorker.checkpoint_dir(rival.cfg, policy_id))
-#         checkpoint_dict = LearnerWorker.load_checkpoint(checkpoints, device)
-#         rival.actor_critic.load_state_dict(checkpoint_dict["model"])
-#
-#     episode_rewards = []
-#     num_frames = 0
-#
-#     last_render_start = time.time()
-#
-#     def max_frames_reached(frames):
-#         return max_num_frames is not None and frames > max_num_frames
-#
-#     wins = [0 for _ in RIVALS]
-#     ties = 0
-#     frag_differences = []
-#
-#     with torch.no_grad():
-#         for _ in range(max_num_episodes):
-#             obs = env.reset()
-#             obs_dict_torch = dict()
-#
-#             done = [False] * len(obs)
-#             for rival in RIVALS:
-#                 rival.rnn_states = torch.zeros([1, rival.cfg.rnn_size], dtype=torch.float32, device=device)
-#
-#             episode_reward = 0
-#             prev_frame = time.time()
-#
-#             while True:
-#                 actions = []
-#                 for i, obs_dict in enumerate(obs):
-#                     for key, x in obs_dict.items():
-#                         obs_dict_torch[key] = torch.from_numpy(x).to(device).float().view(1, *x.shape)
-#
-#                     rival = RIVALS[i]
-#                     policy_outputs = rival.actor_critic(obs_dict_torch, rival.rnn_states)
-#                     rival.rnn_states = policy_outputs.rnn_states
-#                     actions.append(policy_outputs.actions[0].cpu().numpy())
-#
-#                 for _ in range(render_action_repeat):
-#                     if not NO_RENDER:
-#                         target_delay = 1.0 / FPS if FPS > 0 else 0
-#                         current_delay = time.time() - last_render_start
-#                         time_wait = target_delay - current_delay
-#
-#                         if time_wait > 0:
-#                             # log.info('Wait time %.3f', time_wait)
-#                             time.sleep(time_wait)
-#
-#                         last_render_start = time.time()
-#                         env.render()
-#
-#                     obs, rew, done, infos = env.step(actions)
-#                     if all(done):
-#                         log.debug("Finished episode!")
-#
-#                         frag_diff = infos[0]["PLAYER1_FRAGCOUNT"] - infos[0]["PLAYER2_FRAGCOUNT"]
-#                         if frag_diff > 0:
-#                             wins[0] += 1
-#                         elif frag_diff < 0:
-#                             wins[1] += 1
-#                         else:
-#                             ties += 1
-#
-#                         frag_differences.append(frag_diff)
-#                         avg_frag_diff = np.mean(frag_differences)
-#
-#                         report = f"wins: {wins}, ties: {ties}, avg_frag_diff: {avg_frag_diff}"
-#                         with open(evaluation_filename, "a") as fobj:
-#                             fobj.write(report + "\n")
-#
-#                     # log.info('%d:%d', infos[0]['PLAYER1_FRAGCOUNT'], infos[0]['PLAYER2_FRAGCOUNT'])
-#
-#                     episode_reward += np.mean(rew)
-#                     num_frames += 1
-#
-#                     if num_frames % 100 == 0:
-#                         log.debug("%.1f", render_action_repeat / (time.time() - prev_frame))
-#                     prev_frame = time.time()
-#
-#                     if all(done):
-#                         log.info("Episode finished at %d frames", num_frames)
-#                         break
-#
-#                 if all(done) or max_frames_reached(num_frames):
-#                     break
-#
-#             if not NO_RENDER:
-#                 env.render()
-#             time.sleep(0.01)
-#
-#             episode_rewards.append(episode_reward)
-#             last_episodes = episode_rewards[-100:]
-#             avg_reward = sum(last_episodes) / len(last_episodes)
-#             log.info(
-#                 "Episode reward: %f, avg reward for %d episodes: %f",
-#                 episode_reward,
-#                 len(last_episodes),
-#                 avg_reward,
-#             )
-#
-#             if max_frames_reached(num_frames):
-#                 break
-#
-#     env.close()
-#
-#
-# def main():
-#     """Script entry point."""
-#     multi_process = True
-#     if multi_process:
-#         num_policies = 8
-#         processes = []
-#         for p_id in range(num_policies):
-#             process = Process(target=multi_agent_match, args=[(p_id, 0)])
-#             process.start()
-#             processes.append(process)
-#             time.sleep(5.0)
-#
-#         for process in processes:
-#             process.join()
-#     else:
-#         multi_agent_match((0, 0))
-#
-#     return 0
-#
-#
-# if __name__ == "__main__":
-#     sys.exit(main())
+import argparse
+import importlib
+import multiprocessing
+import os
+import random
+import sys
+import time
+from os.path import basename, dirname, isdir, isfile
+from queue import Empty
+from typing import Dict, List, Optional, Tuple
+
+import torch
+from torch import Tensor
+
+from sample_factory.algo.learning.learner import Learner
+from sample_factory.algo.sampling.batched_sampling import preprocess_actions
+from sample_factory.algo.utils.action_distributions import argmax_actions
+from sample_factory.algo.utils.env_info import extract_env_info
+from sample_factory.algo.utils.make_env import make_env_func_batched
+from sample_factory.algo.utils.misc import ExperimentStatus
+from sample_factory.algo.utils.rl_utils import make_dones, prepare_and_normalize_obs
+from sample_factory.cfg.arguments import load_from_checkpoint
+from sample_factory.model.actor_critic import create_actor_critic
+from sample_factory.model.model_utils import get_rnn_size
+from sample_factory.utils.attr_dict import AttrDict
+from sample_factory.utils.elo import EloLadder
+from sample_factory.utils.typing import Config
+from sample_factory.utils.utils import log, str2bool
+from sf_examples.vizdoom.doom.multiplayer.doom_multiagent import find_available_port
+from sf_examples.vizdoom.train_vizdoom import parse_vizdoom_cfg, register_vizdoom_components
+
+MATCH_RESULT_TIMEOUT_SEC = 60 * 60
+
+
+class Contestant:
+    """
+    A player in the tournament. Subclass to add agents that were not trained with Sample Factory, i.e. an adapter
+    for Arnold models would convert SF observations into Arnold inputs and Arnold actions into the Doom action space.
+    Adapters are registered with --adapter NAME=module:factory, where factory(name) returns a Contestant.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def load(self, obs_space, action_space, device: torch.device) -> None:
+        """Called once per worker process, before the first match."""
+        pass
+
+    def rnn_size(self) -> int:
+        """Size of recurrent state kept per seat (zeros at the beginning of the match)."""
+        return 0
+
+    def act(self, obs: Dict[str, Tensor], rnn_states: Tensor) -> Tuple[Tensor, Tensor]:
+        """Batched inference for all seats of this contestant. Returns actions and new recurrent states."""
+        raise NotImplementedError()
+
+
+class CheckpointContestant(Contestant):
+    def __init__(self, name: str, spec: str, env: str, deterministic: bool):
+        super().__init__(name)
+        self.spec = spec
+        self.env = env
+        self.deterministic = deterministic
+
+        self.cfg: Optional[Config] = None
+        self.actor_critic = None
+        self._rnn_size = 0
+
+    def experiment_and_checkpoint(self) -> Tuple[str, int, Optional[str]]:
+        """Returns experiment folder, policy index and an explicit checkpoint path (None for latest)."""
+        if isfile(self.spec):
+            checkpoint_dir = dirname(os.path.abspath(self.spec))
+            policy_id = int(basename(checkpoint_dir).replace("checkpoint_p", ""))
+            return dirname(checkpoint_dir), policy_id, self.spec
+
+        experiment, _, policy_id = self.spec.partition("#")
+        return experiment.rstrip("/"), int(policy_id or 0), None
+
+    def load_cfg(self) -> Config:
+        experiment, policy_id, _ = self.experiment_and_checkpoint()
+        if not isdir(experiment):
+            raise FileNotFoundError(f"Experiment folder {experiment} not found (contestant {self.name})")
+
+        argv = [f"--env={self.env}", f"--experiment={basename(experiment)}", f"--train_dir={dirname(experiment)}"]
+        cfg = load_from_checkpoint(parse_vizdoom_cfg(argv=argv, evaluation=True))
+        cfg.policy_index = policy_id
+        return cfg
+
+    def load(self, obs_space, action_space, device: torch.device) -> None:
+        self.cfg = self.load_cfg()
+        self.actor_critic = create_actor_critic(self.cfg, obs_space, action_space)
+        self.actor_critic.eval()
+        self.actor_critic.model_to_device(device)
+
+        _, policy_id, checkpoint = self.experiment_and_checkpoint()
+        if checkpoint is None:
+            checkpoints = Learner.get_checkpoints(Learner.checkpoint_dir(self.cfg, policy_id))
+        else:
+            checkpoints = [checkpoint]
+        checkpoint_dict = Learner.load_checkpoint(checkpoints, device)
+        if checkpoint_dict is None:
+            raise FileNotFoundError(f"No checkpoints found for contestant {self.name}")
+        self.actor_critic.load_state_dict(checkpoint_dict["model"])
+        self._rnn_size = get_rnn_size(self.cfg)
+
+    def rnn_size(self) -> int:
+        return self._rnn_size
+
+    def act(self, obs: Dict[str, Tensor], rnn_states: Tensor) -> Tuple[Tensor, Tensor]:
+        normalized_obs = prepare_and_normalize_obs(self.actor_critic, obs)
+        policy_outputs = self.actor_critic(normalized_obs, rnn_states)
+        actions = policy_outputs["actions"]
+        if self.deterministic:
+            actions = argmax_actions(self.actor_critic.action_distribution())
+        return actions, policy_outputs["new_rnn_states"]
+
+
+def contestant_name(spec: str) -> str:
+    if isfile(spec):
+        experiment = dirname(dirname(os.path.abspath(spec)))
+        return f"{basename(experiment)}/{basename(spec).replace('.pth', '')}"
+    return basename(spec.rstrip("/"))
+
+
+def make_contestants(args) -> List[Contestant]:
+    contestants = [CheckpointContestant(contestant_name(s), s, args.env, args.deterministic) for s in args.contestants]
+    for adapter in args.adapter:
+        name, _, factory_path = adapter.partition("=")
+        module_name, _, factory_name = factory_path.partition(":")
+        factory = getattr(importlib.import_module(module_name), factory_name)
+        contestants.append(factory(name))
+
+    names = [c.name for c in contestants]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Contestant names must be unique, got {names}")
+    return contestants
+
+
+def host_match(port: int, num_players: int, args) -> None:
+    """Spectator host for a single match, similar to host/host.py but synchronous, so matches run at full speed."""
+    import vizdoom as vzd
+
+    game = vzd.DoomGame()
+    game.set_doom_scenario_path(args.host_wad)
+    game.set_doom_map(f"map{args.host_map:02d}")
+    game.add_game_args(f"-host {num_players + 1} -port {port} -deathmatch +timelimit {args.match_timelimit}")
+    game.add_game_args("+sv_forcerespawn 1 +sv_noautoaim 1 +sv_respawnprotect 1 +sv_spawnfarthest 1 +sv_crouch 1")
+    game.add_game_args(f"+viz_respawn_delay {args.respawn_delay} +viz_nocheat 1 +viz_spectator 1 +name ghost")
+    game.set_mode(vzd.Mode.PLAYER)
+    game.set_window_visible(False)
+    game.set_console_enabled(False)
+    game.init()
+
+    game.send_game_command("removebots")
+    for _ in range(args.num_bots):
+        game.send_game_command("addbot")
+
+    while not game.is_episode_finished():
+        game.advance_action()
+    game.close()
+
+
+class Match:
+    def __init__(self, task: Dict, env, host_process, rnn_states: List[Tensor]):
+        self.task = task
+        self.env = env
+        self.host_process = host_process
+        self.rnn_states = rnn_states  # one per seat
+        self.obs = None
+        self.frames = 0
+        self.started = time.time()
+
+
+def tournament_worker(worker_idx: int, args, env_cfg: Config, task_queue, result_queue) -> None:
+    register_vizdoom_components()
+    torch.set_num_threads(1)
+    device = torch.device("cuda" if args.device == "gpu" and torch.cuda.is_available() else "cpu")
+
+    contestants = {c.name: c for c in make_contestants(args)}
+    contestants_loaded = False
+    env_info = None
+
+    mp_ctx = multiprocessing.get_context("spawn")
+    matches: List[Optional[Match]] = [None] * args.matches_per_worker
+    no_more_tasks = False
+
+    def start_match(slot: int, task: Dict) -> Match:
+        nonlocal contestants_loaded, env_info
+
+        port = find_available_port(args.base_port + 100 * worker_idx + slot, increment=1000)
+        host_process = mp_ctx.Process(target=host_match, args=(port, len(task["players"]), args), daemon=True)
+        host_process.start()
+
+        env = None
+        try:
+            env_config = AttrDict(worker_index=worker_idx, vector_index=slot, env_id=slot, host_port=port)
+            env = make_env_func_batched(env_cfg, env_config=env_config, render_mode=None)
+
+            if not contestants_loaded:
+                env_info = extract_env_info(env, env_cfg)
+                for c in contestants.values():
+                    c.load(env.observation_space, env.action_space, device)
+                contestants_loaded = True
+
+            rnn_states = [torch.zeros([contestants[p].rnn_size()], device=device) for p in task["players"]]
+            match = Match(task, env, host_process, rnn_states)
+            match.obs, _ = env.reset()
+            return match
+        except BaseException:
+            # otherwise the host keeps waiting for players that will never join
+            try:
+                if env is not None:
+                    env.close()
+            finally:
+                host_process.kill()
+                host_process.join()
+            raise
+
+    def finish_match(match: Match, result: Dict) -> None:
+        try:
+            match.env.close()
+        finally:
+            match.host_process.join(timeout=10)
+            if match.host_process.is_alive():
+                match.host_process.kill()
+        result_queue.put(result)
+
+    while True:
+        for slot in range(len(matches)):
+            if matches[slot] is not None or no_more_tasks:
+                continue
+            try:
+                task = task_queue.get(block=not any(matches), timeout=1.0)
+            except Empty:
+                break
+            if task is None:
+                no_more_tasks = True
+                break
+            try:
+                matches[slot] = start_match(slot, task)
+            except Exception as exc:
+                log.exception("Worker %d could not start match %r", worker_idx, task)
+                result_queue.put(dict(task_id=task["task_id"], error=repr(exc)))
+
+        active = [(slot, m) for slot, m in enumerate(matches) if m is not None]
+        if not active:
+            if no_more_tasks:
+                break
+            continue
+
+        # gather observations of all seats of the same contestant across matches and run a single forward pass
+        seats_per_contestant: Dict[str, List[Tuple[Match, int]]] = dict()
+        for _, m in active:
+            for seat, player in enumerate(m.task["players"]):
+                seats_per_contestant.setdefault(player, []).append((m, seat))
+
+        actions_per_match = {id(m): [None] * len(m.task["players"]) for _, m in active}
+        with torch.no_grad():
+            for player, seats in seats_per_contestant.items():
+                obs = {key: torch.stack([m.obs[key][seat] for m, seat in seats]).to(device) for key in active[0][1].obs}
+                rnn_states = torch.stack([m.rnn_states[seat] for m, seat in seats])
+                actions, new_rnn_states = contestants[player].act(obs, rnn_states)
+                for i, (m, seat) in enumerate(seats):
+                    actions_per_match[id(m)][seat] = actions[i]
+                    m.rnn_states[seat] = new_rnn_states[i]
+
+        for slot, m in active:
+            actions = torch.stack(actions_per_match[id(m)])
+            if actions.ndim == 1:
+                actions = actions.unsqueeze(-1)
+            try:
+                m.obs, _, terminated, truncated, infos = m.env.step(preprocess_actions(env_info, actions))
+            except Exception as exc:
+                log.exception("Worker %d: match %r failed", worker_idx, m.task)
+                finish_match(m, dict(task_id=m.task["task_id"], error=repr(exc)))
+                matches[slot] = None
+                continue
+
+            m.frames += 1
+            dones = make_dones(terminated, truncated)
+            if dones.all():
+                frags = [float(info.get("FRAGCOUNT", 0.0)) for info in infos]
+                result = dict(
+                    task_id=m.task["task_id"],
+                    players=m.task["players"],
+                    frags=frags,
+                    frames=m.frames,
+                    duration=time.time() - m.started,
+                )
+                finish_match(m, result)
+                matches[slot] = None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Tournament between Doom agents with an Elo ladder")
+    parser.add_argument("--env", default="doom_deathmatch_full", type=str, help="Multiplayer Doom env to play")
+    parser.add_argument(
+        "--contestants",
+        default=[],
+        nargs="*",
+        type=str,
+        help="Experiment folders (optionally with #policy_index suffix) or paths to .pth checkpoints",
+    )
+    parser.add_argument(
+        "--adapter",
+        default=[],
+        action="append",
+        type=str,
+        help="Contestant from another codebase as NAME=module:factory, where factory(name) returns a Contestant",
+    )
+    parser.add_argument("--players_per_match", default=2, type=int, help="Number of agents (seats) in every match")
+    parser.add_argument("--num_bots", default=0, type=int, help="Classic bots added to every match by the host")
+    parser.add_argument(
+        "--num_matches", default=100, type=int, help="Play until the ladder has this many matches (incl. resumed)"
+    )
+    parser.add_argument("--num_workers", default=4, type=int, help="Number of worker processes")
+    parser.add_argument(
+        "--matches_per_worker",
+        default=2,
+        type=int,
+        help="Matches played by each worker at the same time, inference for all of them is batched",
+    )
+    parser.add_argument("--match_timelimit", default=4.0, type=float, help="Match duration in (game) minutes")
+    parser.add_argument("--respawn_delay", default=2, type=int, help="Respawn delay in seconds")
+    parser.add_argument("--host_wad", default="wads/dwango5.wad", type=str, help="WAD file used by the match host")
+    parser.add_argument("--host_map", default=1, type=int, help="Map number")
+    parser.add_argument("--base_port", default=6029, type=int, help="Match hosts use ports starting from this one")
+    parser.add_argument("--device", default="gpu", choices=["gpu", "cpu"], help="Device for inference")
+    parser.add_argument("--deterministic", default=False, type=str2bool, help="Use argmax actions")
+    parser.add_argument("--k_factor", default=32.0, type=float, help="Elo K-factor")
+    parser.add_argument(
+        "--ladder", default="ladder.json", type=str, help="Ladder file, the tournament is resumed if it exists"
+    )
+    return parser.parse_args(argv)
+
+
+def make_env_cfg(args, contestants: List[Contestant]) -> Config:
+    checkpoints = [c for c in contestants if isinstance(c, CheckpointContestant)]
+    cfg = checkpoints[0].load_cfg() if checkpoints else parse_vizdoom_cfg(argv=[f"--env={args.env}"], evaluation=True)
+    cfg.env = args.env
+    cfg.num_agents = args.players_per_match
+    cfg.num_bots = 0  # bots are added by the host
+    cfg.timelimit = args.match_timelimit
+    cfg.num_envs = 1
+    return cfg
+
+
+def run_tournament(args) -> int:
+    register_vizdoom_components()
+
+    contestants = make_contestants(args)
+    names = [c.name for c in contestants]
+    if args.players_per_match > len(names):
+        log.error("Need at least %d contestants, got %r", args.players_per_match, names)
+        return ExperimentStatus.FAILURE
+
+    if isfile(args.ladder):
+        ladder = EloLadder.load(args.ladder)
+        log.info("Resuming the tournament from %s (%d matches played)", args.ladder, ladder.num_matches)
+    else:
+        ladder = EloLadder(k_factor=args.k_factor)
+    for name in names:
+        ladder.add_player(name)
+
+    env_cfg = make_env_cfg(args, contestants)
+
+    mp_ctx = multiprocessing.get_context("spawn")
+    task_queue, result_queue = mp_ctx.Queue(), mp_ctx.Queue()
+    workers = [
+        mp_ctx.Process(target=tournament_worker, args=(i, args, env_cfg, task_queue, result_queue))
+        for i in range(args.num_workers)
+    ]
+    for w in workers:
+        w.start()
+
+    rng = random.Random()
+    in_flight: Dict[int, List[str]] = dict()
+    next_task_id = 0
+    matches_played, failed_matches = 0, 0
+    start = time.time()
+    concurrent_matches = args.num_workers * args.matches_per_worker
+
+    try:
+        while ladder.num_matches < args.num_matches:
+            while len(in_flight) < concurrent_matches and ladder.num_matches + len(in_flight) < args.num_matches:
+                scheduled = [p for players in in_flight.values() for p in players]
+                players = ladder.matchmake(names, args.players_per_match, scheduled, rng)
+                in_flight[next_task_id] = players
+                task_queue.put(dict(task_id=next_task_id, players=players))
+                next_task_id += 1
+
+            result = result_queue.get(timeout=MATCH_RESULT_TIMEOUT_SEC)
+            in_flight.pop(result["task_id"], None)
+            if "error" in result:
+                failed_matches += 1
+                log.error("Match failed: %s", result["error"])
+                if failed_matches > max(10, matches_played):
+                    log.error("Too many failed matches, stopping the tournament")
+                    break
+                continue
+
+            deltas = ladder.update(result["players"], result["frags"])
+            ladder.save(args.ladder)
+            matches_played += 1
+
+            matches_per_hour = matches_played / (time.time() - start) * 3600
+            log.info(
+                "Match %d: %s, took %.1f s, %d frames. %.1f matches/hour",
+                ladder.num_matches,
+                ", ".join(f"{p} {f:.0f} frags ({deltas[p]:+.1f})" for p, f in zip(result["players"], result["frags"])),
+                result["duration"],
+                result["frames"],
+                matches_per_hour,
+            )
+    except (KeyboardInterrupt, Empty):
+        log.warning("Tournament interrupted, the ladder is saved to %s", args.ladder)
+    finally:
+        for _ in workers:
+            task_queue.put(None)
+        for w in workers:
+            w.join(timeout=30)
+            if w.is_alive():
+                w.terminate()
+
+    elapsed = time.time() - start
+    log.info(
+        "Played %d matches in %.1f min (%.1f matches/hour)",
+        matches_played,
+        elapsed / 60,
+        matches_played / elapsed * 3600,
+    )
+    log.info("Standings after %d matches:\n%s", ladder.num_matches, ladder.table())
+    return ExperimentStatus.SUCCESS
+
+
+def main():
+    """Script entry point."""
+    return run_tournament(parse_args())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
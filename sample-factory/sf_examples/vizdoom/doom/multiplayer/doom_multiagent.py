@@ -147,9 +147,11 @@ class VizdoomEnvMultiplayer(VizdoomEnv):
         #     # 0 - green, 1 - gray, 2 - brown, 3 - red, 4 - light gray, 5 - light brown, 6 - light red, 7 - light blue
         #     self.game.add_game_args(f"+name AI{self.player_id} +colorset 0")
 
-        # Join existing game.
+        # Join existing game. The host runs in a separate process (i.e. host.py), by default on the standard port
+        host_port = None if self.init_info is None else self.init_info.get("host_port")
+        host_address = "localhost" if host_port is None else f"localhost:{host_port}"
         self.game.add_game_args(
-            f"-join localhost "  # Connect to a host for a multiplayer game.
+            f"-join {host_address} "  # Connect to a host for a multiplayer game.
             f"+viz_connect_timeout {vizdoom_env_timeout} "
         )
 
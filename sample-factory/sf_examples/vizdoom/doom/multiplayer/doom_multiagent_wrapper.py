@@ -65,6 +65,13 @@ def udp_port_num(env_config):
     return port_to_use
 
 
+def host_port_num(env_config):
+    """Port of an external host to join, None means the default port."""
+    if env_config is None:
+        return None
+    return env_config.get("host_port")
+
+
 class TaskType(Enum):
     INIT, TERMINATE, RESET, STEP, STEP_UPDATE, INFO, SET_ATTR = range(7)
 
@@ -81,7 +88,7 @@ def init_multiplayer_env(make_env_func, player_id, env_config, init_info=None):
         port_to_use = udp_port_num(env_config)
         port = find_available_port(port_to_use, increment=1000)
         log.debug("Using port %d", port)
-        init_info = dict(port=port)
+        init_info = dict(port=port, host_port=host_port_num(env_config))
 
     env.unwrapped.init_info = init_info
 
@@ -285,7 +292,7 @@ class MultiAgentEnv(gym.Env, RewardShapingInterface):
                 port_to_use = udp_port_num(self.env_config)
                 port = find_available_port(port_to_use, increment=1000)
                 log.debug("Using port %d", port)
-                init_info = dict(port=port)
+                init_info = dict(port=port, host_port=host_port_num(self.env_config))
 
                 lock_file = doom_lock_file(max_parallel=20)
                 lock = FileLock(lock_file)
@@ -0,0 +1,110 @@
+from queue import Empty
+from typing import List, Tuple
+
+import pytest
+import torch
+from signal_slot.signal_slot import EventLoop
+
+from sample_factory.algo.learning.batcher import Batcher
+from sample_factory.algo.utils.context import reset_global_context
+from sample_factory.algo.utils.env_info import extract_env_info
+from sample_factory.algo.utils.make_env import make_env_func_batched
+from sample_factory.algo.utils.shared_buffers import BufferMgr
+from sample_factory.utils.attr_dict import AttrDict
+from sample_factory.utils.gpu_utils import set_global_cuda_envvars
+from sf_examples.train_custom_env_custom_model import register_custom_components
+from tests.examples.test_example import default_test_cfg
+
+
+def _make_batcher(async_rl: bool) -> Tuple[Batcher, BufferMgr]:
+    register_custom_components()
+    cfg, _ = default_test_cfg()
+    cfg.serial_mode = True
+    cfg.async_rl = async_rl
+    cfg.num_workers = 1
+    cfg.num_envs_per_worker = 4
+    cfg.batcher_zero_copy = True
+    set_global_cuda_envvars(cfg)
+
+    env = make_env_func_batched(cfg, env_config=AttrDict(worker_index=0, vector_index=0, env_id=0))
+    env_info = extract_env_info(env, cfg)
+    env.close()
+
+    buffer_mgr = BufferMgr(cfg, env_info)
+    batcher = Batcher(EventLoop("test_batcher_evt_loop", serial_mode=True), 0, buffer_mgr, cfg, env_info)
+    batcher.init()
+
+    # 2 trajectories per training batch
+    assert batcher.traj_per_training_iteration == 2
+    # trajectory buffers are all taken by the (imaginary) rollout workers
+    _released(buffer_mgr)
+    return batcher, buffer_mgr
+
+
+def _released(buffer_mgr: BufferMgr) -> List[int]:
+    try:
+        return sorted(buffer_mgr.traj_buffer_queues["cpu"].get_many(block=False))
+    except Empty:
+        return []
+
+
+def _send(batcher: Batcher, buffer_mgr: BufferMgr, indices: List[int]):
+    rewards = buffer_mgr.traj_tensors_torch["cpu"]["rewards"]
+    for i in indices:
+        rewards[i] = float(i)
+    batcher.on_new_trajectories([dict(policy_id=0, traj_buffer_idx=i) for i in indices], "cpu")
+
+
+class TestBatcherZeroCopy:
+    @pytest.fixture(scope="function", autouse=True)
+    def _reset_context(self):
+        yield
+        reset_global_context()
+
+    @pytest.mark.parametrize("async_rl", [True, False])
+    def test_contiguous_batch_is_a_view(self, async_rl: bool):
+        batcher, buffer_mgr = _make_batcher(async_rl)
+        _send(batcher, buffer_mgr, [2, 3])
+
+        assert batcher.num_zero_copy_batches == 1 and batcher.num_copied_batches == 0
+        batch = batcher.training_batch(0)
+        traj_rewards = buffer_mgr.traj_tensors_torch["cpu"]["rewards"]
+        assert batch["rewards"].data_ptr() == traj_rewards[2].data_ptr()
+        assert batch["rewards"][:, 0].tolist() == [2.0, 3.0]
+
+        # the learner reads the trajectory buffers, they're released only when it's done with the batch
+        assert _released(buffer_mgr) == []
+        batcher.on_training_batch_released(0, 1)
+        assert _released(buffer_mgr) == [2, 3]
+        assert batcher.training_batch(0) is batcher.training_batches[0]
+
+    @pytest.mark.parametrize("indices", [[1, 3], [7, 0]], ids=["fragmented", "wrapped"])
+    def test_non_contiguous_batch_is_copied(self, indices: List[int]):
+        batcher, buffer_mgr = _make_batcher(async_rl=True)
+        _send(batcher, buffer_mgr, indices)
+
+        assert batcher.num_zero_copy_batches == 0 and batcher.num_copied_batches == 1
+        batch = batcher.training_batch(0)
+        assert batch is batcher.training_batches[0]
+        assert sorted(batch["rewards"][:, 0].tolist()) == sorted(float(i) for i in indices)
+
+        # copies don't hold the trajectory buffers in async mode
+        assert _released(buffer_mgr) == sorted(indices)
+        batcher.on_training_batch_released(0, 1)
+        assert _released(buffer_mgr) == []
+
+    def test_one_view_at_a_time(self):
+        """In async mode only one batch holds trajectory buffers, so that rollout workers don't run out of them."""
+        batcher, buffer_mgr = _make_batcher(async_rl=True)
+        _send(batcher, buffer_mgr, [0, 1, 2, 3])
+
+        assert batcher.num_zero_copy_batches == 1 and batcher.num_copied_batches == 1
+        assert (
+            batcher.training_batch(0)["rewards"].data_ptr()
+            == buffer_mgr.traj_tensors_torch["cpu"]["rewards"].data_ptr()
+        )
+        assert _released(buffer_mgr) == [2, 3]
+
+        batcher.on_training_batch_released(0, 1)
+        assert _released(buffer_mgr) == [0, 1]
+        assert torch.equal(batcher.training_batch(1)["rewards"][:, 0], torch.tensor([2.0, 3.0]))
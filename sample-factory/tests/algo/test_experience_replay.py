@@ -0,0 +1,33 @@
+import torch
+
+from sample_factory.algo.learning.experience_replay import ExperienceReplayBuffer
+from sample_factory.algo.utils.tensor_dict import TensorDict
+
+
+def _batch(version: int) -> TensorDict:
+    return TensorDict(
+        dict(policy_version=torch.full((4, 8), version, dtype=torch.int32), rewards=torch.full((4, 8), float(version)))
+    )
+
+
+class TestExperienceReplay:
+    def test_replay_buffer(self):
+        replay = ExperienceReplayBuffer(2, lambda: _batch(0), max_policy_lag=10)
+        assert len(replay) == 0
+        assert replay.sample(0) is None
+
+        batch = _batch(1)
+        replay.store(batch)
+        # stored batches are copies, the learner is free to modify the original
+        batch["rewards"][:] = -1
+        assert replay.sample(1)["rewards"].min().item() == 1.0
+
+        replay.store(_batch(5))
+        replay.store(_batch(12))  # overwrites the oldest batch
+        assert len(replay) == 2
+
+        # batch collected by policy version 5 is too old
+        for _ in range(10):
+            assert replay.sample(15)["policy_version"].max().item() == 12
+
+        assert replay.sample(30) is None
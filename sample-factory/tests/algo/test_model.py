@@ -1,7 +1,11 @@
+import gymnasium as gym
+import numpy as np
 import pytest
 import torch
+from torch.profiler import ProfilerActivity, profile
 
 from sample_factory.algo.utils.make_env import make_env_func_batched
+from sample_factory.algo.utils.rl_utils import prepare_and_normalize_obs
 from sample_factory.cfg.arguments import default_cfg
 from sample_factory.model.actor_critic import create_actor_critic
 from sample_factory.model.model_utils import get_rnn_size
@@ -57,3 +61,102 @@ class TestModel:
     @pytest.mark.skipif(not torch.cuda.is_available(), reason="This test requires a GPU")
     def test_forward_pass_gpu(self):
         self.forward_pass("cuda")
+
+
+class TestFusedObsNormalization:
+    @staticmethod
+    def make_actor_critic(fused: bool, normalize_input: bool, share_weights: bool = True):
+        cfg = default_cfg(algo="APPO", env="fused_obs_normalization")
+        cfg.obs_subtract_mean = 128.0
+        cfg.obs_scale = 128.0
+        cfg.normalize_input = normalize_input
+        cfg.fused_obs_normalization = fused
+        cfg.actor_critic_share_weights = share_weights
+
+        obs_space = gym.spaces.Dict(
+            obs=gym.spaces.Box(0, 255, (3, 72, 128), dtype=np.uint8),
+            measurements=gym.spaces.Box(-1, 1, (8,), dtype=np.float32),
+        )
+        return create_actor_critic(cfg, obs_space, gym.spaces.Discrete(5)), cfg
+
+    @staticmethod
+    def make_obs(batch: int):
+        return dict(
+            obs=torch.randint(0, 256, (batch, 3, 72, 128), dtype=torch.uint8),
+            measurements=torch.rand(batch, 8),
+        )
+
+    @pytest.mark.parametrize("normalize_input", [False, True])
+    @pytest.mark.parametrize("share_weights", [False, True])
+    def test_same_outputs(self, normalize_input: bool, share_weights: bool):
+        actor_critic, cfg = self.make_actor_critic(False, normalize_input, share_weights)
+        fused_actor_critic, _ = self.make_actor_critic(True, normalize_input, share_weights)
+        fused_actor_critic.load_state_dict(actor_critic.state_dict())
+        assert fused_actor_critic.obs_normalizer.fused
+
+        rnn_states = torch.zeros(16, get_rnn_size(cfg))
+        for _ in range(3):
+            # in training mode this also updates the running mean/std statistics
+            obs = self.make_obs(16)
+            normalized_obs = prepare_and_normalize_obs(actor_critic, dict(obs))
+            fused_normalized_obs = prepare_and_normalize_obs(fused_actor_critic, dict(obs))
+
+            assert normalized_obs["obs"].dtype == torch.float32
+            assert fused_normalized_obs["obs"].dtype == torch.uint8
+            assert fused_normalized_obs["obs"] is obs["obs"]  # not even a copy
+
+            head = actor_critic.forward_head(normalized_obs)
+            fused_head = fused_actor_critic.forward_head(fused_normalized_obs)
+            assert torch.allclose(head, fused_head, atol=1e-4)
+
+        # gradients must not be affected either
+        head.sum().backward()
+        fused_head.sum().backward()
+        for (name, p), (_, fused_p) in zip(actor_critic.named_parameters(), fused_actor_critic.named_parameters()):
+            if p.grad is not None:
+                assert torch.allclose(p.grad, fused_p.grad, rtol=1e-3, atol=1e-3), name
+
+        with torch.no_grad():
+            values = actor_critic(normalized_obs, rnn_states, values_only=True)["values"]
+            fused_values = fused_actor_critic(fused_normalized_obs, rnn_states, values_only=True)["values"]
+            assert torch.allclose(values, fused_values, atol=1e-4)
+
+    @staticmethod
+    def allocated_bytes(func) -> int:
+        with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+            func()
+        return sum(e.self_cpu_memory_usage for e in prof.key_averages() if e.self_cpu_memory_usage > 0)
+
+    def test_memory_and_latency(self):
+        batch, n = 256, 10
+        obs = self.make_obs(batch)
+        float_obs_bytes = obs["obs"].nelement() * torch.finfo(torch.float32).bits // 8
+
+        for fused in (False, True):
+            actor_critic, cfg = self.make_actor_critic(fused, normalize_input=True)
+            actor_critic.eval()
+            rnn_states = torch.zeros(batch, get_rnn_size(cfg))
+
+            timing = Timing()
+            with torch.no_grad():
+                for _ in range(n):
+                    with timing.add_time("normalize"):
+                        normalized_obs = prepare_and_normalize_obs(actor_critic, dict(obs))
+                    with timing.add_time("forward"):
+                        actor_critic(normalized_obs, rnn_states)
+
+                normalize_bytes = self.allocated_bytes(lambda: prepare_and_normalize_obs(actor_critic, dict(obs)))
+
+            # the fused path keeps obs as uint8 until the encoder, normalization must not make a float32 copy
+            if fused:
+                assert normalize_bytes < float_obs_bytes // 4
+            else:
+                assert normalize_bytes >= float_obs_bytes
+
+            log.debug(
+                "Fused normalization %r: normalization allocated %.1f MB per batch of %d, normalize+forward %.1f ms",
+                fused,
+                normalize_bytes / 1e6,
+                batch,
+                (timing.normalize + timing.forward) / n * 1000,
+            )
@@ -0,0 +1,136 @@
+import multiprocessing
+import threading
+
+import torch
+from torch import nn
+
+from sample_factory.algo.learning.learner import Learner
+from sample_factory.algo.utils.model_sharing import CheckpointSlot
+from sample_factory.utils.attr_dict import AttrDict
+
+
+def _make_checkpoint():
+    model = nn.Sequential(nn.Linear(8, 16), nn.ReLU(), nn.Linear(16, 4), nn.BatchNorm1d(4))
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+    loss = model(torch.randn(5, 8)).sum()
+    loss.backward()
+    optimizer.step()
+
+    return dict(
+        train_step=1,
+        env_steps=1000,
+        model=model.state_dict(),
+        optimizer=optimizer.state_dict(),
+        curr_lr=1e-3,
+    )
+
+
+def _assert_same(a, b):
+    if isinstance(a, torch.Tensor):
+        assert isinstance(b, torch.Tensor)
+        assert a.dtype == b.dtype and a.shape == b.shape
+        assert torch.equal(a, b)
+    elif isinstance(a, dict):
+        assert a.keys() == b.keys()
+        for key in a:
+            _assert_same(a[key], b[key])
+    elif isinstance(a, (list, tuple)):
+        assert len(a) == len(b)
+        for x, y in zip(a, b):
+            _assert_same(x, y)
+    else:
+        assert a == b
+
+
+def _read_in_another_process(slot: CheckpointSlot, res_queue):
+    checkpoint = slot.read(torch.device("cpu"))
+    res_queue.put((slot.version, checkpoint["env_steps"], checkpoint["model"]["0.weight"].sum().item()))
+
+
+class TestCheckpointSlot:
+    def test_round_trip(self):
+        slot = CheckpointSlot(1 << 20, serial_mode=True)
+        assert slot.version == -1
+        assert slot.read(torch.device("cpu")) is None
+
+        checkpoint = _make_checkpoint()
+        assert slot.publish(checkpoint, version=42)
+        assert slot.version == 42
+
+        copy = slot.read(torch.device("cpu"))
+        _assert_same(checkpoint, copy)
+
+        # the copy must not alias the slot memory
+        copy["model"]["0.weight"].zero_()
+        _assert_same(checkpoint, slot.read(torch.device("cpu")))
+
+        # loading the copy into a fresh model and optimizer should work just like loading a checkpoint file
+        model = nn.Sequential(nn.Linear(8, 16), nn.ReLU(), nn.Linear(16, 4), nn.BatchNorm1d(4))
+        optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+        copy = slot.read(torch.device("cpu"))
+        model.load_state_dict(copy["model"])
+        optimizer.load_state_dict(copy["optimizer"])
+        _assert_same(checkpoint["model"], model.state_dict())
+
+    def test_min_version(self):
+        slot = CheckpointSlot(1 << 20, serial_mode=True)
+        assert slot.read(torch.device("cpu"), min_version=-1) is None
+
+        assert slot.publish(_make_checkpoint(), version=42)
+        assert slot.read(torch.device("cpu"), min_version=42) is not None
+        assert slot.read(torch.device("cpu"), min_version=43) is None
+
+    def test_does_not_fit(self):
+        slot = CheckpointSlot(1024, serial_mode=True)
+        assert not slot.publish(_make_checkpoint(), version=1)
+        assert slot.version == -1
+
+    def test_shared_between_processes(self):
+        slot = CheckpointSlot(1 << 20, serial_mode=False)
+        checkpoint = _make_checkpoint()
+        assert slot.publish(checkpoint, version=7)
+
+        ctx = multiprocessing.get_context("spawn")
+        res_queue = ctx.Queue()
+        p = ctx.Process(target=_read_in_another_process, args=(slot, res_queue))
+        p.start()
+        version, env_steps, weight_sum = res_queue.get(timeout=60)
+        p.join()
+
+        assert version == 7
+        assert env_steps == checkpoint["env_steps"]
+        assert abs(weight_sum - checkpoint["model"]["0.weight"].sum().item()) < 1e-5
+
+
+def _learner_loading_policy(slot: CheckpointSlot, policy_version: int):
+    # only the state used to load the weights of another policy
+    learner = Learner.__new__(Learner)
+    learner.cfg = AttrDict(serial_mode=True, max_policy_lag=10)
+    learner.policy_id = 0
+    learner.device = torch.device("cpu")
+    learner.train_step = 100
+    learner.policy_versions_tensor = torch.zeros(2, dtype=torch.int32)
+    learner.param_server = AttrDict(policy_lock=threading.Lock())
+    learner.checkpoint_slots = {0: CheckpointSlot(1 << 20, serial_mode=True), 1: slot}
+
+    loaded = []
+    learner.load_from_checkpoint = lambda policy_id, load_progress: loaded.append(("file", policy_id))
+    learner._load_state = lambda checkpoint_dict, load_progress: loaded.append(("slot", checkpoint_dict["env_steps"]))
+
+    learner.set_policy_to_load(1, policy_version)
+    learner._maybe_load_policy()
+    assert learner.policy_to_load is None
+    return loaded
+
+
+class TestLoadPolicy:
+    def test_load_from_slot(self):
+        slot = CheckpointSlot(1 << 20, serial_mode=True)
+        assert slot.publish(_make_checkpoint(), version=20)
+        assert _learner_loading_policy(slot, policy_version=20) == [("slot", 1000)]
+
+    def test_stale_slot(self):
+        """Other policy saved a newer checkpoint file since it last published, don't load the old weights."""
+        slot = CheckpointSlot(1 << 20, serial_mode=True)
+        assert slot.publish(_make_checkpoint(), version=20)
+        assert _learner_loading_policy(slot, policy_version=30) == [("file", 1)]
@@ -0,0 +1,66 @@
+import numpy as np
+import torch
+
+from sample_factory.algo.utils.remote_protocol import (
+    FrameReader,
+    MsgType,
+    copy_trajectories,
+    decode_json,
+    decode_trajectories,
+    decode_weights,
+    encode_json,
+    encode_trajectories,
+    encode_weights,
+    frame,
+    trajectory_spec,
+)
+from sample_factory.algo.utils.tensor_dict import TensorDict
+
+
+def _trajectories(num_traj: int) -> TensorDict:
+    traj = TensorDict()
+    traj["obs"] = TensorDict(obs=torch.randint(0, 255, (num_traj, 9, 3, 8, 8), dtype=torch.uint8))
+    traj["rewards"] = torch.randn(num_traj, 8)
+    traj["dones"] = torch.rand(num_traj, 8) > 0.5
+    return traj
+
+
+class TestRemoteProtocol:
+    def test_frames(self):
+        data = frame(MsgType.REPORT, b"abc") + frame(MsgType.TRAJECTORIES, b"") + frame(MsgType.WEIGHTS, b"x" * 1000)
+        reader = FrameReader()
+        frames = []
+        # arbitrary chunks, as they would come from a socket
+        for i in range(0, len(data), 7):
+            frames.extend(reader.feed(data[i : i + 7]))
+        assert frames == [(MsgType.REPORT, b"abc"), (MsgType.TRAJECTORIES, b""), (MsgType.WEIGHTS, b"x" * 1000)]
+
+    def test_trajectories(self):
+        traj = _trajectories(3)
+        for compression_level in (0, 1):
+            arrays = decode_trajectories(encode_trajectories(traj, compression_level))
+            assert set(arrays.keys()) == {"obs/obs", "rewards", "dones"}
+
+            buffer = TensorDict()
+            buffer["obs"] = TensorDict(obs=torch.zeros((5, 9, 3, 8, 8), dtype=torch.uint8))
+            buffer["rewards"] = torch.zeros(5, 8)
+            buffer["dones"] = torch.zeros(5, 8, dtype=torch.bool)
+            assert trajectory_spec(buffer) == trajectory_spec(traj)
+
+            copy_trajectories(buffer, slice(3, 5), arrays, slice(1, 3))
+            assert torch.equal(buffer["obs"]["obs"][3:5], traj["obs"]["obs"][1:3])
+            assert torch.equal(buffer["rewards"][3:5], traj["rewards"][1:3])
+            assert torch.equal(buffer["dones"][3:5], traj["dones"][1:3])
+            assert buffer["rewards"][:3].abs().sum().item() == 0
+
+    def test_weights_and_reports(self):
+        state_dict = dict(weight=torch.randn(4, 4), bias=torch.zeros(4))
+        version, decoded = decode_weights(encode_weights(42, state_dict), torch.device("cpu"))
+        assert version == 42
+        assert all(torch.equal(state_dict[k], decoded[k]) for k in state_dict)
+
+        reports = [dict(episodic=dict(reward=np.float32(1.5), len=20, extra=np.arange(3)), samples_collected=64)]
+        decoded_reports = decode_json(encode_json(reports))
+        assert decoded_reports[0]["episodic"]["reward"] == 1.5
+        assert np.array_equal(decoded_reports[0]["episodic"]["extra"], np.arange(3))
+        assert decoded_reports[0]["samples_collected"] == 64
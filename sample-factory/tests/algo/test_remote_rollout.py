@@ -0,0 +1,182 @@
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+import torch
+
+from sample_factory.algo.sampling.remote_rollout import RemoteConnection, RemoteRolloutServer
+from sample_factory.algo.utils.remote_protocol import (
+    PROTOCOL_VERSION,
+    FrameReader,
+    MsgType,
+    decode_json,
+    decode_trajectories,
+    encode_trajectories,
+    frame,
+    trajectory_spec,
+)
+from sample_factory.algo.utils.tensor_dict import TensorDict
+from sample_factory.remote_rollout import RemoteRolloutClient
+
+
+class _SamplingLoop:
+    def __init__(self):
+        self.yielded = []
+
+    def yield_trajectory_buffers(self, traj_buffer_indices, device):
+        self.yielded.append((traj_buffer_indices, device))
+
+
+def _recv_all(sock: socket.socket) -> bytes:
+    chunks = []
+    while data := sock.recv(1 << 22):
+        chunks.append(data)
+    return b"".join(chunks)
+
+
+class TestRemoteRolloutClient:
+    def test_learner_back_pressure(self):
+        """Sending trajectories blocks while the learner does not read, but doesn't drop the connection."""
+        client_sock, learner_sock = socket.socketpair()
+
+        cfg = SimpleNamespace(rollout=8, remote_compression_level=0)
+        client = RemoteRolloutClient(cfg, env_info=None)
+        client.sock = client_sock
+        client.sampling_loop = _SamplingLoop()
+        # receive loop runs while the sampling thread (here, this one) is alive
+        client.sampling_thread = threading.current_thread()
+        receive_thread = threading.Thread(target=client._receive_loop, daemon=True)
+        receive_thread.start()
+
+        # random observations don't compress, this is much larger than the socket buffers
+        traj = TensorDict()
+        traj["obs"] = TensorDict(obs=torch.randint(0, 255, (4, 9, 3, 256, 256), dtype=torch.uint8))
+        traj["rewards"] = torch.randn(4, 8)
+
+        received = []
+        stall_sec = 2.0
+
+        def learner():
+            time.sleep(stall_sec)
+            received.append(_recv_all(learner_sock))
+
+        learner_thread = threading.Thread(target=learner, daemon=True)
+        learner_thread.start()
+
+        started = time.time()
+        client._on_new_trajectories(traj, slice(0, 4), "cpu")
+        assert time.time() - started >= stall_sec - 0.5
+        assert not client.disconnected
+        assert client.samples_sent == 4 * 8
+        assert client.sampling_loop.yielded == [(slice(0, 4), "cpu")]
+
+        client_sock.shutdown(socket.SHUT_WR)
+        learner_thread.join()
+
+        frames = list(FrameReader().feed(received[0]))
+        assert len(frames) == 1
+        msg_type, payload = frames[0]
+        assert msg_type == MsgType.TRAJECTORIES
+        assert torch.equal(torch.from_numpy(decode_trajectories(payload)["obs/obs"]), traj["obs"]["obs"])
+
+        # learner closes the connection, the receive loop stops
+        learner_sock.close()
+        receive_thread.join(timeout=5)
+        assert not receive_thread.is_alive()
+        client_sock.close()
+
+
+class TestRemoteRolloutServer:
+    def test_hello_rejections(self):
+        traj = TensorDict(rewards=torch.zeros(4, 8))
+        # only the state used by the handshake
+        server = RemoteRolloutServer.__new__(RemoteRolloutServer)
+        server.policy_id = 0
+        server.spec = trajectory_spec(traj)
+        sent = []
+        server._send = lambda conn, data: sent.append(data)
+
+        def hello(**kwargs):
+            sent.clear()
+            conn = RemoteConnection(None, ("localhost", 1234))
+            server._on_hello(conn, dict(protocol_version=PROTOCOL_VERSION, **kwargs))
+            msg_type, payload = next(FrameReader().feed(sent[0]))
+            return conn, msg_type, decode_json(payload)
+
+        for spec in (None, ["rewards"]):
+            kwargs = {} if spec is None else dict(spec=spec)
+            conn, msg_type, msg = hello(**kwargs)
+            assert msg_type == MsgType.ERROR
+            assert "spec" in msg["error"]
+            assert conn.closing and not conn.accepted
+
+        spec = trajectory_spec(TensorDict(rewards=torch.zeros(4, 16)))
+        conn, msg_type, msg = hello(spec=spec)
+        assert msg_type == MsgType.ERROR
+        assert "['rewards']" in msg["error"]
+
+        conn, msg_type, msg = hello(spec=server.spec)
+        assert msg_type == MsgType.WELCOME
+        assert conn.accepted
+
+    def test_invalid_trajectories(self):
+        """A worker sending trajectories that don't match the spec is dropped, others keep streaming."""
+
+        def make_traj(num_traj: int, rollout: int = 8) -> TensorDict:
+            traj = TensorDict()
+            traj["obs"] = TensorDict(obs=torch.zeros((num_traj, rollout + 1, 3, 4, 4), dtype=torch.uint8))
+            traj["rewards"] = torch.zeros(num_traj, rollout)
+            return traj
+
+        # only the state used to receive trajectories
+        server = RemoteRolloutServer.__new__(RemoteRolloutServer)
+        server.cfg = SimpleNamespace(rollout=8)
+        server.policy_id = 0
+        server.spec = trajectory_spec(make_traj(4))
+        server.pending = deque()
+        server.num_pending = server.samples_received = server.bytes_received = 0
+        server.selector = selectors.DefaultSelector()
+        server.remote_connections = dict()
+
+        def connect():
+            client_sock, server_sock = socket.socketpair()
+            conn = RemoteConnection(server_sock, ("localhost", len(server.remote_connections)))
+            conn.accepted = True
+            server.remote_connections[server_sock] = conn
+            server.selector.register(server_sock, selectors.EVENT_READ, data=conn)
+            return client_sock, conn
+
+        bad_obs = make_traj(4)
+        bad_obs["obs"]["obs"] = torch.zeros((4, 9, 3, 8, 8), dtype=torch.uint8)
+        bad_dtype = make_traj(4)
+        bad_dtype["rewards"] = bad_dtype["rewards"].double()
+        bad_len = make_traj(4)
+        bad_len["rewards"] = torch.zeros(3, 8)
+        bad_keys = make_traj(4)
+        bad_keys["dones"] = torch.zeros(4, 8)
+
+        for traj in (bad_obs, bad_dtype, bad_len, bad_keys):
+            client_sock, conn = connect()
+            # followed by a valid message that must not be processed
+            client_sock.sendall(
+                frame(MsgType.TRAJECTORIES, encode_trajectories(traj, 0))
+                + frame(MsgType.TRAJECTORIES, encode_trajectories(make_traj(4), 0))
+            )
+            server._receive(conn)
+            assert conn.sock not in server.remote_connections
+            assert client_sock.recv(1) == b""
+            assert server.num_pending == 0 and len(server.pending) == 0
+            client_sock.close()
+
+        client_sock, conn = connect()
+        client_sock.sendall(frame(MsgType.TRAJECTORIES, encode_trajectories(make_traj(4), 0)))
+        server._receive(conn)
+        assert conn.sock in server.remote_connections
+        assert server.num_pending == 4
+        assert server.samples_received == 4 * 8
+
+        client_sock.close()
+        server.selector.close()
@@ -0,0 +1,59 @@
+import json
+
+import torch
+
+from sample_factory.algo.learning.learner import Learner
+from sample_factory.algo.utils.telemetry import TelemetryAggregator, telemetry_msg
+from sample_factory.utils.attr_dict import AttrDict
+from sample_factory.utils.streaming_stats import StreamingHistogram
+
+
+class TestTelemetry:
+    def test_telemetry_aggregation(self, tmp_path):
+        cfg = AttrDict(train_dir=str(tmp_path), experiment="telemetry", num_policies=2, telemetry_interval=1.0)
+        (tmp_path / "telemetry").mkdir()
+        telemetry = TelemetryAggregator(cfg)
+
+        # two inference workers of the same policy report queue depth, histograms are merged
+        for worker, depths in (("InferenceWorker_p0-w0", [1, 2, 3]), ("InferenceWorker_p0-w1", [4, 5])):
+            h = StreamingHistogram()
+            h.add_many(depths)
+            telemetry.on_telemetry_msg(telemetry_msg(worker, 0, dict(inference_queue_depth=h)), 0)
+
+        telemetry.on_telemetry_msg(telemetry_msg("Batcher_0", 0, values=dict(collection_stopped_sec=1.0)), 0)
+        telemetry.save_snapshot({0: 100, 1: 0}, dict())
+
+        telemetry.on_telemetry_msg(telemetry_msg("Batcher_0", 0, values=dict(collection_stopped_sec=1.5)), 0)
+        telemetry.last_snapshot_time -= 1.0
+        snapshot = telemetry.save_snapshot({0: 200, 1: 0}, dict())
+
+        with open(telemetry.snapshot_path) as f:
+            saved = json.load(f)
+        assert saved["env_steps"] == {"0": 200, "1": 0}
+
+        policy_0 = snapshot["policies"]["0"]
+        assert policy_0["inference_queue_depth"]["count"] == 5
+        assert policy_0["inference_queue_depth"]["max"] == 5
+        assert policy_0["totals"]["collection_stopped_sec"] == 1.5
+        assert 0.0 < policy_0["totals"]["collection_stopped_fraction"] <= 0.5
+        assert snapshot["policies"]["1"]["components"] == dict()
+
+    def test_policy_lag_counts(self):
+        # only the state used by the policy lag telemetry
+        learner = Learner.__new__(Learner)
+        learner.cfg = AttrDict(max_policy_lag=5)
+        learner.policy_lag_counts = None
+
+        policy_version = torch.tensor([[10, 10, 9], [4, 8, 7]])
+        valids = torch.tensor([[True, True, False], [True, True, True]])
+        learner._record_policy_lag(10 - policy_version, valids)
+        learner._record_policy_lag(10 - policy_version[:1], valids[:1])
+
+        policy_lag, num_samples_too_old = learner.pop_telemetry()
+        assert policy_lag.count == 7
+        assert policy_lag.max == 5
+        assert num_samples_too_old == 1
+
+        # counts are reset after every report
+        policy_lag, num_samples_too_old = learner.pop_telemetry()
+        assert policy_lag.count == 0 and num_samples_too_old == 0
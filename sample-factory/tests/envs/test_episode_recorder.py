@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+import time
+
+import gymnasium as gym
+import numpy as np
+import psutil
+
+from sample_factory.envs.env_wrappers import RecordingWrapper
+from sample_factory.envs.episode_recorder import AsyncEpisodeWriter, load_episode_recording
+
+
+class CountingImageEnv(gym.Env):
+    def __init__(self, episode_len=10):
+        self.episode_len = episode_len
+        self.observation_space = gym.spaces.Box(0, 255, shape=(8, 6, 3), dtype=np.uint8)
+        self.action_space = gym.spaces.Discrete(4)
+        self.t = 0
+
+    def _obs(self):
+        return np.full(self.observation_space.shape, self.t, dtype=np.uint8)
+
+    def reset(self, **kwargs):
+        self.t = 0
+        return self._obs(), {}
+
+    def step(self, action):
+        self.t += 1
+        return self._obs(), 1.0, self.t >= self.episode_len, False, {}
+
+
+def _crashing_env_process(episode_dir: str, recorder_pid):
+    writer = AsyncEpisodeWriter(max_buffered_bytes=1 << 20)
+    writer.start()
+    writer.write_chunk(episode_dir, 0, np.zeros((2, 4, 4), dtype=np.uint8), [0, 1], np.zeros(2, dtype=np.float32))
+    recorder_pid.value = writer._process.pid
+    # no writer.stop(), no atexit handlers
+    os._exit(1)
+
+
+def _process_gone(pid: int) -> bool:
+    try:
+        return psutil.Process(pid).status() == psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return True
+
+
+class TestEpisodeRecorder:
+    def test_recording_roundtrip(self, tmp_path):
+        record_to = str(tmp_path)
+        env = RecordingWrapper(CountingImageEnv(episode_len=10), record_to, player_id=0, chunk_len=3)
+
+        for _ in range(2):
+            env.reset()
+            terminated = False
+            while not terminated:
+                _, _, terminated, _, _ = env.step(2)
+        env.close()
+
+        episode_dirs = sorted(os.listdir(record_to))
+        assert episode_dirs == ["ep_000_p0_r10.00", "ep_001_p0_r10.00"]
+
+        recording = load_episode_recording(os.path.join(record_to, episode_dirs[0]))
+        assert recording["frames"].shape == (10, 8, 6, 3)
+        assert recording["frames"].dtype == np.uint8
+        assert [int(f[0, 0, 0]) for f in recording["frames"]] == list(range(1, 11))
+        assert recording["actions"].tolist() == [2] * 10
+        assert np.allclose(recording["rewards"], 1.0)
+        assert recording["meta"]["num_frames"] == 10
+
+    def test_small_memory_budget(self, tmp_path):
+        record_to = str(tmp_path)
+        # budget fits only a couple of frames at a time, chunk length is reduced and env blocks on the writer
+        env = RecordingWrapper(
+            CountingImageEnv(episode_len=50), record_to, player_id=1, chunk_len=64, max_buffered_mb=1e-3
+        )
+        env.reset()
+        terminated = False
+        while not terminated:
+            _, _, terminated, _, _ = env.step(1)
+        env.close()
+
+        (episode_dir,) = os.listdir(record_to)
+        recording = load_episode_recording(os.path.join(record_to, episode_dir))
+        assert len(recording["frames"]) == 50
+
+    def test_recorder_exits_with_env_process(self, tmp_path):
+        episode_dir = str(tmp_path / "ep")
+        ctx = multiprocessing.get_context("spawn")
+        recorder_pid = ctx.Value("i", 0)
+        env_process = ctx.Process(target=_crashing_env_process, args=(episode_dir, recorder_pid))
+        env_process.start()
+        env_process.join()
+        pid = recorder_pid.value
+        assert pid != 0
+
+        deadline = time.time() + 30
+        while not _process_gone(pid) and time.time() < deadline:
+            time.sleep(0.1)
+        assert _process_gone(pid)
+
+        # what was sent before the env process died is still written
+        assert len(load_episode_recording(episode_dir)["frames"]) == 2
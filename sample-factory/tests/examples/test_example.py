@@ -1,7 +1,10 @@
+import glob
+import os
 import shutil
-from os.path import isdir
+from os.path import isdir, isfile, join
 from typing import Callable, Tuple
 
+import pandas as pd
 import pytest
 
 from sample_factory.algo.sampling.batched_sampling import BatchedVectorEnvRunner
@@ -17,6 +20,7 @@ from sample_factory.envs.env_utils import (
     find_training_info_interface,
     find_wrapper_interface,
 )
+from sample_factory.eval import do_eval
 from sample_factory.train import make_runner
 from sample_factory.utils.typing import Config
 from sample_factory.utils.utils import experiment_dir, log
@@ -138,6 +142,15 @@ class TestExample:
         cfg.async_rl = async_rl
         run_test_env(cfg, eval_cfg)
 
+    def test_eval_num_envs(self):
+        """Evaluate with several envs batched into one forward pass."""
+        cfg, eval_cfg = default_test_cfg()
+        cfg.num_workers = 1
+        cfg.train_for_env_steps = 50
+        eval_cfg.eval_num_envs = 3
+        eval_cfg.max_num_episodes = 6
+        run_test_env(cfg, eval_cfg)
+
     @pytest.mark.parametrize("batched_sampling", [True, False])
     def test_chk_envs(self, batched_sampling: bool):
         cfg, eval_cfg = default_test_cfg()
@@ -150,6 +163,53 @@ class TestExample:
         cfg.async_rl = False
         run_test_env(cfg, eval_cfg, check_envs=True)
 
+    def test_eval_checkpoints(self):
+        """Evaluate the same checkpoint twice in a row without restarting the envs."""
+        register_custom_components()
+        cfg, eval_cfg = default_test_cfg()
+        cfg.num_workers = 2
+        cfg.train_for_env_steps = 128
+        cfg.custom_env_episode_len = 20
+        # with a single action the return of every episode is known: reward is action * action_rew_coeff = 0
+        cfg.custom_env_num_actions = eval_cfg.custom_env_num_actions = 1
+
+        directory = experiment_dir(cfg=cfg, mkdir=False)
+        shutil.rmtree(directory, ignore_errors=True)
+
+        cfg, runner = make_runner(cfg)
+        assert runner.init() == ExperimentStatus.SUCCESS
+        assert runner.run() == ExperimentStatus.SUCCESS
+        reset_global_context()
+
+        register_custom_components()
+        eval_cfg.custom_env_episode_len = 20
+        eval_cfg.num_workers = 2
+        eval_cfg.num_envs_per_worker = 2
+        eval_cfg.sample_env_episodes = 8
+        eval_cfg.eval_checkpoints = "checkpoint_p0/checkpoint_*,checkpoint_p0/checkpoint_*"
+        status = do_eval(eval_cfg)
+        assert status == ExperimentStatus.SUCCESS
+
+        csv_path = join(directory, "eval_checkpoints.csv")
+        assert isfile(csv_path)
+        results = pd.read_csv(csv_path)
+        num_checkpoints = len(glob.glob(join(directory, "checkpoint_p0", "checkpoint_*")))
+        assert num_checkpoints > 0
+        assert len(results) == 2 * num_checkpoints
+
+        # every row summarizes the episodes of its own checkpoint: exactly sample_env_episodes of them,
+        # i.e. 2 per env, episodes of the previous checkpoint are dropped
+        assert (results["episodes"] == eval_cfg.sample_env_episodes).all()
+        assert (results["reward_mean"] == 0).all() and (results["reward_max"] == 0).all()
+        # episode ends on the step after custom_env_episode_len steps
+        assert (results["len_mean"] == eval_cfg.custom_env_episode_len + 1).all()
+        for _, row in results.iterrows():
+            _, train_step, env_steps = os.path.splitext(os.path.basename(row["checkpoint"]))[0].split("_")
+            assert (row["train_step"], row["env_steps"]) == (int(train_step), int(env_steps))
+
+        shutil.rmtree(directory, ignore_errors=True)
+        reset_global_context()
+
     def test_full_run(self):
         """Actually train this little env and expect some reward."""
         cfg, eval_cfg = default_test_cfg()
@@ -0,0 +1,70 @@
+import multiprocessing
+import shutil
+import socket
+from os.path import isdir
+
+from sample_factory.algo.utils.context import reset_global_context
+from sample_factory.algo.utils.misc import ExperimentStatus
+from sample_factory.remote_rollout import run_remote_rollout
+from sample_factory.train import make_runner
+from sample_factory.utils.utils import experiment_dir
+from sf_examples.train_custom_env_custom_model import register_custom_components
+from tests.examples.test_example import default_test_cfg
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def _run_remote_rollout(cfg):
+    register_custom_components()
+    run_remote_rollout(cfg)
+
+
+class TestRemoteRollout:
+    def test_remote_rollout_localhost(self):
+        """Learner and a remote rollout worker in separate processes talking over localhost."""
+        register_custom_components()
+
+        cfg, _ = default_test_cfg()
+        cfg.experiment = "test_example_remote"
+        cfg.num_workers = 1
+        cfg.serial_mode = True
+        cfg.custom_env_episode_len = 20
+        cfg.train_for_env_steps = int(1e9)
+        cfg.train_for_seconds = 40
+        cfg.with_vtrace = True
+        cfg.normalize_returns = False
+        cfg.remote_rollout_port = _free_port()
+        cfg.remote_rollout_bind_address = "localhost"
+
+        directory = experiment_dir(cfg=cfg, mkdir=False)
+        if isdir(directory):
+            shutil.rmtree(directory, ignore_errors=True)
+
+        client_cfg, _ = default_test_cfg()
+        client_cfg.__dict__.update(vars(cfg))
+        client_cfg.num_workers = 2
+        client_cfg.remote_rollout_port = 0
+        client_cfg.remote_learner_address = f"localhost:{cfg.remote_rollout_port}"
+
+        client = multiprocessing.get_context("spawn").Process(target=_run_remote_rollout, args=(client_cfg,))
+        client.start()
+
+        cfg, runner = make_runner(cfg)
+        assert runner.init() == ExperimentStatus.SUCCESS
+        assert runner.run() == ExperimentStatus.SUCCESS
+
+        # remote worker stops when the learner closes the connection
+        client.join(timeout=60)
+        assert not client.is_alive()
+        assert client.exitcode == 0
+
+        server = runner.remote_rollout_server
+        assert server.samples_received > 0
+        assert server.stats()["remote_bytes_per_sample"] > 0
+
+        shutil.rmtree(directory, ignore_errors=True)
+        reset_global_context()
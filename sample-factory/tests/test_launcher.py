@@ -3,10 +3,12 @@ import shutil
 from os.path import join, split
 
 import numpy as np
+from tensorboardX import SummaryWriter
 
 from sample_factory.launcher.run import launcher_argparser
 from sample_factory.launcher.run_description import Experiment, ParamGrid, ParamList, RunDescription
 from sample_factory.launcher.run_processes import run
+from sample_factory.launcher.scheduling import AsyncSuccessiveHalving, ResourcePool, SummaryMonitor
 from sample_factory.utils.utils import ensure_dir_exists, project_tmp_dir
 
 
@@ -103,3 +105,112 @@ class TestLauncher:
         logging.disable(logging.NOTSET)
 
         shutil.rmtree(join(train_dir, root_dir_name))
+
+    def test_resource_aware_cmd(self):
+        logging.disable(logging.INFO)
+
+        echo_params = ParamGrid([("p1", [1, 2, 3, 4])])
+        experiments = [
+            Experiment("test_echo_cpus", "echo", echo_params.generate_params(randomize=False)),
+            Experiment("test_echo_big", "echo", echo_params.generate_params(randomize=False), cpus=1000),
+        ]
+        train_dir = ensure_dir_exists(join(project_tmp_dir(), "tests"))
+        root_dir_name = "__test_run_resources__"
+        rd = RunDescription(root_dir_name, experiments)
+
+        args = launcher_argparser([]).parse_args(["--cpus_per_experiment=1", "--memory_gb_per_experiment=0.1"])
+        args.max_parallel = 8
+        args.pause_between = 0
+        args.train_dir = train_dir
+        args.asha_min_env_steps = 1000
+        args.monitor_interval = 0
+
+        assert run(rd, args) == 0
+
+        logging.disable(logging.NOTSET)
+
+        shutil.rmtree(join(train_dir, root_dir_name))
+
+
+class TestScheduling:
+    def test_resource_pool(self):
+        pool = ResourcePool(cores=[0, 1, 2, 3], memory_gb=8.0)
+
+        cores1, mem1 = pool.allocate(2, 3.0)
+        assert cores1 == [0, 1] and mem1 == 3.0
+        assert pool.can_allocate(2, 5.0)
+        assert not pool.can_allocate(3, 1.0)
+        assert not pool.can_allocate(1, 6.0)
+
+        cores2, _ = pool.allocate(1, 1.0)
+        assert cores2 == [2]
+
+        pool.release(cores1, mem1)
+        cores3, _ = pool.allocate(3, 4.0)
+        assert cores3 == [0, 1, 3]
+
+        pool.release(cores2, 1.0)
+        pool.release(cores3, 4.0)
+        assert sorted(pool.free_cores) == [0, 1, 2, 3] and pool.free_memory_gb == 8.0
+
+        # too big to ever fit, scheduled alone on the whole machine
+        assert pool.can_allocate(100, 100.0)
+        cores, mem = pool.allocate(100, 100.0)
+        assert len(cores) == 4 and mem == 8.0
+        assert not pool.can_allocate(0, 0.1)
+
+    def test_asha(self):
+        asha = AsyncSuccessiveHalving(min_env_steps=100, reduction_factor=2, num_rungs=3)
+        assert sorted(m for m, _ in asha.rungs) == [100, 200, 400]
+
+        # nothing to compare to before the first milestone or for the first run at each rung
+        assert not asha.on_result("a", 50, 0.0)
+        assert not asha.on_result("a", 100, 5.0)
+        assert not asha.on_result("a", 150, 0.0)  # already judged at this rung
+
+        assert asha.on_result("b", 110, 1.0)
+        assert not asha.on_result("c", 120, 10.0)
+        assert asha.on_result("d", 100, 4.0)
+
+        # runs are judged at the highest milestone they've reached
+        assert not asha.on_result("c", 450, 3.0)
+        assert "c" not in asha.rungs[1][1]
+        assert asha.on_result("a", 400, 2.0)
+
+    def test_asha_judged_once(self):
+        asha = AsyncSuccessiveHalving(min_env_steps=100, reduction_factor=3, num_rungs=3)
+        assert not asha.on_result("a", 100, 8.0)
+        assert not asha.on_result("b", 100, 9.0)
+        assert not asha.on_result("c", 100, 10.0)
+
+        # first seen past the second milestone, nothing to compare to there, so it's kept
+        assert not asha.on_result("d", 350, 1.0)
+        # later results must not judge it again at the lower milestone, where it would be below the cutoff
+        assert not asha.on_result("d", 360, 1.0)
+        assert "d" not in asha.rungs[-1][1]
+
+    def test_summary_monitor(self):
+        experiment_dir = join(project_tmp_dir(), "tests", "__test_summary_monitor__")
+        shutil.rmtree(experiment_dir, ignore_errors=True)
+
+        monitor = SummaryMonitor(experiment_dir, "reward/reward")
+        assert monitor.latest() is None
+
+        summary_dir = join(experiment_dir, ".summary", "0")
+        writer = SummaryWriter(summary_dir)
+        writer.add_scalar("perf/_fps", 1000.0, 10)
+        writer.close()
+        assert monitor.latest() is None
+
+        writer = SummaryWriter(summary_dir, filename_suffix=".1")
+        for step, reward in ((10, 1.0), (20, 2.0), (30, 1.5)):
+            writer.add_scalar("reward/reward", reward, step)
+        writer.close()
+        assert monitor.latest() == (30, 1.5)
+
+        writer = SummaryWriter(summary_dir, filename_suffix=".2")
+        writer.add_scalar("reward/reward", 3.0, 40)
+        writer.close()
+        assert monitor.latest() == (40, 3.0)
+
+        shutil.rmtree(experiment_dir)
@@ -1,9 +1,29 @@
+import functools
+import json
+import multiprocessing
+import multiprocessing.forkserver
+import os
+import random
 import time
+from types import SimpleNamespace
 
+import numpy as np
+
+from sample_factory.algo.runners.runner import Runner
+from sample_factory.algo.utils.context import reset_global_context
+from sample_factory.algo.utils.misc import EPISODIC
+from sample_factory.algo.utils.multiprocessing_utils import FORKSERVER_PRELOAD_MODULES, get_mp_ctx, init_mp_ctx
+from sample_factory.envs.env_utils import register_env
+from sample_factory.envs.env_wrappers import ENV_UID_KEY, EPISODE_START_TIME_KEY
+from sample_factory.utils import tracing
 from sample_factory.utils.dicts import list_of_dicts_to_dict_of_lists
+from sample_factory.utils.elo import EloLadder
 from sample_factory.utils.network import is_udp_port_available
+from sample_factory.utils.streaming_stats import EpisodicStatsSketches, SketchWindow, StreamingHistogram
 from sample_factory.utils.timing import Timing
+from sample_factory.utils.tracing import EventTracer, merge_traces
 from sample_factory.utils.utils import cores_for_worker_process, log
+from sf_examples.train_custom_env_custom_model import make_custom_env_func
 
 
 class TestUtils:
@@ -53,8 +73,145 @@ class TestUtils:
         log.debug(t.flat_str())
         log.debug(t)  # tree view
 
+    def test_timing_trace(self, tmp_path):
+        tracer = EventTracer("test_process", capacity=5)
+        tracing.TRACER = tracer
+        try:
+            t = Timing(name="TraceProfile")
+            with t.add_time("outer"):
+                for i in range(6):
+                    with t.add_time("inner"):
+                        pass
+        finally:
+            tracing.TRACER = None
+
+        assert tracer.num_recorded == 7
+
+        tracer.dump(str(tmp_path))
+        merged = merge_traces(str(tmp_path))
+        assert os.path.basename(merged) == tracing.MERGED_TRACE_FILE
+        with open(merged) as f:
+            trace = json.load(f)
+
+        # ring buffer keeps only the most recent events, in order
+        events = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+        assert [e["name"] for e in events] == ["inner"] * 4 + ["outer"]
+        assert all(e["cat"] == "TraceProfile" and e["dur"] >= 0 for e in events)
+        assert events[-1]["ts"] <= events[0]["ts"]
+
     def test_list_of_dicts_to_dict_of_lists(self):
         """Test list_of_dicts_to_dict_of_lists() with recursive dicts."""
         lt = [{"a": 1, "b": {"c": 2, "d": 3}}, {"a": 4, "b": {"c": 5, "d": 6}}]
         d = list_of_dicts_to_dict_of_lists(lt)
         assert d == {"a": [1, 4], "b": {"c": [2, 5], "d": [3, 6]}}
+
+    def test_streaming_histogram(self):
+        rng = np.random.default_rng(0)
+        values = np.concatenate([rng.normal(-5, 2, 5000), rng.exponential(10, 5000), np.zeros(100)])
+
+        # merging sketches of two halves is equivalent to sketching everything at once
+        h1, h2 = StreamingHistogram(0.01), StreamingHistogram(0.01)
+        h1.add_many(values[::2])
+        h2.add_many(values[1::2])
+        h1.merge(h2)
+
+        assert h1.count == len(values)
+        assert np.isclose(h1.mean, values.mean())
+        assert h1.min == values.min() and h1.max == values.max()
+
+        for q in (0.01, 0.05, 0.5, 0.95, 0.99):
+            exact = np.quantile(values, q)
+            assert abs(h1.quantile(q) - exact) <= 0.02 * abs(exact) + 1e-2
+
+        hist = h1.tensorboard_histogram(max_bins=32)
+        assert sum(hist["bucket_counts"]) == len(values)
+        assert len(hist["bucket_limits"]) <= 32
+
+        window = SketchWindow(min_count=100)
+        for i in range(10):
+            h = StreamingHistogram()
+            h.add_many([float(i)] * 60)
+            window.add(h)
+        merged = window.merged()
+        assert merged.count == 120 and merged.min == 8.0 and merged.max == 9.0
+
+    def test_episode_bookkeeping_not_summarized(self):
+        stats = dict(
+            reward=np.array([1.0, 2.0]),
+            episode_extra_stats=dict(
+                episode_number=np.array([0, 3]),
+                **{ENV_UID_KEY: np.array([1234.0, 5678.0]), EPISODE_START_TIME_KEY: np.array([1e9, 1e9])},
+            ),
+        )
+
+        runner = SimpleNamespace(
+            cfg=SimpleNamespace(stats_avg=100, num_policies=1),
+            policy_avg_stats=dict(),
+            pending_stats_sketches=EpisodicStatsSketches(num_policies=1),
+        )
+        Runner._episodic_stats_handler(runner, {EPISODIC: stats}, 0)
+
+        assert sorted(runner.policy_avg_stats) == ["episode_number", "reward"]
+        assert list(runner.policy_avg_stats["episode_number"][0]) == [0, 3]
+        assert sorted(runner.pending_stats_sketches.pop(0)) == ["episode_number", "reward"]
+
+    def test_mp_ctx(self):
+        prev_ctx = get_mp_ctx.mp_ctx
+        prev_preload = multiprocessing.forkserver._forkserver._preload_modules
+        register_env("test_mp_ctx_env", functools.partial(make_custom_env_func, render_mode=None))
+
+        try:
+            for start_method in multiprocessing.get_all_start_methods():
+                init_mp_ctx(SimpleNamespace(serial_mode=False, worker_start_method=start_method))
+                assert get_mp_ctx(serial=False).get_start_method() == start_method
+                assert get_mp_ctx(serial=True) is None
+
+                if start_method == "forkserver":
+                    preload = multiprocessing.forkserver._forkserver._preload_modules
+                    assert preload[: len(FORKSERVER_PRELOAD_MODULES)] == FORKSERVER_PRELOAD_MODULES
+                    # modules that define registered envs are preloaded as well
+                    assert "sf_examples.train_custom_env_custom_model" in preload
+
+            # serial mode doesn't touch the context
+            ctx = get_mp_ctx.mp_ctx
+            init_mp_ctx(SimpleNamespace(serial_mode=True, worker_start_method="spawn"))
+            assert get_mp_ctx.mp_ctx is ctx
+        finally:
+            get_mp_ctx.mp_ctx = prev_ctx
+            multiprocessing.forkserver._forkserver._preload_modules = prev_preload
+            reset_global_context()
+
+    def test_elo_ladder(self, tmp_path):
+        ladder = EloLadder(k_factor=32.0)
+
+        # duel between equal players: winner gets k/2
+        deltas = ladder.update(["a", "b"], [10, 3])
+        assert np.isclose(deltas["a"], 16.0) and np.isclose(deltas["b"], -16.0)
+        assert ladder.entries["a"].wins == 1 and ladder.entries["b"].wins == 0
+
+        # multiplayer match is a set of pairwise games, ratings are zero-sum
+        ladder.update(["a", "b", "c", "d"], [5, 5, 1, 8])
+        assert np.isclose(sum(e.rating for e in ladder.entries.values()), 4 * 1000.0)
+        assert ladder.standings()[0] in ("a", "d") and ladder.standings()[-1] == "c"
+        assert ladder.num_matches == 2
+
+        # stronger player gains less for an expected win
+        rating_a = ladder.rating("a")
+        deltas = ladder.update(["a", "c"], [3, 1])
+        assert 0 < deltas["a"] < 16.0 and ladder.rating("a") > rating_a
+
+        path = str(tmp_path / "ladder.json")
+        ladder.save(path)
+        loaded = EloLadder.load(path)
+        assert loaded == ladder
+        assert "rating" in loaded.table()
+
+        # the least played player is always in the next match, scheduled matches count as played
+        rng = random.Random(0)
+        for name in ("e", "f"):
+            loaded.add_player(name)
+        players = ["a", "b", "c", "d", "e", "f"]
+        match = loaded.matchmake(players, 3, rng=rng)
+        assert len(set(match)) == 3 and ("e" in match or "f" in match)
+        match = loaded.matchmake(players, 2, scheduled=["e"], rng=rng)
+        assert "f" in match